@@ -0,0 +1,102 @@
+"""
+Microbenchmark: logging cost per adjudicated claim.
+
+Runs the in-process line adjudication (no mock API sleeps) for a 10-line claim with the claim tools' loggers at
+DEBUG, INFO and WARNING, writing to a discarded stream, and compares an eagerly formatted f-string payload dump
+(what the tools used to do on every claim) with the lazy DEBUG call that replaced it.
+
+    python benchmarks/bench_logging.py [--claims 2000]
+"""
+import argparse
+import io
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "insurance"))
+
+from policy_adjudication_tools import (  # noqa: E402
+    BenefitsEngineTool,
+    MOCK_POLICY_DB,
+    _adjudicate_claim_lines,
+)
+
+CPT_CODES = ["99213", "99214", "80053", "71046", "97110"]
+
+
+def make_claim(lines: int = 10) -> dict:
+    return {
+        "member_id": "MEMBER123",
+        "patient_name": "John Doe",
+        "member_eligibility": {"member_id": "MEMBER123", "date_of_service": "2024-03-15", "is_eligible": True, "plan_id": "PPO_GOLD"},
+        "services": [
+            {
+                "date_of_service": "2024-03-15",
+                "cpt_code": CPT_CODES[i % len(CPT_CODES)],
+                "icd_10_code": "M54.5",
+                "provider_npi": "1234567890",
+                "charge_amount": 100.0 + 25 * i,
+                "network_status": "In-Network",
+            }
+            for i in range(lines)
+        ],
+    }
+
+
+def adjudicate_once(claim: dict, policy: dict, engine: BenefitsEngineTool):
+    adjudicated = claim.copy()
+    adjudicated["services"] = [line.copy() for line in claim["services"]]
+    _adjudicate_claim_lines(
+        adjudicated,
+        claim["member_id"],
+        2024,
+        {2024: policy},
+        {2024: {"deductible_met_individual": 0.0, "oop_max_met_individual": 0.0}},
+        lambda cpt, icd: (True, {"status": "Not Required"}, None),
+        lambda cpt, icd: (True, {"status": "Covered"}, None),
+        engine,
+    )
+
+
+def per_claim_us(func, claims: int) -> float:
+    return min(timeit.repeat(func, number=claims, repeat=3)) / claims * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--claims", type=int, default=2000)
+    args = parser.parse_args()
+
+    claim = make_claim()
+    policy = MOCK_POLICY_DB["PPO_GOLD"]
+    engine = BenefitsEngineTool()
+
+    # The host owns configuration: one handler on the root logger writing to a discarded stream
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    bench_logger = logging.getLogger("bench_logging")
+
+    print(f"Per-claim cost, {len(claim['services'])} lines, {args.claims} claims per run (best of 3):")
+    results = {}
+    for level in (logging.DEBUG, logging.INFO, logging.WARNING):
+        root.setLevel(level)
+        handler.stream = io.StringIO()
+        results[level] = per_claim_us(lambda: adjudicate_once(claim, policy, engine), args.claims)
+        print(f"  adjudication, loggers at {logging.getLevelName(level):<7} {results[level]:9.1f} us")
+
+    root.setLevel(logging.INFO)
+    eager = per_claim_us(lambda: bench_logger.debug(f"processed_claim_data: {claim}"), args.claims)
+    lazy = per_claim_us(lambda: bench_logger.debug("processed_claim_data: %s", claim), args.claims)
+    print(f"  payload dump, eager f-string      {eager:9.1f} us")
+    print(f"  payload dump, lazy DEBUG          {lazy:9.1f} us")
+    print(f"Savings vs DEBUG: {results[logging.DEBUG] - results[logging.WARNING]:.1f} us/claim at WARNING, "
+          f"{results[logging.DEBUG] - results[logging.INFO]:.1f} us/claim at INFO; "
+          f"{eager - lazy:.1f} us/claim for the payload dump alone")
+    root.removeHandler(handler)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Benchmark harness for the claim pipeline stages.
+
+Generates a seeded synthetic workload (see synthetic_claims.py) and runs each selected stage over it, reporting
+throughput, per-call latency percentiles and peak Python memory (tracemalloc, measured in a separate pass so it
+does not slow down the timed one). Mock API latencies are zero by default (CPU cost only); use --latency realistic
+to keep the mock sleeps. Accumulators are reset before every pass, so runs are repeatable.
+
+    python benchmarks/bench_pipeline.py --lines 100k --stages validate,benefits_engine,adjudicate_batch
+    python benchmarks/bench_pipeline.py --lines 1k --latency realistic --json before.json
+
+Stages:
+    validate           validate_claim_data, one call per claim (JSON string input)
+    eligibility        check_eligibility, one call per claim
+    eligibility_bulk   check_eligibility_bulk, one call per --batch-size claims
+    network            check_network_status, one call per service line (cached per NPI/plan)
+    network_bulk       check_network_status_bulk, one call per --batch-size claims
+    benefits_engine    BenefitsEngineTool.adjudicate_claim_line, one call per service line
+    adjudicate         adjudicate_claim, one call per claim (JSON string input)
+    adjudicate_batch   adjudicate_claims_batch, one call per --batch-size claims
+    pipeline           claim_pipeline.process_claim end to end, one call per claim (JSON string input)
+    pipeline_batch     claim_pipeline.process_claims_batch, one call per --batch-size claims
+    pipeline_pool      claim_worker_pool.ClaimWorkerPool over --workers processes, one call for the whole workload
+                       (including worker start-up; workers batch up to --batch-size claims)
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from synthetic_claims import SyntheticDataset, parse_count
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "insurance"))
+
+import claim_pipeline  # noqa: E402
+import claim_worker_pool  # noqa: E402
+import claim_validation_tools  # noqa: E402
+import policy_adjudication_tools  # noqa: E402
+from claim_metrics import LatencyHistogram  # noqa: E402
+from mock_latency import get_mock_latency_scale, set_mock_latency_scale  # noqa: E402
+
+
+def _unwrap(tool_function):
+    # @tool wraps the function in a PythonTool whose __call__ returns a ToolResponse; benchmark the plain function
+    return getattr(tool_function, "fn", tool_function)
+
+
+validate_claim_data = _unwrap(claim_validation_tools.validate_claim_data)
+check_eligibility = _unwrap(claim_validation_tools.check_eligibility)
+check_network_status = _unwrap(claim_validation_tools.check_network_status)
+adjudicate_claim = _unwrap(policy_adjudication_tools.adjudicate_claim)
+
+
+# Each stage yields (lines, claims, call) work items; only call() is timed
+def _validate_items(dataset: SyntheticDataset, total_lines: int, batch_size: int):
+    for claim in dataset.iter_claims(total_lines):
+        claim_json = json.dumps(claim)
+        yield len(claim["services"]), 1, lambda claim_json=claim_json: validate_claim_data(claim_json)
+
+
+def _eligibility_items(dataset: SyntheticDataset, total_lines: int, batch_size: int):
+    for claim in dataset.iter_claims(total_lines):
+        member_id, dos = claim["member_id"], claim["services"][0]["date_of_service"]
+        yield len(claim["services"]), 1, lambda: check_eligibility(member_id, dos)
+
+
+def _eligibility_bulk_items(dataset: SyntheticDataset, total_lines: int, batch_size: int):
+    checks = []
+    lines = 0
+    for claim in dataset.iter_claims(total_lines):
+        checks.append((claim["member_id"], claim["services"][0]["date_of_service"]))
+        lines += len(claim["services"])
+        if len(checks) == batch_size:
+            yield lines, len(checks), lambda checks=checks: claim_validation_tools.check_eligibility_bulk(checks)
+            checks = []
+            lines = 0
+    if checks:
+        yield lines, len(checks), lambda: claim_validation_tools.check_eligibility_bulk(checks)
+
+
+def _network_items(dataset: SyntheticDataset, total_lines: int, batch_size: int):
+    for claim in dataset.iter_claims(total_lines):
+        plan_id = dataset.member_plans[claim["member_id"]]
+        for line in claim["services"]:
+            npi = line.get("provider_npi")
+            yield 1, 0, lambda npi=npi: check_network_status(npi, plan_id)
+
+
+def _network_bulk_items(dataset: SyntheticDataset, total_lines: int, batch_size: int):
+    checks = []
+    claims = 0
+    for claim in dataset.iter_claims(total_lines):
+        plan_id = dataset.member_plans[claim["member_id"]]
+        checks.extend((line.get("provider_npi"), plan_id) for line in claim["services"])
+        claims += 1
+        if claims == batch_size:
+            yield len(checks), claims, lambda checks=checks: claim_validation_tools.check_network_status_bulk(checks)
+            checks = []
+            claims = 0
+    if checks:
+        yield len(checks), claims, lambda: claim_validation_tools.check_network_status_bulk(checks)
+
+
+def _benefits_engine_items(dataset: SyntheticDataset, total_lines: int, batch_size: int):
+    engine = policy_adjudication_tools.BenefitsEngineTool()
+    for claim in dataset.iter_validated_claims(total_lines):
+        member_id = claim["member_id"]
+        policy = dataset.plans[claim["member_eligibility"]["plan_id"]]
+        compiled_plan = policy_adjudication_tools.get_compiled_plan(policy)
+        accumulators = dict(dataset.accumulators.get(
+            f"{member_id}_{claim['services'][0]['date_of_service'][:4]}",
+            {"deductible_met_individual": 0.0, "oop_max_met_individual": 0.0},
+        ))
+        for line in claim["services"]:
+            yield 1, 0, lambda line=line: engine.adjudicate_claim_line(line, policy, accumulators, compiled_plan)
+
+
+def _adjudicate_items(dataset: SyntheticDataset, total_lines: int, batch_size: int):
+    for claim in dataset.iter_validated_claims(total_lines):
+        claim_json = json.dumps(claim)
+        yield len(claim["services"]), 1, lambda claim_json=claim_json: adjudicate_claim(claim_json)
+
+
+def _adjudicate_batch_items(dataset: SyntheticDataset, total_lines: int, batch_size: int):
+    batch = []
+    for claim in dataset.iter_validated_claims(total_lines):
+        batch.append(claim)
+        if len(batch) == batch_size:
+            yield sum(len(c["services"]) for c in batch), len(batch), lambda batch=batch: policy_adjudication_tools.adjudicate_claims_batch(batch)
+            batch = []
+    if batch:
+        yield sum(len(c["services"]) for c in batch), len(batch), lambda: policy_adjudication_tools.adjudicate_claims_batch(batch)
+
+
+def _pipeline_items(dataset: SyntheticDataset, total_lines: int, batch_size: int):
+    for claim in dataset.iter_claims(total_lines):
+        claim_json = json.dumps(claim)
+        yield len(claim["services"]), 1, lambda claim_json=claim_json: claim_pipeline.process_claim(claim_json)
+
+
+def _pipeline_batch_items(dataset: SyntheticDataset, total_lines: int, batch_size: int):
+    batch = []
+    for claim in dataset.iter_claims(total_lines):
+        batch.append(claim)
+        if len(batch) == batch_size:
+            yield sum(len(c["services"]) for c in batch), len(batch), lambda batch=batch: claim_pipeline.process_claims_batch(batch)
+            batch = []
+    if batch:
+        yield sum(len(c["services"]) for c in batch), len(batch), lambda: claim_pipeline.process_claims_batch(batch)
+
+
+def _install_in_worker(dataset: SyntheticDataset, latency_scale: float):
+    set_mock_latency_scale(latency_scale)
+    dataset.install()
+
+
+# Worker processes of the pipeline_pool stage (--workers)
+pool_workers = os.cpu_count() or 1
+
+
+def _pipeline_pool_items(dataset: SyntheticDataset, total_lines: int, batch_size: int):
+    claims = list(dataset.iter_claims(total_lines))
+
+    def run():
+        with claim_worker_pool.ClaimWorkerPool(workers=pool_workers, batch_size=batch_size, output_mode="summary",
+                                               initializer=_install_in_worker,
+                                               initargs=(dataset, get_mock_latency_scale())) as pool:
+            pool.process_claims(claims)
+    yield sum(len(c["services"]) for c in claims), len(claims), run
+
+
+STAGES = {
+    "validate": _validate_items,
+    "eligibility": _eligibility_items,
+    "eligibility_bulk": _eligibility_bulk_items,
+    "network": _network_items,
+    "network_bulk": _network_bulk_items,
+    "benefits_engine": _benefits_engine_items,
+    "adjudicate": _adjudicate_items,
+    "adjudicate_batch": _adjudicate_batch_items,
+    "pipeline": _pipeline_items,
+    "pipeline_batch": _pipeline_batch_items,
+    "pipeline_pool": _pipeline_pool_items,
+}
+
+
+def run_stage(stage: str, dataset: SyntheticDataset, total_lines: int, batch_size: int, measure_memory: bool) -> dict:
+    dataset.reset_accumulators()
+    policy_adjudication_tools.invalidate_policy_cache()
+    claim_validation_tools.invalidate_network_status_cache()
+    histogram = LatencyHistogram()
+    lines = claims = 0
+    gc.collect()
+    wall_start = time.perf_counter()
+    for item_lines, item_claims, call in STAGES[stage](dataset, total_lines, batch_size):
+        start = time.perf_counter()
+        call()
+        histogram.record(time.perf_counter() - start)
+        lines += item_lines
+        claims += item_claims
+    wall_seconds = time.perf_counter() - wall_start
+    busy_seconds = histogram.total
+
+    result = {
+        "stage": stage,
+        "calls": histogram.count,
+        "lines": lines,
+        "claims": claims,
+        "busy_seconds": round(busy_seconds, 4),
+        "wall_seconds": round(wall_seconds, 4),
+        "lines_per_second": round(lines / busy_seconds, 1) if busy_seconds else None,
+        "claims_per_second": round(claims / busy_seconds, 1) if busy_seconds and claims else None,
+        "latency_ms": {key: value for key, value in histogram.summary().items() if key != "count"},
+        "peak_memory_mb": None,
+    }
+
+    if measure_memory:
+        dataset.reset_accumulators()
+        policy_adjudication_tools.invalidate_policy_cache()
+        claim_validation_tools.invalidate_network_status_cache()
+        gc.collect()
+        tracemalloc.start()
+        for _, _, call in STAGES[stage](dataset, total_lines, batch_size):
+            call()
+        result["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+    return result
+
+
+def _format_rate(rate: float | None) -> str:
+    return f"{rate:,.0f}" if rate is not None else "-"
+
+
+def main(argv: list[str] | None = None) -> list[dict]:
+    global pool_workers
+    parser = argparse.ArgumentParser(description="Benchmark the claim pipeline stages on synthetic data.")
+    parser.add_argument("--lines", type=parse_count, default=10_000, help="service lines per stage, e.g. 1k, 100k, 1M")
+    parser.add_argument("--stages", default="validate,benefits_engine,adjudicate_batch",
+                        help=f"comma-separated subset of: {', '.join(STAGES)} (or 'all')")
+    parser.add_argument("--latency", choices=("zero", "realistic"), default="zero", help="mock API sleep latencies")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--members", type=int, default=5_000)
+    parser.add_argument("--plans", type=int, default=8)
+    parser.add_argument("--providers", type=int, default=1_000)
+    parser.add_argument("--batch-size", type=int, default=500, help="claims per adjudicate_claims_batch call")
+    parser.add_argument("--workers", type=int, default=pool_workers, help="worker processes for pipeline_pool")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON (to compare runs)")
+    args = parser.parse_args(argv)
+
+    stages = list(STAGES) if args.stages == "all" else [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    pool_workers = args.workers
+    set_mock_latency_scale(1.0 if args.latency == "realistic" else 0.0)
+    dataset = SyntheticDataset(seed=args.seed, members=args.members, plans=args.plans, providers=args.providers)
+    dataset.install()
+
+    print(f"{args.lines:,} lines, seed {args.seed}, latency {args.latency}, Python {platform.python_version()}")
+    header = f"{'stage':<18}{'calls':>9}{'lines/s':>12}{'claims/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    results = []
+    for stage in stages:
+        result = run_stage(stage, dataset, args.lines, args.batch_size, not args.no_memory)
+        results.append(result)
+        latency = result["latency_ms"]
+        print(
+            f"{stage:<18}{result['calls']:>9,}{_format_rate(result['lines_per_second']):>12}{_format_rate(result['claims_per_second']):>11}"
+            f"{latency['p50_ms']:>10.3f}{latency['p95_ms']:>10.3f}{latency['p99_ms']:>10.3f}{latency['max_ms']:>10.3f}"
+            f"{result['peak_memory_mb'] if result['peak_memory_mb'] is not None else '-':>9}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
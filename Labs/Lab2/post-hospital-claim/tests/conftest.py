@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# The claim tools import each other as top-level modules, as they do when imported into Orchestrate
+sys.path.insert(0, os.path.join(HERE, "..", "tools", "insurance"))
+sys.path.insert(0, os.path.join(HERE, "..", "benchmarks"))
+# No simulated API latency; read when mock_latency is first imported
+os.environ["MOCK_API_LATENCY_SCALE"] = "0"
+
+import policy_adjudication_tools  # noqa: E402
+from accumulator_store import InMemoryAccumulatorStore  # noqa: E402
+
+_SEED_ACCUMULATORS = {key: values.copy() for key, values in policy_adjudication_tools.MOCK_ACCUMULATORS_DB.items()}
+
+
+def seed_accumulators() -> dict:
+    """The seed balances of MOCK_ACCUMULATORS_DB, as {"<member_id>_<benefit_year>": values}."""
+    return {key: values.copy() for key, values in _SEED_ACCUMULATORS.items()}
+
+
+@pytest.fixture
+def reset_accumulators():
+    """
+    Returns reset(): points the accumulator API at a fresh in-memory store with the seed balances, forgets remembered
+    adjudications and returns the store. The previous store is put back after the test.
+    """
+    previous = policy_adjudication_tools.ACCUMULATOR_STORE
+
+    def reset() -> InMemoryAccumulatorStore:
+        policy_adjudication_tools.ACCUMULATOR_STORE = InMemoryAccumulatorStore(seed_accumulators())
+        policy_adjudication_tools.invalidate_adjudication_results()
+        return policy_adjudication_tools.ACCUMULATOR_STORE
+
+    yield reset
+    policy_adjudication_tools.ACCUMULATOR_STORE = previous
+    policy_adjudication_tools.invalidate_adjudication_results()
+
+
+@pytest.fixture
+def accumulators(reset_accumulators) -> InMemoryAccumulatorStore:
+    """A fresh accumulator store with the seed balances (see reset_accumulators)."""
+    return reset_accumulators()
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import policy_adjudication_tools
+from policy_adjudication_tools import ACCUMULATOR_UPDATE_LOST, DUPLICATE_SUBMISSION
+from accumulator_journal import AccumulatorJournal
+from accumulator_store import InMemoryAccumulatorStore
+
+DEDUCTIBLE = "deductible_met_individual"
+OOP = "oop_max_met_individual"
+
+
+def _journal(tmp_path, **kwargs) -> AccumulatorJournal:
+    return AccumulatorJournal(str(tmp_path / "accumulators.journal"), snapshot_path=str(tmp_path / "accumulators.snapshot"),
+                              group_commit_window=0, fsync=False, **kwargs)
+
+
+class TestAccumulatorJournal:
+    def test_replay_applies_each_claim_once(self, tmp_path):
+        journal = _journal(tmp_path)
+        journal.append("CLM1", "M1", 2023, {DEDUCTIBLE: 10.0})
+        journal.append_many([("CLM2", "M1", 2023, {DEDUCTIBLE: 5.0}), ("CLM3", "M2", 2023, {DEDUCTIBLE: 1.0})])
+        store = InMemoryAccumulatorStore()
+        assert journal.replay(store) == 3
+        assert journal.replay(store) == 0
+        assert store.get("M1", 2023)[0][DEDUCTIBLE] == 15.0
+        assert store.get("M2", 2023)[0][DEDUCTIBLE] == 1.0
+
+    def test_last_record_of_a_claim_wins(self, tmp_path):
+        # A claim is journaled again when it is re-adjudicated after losing a compare-and-swap
+        journal = _journal(tmp_path)
+        journal.append("CLM1", "M1", 2023, {DEDUCTIBLE: 10.0})
+        journal.append("CLM1", "M1", 2023, {DEDUCTIBLE: 7.0})
+        store = InMemoryAccumulatorStore()
+        assert journal.replay(store) == 1
+        assert store.get("M1", 2023)[0][DEDUCTIBLE] == 7.0
+
+    def test_replay_skips_claims_already_in_the_store(self, tmp_path):
+        journal = _journal(tmp_path)
+        store = InMemoryAccumulatorStore()
+        journal.append("CLM1", "M1", 2023, {DEDUCTIBLE: 10.0})
+        store.apply_deltas("M1", 2023, [{DEDUCTIBLE: 10.0}], claim_ids=["CLM1"])
+        assert journal.replay(store) == 0
+        assert store.get("M1", 2023)[0][DEDUCTIBLE] == 10.0
+
+    def test_torn_last_record_is_skipped(self, tmp_path):
+        journal = _journal(tmp_path)
+        journal.append("CLM1", "M1", 2023, {DEDUCTIBLE: 10.0})
+        journal.close()
+        with open(journal.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"claim_id": "CLM2", "member_id": "M1"})[:20])
+        store = InMemoryAccumulatorStore()
+        assert _journal(tmp_path).replay(store) == 1
+        assert store.get("M1", 2023)[0][DEDUCTIBLE] == 10.0
+
+    def test_recover_after_compaction(self, tmp_path):
+        journal = _journal(tmp_path)
+        store = InMemoryAccumulatorStore()
+        journal.append("CLM1", "M1", 2023, {DEDUCTIBLE: 10.0})
+        assert journal.compact(store) == 1
+        journal.append("CLM2", "M1", 2023, {DEDUCTIBLE: 5.0})
+        journal.close()
+
+        # A restart: the snapshot has CLM1, the new journal CLM2
+        recovered = InMemoryAccumulatorStore()
+        assert _journal(tmp_path).recover(recovered) == 1
+        assert recovered.get("M1", 2023)[0][DEDUCTIBLE] == 15.0
+
+    def test_compaction_forgets_markers_of_settled_claims(self, tmp_path):
+        journal = _journal(tmp_path)
+        store = InMemoryAccumulatorStore()
+        journal.append("CLM1", "M1", 2023, {DEDUCTIBLE: 10.0})
+        store.apply_deltas("M1", 2023, [{DEDUCTIBLE: 10.0}], claim_ids=["CLM1"])
+        assert journal.compact(store) == 0
+        assert store.applied_claims("M1", 2023, ["CLM1"]) == set()
+        assert store.get("M1", 2023)[0][DEDUCTIBLE] == 10.0
+
+    def test_voided_claim_is_not_replayed(self, tmp_path):
+        journal = _journal(tmp_path)
+        journal.append_many([("CLM1", "M1", 2023, {DEDUCTIBLE: 10.0}), ("CLM2", "M1", 2023, {DEDUCTIBLE: 5.0})])
+        journal.void([("CLM1", "M1", 2023)])
+        store = InMemoryAccumulatorStore()
+        assert journal.replay(store) == 1
+        assert store.get("M1", 2023)[0][DEDUCTIBLE] == 5.0
+
+    def test_interrupted_compaction_is_finished_by_recover(self, tmp_path):
+        journal = _journal(tmp_path)
+        journal.append("CLM1", "M1", 2023, {DEDUCTIBLE: 10.0})
+        journal.close()
+        # Crash right after the journal was rotated out
+        (tmp_path / "accumulators.journal").rename(tmp_path / "accumulators.journal.compacting")
+        store = InMemoryAccumulatorStore()
+        assert _journal(tmp_path).recover(store) == 1
+        assert store.get("M1", 2023)[0][DEDUCTIBLE] == 10.0
+
+
+class TestCompactionDuringAdjudication:
+    @pytest.mark.parametrize("concurrent_write", [False, True])
+    def test_compaction_during_in_flight_update_counts_the_claim_once(self, tmp_path, accumulators, monkeypatch,
+                                                                       concurrent_write):
+        journal = _journal(tmp_path)
+        monkeypatch.setattr(policy_adjudication_tools, "ACCUMULATOR_JOURNAL", journal)
+        apply_deltas_many = accumulators.apply_deltas_many
+        compactions = []
+
+        def apply_during_compaction(writes, expected_versions=None):
+            if not compactions:
+                # The claim's deltas are journaled and its write is on its way when compaction starts
+                compaction = threading.Thread(target=lambda: compactions.append(journal.compact(accumulators)))
+                compactions.append(compaction)
+                compaction.start()
+                while not os.path.exists(f"{journal.path}.compacting"):
+                    time.sleep(0.001)
+                if concurrent_write:
+                    # Another claim of the member lands first, so this claim is re-adjudicated and journaled again
+                    accumulators.apply_deltas("MEMBER123", 2023, [{DEDUCTIBLE: 400.0, OOP: 400.0}])
+            return apply_deltas_many(writes, expected_versions)
+
+        monkeypatch.setattr(accumulators, "apply_deltas_many", apply_during_compaction)
+        seed, _ = accumulators.get("MEMBER123", 2023)
+        success, claim, _ = policy_adjudication_tools._adjudicate_claim({
+            "claim_id": "INFLIGHT1",
+            "member_id": "MEMBER123",
+            "member_eligibility": {"member_id": "MEMBER123", "is_eligible": True, "plan_id": "PPO_GOLD"},
+            "services": [{"date_of_service": "2023-10-26", "cpt_code": "99214", "icd_10_code": "M54.5",
+                          "provider_npi": "1234567890", "charge_amount": 300.0, "network_status": "In-Network"}],
+        })
+        compaction, = compactions[:1]
+        compaction.join(5)
+        assert success and compactions[1:] == [0] # The claim's own write applied its deltas
+
+        line = claim["services"][0]
+        concurrent = 400.0 if concurrent_write else 0.0
+        values, _ = accumulators.get("MEMBER123", 2023)
+        assert values[DEDUCTIBLE] == seed[DEDUCTIBLE] + concurrent + line["deductible_applied"]
+        assert values[OOP] == seed[OOP] + concurrent + line["member_responsibility"]
+        # Only a claim journaled again after the rotation still has its marker, until the next compaction
+        assert accumulators.applied_claims("MEMBER123", 2023, ["INFLIGHT1"]) == ({"INFLIGHT1"} if concurrent_write else set())
+        assert journal.compact(accumulators) == 0
+        assert accumulators.applied_claims("MEMBER123", 2023, ["INFLIGHT1"]) == set()
+        assert accumulators.get("MEMBER123", 2023)[0] == values
+
+
+class TestLostCompareAndSwap:
+    @pytest.mark.parametrize("batch", [False, True])
+    def test_claim_losing_every_attempt_is_voided_and_not_cached(self, tmp_path, accumulators, monkeypatch, batch):
+        journal = _journal(tmp_path)
+        monkeypatch.setattr(policy_adjudication_tools, "ACCUMULATOR_JOURNAL", journal)
+        monkeypatch.setattr(policy_adjudication_tools, "ACCUMULATOR_CAS_MAX_ATTEMPTS", 3)
+        monkeypatch.setattr(policy_adjudication_tools, "ACCUMULATOR_CAS_BACKOFF_SECONDS", 0)
+        apply_deltas_many = accumulators.apply_deltas_many
+
+        def apply_after_concurrent_claim(writes, expected_versions=None):
+            # Another claim of the member always lands between this claim's read and its write
+            accumulators.apply_deltas("MEMBER123", 2023, [{DEDUCTIBLE: 10.0, OOP: 10.0}])
+            return apply_deltas_many(writes, expected_versions)
+
+        monkeypatch.setattr(accumulators, "apply_deltas_many", apply_after_concurrent_claim)
+        seed, _ = accumulators.get("MEMBER123", 2023)
+        claim = {
+            "claim_id": "LOST1",
+            "member_id": "MEMBER123",
+            "member_eligibility": {"member_id": "MEMBER123", "is_eligible": True, "plan_id": "PPO_GOLD"},
+            "services": [{"date_of_service": "2023-10-26", "cpt_code": "99214", "icd_10_code": "M54.5",
+                          "provider_npi": "1234567890", "charge_amount": 300.0, "network_status": "In-Network"}],
+        }
+
+        def adjudicate():
+            if batch:
+                return policy_adjudication_tools.adjudicate_claims_batch([dict(claim)])[0]
+            return policy_adjudication_tools._adjudicate_claim(dict(claim))
+
+        success, _, messages = adjudicate()
+        assert success and messages[-1].startswith(ACCUMULATOR_UPDATE_LOST)
+        only_concurrent = {DEDUCTIBLE: seed[DEDUCTIBLE] + 30.0, OOP: seed[OOP] + 30.0}
+        assert accumulators.get("MEMBER123", 2023)[0] == only_concurrent
+
+        # The stale deltas of the last attempt are never replayed, neither by a restart nor by compaction
+        assert _journal(tmp_path).recover(InMemoryAccumulatorStore()) == 0
+        assert journal.recover(accumulators) == 0
+        assert journal.compact(accumulators) == 0
+        assert accumulators.get("MEMBER123", 2023)[0] == only_concurrent
+
+        # Not cached as final: a resubmission is adjudicated for real
+        monkeypatch.setattr(accumulators, "apply_deltas_many", apply_deltas_many)
+        success, claim_data, messages = adjudicate()
+        assert success and DUPLICATE_SUBMISSION not in messages
+        assert messages[-1] == "Core accumulators updated successfully."
+        assert accumulators.get("MEMBER123", 2023)[0][DEDUCTIBLE] == only_concurrent[DEDUCTIBLE] + claim_data["services"][0]["deductible_applied"]
@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from accumulator_store import DEFAULT_ACCUMULATORS, InMemoryAccumulatorStore, SQLiteAccumulatorStore
+
+DEDUCTIBLE = "deductible_met_individual"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryAccumulatorStore()
+    return SQLiteAccumulatorStore(str(tmp_path / "accumulators.db"))
+
+
+class TestAccumulatorStore:
+    def test_unwritten_record_is_default_at_version_0(self, store):
+        assert store.get("M1", 2023) == (DEFAULT_ACCUMULATORS, 0)
+
+    def test_compare_and_swap_bumps_version(self, store):
+        assert store.compare_and_swap("M1", 2023, 0, {DEDUCTIBLE: 10.0})
+        assert store.get("M1", 2023) == ({DEDUCTIBLE: 10.0}, 1)
+        assert store.compare_and_swap("M1", 2023, 1, {DEDUCTIBLE: 25.0})
+        assert store.get("M1", 2023) == ({DEDUCTIBLE: 25.0}, 2)
+
+    def test_compare_and_swap_rejects_stale_version(self, store):
+        assert store.compare_and_swap("M1", 2023, 0, {DEDUCTIBLE: 10.0})
+        assert not store.compare_and_swap("M1", 2023, 0, {DEDUCTIBLE: 99.0})
+        assert store.get("M1", 2023) == ({DEDUCTIBLE: 10.0}, 1)
+
+    def test_apply_deltas_adds_in_order(self, store):
+        applied, values, version = store.apply_deltas("M1", 2023, [{DEDUCTIBLE: 10.0}, {DEDUCTIBLE: 5.5}])
+        assert applied and version == 1
+        assert values[DEDUCTIBLE] == 15.5
+        assert store.get("M1", 2023)[0][DEDUCTIBLE] == 15.5
+
+    def test_apply_deltas_with_stale_expected_version_does_not_write(self, store):
+        store.apply_deltas("M1", 2023, [{DEDUCTIBLE: 10.0}])
+        applied, values, version = store.apply_deltas("M1", 2023, [{DEDUCTIBLE: 5.0}], expected_version=0)
+        assert not applied
+        assert (values[DEDUCTIBLE], version) == (10.0, 1)
+
+    def test_applied_claim_is_skipped(self, store):
+        store.apply_deltas("M1", 2023, [{DEDUCTIBLE: 10.0}], claim_ids=["CLM1"])
+        assert store.applied_claims("M1", 2023, ["CLM1", "CLM2"]) == {"CLM1"}
+        applied, values, version = store.apply_deltas("M1", 2023, [{DEDUCTIBLE: 10.0}, {DEDUCTIBLE: 1.0}], claim_ids=["CLM1", "CLM2"])
+        assert applied
+        assert (values[DEDUCTIBLE], version) == (11.0, 2)
+
+    def test_forget_claims_drops_markers(self, store):
+        store.apply_deltas("M1", 2023, [{DEDUCTIBLE: 10.0}], claim_ids=["CLM1"])
+        store.forget_claims([("M1", 2023, "CLM1")])
+        assert store.applied_claims("M1", 2023, ["CLM1"]) == set()
+        assert store.get("M1", 2023)[0][DEDUCTIBLE] == 10.0
+
+    def test_apply_deltas_many_checks_every_expected_version(self, store):
+        store.apply_deltas("M2", 2023, [{DEDUCTIBLE: 1.0}])
+        # M2 (only read, e.g. another family member) moved on: nothing is written
+        assert not store.apply_deltas_many([("M1", 2023, [{DEDUCTIBLE: 10.0}], None)], {("M1", 2023): 0, ("M2", 2023): 0})
+        assert store.get("M1", 2023) == (DEFAULT_ACCUMULATORS, 0)
+        assert store.apply_deltas_many(
+            [("M1", 2023, [{DEDUCTIBLE: 10.0}], ["CLM1"]), ("M2", 2023, [{DEDUCTIBLE: 2.0}], ["CLM1"])],
+            {("M1", 2023): 0, ("M2", 2023): 1},
+        )
+        assert store.get("M1", 2023) == ({**DEFAULT_ACCUMULATORS, DEDUCTIBLE: 10.0}, 1)
+        assert store.get("M2", 2023) == ({**DEFAULT_ACCUMULATORS, DEDUCTIBLE: 3.0}, 2)
+
+    def test_apply_deltas_many_of_applied_claims_succeeds_without_writing(self, store):
+        assert store.apply_deltas_many([("M1", 2023, [{DEDUCTIBLE: 10.0}], ["CLM1"])])
+        assert store.apply_deltas_many([("M1", 2023, [{DEDUCTIBLE: 10.0}], ["CLM1"])], {("M1", 2023): 0})
+        assert store.get("M1", 2023)[1] == 1
+
+    def test_concurrent_apply_deltas_loses_no_update(self, store):
+        def add():
+            for _ in range(50):
+                assert store.apply_deltas("M1", 2023, [{DEDUCTIBLE: 1.0}])[0]
+
+        threads = [threading.Thread(target=add) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert store.get("M1", 2023) == ({**DEFAULT_ACCUMULATORS, DEDUCTIBLE: 200.0}, 200)
+
+
+class TestInMemoryAccumulatorStoreSnapshot:
+    def test_snapshot_round_trip(self, tmp_path):
+        store = InMemoryAccumulatorStore()
+        store.apply_deltas("M1", 2023, [{DEDUCTIBLE: 10.0}], claim_ids=["CLM1"])
+        path = str(tmp_path / "snapshot.json")
+        store.write_snapshot(path)
+
+        restored = InMemoryAccumulatorStore()
+        restored.load_snapshot(path)
+        assert restored.get("M1", 2023) == store.get("M1", 2023)
+        assert restored.applied_claims("M1", 2023, ["CLM1"]) == {"CLM1"}
+
+
+class TestSQLiteAccumulatorStoreSharing:
+    def test_stores_on_one_file_see_each_others_writes(self, tmp_path):
+        # As worker processes sharing ACCUMULATOR_DB_PATH would
+        path = str(tmp_path / "accumulators.db")
+        first, second = SQLiteAccumulatorStore(path), SQLiteAccumulatorStore(path)
+        assert first.compare_and_swap("M1", 2023, 0, {DEDUCTIBLE: 10.0}, claim_ids=["CLM1"])
+        assert not second.compare_and_swap("M1", 2023, 0, {DEDUCTIBLE: 99.0})
+        assert second.get("M1", 2023) == ({DEDUCTIBLE: 10.0}, 1)
+        assert second.applied_claims("M1", 2023, ["CLM1"]) == {"CLM1"}
+        applied, values, version = second.apply_deltas("M1", 2023, [{DEDUCTIBLE: 5.0}], claim_ids=["CLM1"])
+        assert applied and (values[DEDUCTIBLE], version) == (10.0, 1) # Already applied through the other store
@@ -0,0 +1,221 @@
+import copy
+import json
+import threading
+import types
+
+import pytest
+
+import policy_adjudication_tools
+from claim_pipeline import process_claim_submission
+from policy_adjudication_tools import (DUPLICATE_SUBMISSION, OUTPUT_MODES, TOOL_OUTPUT_MODES, _adjudicate_claim, adjudicate_claim,
+                                       adjudicate_claims_batch, render_adjudication)
+from synthetic_claims import SyntheticDataset
+
+DEDUCTIBLE = "deductible_met_individual"
+OOP = "oop_max_met_individual"
+FAMILY600 = ("MEMBER600", "MEMBER601", "MEMBER602")
+
+
+def _claim(member_id: str, plan_id: str, lines: list[tuple[str, float]], claim_id: str | None = None,
+           cpt_code: str = "99999") -> dict:
+    claim = {
+        "member_id": member_id,
+        "member_eligibility": {"member_id": member_id, "is_eligible": True, "plan_id": plan_id},
+        "services": [
+            {"date_of_service": date_of_service, "cpt_code": cpt_code, "icd_10_code": "M54.5", "provider_npi": "1234567890",
+             "charge_amount": charge_amount, "network_status": "In-Network"}
+            for date_of_service, charge_amount in lines
+        ],
+    }
+    if claim_id is not None:
+        claim["claim_id"] = claim_id
+    return claim
+
+
+def _comparable(result):
+    # Everything but the adjudication time
+    success, claim, messages = result
+    if claim and "claim_summary" in claim:
+        claim = {**claim, "claim_summary": {k: v for k, v in claim["claim_summary"].items() if k != "adjudication_timestamp"}}
+    return success, claim, messages
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    dataset = SyntheticDataset(seed=5, members=60, inactive_rate=0.2)
+    dataset.install()
+    return dataset
+
+
+class TestAdjudicationParity:
+    def test_batch_matches_claim_by_claim(self, dataset, reset_accumulators):
+        claims = list(dataset.iter_validated_claims(600))
+        dataset.reset_accumulators()
+        single = [_comparable(_adjudicate_claim(copy.deepcopy(claim))) for claim in claims]
+        single_accumulators = copy.deepcopy(policy_adjudication_tools.ACCUMULATOR_STORE.data)
+
+        dataset.reset_accumulators()
+        batch = [_comparable(result) for result in adjudicate_claims_batch(copy.deepcopy(claims))]
+        assert batch == single
+        assert policy_adjudication_tools.ACCUMULATOR_STORE.data == single_accumulators
+
+    def test_family_claims_match_across_benefit_years(self, reset_accumulators):
+        claims = [
+            _claim("MEMBER600", "HMO_SILVER", [("2023-12-30", 800.0), ("2024-01-02", 900.0)]),
+            _claim("MEMBER601", "HMO_SILVER", [("2023-11-01", 3000.0)]),
+            _claim("MEMBER602", "HMO_SILVER", [("2024-02-01", 5000.0), ("2023-12-31", 700.0)]),
+            _claim("MEMBER123", "PPO_GOLD", [("2023-05-05", 100.0)]),
+        ]
+        store = reset_accumulators()
+        single = [_comparable(_adjudicate_claim(copy.deepcopy(claim))) for claim in claims]
+        single_accumulators = copy.deepcopy(store.data)
+
+        store = reset_accumulators()
+        batch = [_comparable(result) for result in adjudicate_claims_batch(copy.deepcopy(claims))]
+        assert batch == single
+        assert store.data == single_accumulators
+
+
+class TestFamilies:
+    def test_member_moving_to_another_family_leaves_the_previous_one(self, monkeypatch):
+        monkeypatch.setattr(policy_adjudication_tools, "MOCK_FAMILY_DB", {})
+        monkeypatch.setattr(policy_adjudication_tools, "MEMBER_FAMILIES", {})
+        policy_adjudication_tools.register_families({"FAMA": ["M1", "M2", "M3"]})
+        policy_adjudication_tools.register_families({"FAMB": ["M2", "M3"]})
+        assert policy_adjudication_tools._family_of("M1") == ("FAMA", ["M1"])
+        assert policy_adjudication_tools._family_of("M2") == ("FAMB", ["M2", "M3"])
+
+        policy_adjudication_tools.register_families({"FAMC": ["M1", "M4"], "FAMB": ["M3"]})
+        assert policy_adjudication_tools.MOCK_FAMILY_DB == {"FAMB": ["M3"], "FAMC": ["M1", "M4"]}
+        assert policy_adjudication_tools._family_of("M2") == ("M2", ["M2"])
+
+
+class TestAdjudicateClaimTool:
+    def test_invalid_json_is_an_error_result(self, accumulators):
+        success, claim, messages = adjudicate_claim.fn('{"member_id": "MEMBER123", "services": [')
+        assert (success, claim) == (False, None)
+        assert len(messages) == 1 and messages[0].startswith("Invalid claim JSON: ")
+
+
+class TestOutputModes:
+    def _adjudicated(self):
+        # The claim and its first adjudication, in full
+        claim = _claim("MEMBER123", "PPO_GOLD", [("2023-10-26", 250.0), ("2023-10-27", 400.0)], claim_id="C1", cpt_code="99214")
+        return claim, _adjudicate_claim(claim, output_mode="full")
+
+    def test_full_output_renders_notes_as_text(self, accumulators):
+        _, (success, claim, messages) = self._adjudicated()
+        assert success and messages == ["Claim adjudication status: Processed - Adjudicated", "Core accumulators updated successfully."]
+        first, second = claim["services"]
+        assert "note_codes" not in first and "message_codes" not in first
+        assert first["notes"] == ["Applied $250.00 towards deductible."]
+        assert first["processing_messages"] == ["Guideline check: Generally Payable", "Applied $250.00 towards deductible."]
+        assert second["notes"] == ["Applied $250.00 towards deductible.", "Applied 10% coinsurance ($15.00)."]
+        assert (second["member_responsibility"], second["insurer_payment"]) == (265.0, 135.0)
+
+    def test_summary_and_stream_match_full(self, accumulators):
+        claim, full = self._adjudicated()
+        summary = _adjudicate_claim(claim, output_mode="summary") # The stored result of the claim, rendered again
+        assert "services" not in summary[1]
+        assert summary[1] == {key: value for key, value in full[1].items() if key != "services"}
+        assert summary[2] == full[2] + [DUPLICATE_SUBMISSION]
+
+        stream = _adjudicate_claim(claim, output_mode="stream")
+        assert isinstance(stream[1]["services"], types.GeneratorType)
+        assert list(stream[1]["services"]) == full[1]["services"]
+
+    def test_stream_renders_lines_as_they_are_consumed(self, monkeypatch):
+        rendered = []
+        render_line = policy_adjudication_tools._render_line
+        monkeypatch.setattr(policy_adjudication_tools, "_render_line", lambda line: rendered.append(line) or render_line(line))
+        lines = [{"cpt_code": "99214", "note_codes": [("copay_applied", 25.0)], "message_codes": []}] * 3
+        _, claim, _ = render_adjudication((True, {"member_id": "MEMBER123", "services": lines}, []), "stream")
+        assert rendered == []
+        assert next(claim["services"]) == {"cpt_code": "99214", "notes": ["Applied $25.00 Copay."], "processing_messages": []}
+        assert len(rendered) == 1
+
+    def test_output_shares_no_data_with_the_stored_result(self):
+        stored = (True, {"member_id": "MEMBER123", "claim_summary": {"total_charge_amount": 1.0},
+                         "services": [{"cpt_code": "99214", "note_codes": [], "message_codes": []}]}, ["ok"])
+        for output_mode in ("full", "summary"):
+            _, claim, messages = render_adjudication(stored, output_mode)
+            claim["claim_summary"]["total_charge_amount"] = 2.0
+            messages.append("changed")
+        assert stored[1]["claim_summary"] == {"total_charge_amount": 1.0} and stored[2] == ["ok"]
+        with pytest.raises(ValueError):
+            render_adjudication(stored, "compact")
+
+    def test_tools_reject_stream(self, accumulators):
+        assert set(TOOL_OUTPUT_MODES) < set(OUTPUT_MODES)
+        claim_json = json.dumps(_claim("MEMBER123", "PPO_GOLD", [("2023-10-26", 250.0)], claim_id="C1"))
+        for entry_point in (adjudicate_claim.fn, process_claim_submission.fn):
+            success, claim, messages = entry_point(claim_json, output_mode="stream")
+            assert (success, claim) == (False, None)
+            assert messages == [f"Unknown output mode 'stream', expected one of {TOOL_OUTPUT_MODES}."]
+        assert accumulators.get_many([("MEMBER123", 2023)])[("MEMBER123", 2023)][0]["deductible_met_individual"] == 0.0
+
+
+class TestDuplicateClaims:
+    def test_resubmission_returns_prior_result(self, accumulators):
+        claim = _claim("MEMBER123", "PPO_GOLD", [("2023-10-26", 300.0)], claim_id="DUP1")
+        first = _adjudicate_claim(copy.deepcopy(claim))
+        accumulators_after_first = accumulators.get("MEMBER123", 2023)
+
+        again = _adjudicate_claim(copy.deepcopy(claim))
+        assert again[2] == first[2] + [DUPLICATE_SUBMISSION]
+        assert _comparable(again)[1] == _comparable(first)[1]
+        assert accumulators.get("MEMBER123", 2023) == accumulators_after_first
+
+    def test_repeats_within_a_batch_are_applied_once(self, accumulators):
+        claim = _claim("MEMBER123", "PPO_GOLD", [("2023-10-26", 300.0)], claim_id="DUP2")
+        first, repeat = adjudicate_claims_batch([copy.deepcopy(claim), copy.deepcopy(claim)])
+        assert repeat[2] == first[2] + [DUPLICATE_SUBMISSION]
+        assert accumulators.get("MEMBER123", 2023) == ({DEDUCTIBLE: 300.0, OOP: 350.0}, 1)
+
+    def test_identical_services_with_different_claim_ids_are_distinct(self, accumulators):
+        claims = [_claim("MEMBER123", "PPO_GOLD", [("2023-10-26", 100.0)], claim_id=claim_id) for claim_id in ("A", "B")]
+        results = [_adjudicate_claim(claim) for claim in claims]
+        assert all(DUPLICATE_SUBMISSION not in messages for _, _, messages in results)
+        assert accumulators.get("MEMBER123", 2023)[0][DEDUCTIBLE] == 200.0
+
+
+class TestConcurrentAccumulatorUpdates:
+    def test_claim_is_readjudicated_after_losing_compare_and_swap(self, accumulators, monkeypatch):
+        apply_deltas_many = accumulators.apply_deltas_many
+        interleaved = []
+
+        def apply_after_concurrent_claim(writes, expected_versions=None):
+            if not interleaved:
+                # Another claim of the member lands between this claim's read and its write
+                interleaved.append(True)
+                accumulators.apply_deltas("MEMBER123", 2023, [{DEDUCTIBLE: 400.0, OOP: 400.0}])
+            return apply_deltas_many(writes, expected_versions)
+
+        monkeypatch.setattr(accumulators, "apply_deltas_many", apply_after_concurrent_claim)
+        success, claim, _ = _adjudicate_claim(_claim("MEMBER123", "PPO_GOLD", [("2023-10-26", 300.0)], claim_id="CAS1"))
+        assert success
+        line = claim["services"][0]
+        # Re-adjudicated from the fresh balances: only $100 of the $500 deductible was left
+        assert line["deductible_applied"] == 100.0
+        assert claim["claim_summary"]["initial_accumulators"][DEDUCTIBLE] == 400.0
+        assert accumulators.get("MEMBER123", 2023)[0] == {DEDUCTIBLE: 500.0, OOP: 450.0 + line["member_responsibility"]}
+
+    def test_parallel_family_claims_never_exceed_family_deductible(self, accumulators):
+        seed = sum(accumulators.get(member_id, 2023)[0][DEDUCTIBLE] for member_id in FAMILY600)
+        family_deductible = policy_adjudication_tools.MOCK_POLICY_DB["HMO_SILVER"]["deductible_family"]
+        claims = [
+            _claim(member_id, "HMO_SILVER", [("2023-06-01", 300.0)], claim_id=f"FAM{i}")
+            for i, member_id in enumerate(FAMILY600 * 6)
+        ]
+        results = []
+        threads = [threading.Thread(target=lambda claim=claim: results.append(_adjudicate_claim(claim))) for claim in claims]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert all(success for success, _, _ in results)
+        applied = sum(line["deductible_applied"] for _, claim, _ in results for line in claim["services"])
+        met = sum(accumulators.get(member_id, 2023)[0][DEDUCTIBLE] for member_id in FAMILY600)
+        assert met == pytest.approx(seed + applied)
+        assert met == pytest.approx(family_deductible)
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pytest
+
+from adjudication_results import AdjudicationResultStore
+
+
+def _claim(claim_id: str, plan_id: str, lines: list[tuple[str, float]]) -> dict:
+    return {
+        "claim_id": claim_id,
+        "member_id": "M1",
+        "member_eligibility": {"plan_id": plan_id},
+        "services": [
+            {"date_of_service": date_of_service, "cpt_code": "99214", "line_status": "Adjudicated",
+             "charge_amount": insurer_payment, "insurer_payment": insurer_payment}
+            for date_of_service, insurer_payment in lines
+        ],
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AdjudicationResultStore(str(tmp_path / "results"), flush_rows=3)
+
+
+class TestAdjudicationResultStore:
+    def test_sum_by_plan_month(self, store):
+        store.append_claim(_claim("C1", "PPO_GOLD", [("2023-10-01", 100.0), ("2023-10-20", 50.5)]), [2023, 2023])
+        store.append_claim(_claim("C2", "HMO_SILVER", [("2023-11-02", 10.0), ("2024-01-05", 7.0)]), [2023, 2024])
+        store.append_claim(_claim("C3", "PPO_GOLD", [("2023-11-30", 1.25)]), [2023])
+        assert store.insurer_payment_by_plan_month() == {
+            "HMO_SILVER": {"2023-11": 10.0, "2024-01": 7.0},
+            "PPO_GOLD": {"2023-10": 150.5, "2023-11": 1.25},
+        }
+        assert store.insurer_payment_by_plan_month(benefit_years=[2024]) == {"HMO_SILVER": {"2024-01": 7.0}}
+        assert store.benefit_years() == [2023, 2024]
+
+    def test_scan_reads_buffered_and_written_rows(self, store):
+        store.append_claim(_claim("C1", "PPO_GOLD", [("2023-10-01", 1.0)] * 4), [2023] * 4) # Past flush_rows
+        store.append_claim(_claim("C2", "PPO_GOLD", [("2023-10-01", 2.0)]), [2023]) # Still buffered
+        rows = {}
+        for _, columns in store.scan(("claim_id", "plan_id", "insurer_payment")):
+            for claim_id, plan_id, payment in zip(columns["claim_id"], columns["plan_id"], columns["insurer_payment"]):
+                rows.setdefault((claim_id.decode(), plan_id.decode()), []).append(float(payment))
+        assert rows == {("C1", "PPO_GOLD"): [1.0] * 4, ("C2", "PPO_GOLD"): [2.0]}
+
+    def test_compact_merges_segments_without_changing_results(self, store):
+        for i in range(5):
+            store.append_claim(_claim(f"C{i}", "PPO_GOLD", [("2023-10-01", float(i))]), [2023])
+            store.flush()
+        before = store.insurer_payment_by_plan_month()
+        assert store.compact() == 4
+        assert len(os.listdir(os.path.join(store.root, "benefit_year=2023"))) == 1
+        assert store.insurer_payment_by_plan_month() == before
+
+    def test_unknown_amount_column_is_rejected(self, store):
+        with pytest.raises(ValueError):
+            store.sum_by_plan_month("not_a_column")
+
+    def test_segments_are_dictionary_encoded(self, store):
+        store.append_claim(_claim("C1", "PPO_GOLD", [("2023-10-01", 1.0), ("2023-10-02", 2.0)]), [2023, 2023])
+        store.flush()
+        (_, path), = store._segment_paths()
+        with np.load(path) as segment:
+            assert segment["plan_id"].dtype == np.int32
+            assert segment["plan_id_values"].tolist() == [b"PPO_GOLD"]
+
+    def test_unreadable_date_of_service_is_month_00(self, store):
+        store.append_claim(_claim("C1", "PPO_GOLD", [("10/26/2023", 5.0), ("", 1.0), ("2023-10-26", 2.0)]), [2023] * 3)
+        assert store.insurer_payment_by_plan_month() == {"PPO_GOLD": {"2023-00": 6.0, "2023-10": 2.0}}
+
+    def test_stores_sharing_a_root_read_each_others_segments(self, store):
+        # As worker processes appending to one ADJUDICATION_RESULT_STORE would
+        other = AdjudicationResultStore(store.root, flush_rows=3)
+        store.append_claim(_claim("C1", "PPO_GOLD", [("2023-10-01", 1.0)]), [2023])
+        other.append_claim(_claim("C2", "PPO_GOLD", [("2023-10-01", 2.0)]), [2023])
+        other.flush()
+        assert store.insurer_payment_by_plan_month() == {"PPO_GOLD": {"2023-10": 3.0}}
+        assert other.insurer_payment_by_plan_month() == {"PPO_GOLD": {"2023-10": 3.0}}
+        assert len(store._segment_paths()) == 2
+
+    def test_export_parquet(self, store, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        store.append_claim(_claim("C1", "PPO_GOLD", [("2023-10-01", 1.0)]), [2023])
+        store.append_claim(_claim("C2", "HMO_SILVER", [("2024-01-05", 7.0)]), [2024])
+        written = store.export_parquet(str(tmp_path / "export"))
+        assert [os.path.relpath(path, tmp_path / "export") for path in written] == [
+            os.path.join("benefit_year=2023", "results.parquet"), os.path.join("benefit_year=2024", "results.parquet"),
+        ]
+        table = pq.read_table(written[1])
+        assert table.column("plan_id").to_pylist() == ["HMO_SILVER"]
+        assert table.column("insurer_payment").to_pylist() == [7.0]
@@ -0,0 +1,96 @@
+import math
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+import claim_metrics
+from claim_metrics import InMemoryMetricsSink, LatencyHistogram, MetricsSink, get_metrics_sink, set_metrics_sink, span
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(claim_metrics.__file__))
+
+
+class RecordingSink(MetricsSink):
+    def __init__(self):
+        self.records = []
+
+    def record(self, stage: str, seconds: float):
+        self.records.append((stage, seconds))
+
+
+@pytest.fixture
+def install_sink():
+    """Returns install(sink): makes sink the metrics sink for the test."""
+    previous = get_metrics_sink()
+
+    def install(sink: MetricsSink) -> MetricsSink:
+        set_metrics_sink(sink)
+        return sink
+
+    yield install
+    set_metrics_sink(previous)
+
+
+class TestLatencyHistogram:
+    def test_buckets_grow_by_five_percent(self):
+        histogram = LatencyHistogram()
+        for seconds in (0.0, 1e-6, 1e-6 * 1.05 ** 10 * 1.001, 1e-6 * 1.05 ** 10 * 1.049, 1e9):
+            histogram.record(seconds)
+        assert [index for index, count in enumerate(histogram.counts) for _ in range(count)] == [0, 0, 11, 11, len(histogram.counts) - 1]
+
+    def test_percentiles_are_bucket_upper_bounds_within_five_percent(self):
+        rng = random.Random(8)
+        values = [rng.lognormvariate(math.log(0.02), 1.0) for _ in range(5000)]
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+        values.sort()
+        for pct in (1, 25, 50, 90, 95, 99, 99.9):
+            exact = values[math.ceil(pct / 100 * len(values)) - 1]
+            assert exact <= histogram.percentile(pct) <= exact * 1.05, pct
+        assert histogram.percentile(100) == histogram.max == values[-1] # Capped at the largest value
+
+    def test_summary(self):
+        histogram = LatencyHistogram()
+        assert histogram.summary() == {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        for milliseconds in range(1, 101):
+            histogram.record(milliseconds / 1000)
+        summary = histogram.summary()
+        assert (summary["count"], summary["mean_ms"], summary["max_ms"]) == (100, 50.5, 100.0)
+        assert 50.0 <= summary["p50_ms"] <= 52.5 and 95.0 <= summary["p95_ms"] <= 99.75 and 99.0 <= summary["p99_ms"] <= 100.0
+
+
+class TestSpans:
+    def test_spans_record_per_stage(self, install_sink):
+        sink = install_sink(InMemoryMetricsSink())
+        for _ in range(3):
+            with span("policy_fetch"):
+                pass
+        with pytest.raises(KeyError): # Recorded, and the exception is not swallowed
+            with span("adjudicate_claim"):
+                raise KeyError("plan")
+        snapshot = sink.snapshot()
+        assert {stage: stats["count"] for stage, stats in snapshot.items()} == {"policy_fetch": 3, "adjudicate_claim": 1}
+        sink.reset()
+        assert sink.snapshot() == {}
+
+    def test_custom_sink_receives_durations(self, install_sink):
+        sink = install_sink(RecordingSink())
+        with span("json_parse"):
+            pass
+        (stage, seconds), = sink.records
+        assert stage == "json_parse" and 0.0 <= seconds < 1.0
+
+    def test_disabled_spans_are_no_ops(self):
+        # _enabled is read when claim_metrics is imported, so the disabled module runs in its own interpreter
+        script = (
+            "import claim_metrics\n"
+            "with claim_metrics.span('policy_fetch'):\n"
+            "    pass\n"
+            "print(claim_metrics._enabled, claim_metrics.get_metrics_sink().snapshot())\n"
+        )
+        env = {**os.environ, "PYTHONPATH": TOOLS_DIR, "CLAIM_METRICS_ENABLED": "0"}
+        output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True).stdout
+        assert output.strip() == "False {}"
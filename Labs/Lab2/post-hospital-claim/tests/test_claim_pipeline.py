@@ -0,0 +1,88 @@
+import copy
+import json
+
+import pytest
+
+import policy_adjudication_tools
+from claim_pipeline import VALIDATION_SUCCESSFUL, process_claim, process_claim_submission, process_claims_batch
+from claim_validation_tools import check_eligibility, check_network_status, validate_claim_data
+from policy_adjudication_tools import adjudicate_claim
+from synthetic_claims import SyntheticDataset
+
+
+def _comparable(result):
+    # Everything but the adjudication time
+    success, claim, messages = result
+    if claim and "claim_summary" in claim:
+        claim = {**claim, "claim_summary": {k: v for k, v in claim["claim_summary"].items() if k != "adjudication_timestamp"}}
+    return success, claim, messages
+
+
+def _chained_tools(claim: dict):
+    # The agent's sequence of tool calls, each taking the previous tool's output
+    valid, claim_data, errors = validate_claim_data.fn(json.dumps(claim))
+    if not valid:
+        return False, claim_data, errors
+    member_id, date_of_service = claim_data["member_id"], claim_data["services"][0]["date_of_service"]
+    eligibility_ok, eligibility, eligibility_err = check_eligibility.fn(member_id, date_of_service)
+    if not eligibility_ok:
+        return False, claim_data, [f"Eligibility API call failed: {eligibility_err}"]
+    if not eligibility["is_eligible"]:
+        return False, claim_data, [f"Member {member_id} not eligible on {date_of_service}. Reason: {eligibility.get('reason', 'Not specified')}"]
+    claim_data["member_eligibility"] = eligibility
+    for line in claim_data["services"]:
+        network_ok, network, network_err = check_network_status.fn(line["provider_npi"], eligibility["plan_id"])
+        if not network_ok:
+            return False, claim_data, [f"Network check API call failed for NPI {line['provider_npi']}: {network_err}"]
+        line["network_status"] = network["network_status"] or "Unknown"
+    adjudicated, adjudicated_data, messages = adjudicate_claim.fn(json.dumps(claim_data))
+    return adjudicated, adjudicated_data, [VALIDATION_SUCCESSFUL] + messages
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    dataset = SyntheticDataset(seed=5, members=60, error_rate=0.05, inactive_rate=0.2)
+    dataset.install()
+    return dataset
+
+
+class TestPipelineParity:
+    def test_pipeline_matches_chained_tools(self, dataset, reset_accumulators):
+        claims = list(dataset.iter_claims(1000))
+        dataset.reset_accumulators()
+        chained = [_comparable(_chained_tools(copy.deepcopy(claim))) for claim in claims]
+        chained_accumulators = copy.deepcopy(policy_adjudication_tools.ACCUMULATOR_STORE.data)
+        assert any(not success and claim and "member_eligibility" not in claim and "not eligible" not in messages[0]
+                   for success, claim, messages in chained) # Invalid claims
+        assert any(not success and messages[0].startswith("Member ") for success, _, messages in chained) # Ineligible members
+        assert sum(success for success, _, _ in chained) > len(claims) // 2
+
+        dataset.reset_accumulators()
+        single = [_comparable(process_claim(claim)) for claim in claims]
+        assert single == chained
+        assert policy_adjudication_tools.ACCUMULATOR_STORE.data == chained_accumulators
+
+        dataset.reset_accumulators()
+        # JSON strings and dicts mixed, as either may be submitted
+        batch = [_comparable(result) for result in process_claims_batch([json.dumps(claim) if index % 2 else claim
+                                                                         for index, claim in enumerate(claims)])]
+        assert batch == chained
+        assert policy_adjudication_tools.ACCUMULATOR_STORE.data == chained_accumulators
+
+        dataset.reset_accumulators()
+        submitted = [_comparable(process_claim_submission.fn(json.dumps(claim))) for claim in claims]
+        assert submitted == chained
+
+    def test_claims_are_not_modified(self, dataset, reset_accumulators):
+        claims = list(dataset.iter_claims(50))
+        originals = copy.deepcopy(claims)
+        dataset.reset_accumulators()
+        process_claims_batch(claims)
+        for claim in claims:
+            process_claim(claim)
+        assert claims == originals
+
+    def test_invalid_json(self):
+        assert process_claim("{bad") == process_claims_batch(["{bad"])[0]
+        success, claim, messages = process_claim("{bad")
+        assert (success, claim) == (False, None) and messages[0].startswith("Invalid claim JSON: ")
@@ -0,0 +1,72 @@
+import io
+import json
+
+import pytest
+
+import claim_stream_validation
+from claim_stream_validation import iter_json_array_records, validate_claim_stream
+from claim_validation_tools import _validate_claim_fields
+
+VALID_LINE = {"date_of_service": "2023-10-26", "cpt_code": "99214", "provider_npi": "1234567890", "charge_amount": 150.0}
+
+
+def _claim(claim_id: str, **line_overrides) -> dict:
+    return {"claim_id": claim_id, "member_id": "MEMBER123", "services": [VALID_LINE, {**VALID_LINE, **line_overrides}]}
+
+
+class TestClaimStreamValidation:
+    CLAIMS = [_claim("C1"), _claim("C2", cpt_code=""), _claim("C3", date_of_service="10/26/2023")]
+
+    def _expected(self):
+        return [(claim["claim_id"], not _validate_claim_fields(claim), _validate_claim_fields(claim)) for claim in self.CLAIMS]
+
+    @pytest.mark.parametrize("max_workers", [1, 2])
+    def test_jsonl_and_array_give_the_same_records(self, max_workers):
+        jsonl = "\n".join(json.dumps(claim) for claim in self.CLAIMS) + "\n"
+        array = json.dumps(self.CLAIMS, indent=1)
+        for data in (jsonl, array):
+            assert list(validate_claim_stream(io.StringIO(data), max_workers=max_workers, records_per_task=2)) == self._expected()
+        assert list(validate_claim_stream(io.BytesIO(array.encode()), max_workers=1)) == self._expected()
+
+    def test_invalid_jsonl_line_does_not_stop_the_stream(self):
+        data = json.dumps(self.CLAIMS[0]) + "\n{not json\n[1]\n"
+        records = list(validate_claim_stream(io.StringIO(data), max_workers=1))
+        assert [(claim_id, is_valid) for claim_id, is_valid, _ in records] == [("C1", True), ("#2", False), ("#3", False)]
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 7, 1 << 16])
+    def test_array_elements_split_across_chunks(self, monkeypatch, chunk_size):
+        monkeypatch.setattr(claim_stream_validation, "READ_CHUNK_SIZE", chunk_size)
+        values = [self.CLAIMS[0], 12345, -1.5e3, 'a,\\"]}', [1, [2, {"]": "["}]], None, True, {}]
+        text = " [ " + " ,\n".join(json.dumps(value) for value in values) + " ] "
+        assert [value for _, value in iter_json_array_records(io.StringIO(text))] == values
+
+    def test_number_at_chunk_end_is_not_decoded_early(self, monkeypatch):
+        monkeypatch.setattr(claim_stream_validation, "READ_CHUNK_SIZE", 4)
+        assert list(iter_json_array_records(io.StringIO("[12345, 6789]"))) == [(1, 12345), (2, 6789)]
+
+    @pytest.mark.parametrize("text", ["[1,,2]", "[1,]", '[{"a": 1} {"b": 2}]', "[1, 2", '{"a": 1}'])
+    def test_malformed_array_raises(self, monkeypatch, text):
+        monkeypatch.setattr(claim_stream_validation, "READ_CHUNK_SIZE", 3)
+        with pytest.raises(ValueError):
+            list(iter_json_array_records(io.StringIO(text)))
+
+    def test_empty_array(self):
+        assert list(iter_json_array_records(io.StringIO(" [ ] "))) == []
+
+    def test_reads_a_path(self, tmp_path):
+        path = tmp_path / "claims.jsonl"
+        path.write_text("\n".join(json.dumps(claim) for claim in self.CLAIMS) + "\n", encoding="utf-8")
+        assert list(validate_claim_stream(str(path), max_workers=1)) == self._expected()
+
+    def test_oversized_array_element_raises(self, monkeypatch):
+        monkeypatch.setattr(claim_stream_validation, "READ_CHUNK_SIZE", 8)
+        monkeypatch.setattr(claim_stream_validation, "MAX_RECORD_SIZE", 64)
+        text = json.dumps([{"claim_id": "C1"}, {"claim_id": "C2", "notes": "x" * 100}])
+        records = iter_json_array_records(io.StringIO(text))
+        assert next(records) == (1, {"claim_id": "C1"})
+        with pytest.raises(ValueError, match="exceeds"):
+            next(records)
+
+    def test_unknown_input_format_is_rejected(self):
+        with pytest.raises(ValueError):
+            list(validate_claim_stream(io.StringIO("[]"), input_format="xml", max_workers=1))
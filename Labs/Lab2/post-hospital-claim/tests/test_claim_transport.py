@@ -0,0 +1,202 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from claim_transport import CircuitBreaker, HTTPTransport, InProcessTransport, run_exchange_sync
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0, clock=FakeClock())
+        for _ in range(2):
+            assert breaker.allow()
+            breaker.record_failure()
+        breaker.record_success() # Resets the count
+        for _ in range(3):
+            breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+    def test_half_open_lets_one_trial_call_through(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, clock=clock)
+        breaker.record_failure()
+        clock.now = 10.0
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+
+    def test_failed_trial_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=10.0, clock=clock)
+        for _ in range(5):
+            breaker.record_failure()
+        clock.now = 10.0
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        clock.now = 19.0
+        assert not breaker.allow()
+
+
+class TestInProcessTransport:
+    def test_exchange_runs_requests_and_blocking_steps_in_order(self):
+        calls = []
+        transport = InProcessTransport({"echo.get": lambda value: {"status_code": 200, "body": {"value": value}}})
+
+        def exchange():
+            first = yield "echo.get", {"value": 1}, True
+            yield lambda: calls.append("blocking step")
+            second = yield "echo.get", {"value": first["body"]["value"] + 1}, True
+            return second["body"]["value"]
+
+        assert run_exchange_sync(transport, exchange()) == 2
+        assert calls == ["blocking step"]
+
+
+BASE_URLS = {"policy": "http://policy.test/api", "preauth": "http://preauth.test"}
+
+
+class RecordingHandler:
+    """httpx.MockTransport handler: answers requests with the next of responses (the last one repeats)."""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        response = self.responses[min(len(self.requests), len(self.responses)) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def _http_transport(handler, **kwargs) -> HTTPTransport:
+    return HTTPTransport(BASE_URLS, http_transport=httpx.MockTransport(handler), **{"retry_backoff": 0.0, **kwargs})
+
+
+def _request(transport: HTTPTransport, operation: str, payload: dict | None = None, idempotent: bool = True) -> dict:
+    async def request():
+        try:
+            return await transport.request(operation, payload or {}, idempotent)
+        finally:
+            await transport.aclose()
+    return asyncio.run(request())
+
+
+class TestHTTPTransport:
+    def test_posts_the_payload_and_maps_the_response(self):
+        handler = RecordingHandler(httpx.Response(200, json={"plan_id": "PPO_GOLD"}, headers={"ETag": 'W/"7"'}))
+        response = _request(_http_transport(handler, headers={"Authorization": "Bearer t"}), "policy.get", {"plan_id": "PPO_GOLD"})
+        assert response == {"status_code": 200, "body": {"plan_id": "PPO_GOLD"}, "version": 7}
+        request, = handler.requests
+        assert (request.method, str(request.url)) == ("POST", "http://policy.test/api/policy/get")
+        assert json.loads(request.content) == {"plan_id": "PPO_GOLD"}
+        assert request.headers["Authorization"] == "Bearer t"
+
+    @pytest.mark.parametrize("etag, version", [('"12"', 12), ('W/"3"', 3), ('"v2"', None), (None, None)])
+    def test_etag_becomes_the_version(self, etag, version):
+        handler = RecordingHandler(httpx.Response(200, json={}, headers={"ETag": etag} if etag else {}))
+        assert _request(_http_transport(handler), "policy.get").get("version") == version
+
+    def test_non_json_body_and_unknown_service(self):
+        handler = RecordingHandler(httpx.Response(404, text="no such plan"))
+        assert _request(_http_transport(handler), "policy.get") == {"status_code": 404, "body": {"message": "no such plan"}}
+        assert _request(_http_transport(handler), "guidelines.check")["status_code"] == 404
+        assert len(handler.requests) == 1 # The unknown service was not sent
+
+    def test_retries_idempotent_requests(self):
+        handler = RecordingHandler(httpx.Response(503), httpx.Response(429), httpx.Response(200, json={"ok": True}))
+        assert _request(_http_transport(handler, max_retries=3), "policy.get") == {"status_code": 200, "body": {"ok": True}}
+        assert len(handler.requests) == 3
+
+        handler = RecordingHandler(httpx.Response(502, json={"message": "bad gateway"}))
+        response = _request(_http_transport(handler, max_retries=2, failure_threshold=10), "policy.get")
+        assert response == {"status_code": 502, "body": {"message": "bad gateway"}}
+        assert len(handler.requests) == 3 # The first attempt and two retries
+
+        handler = RecordingHandler(httpx.Response(400, json={}))
+        assert _request(_http_transport(handler), "policy.get")["status_code"] == 400
+        assert len(handler.requests) == 1 # Client errors are not retried
+
+    def test_non_idempotent_writes_are_not_retried(self):
+        for failure in (httpx.Response(503), httpx.ReadTimeout("slow")):
+            handler = RecordingHandler(failure, httpx.Response(200, json={}))
+            assert _request(_http_transport(handler), "policy.update", idempotent=False)["status_code"] in (503, 504)
+            assert len(handler.requests) == 1
+
+    @pytest.mark.parametrize("retry_after, delay", [("0.05", 0.05), ("30", 0.2), ("Wed, 21 Oct 2026 07:28:00 GMT", 0.0), (None, 0.0)])
+    def test_retry_after_sets_the_backoff(self, retry_after, delay, monkeypatch):
+        handler = RecordingHandler(httpx.Response(503, headers={"Retry-After": retry_after} if retry_after else {}),
+                                   httpx.Response(200, json={}))
+        transport = _http_transport(handler, retry_backoff_max=0.2)
+        delays = []
+        backoff = transport._backoff
+        monkeypatch.setattr(transport, "_backoff", lambda attempt, header: delays.append(backoff(attempt, header)) or delays[-1])
+        assert _request(transport, "policy.get")["status_code"] == 200
+        assert delays == [delay] # Capped at retry_backoff_max; an HTTP-date falls back to the jittered delay (0 here)
+
+    def test_timeouts_and_connection_errors_are_retried(self):
+        handler = RecordingHandler(httpx.ReadTimeout("slow"), httpx.ConnectError("refused"), httpx.Response(200, json={}))
+        assert _request(_http_transport(handler), "policy.get")["status_code"] == 200
+        assert len(handler.requests) == 3
+
+        handler = RecordingHandler(httpx.ConnectTimeout("slow"))
+        response = _request(_http_transport(handler, max_retries=0), "policy.get")
+        assert response["status_code"] == 504 and "timed out" in response["body"]["message"]
+
+    def test_client_timeouts(self):
+        transport = _http_transport(RecordingHandler(httpx.Response(200, json={})), timeout=1.5, connect_timeout=0.5)
+
+        async def client_timeout():
+            timeout = transport._loop_state().client.timeout
+            await transport.aclose()
+            return timeout
+        assert asyncio.run(client_timeout()) == httpx.Timeout(1.5, connect=0.5)
+
+    def test_concurrency_is_limited_per_host(self):
+        in_flight = {"policy.test": 0, "preauth.test": 0}
+        peaks = dict(in_flight)
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            host = request.url.host
+            in_flight[host] += 1
+            peaks[host] = max(peaks[host], in_flight[host])
+            await asyncio.sleep(0.01)
+            in_flight[host] -= 1
+            return httpx.Response(200, json={})
+
+        transport = _http_transport(handler, max_connections_per_host=2)
+
+        async def burst():
+            responses = await asyncio.gather(*(transport.request(operation, {}) for operation in ["policy.get", "preauth.check"] * 10))
+            await transport.aclose()
+            return responses
+        assert all(response["status_code"] == 200 for response in asyncio.run(burst()))
+        assert peaks == {"policy.test": 2, "preauth.test": 2}
+
+    def test_open_circuit_fails_fast_per_host(self):
+        handler = RecordingHandler(httpx.Response(500, json={}))
+        transport = _http_transport(handler, max_retries=0, failure_threshold=2, reset_timeout=60.0)
+        assert [_request(transport, "policy.get")["status_code"] for _ in range(2)] == [500, 500]
+        response = _request(transport, "policy.get")
+        assert response["status_code"] == 503 and "circuit open" in response["body"]["message"]
+        assert len(handler.requests) == 2 # Not sent
+        assert transport.breakers["policy.test"].state == CircuitBreaker.OPEN
+
+        assert _request(transport, "preauth.check")["status_code"] == 500 # The other host's circuit is still closed
+        assert transport.breakers["preauth.test"].state == CircuitBreaker.CLOSED
+
@@ -0,0 +1,161 @@
+import json
+
+import pytest
+
+import claim_validation_tools
+from claim_validation_tools import (INVALID_CHARGE_AMOUNT, INVALID_DATE_OF_SERVICE, MISSING_CLAIM_DATA, MISSING_CPT_CODE,
+                                    MISSING_DATE_OF_SERVICE, MISSING_MEMBER_ID, NETWORK_STATUS_CACHE_TTL_SECONDS,
+                                    NETWORK_STATUS_NEGATIVE_TTL_SECONDS, NOT_FOUND_FOR_PLAN, _validate_claim_fields, check_eligibility, check_eligibility_bulk,
+                                    check_network_status, check_network_status_bulk,
+                                    compile_field_checks, invalidate_network_status_cache, validate_claim_data)
+from ttl_cache import TTLCache
+
+VALID_LINE = {"date_of_service": "2023-10-26", "cpt_code": "99214", "provider_npi": "1234567890", "charge_amount": 150.0}
+
+
+def _claim(claim_id: str, **line_overrides) -> dict:
+    return {"claim_id": claim_id, "member_id": "MEMBER123", "services": [VALID_LINE, {**VALID_LINE, **line_overrides}]}
+
+
+class TestClaimFieldValidation:
+    def test_valid_claim(self):
+        assert _validate_claim_fields(_claim("C1")) == []
+
+    def test_errors_are_reported_per_line_in_field_order(self):
+        claim = _claim("C1", date_of_service="2023-02-30", cpt_code="", charge_amount=-1)
+        del claim["member_id"]
+        assert _validate_claim_fields(claim) == [
+            MISSING_MEMBER_ID, INVALID_DATE_OF_SERVICE.format(2), MISSING_CPT_CODE.format(2), INVALID_CHARGE_AMOUNT.format(2),
+        ]
+
+    @pytest.mark.parametrize("charge_amount", [None, "150", -0.01])
+    def test_invalid_charge_amount(self, charge_amount):
+        assert _validate_claim_fields(_claim("C1", charge_amount=charge_amount)) == [INVALID_CHARGE_AMOUNT.format(2)]
+
+    def test_empty_claim(self):
+        assert _validate_claim_fields({}) == [MISSING_CLAIM_DATA]
+
+    def test_validate_claim_data_reports_invalid_json(self):
+        success, claim, errors = validate_claim_data.fn('{"member_id": "MEMBER123",')
+        assert (success, claim) == (False, None)
+        assert len(errors) == 1 and errors[0].startswith("Invalid claim JSON: ")
+        assert validate_claim_data.fn("{}") == (False, None, [MISSING_CLAIM_DATA])
+        assert validate_claim_data.fn(json.dumps(_claim("C1"))) == (True, _claim("C1"), [])
+
+    def test_missing_and_invalid_dates_have_their_own_errors(self):
+        assert _validate_claim_fields(_claim("C1", date_of_service="")) == [MISSING_DATE_OF_SERVICE.format(2)]
+        assert _validate_claim_fields(_claim("C1", date_of_service="2023-13-05")) == [INVALID_DATE_OF_SERVICE.format(2)]
+        with pytest.raises(TypeError): # As the checks before the field schema did
+            _validate_claim_fields(_claim("C1", date_of_service=20231026))
+
+    def test_compiled_checks_follow_the_schema(self):
+        checks = compile_field_checks({
+            "npi": {"rule": "required", "error": "npi"},
+            "paid": {"rule": "non_negative_number", "error": "paid"},
+            "admitted": {"rule": "date", "error": "admitted", "invalid_error": "admitted format"},
+        })
+        assert [field for field, _ in checks] == ["npi", "paid", "admitted"]
+        (_, npi), (_, paid), (_, admitted) = checks
+        assert [npi(value) for value in ("1", "", None)] == [None, "npi", "npi"]
+        assert [paid(value) for value in (0, 1.5, -1, "1", None)] == [None, None, "paid", "paid", "paid"]
+        assert [admitted(value) for value in ("2024-02-29", "2023-02-29", None)] == [None, "admitted format", "admitted"]
+
+    def test_unknown_rule_is_rejected(self):
+        with pytest.raises(ValueError):
+            compile_field_checks({"member_id": {"rule": "luhn", "error": "bad"}})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def network_api(monkeypatch):
+    """An empty network status cache on a fake clock; returns (clock, calls) with the pairs each API call fetched."""
+    clock = FakeClock()
+    monkeypatch.setattr(claim_validation_tools, "NETWORK_STATUS_CACHE",
+                        TTLCache(maxsize=100, ttl=NETWORK_STATUS_CACHE_TTL_SECONDS, clock=clock))
+    calls = []
+    single, bulk = claim_validation_tools.call_mock_provider_network_api, claim_validation_tools.call_mock_provider_network_api_bulk
+    monkeypatch.setattr(claim_validation_tools, "call_mock_provider_network_api",
+                        lambda provider_npi, plan_id: calls.append([(provider_npi, plan_id)]) or single(provider_npi, plan_id))
+    monkeypatch.setattr(claim_validation_tools, "call_mock_provider_network_api_bulk",
+                        lambda checks: calls.append(list(checks)) or bulk(checks))
+    return clock, calls
+
+
+IN_NETWORK = ("1234567890", "HMO_SILVER")
+NOT_FOR_PLAN = ("1112223333", "PPO_GOLD")
+UNKNOWN_NPI = ("9999999999", "HMO_SILVER")
+
+
+class TestNetworkStatusCache:
+    def test_not_found_for_plan_expires_sooner(self, network_api):
+        clock, calls = network_api
+        assert check_network_status.fn(*NOT_FOR_PLAN)[1]["network_status"] == NOT_FOUND_FOR_PLAN
+        assert check_network_status.fn(*IN_NETWORK)[1]["network_status"] == "In-Network"
+        clock.now = NETWORK_STATUS_NEGATIVE_TTL_SECONDS - 1
+        check_network_status_bulk([NOT_FOR_PLAN, IN_NETWORK])
+        assert calls == [[NOT_FOR_PLAN], [IN_NETWORK]]
+
+        clock.now = NETWORK_STATUS_NEGATIVE_TTL_SECONDS
+        check_network_status_bulk([NOT_FOR_PLAN, IN_NETWORK])
+        assert calls[2:] == [[NOT_FOR_PLAN]]
+        clock.now = NETWORK_STATUS_CACHE_TTL_SECONDS
+        check_network_status.fn(*IN_NETWORK)
+        assert calls[3:] == [[IN_NETWORK]]
+
+    def test_unknown_npi_is_not_cached(self, network_api):
+        _, calls = network_api
+        for _ in range(2):
+            assert check_network_status.fn(*UNKNOWN_NPI) == (False, None, "Provider NPI not found.")
+            assert check_network_status_bulk([UNKNOWN_NPI]) == {UNKNOWN_NPI: (False, None, "Provider NPI not found.")}
+        assert calls == [[UNKNOWN_NPI]] * 4
+        assert len(claim_validation_tools.NETWORK_STATUS_CACHE) == 0
+
+    def test_invalidate(self, network_api):
+        _, calls = network_api
+        pairs = [IN_NETWORK, ("1234567890", "PPO_GOLD"), ("0987654321", "HMO_SILVER"), ("0987654321", "PPO_GOLD")]
+        check_network_status_bulk(pairs)
+        assert invalidate_network_status_cache(provider_npi="1234567890") == 2
+        assert invalidate_network_status_cache(plan_id="PPO_GOLD") == 1
+        assert invalidate_network_status_cache(provider_npi="0987654321", plan_id="HMO_SILVER") == 1
+        check_network_status_bulk(pairs)
+        assert calls[1:] == [pairs] # Everything was dropped
+        assert invalidate_network_status_cache() == 4
+        assert len(claim_validation_tools.NETWORK_STATUS_CACHE) == 0
+
+    def test_bulk_fetches_each_missing_pair_once(self, network_api):
+        _, calls = network_api
+        check_network_status.fn(*IN_NETWORK)
+        checks = [IN_NETWORK, NOT_FOR_PLAN, ("", "HMO_SILVER"), NOT_FOR_PLAN, UNKNOWN_NPI, IN_NETWORK, ("0987654321", None)]
+        results = check_network_status_bulk(checks)
+        assert calls == [[IN_NETWORK], [NOT_FOR_PLAN, UNKNOWN_NPI]] # Cached and invalid pairs are not fetched
+        assert list(results) == list(dict.fromkeys(checks))
+        for check, result in results.items():
+            assert result == check_network_status.fn(*check)
+
+
+class TestEligibilityBulk:
+    def test_bulk_matches_check_eligibility(self, monkeypatch):
+        calls = []
+        bulk = claim_validation_tools.call_mock_member_eligibility_api_bulk
+        monkeypatch.setattr(claim_validation_tools, "call_mock_member_eligibility_api_bulk",
+                            lambda checks: calls.append(list(checks)) or bulk(checks))
+        checks = [
+            ("MEMBER123", "2023-10-26"), ("MEMBER456", "2023-10-26"), ("MEMBER123", "2023-10-26"), # Repeated pair
+            ("MEMBER123", "2022-12-31"), ("MEMBER789", "2022-06-01"), ("MEMBER789", "2023-06-01"), # Before / after coverage
+            ("NOPE", "2023-10-26"), ("MEMBER123", "10/26/2023"), ("", "2023-10-26"), ("MEMBER456", ""),
+            ("MEMBER789", "2023-06-01"), ("NOPE", "2023-10-26"),
+        ]
+        results = check_eligibility_bulk(checks)
+        assert results == {check: check_eligibility.fn(*check) for check in checks}
+        # One API call for the distinct pairs; pairs missing a member or date never reach it
+        assert calls == [[check for check in dict.fromkeys(checks) if all(check)]]
+        assert not results[("MEMBER789", "2023-06-01")][1]["is_eligible"]
+        assert results[("NOPE", "2023-10-26")] == (False, None, "Member ID not found.")
+
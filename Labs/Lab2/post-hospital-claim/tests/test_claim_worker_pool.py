@@ -0,0 +1,129 @@
+import os
+import queue
+import time
+
+import pytest
+
+import claim_worker_pool
+import policy_adjudication_tools
+from claim_worker_pool import ClaimWorkerPool, shard_key, shard_of
+from fee_schedule import FeeSchedule, build_fee_schedule_index
+
+# Members without a family, so each is its own shard key; they land on both workers of a two-worker pool
+FAMILIES = [f"MEMBER{index}" for index in range(8)]
+
+
+def _record_claims(start_delay: float = 0.0, claim_delay: float = 0.0):
+    # Worker initializer: instead of adjudicating, each claim reports the worker process, its position in that
+    # worker's order and the fee schedule the worker prices with
+    time.sleep(start_delay)
+    processed = []
+    fee_schedule = policy_adjudication_tools.FEE_SCHEDULE
+
+    def process_claims_batch(claims, output_mode="full"):
+        outcomes = []
+        for claim in claims:
+            time.sleep(claim_delay)
+            processed.append(claim["claim_id"])
+            outcomes.append((True, {
+                "claim_id": claim["claim_id"], "pid": os.getpid(), "position": len(processed),
+                "fee_schedule": fee_schedule.index_dir if fee_schedule is not None else None,
+            }, []))
+        return outcomes
+
+    claim_worker_pool.process_claims_batch = process_claims_batch
+
+
+def _claims(families: list[str], per_family: int) -> list[dict]:
+    return [{"claim_id": f"{member_id}-{index}", "member_id": member_id} for index in range(per_family) for member_id in families]
+
+
+def _families_by_worker() -> dict[int, list[str]]:
+    by_worker = {}
+    for member_id in FAMILIES:
+        by_worker.setdefault(shard_of(shard_key({"member_id": member_id}), 2), []).append(member_id)
+    return by_worker
+
+
+class TestClaimWorkerPool:
+    def test_refuses_to_share_an_accumulator_journal(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("ACCUMULATOR_JOURNAL_PATH", str(tmp_path / "accumulators.journal"))
+        started = []
+        monkeypatch.setattr(claim_worker_pool.multiprocessing, "get_context", lambda method: started.append(method))
+        with pytest.raises(ValueError, match="ACCUMULATOR_JOURNAL_PATH"):
+            ClaimWorkerPool(workers=2)
+        assert started == [] # Refused before any worker was spawned
+
+    def test_shard_key_is_the_family(self):
+        family_id, members = policy_adjudication_tools._family_of("MEMBER600")
+        assert len(members) > 1
+        assert {shard_key({"member_id": member_id}) for member_id in members} == {family_id}
+        assert shard_key({"member_id": "NOFAMILY1"}) == "NOFAMILY1"
+        assert shard_of("FAM1", 2) == shard_of("FAM1", 2) # Not salted per process like hash()
+        assert sorted(_families_by_worker()) == [0, 1]
+
+    def test_routes_families_to_one_worker_in_submission_order(self):
+        members = FAMILIES + ["MEMBER600", "MEMBER601", "MEMBER602"] # The last three are one family
+        claims = _claims(members, per_family=5)
+        with ClaimWorkerPool(workers=2, batch_size=3, initializer=_record_claims) as pool:
+            results = pool.process_claims(claims)
+            pids = [process.pid for process in pool._processes]
+
+        assert [data["claim_id"] for _, data, _ in results] == [claim["claim_id"] for claim in claims] # Input order
+        families = {}
+        for claim, (_, data, _) in zip(claims, results):
+            families.setdefault(shard_key(claim), []).append(data)
+        assert len(families) == len(FAMILIES) + 1
+        for family_id, family in families.items():
+            assert {data["pid"] for data in family} == {pids[shard_of(family_id, 2)]}
+            assert [data["position"] for data in family] == sorted(data["position"] for data in family)
+
+    def test_submit_times_out_while_the_workers_queue_is_full(self):
+        member_id = FAMILIES[0]
+        with ClaimWorkerPool(workers=2, queue_depth=1, initializer=_record_claims, initargs=(1.0,)) as pool:
+            first = pool.submit({"claim_id": "C1", "member_id": member_id})
+            with pytest.raises(queue.Full):
+                pool.submit({"claim_id": "C2", "member_id": member_id}, timeout=0.1)
+            # The other worker's queue is not full
+            other = _families_by_worker()[1 - shard_of(shard_key({"member_id": member_id}), 2)][0]
+            pool.submit({"claim_id": "C3", "member_id": other}, timeout=0.1)
+        assert first.result(timeout=0)[1]["claim_id"] == "C1"
+
+    def test_close_drains_queued_claims(self):
+        claims = _claims(FAMILIES, per_family=3)
+        pool = ClaimWorkerPool(workers=2, initializer=_record_claims, initargs=(0.5,))
+        futures = [pool.submit(claim) for claim in claims]
+        pool.close() # Before the workers took any claim
+        assert all(future.done() for future in futures)
+        assert [future.result()[1]["claim_id"] for future in futures] == [claim["claim_id"] for claim in claims]
+        with pytest.raises(RuntimeError):
+            pool.submit(claims[0])
+
+    def test_killed_worker_fails_its_outstanding_claims(self):
+        by_worker = _families_by_worker()
+        with ClaimWorkerPool(workers=2, initializer=_record_claims, initargs=(0.0, 0.2)) as pool:
+            doomed = [pool.submit(claim) for claim in _claims(by_worker[0], per_family=10)]
+            survivors = [pool.submit(claim) for claim in _claims(by_worker[1], per_family=2)]
+            time.sleep(0.5)
+            pool._processes[0].kill()
+            outcomes = [future.result(timeout=10) for future in doomed]
+        failed = [messages for success, _, messages in outcomes if not success]
+        assert failed # Claims still queued or in progress when the worker died
+        assert all("Claim worker 0 exited unexpectedly" in messages[0] for messages in failed)
+        assert all(future.result(timeout=0)[0] for future in survivors)
+
+    def test_workers_price_with_the_parents_fee_schedule(self, tmp_path, monkeypatch):
+        # FEE_SCHEDULE_PATH names a source the workers must not index again; they open the parent's build
+        monkeypatch.setenv("FEE_SCHEDULE_PATH", str(tmp_path / "missing.csv"))
+        fee_schedule = FeeSchedule(build_fee_schedule_index(
+            [("PPO_GOLD_PAR", "99214", "", "2023-01-01", 150.0)], str(tmp_path / "index")))
+        monkeypatch.setattr(policy_adjudication_tools, "FEE_SCHEDULE", fee_schedule)
+        with ClaimWorkerPool(workers=2, initializer=_record_claims) as pool:
+            results = pool.process_claims(_claims(FAMILIES, per_family=1))
+        assert {data["fee_schedule"] for _, data, _ in results} == {fee_schedule.index_dir}
+        assert os.environ["FEE_SCHEDULE_PATH"] == str(tmp_path / "missing.csv")
+
+        monkeypatch.setattr(policy_adjudication_tools, "FEE_SCHEDULE", None)
+        with ClaimWorkerPool(workers=2, initializer=_record_claims) as pool:
+            results = pool.process_claims(_claims(FAMILIES, per_family=1))
+        assert {data["fee_schedule"] for _, data, _ in results} == {None}
@@ -0,0 +1,102 @@
+import itertools
+import random
+
+import pytest
+
+import policy_adjudication_tools
+from coverage_guidelines import GuidelineIndex, GuidelineRule, rules_from_exact
+from policy_adjudication_tools import (MOCK_COVERAGE_GUIDELINES, UNKNOWN_GUIDELINE_STATUS, call_mock_guidelines_api,
+                                       invalidate_coverage_guidelines)
+
+RULES = [
+    {"cpt": "99202-99215", "icd": "M54.*", "coverage_status": "Generally Payable"},
+    {"cpt": "99214", "icd": "M54.5", "coverage_status": "Payable - Exact"},
+    {"cpt": "64490-64495", "icd": "M47.8*", "coverage_status": "Requires Review"},
+    {"cpt": "64490-64495", "icd": "*", "coverage_status": "Not Covered"},
+    {"cpt": "*", "icd": "Z00.*", "coverage_status": "Preventive"},
+    {"cpt": "*", "icd": "Z00.00", "coverage_status": "Preventive - Low", "priority": -1},
+    {"cpt": "80000-89999", "icd": "*", "coverage_status": "Lab", "priority": 1},
+    {"cpt": "99213-99214", "icd": "M54.*", "coverage_status": "Narrow Range"},
+]
+
+
+def _brute_force(rules: list[GuidelineRule], cpt_code: str, icd_code: str) -> GuidelineRule | None:
+    cpt = cpt_code.strip().upper()
+    icd = icd_code.replace(".", "").strip().upper()
+    matching = [
+        rule for rule in rules
+        if (rule.cpt_range is None or (len(cpt) == len(rule.cpt_range[0]) and rule.cpt_range[0] <= cpt <= rule.cpt_range[1]))
+        and (icd.startswith(rule.icd_code) if rule.icd_is_prefix else icd == rule.icd_code)
+    ]
+    return max(matching, key=lambda rule: rule.rank, default=None)
+
+
+class TestGuidelineIndex:
+    def test_most_specific_rule_wins(self):
+        index = GuidelineIndex(RULES)
+        assert index.coverage_status("99214", "M54.5") == "Payable - Exact"
+        assert index.coverage_status("99214", "M54.16") == "Generally Payable" # Ranges are equally specific: first listed
+        assert index.coverage_status("99202", "M54.16") == "Generally Payable"
+        assert index.coverage_status("64493", "M47.816") == "Requires Review"
+        assert index.coverage_status("64493", "G56.0") == "Not Covered"
+        assert index.coverage_status("85025", "Z00.00") == "Lab" # Priority beats specificity
+        assert index.coverage_status("12345", "X99.9", default="Unknown") == "Unknown"
+
+    def test_icd_dots_and_case_are_ignored(self):
+        index = GuidelineIndex(RULES)
+        assert index.coverage_status("99214", "m545") == "Payable - Exact"
+
+    def test_exact_rules_combine_with_patterns(self):
+        index = GuidelineIndex(rules_from_exact({"12345_X99.9": "Exact Only"}) + RULES)
+        assert index.coverage_status("12345", "X99.9") == "Exact Only"
+
+    def test_matches_brute_force(self):
+        index = GuidelineIndex(RULES)
+        rng = random.Random(3)
+        cpts = ["99202", "99213", "99214", "99215", "99216", "64490", "64495", "64496", "85025", "1234", "T1015"]
+        icds = ["M54", "M54.5", "M54.16", "M47.816", "M47", "Z00", "Z00.00", "Z00.01", "G56.0", "", "X"]
+        for cpt, icd in itertools.chain(itertools.product(cpts, icds), ((rng.choice(cpts), rng.choice(icds)) for _ in range(200))):
+            assert index.match(cpt, icd) is _brute_force(index.rules, cpt, icd), (cpt, icd)
+
+    @pytest.mark.parametrize("cpt", ["99215-99202", "9920-99215", ""])
+    def test_malformed_cpt_pattern_is_rejected(self, cpt):
+        with pytest.raises(ValueError):
+            GuidelineRule(cpt, "*", "Generally Payable")
+
+    @pytest.mark.parametrize("icd", ["", "M*54", "M5*4*"])
+    def test_malformed_icd_pattern_is_rejected(self, icd):
+        with pytest.raises(ValueError):
+            GuidelineRule("99214", icd, "Generally Payable")
+
+
+def _coverage_status(cpt_code: str, icd_code: str) -> str:
+    return call_mock_guidelines_api(cpt_code, icd_code)["body"]["coverage_status"]
+
+
+@pytest.fixture
+def mock_guideline_rules(monkeypatch):
+    """A copy of MOCK_COVERAGE_GUIDELINE_RULES the test may change; the mock index is recompiled before and after."""
+    rules = list(policy_adjudication_tools.MOCK_COVERAGE_GUIDELINE_RULES)
+    monkeypatch.setattr(policy_adjudication_tools, "MOCK_COVERAGE_GUIDELINE_RULES", rules)
+    invalidate_coverage_guidelines()
+    yield rules
+    invalidate_coverage_guidelines()
+
+
+class TestMockGuidelinesApi:
+    def test_exact_combinations_keep_their_status(self, mock_guideline_rules):
+        for key, coverage_status in MOCK_COVERAGE_GUIDELINES.items():
+            assert _coverage_status(*key.split("_", 1)) == coverage_status, key
+
+    def test_rules_cover_the_combinations_not_listed(self, mock_guideline_rules):
+        assert _coverage_status("99203", "L70.0") == "Generally Payable"
+        assert _coverage_status("64490", "M47.816") == "Payable with PreAuth"
+        assert _coverage_status("99213", "Z41.1") == "Not Covered" # Priority beats the visit range
+        assert _coverage_status("12345", "L70.0") == UNKNOWN_GUIDELINE_STATUS
+
+    def test_invalidate_recompiles_the_rules(self, mock_guideline_rules):
+        assert _coverage_status("12345", "L70.0") == UNKNOWN_GUIDELINE_STATUS
+        mock_guideline_rules.append({"cpt": "12345", "icd": "L70.*", "coverage_status": "Not Covered"})
+        assert _coverage_status("12345", "L70.0") == UNKNOWN_GUIDELINE_STATUS # Still the compiled index
+        invalidate_coverage_guidelines()
+        assert _coverage_status("12345", "L70.0") == "Not Covered"
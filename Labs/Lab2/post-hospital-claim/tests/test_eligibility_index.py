@@ -0,0 +1,54 @@
+from datetime import date
+
+import pytest
+
+from eligibility_index import EligibilityIndex
+
+RECORDS = {
+    "M1": {"plan_id": "PPO_GOLD", "coverage": [
+        {"start": "2023-01-01", "end": "2023-03-31"},
+        {"start": "2023-07-01", "end": None, "plan_id": "HMO_SILVER"},
+    ]},
+    "M2": {"plan_id": "PPO_GOLD", "coverage": []},
+}
+
+
+class TestEligibilityIndex:
+    @pytest.mark.parametrize("date_of_service, expected", [
+        ("2022-12-31", (False, "PPO_GOLD")),
+        ("2023-01-01", (True, "PPO_GOLD")),
+        ("2023-03-31", (True, "PPO_GOLD")),
+        ("2023-04-01", (False, "PPO_GOLD")),
+        ("2023-07-01", (True, "HMO_SILVER")),
+        ("2031-01-01", (True, "HMO_SILVER")),
+        ("not-a-date", (False, "PPO_GOLD")),
+    ])
+    def test_lookup(self, date_of_service, expected):
+        assert EligibilityIndex(RECORDS).lookup("M1", date_of_service) == expected
+
+    def test_unknown_member_and_no_coverage(self):
+        index = EligibilityIndex(RECORDS)
+        assert index.lookup("NOPE", "2023-01-01") is None
+        assert index.lookup("M2", "2023-01-01") == (False, "PPO_GOLD")
+
+    def test_lookup_many_matches_lookup(self):
+        index = EligibilityIndex(RECORDS)
+        checks = [("M1", "2023-02-01"), ("M1", "2023-05-01"), ("M2", "2023-02-01"), ("NOPE", "2023-02-01"), ("M1", "bad")]
+        assert index.lookup_many(checks) == {check: index.lookup(*check) for check in checks}
+
+    def test_update_replaces_a_members_spans(self):
+        index = EligibilityIndex(RECORDS)
+        index.update({"M1": {"plan_id": "HMO_SILVER", "coverage": [{"start": "2024-01-01", "end": "2024-12-31"}]},
+                      "M3": {"plan_id": "PPO_GOLD", "coverage": [{"start": None, "end": "2023-01-31"}]}})
+        assert len(index) == 3 and "M3" in index
+        assert index.lookup("M1", "2023-07-01") == (False, "HMO_SILVER") # The old open-ended span is gone
+        assert index.lookup("M1", date(2024, 6, 1).toordinal()) == (True, "HMO_SILVER")
+        assert index.lookup("M3", "1990-01-01") == (True, "PPO_GOLD") # No start: covered from any date
+
+    @pytest.mark.parametrize("coverage", [
+        [{"start": "2023-01-01", "end": "2023-06-30"}, {"start": "2023-06-30", "end": None}],
+        [{"start": "2023-06-30", "end": "2023-01-01"}],
+    ])
+    def test_invalid_spans_are_rejected(self, coverage):
+        with pytest.raises(ValueError):
+            EligibilityIndex({"M3": {"plan_id": "PPO_GOLD", "coverage": coverage}})
@@ -0,0 +1,25 @@
+import pytest
+
+from eob_notes import NOTE_TEMPLATES, render_note, render_notes
+
+
+class TestEobNotes:
+    def test_render_note(self):
+        assert render_note(("copay_applied", 25.0)) == "Applied $25.00 Copay."
+        assert render_note(("coinsurance_applied", 20.0, 30.0)) == "Applied 20% coinsurance ($30.00)."
+        assert render_note(("fee_schedule_rate", 142.5, "HMO_SILVER_PAR", "2023-01-01")) == \
+            "Allowed $142.50 per fee schedule HMO_SILVER_PAR (effective 2023-01-01)."
+        assert render_note(("pre_auth_approved", "PA-1")) == "Pre-authorization approved (Auth #: PA-1)."
+
+    def test_render_notes_keeps_order(self):
+        notes = [("deductible_applied", 250.0), ("coinsurance_applied", 20.0, 30.0), ("oop_max_reached", 3000.0, 12.5)]
+        assert render_notes(notes) == [render_note(note) for note in notes] == [
+            "Applied $250.00 towards deductible.", "Applied 20% coinsurance ($30.00).",
+            "OOP Max Limit ($3000.00) reached. Reducing member responsibility by $12.50.",
+        ]
+        assert render_notes([]) == []
+
+    def test_unknown_code(self):
+        assert "copay_waived" not in NOTE_TEMPLATES
+        with pytest.raises(KeyError):
+            render_notes([("copay_applied", 25.0), ("copay_waived",)])
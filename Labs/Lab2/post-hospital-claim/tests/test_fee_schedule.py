@@ -0,0 +1,117 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import policy_adjudication_tools
+from fee_schedule import FeeSchedule, build_fee_schedule_index, load_fee_schedule
+from policy_adjudication_tools import MOCK_POLICY_DB, BenefitsEngineTool, install_fee_schedule
+
+ROWS = [
+    ("HMO_SILVER_PAR", "99214", "", "2023-01-01", 142.50),
+    ("HMO_SILVER_PAR", "99214", "25", "2023-01-01", 160.00),
+    ("HMO_SILVER_PAR", "99214", "", "2024-01-01", 148.00),
+    ("HMO_SILVER_PAR", "99213", "", "2023-07-01", 95.00),
+    ("PPO_GOLD_PAR", "99214", "", "2023-01-01", 150.00),
+]
+
+
+def _write_csv(path, rows) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("contract_id,cpt_code,modifier,effective_date,allowed_amount\n")
+        f.writelines(f"{','.join(str(value) for value in row)}\n" for row in rows)
+    return str(path)
+
+
+@pytest.fixture
+def schedule(tmp_path) -> FeeSchedule:
+    return FeeSchedule(build_fee_schedule_index(ROWS, str(tmp_path / "index")))
+
+
+class TestFeeScheduleLookup:
+    def test_rate_in_effect_on_the_date_of_service(self, schedule):
+        assert schedule.lookup("HMO_SILVER_PAR", "99214", None, "2023-10-26") == (142.5, "2023-01-01")
+        assert schedule.lookup("HMO_SILVER_PAR", "99214", None, "2024-01-01") == (148.0, "2024-01-01")
+        assert schedule.lookup("HMO_SILVER_PAR", "99214", None, "2030-06-30") == (148.0, "2024-01-01")
+
+    def test_no_rate_before_the_first_effective_date(self, schedule):
+        assert schedule.lookup("HMO_SILVER_PAR", "99213", None, "2023-06-30") is None
+        assert schedule.lookup("HMO_SILVER_PAR", "99213", None, "2023-07-01") == (95.0, "2023-07-01")
+
+    def test_modifier_rate_and_fallback_to_the_unmodified_rate(self, schedule):
+        assert schedule.lookup("HMO_SILVER_PAR", "99214", "25", "2023-10-26") == (160.0, "2023-01-01")
+        # No rate of its own for the modifier: the unmodified rate, including the 2024 one for "25"
+        assert schedule.lookup("HMO_SILVER_PAR", "99214", "59", "2023-10-26") == (142.5, "2023-01-01")
+        assert schedule.lookup("HMO_SILVER_PAR", "99214", "25", "2024-03-01") == (160.0, "2023-01-01")
+
+    def test_unknown_codes_and_bad_dates(self, schedule):
+        assert schedule.lookup("HMO_SILVER_PAR", "99215", None, "2023-10-26") is None
+        assert schedule.lookup("UNKNOWN", "99214", None, "2023-10-26") is None
+        # A code that is a prefix of another must not match it
+        assert schedule.lookup("HMO_SILVER_PAR", "9921", None, "2023-10-26") is None
+        assert schedule.lookup("HMO_SILVER_PAR", "99214", None, "10/26/2023") is None
+        assert schedule.lookup("HMO_SILVER_PAR", "99214", None, None) is None
+
+    def test_allowed_amounts_matches_allowed_amount(self, schedule):
+        lines = [(contract_id, cpt_code, modifier, date_of_service)
+                 for contract_id in ("HMO_SILVER_PAR", "PPO_GOLD_PAR", "UNKNOWN")
+                 for cpt_code in ("99213", "99214", "99215")
+                 for modifier in ("", "25", "59")
+                 for date_of_service in ("2022-12-31", "2023-01-01", "2023-08-15", "2024-01-01", "2025-05-05")]
+        expected = [schedule.allowed_amount(*line) for line in lines]
+        amounts = schedule.allowed_amounts(*(list(column) for column in zip(*lines)))
+        assert [None if np.isnan(amount) else float(amount) for amount in amounts] == expected
+
+    def test_invalid_rows_are_rejected(self, tmp_path):
+        with pytest.raises(ValueError, match="Duplicate"):
+            build_fee_schedule_index(ROWS + [ROWS[0]], str(tmp_path / "index"))
+        with pytest.raises(ValueError):
+            build_fee_schedule_index([("HMO_SILVER_PAR", "99214", "", "2023-13-01", 1.0)], str(tmp_path / "index"))
+
+
+class TestFeeScheduleBuilds:
+    def test_rebuild_leaves_the_open_schedule_unchanged(self, tmp_path):
+        source = _write_csv(tmp_path / "fees.csv", ROWS)
+        old = load_fee_schedule(source)
+        _write_csv(tmp_path / "fees.csv", [row[:4] + (row[4] + 10,) for row in ROWS])
+        new = load_fee_schedule(source)
+
+        assert new.index_dir != old.index_dir
+        assert os.path.dirname(new.index_dir) == os.path.dirname(old.index_dir) == f"{source}.index"
+        assert old.allowed_amount("HMO_SILVER_PAR", "99214", None, "2023-10-26") == 142.5
+        assert new.allowed_amount("HMO_SILVER_PAR", "99214", None, "2023-10-26") == 152.5
+
+    def test_concurrent_builds_of_one_schedule_share_a_directory(self, tmp_path):
+        index_root = str(tmp_path / "index")
+        index_dirs = []
+        threads = [threading.Thread(target=lambda: index_dirs.append(build_fee_schedule_index(ROWS, index_root))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(index_dirs) == 8 and len(set(index_dirs)) == 1
+        assert os.listdir(index_root) == [os.path.basename(index_dirs[0])] # No staging directory left behind
+        assert len(FeeSchedule(index_dirs[0])) == len(ROWS)
+
+
+class TestInstallFeeSchedule:
+    def test_new_claims_are_priced_with_the_installed_schedule(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(policy_adjudication_tools, "FEE_SCHEDULE", None)
+        engine = BenefitsEngineTool()
+        policy = MOCK_POLICY_DB["PPO_GOLD"]
+        line = {"cpt_code": "99214", "charge_amount": 300.0, "network_status": "In-Network", "date_of_service": "2023-10-26"}
+
+        def allowed() -> float:
+            accumulators = {"deductible_met_individual": 500.0, "oop_max_met_individual": 0.0}
+            return engine.adjudicate_claim_line(dict(line), policy, accumulators)["allowed_amount"]
+
+        assert allowed() == 300.0 # No schedule: the charge
+        first = install_fee_schedule(_write_csv(tmp_path / "fees.csv", ROWS))
+        assert allowed() == 150.0
+        install_fee_schedule(_write_csv(tmp_path / "fees.csv", [row[:4] + (row[4] + 10,) for row in ROWS]))
+        assert allowed() == 160.0
+        # A claim that started on the first schedule still prices with it
+        assert engine.adjudicate_claim_line(dict(line), policy, {"deductible_met_individual": 500.0, "oop_max_met_individual": 0.0},
+                                            fee_schedule=first)["allowed_amount"] == 150.0
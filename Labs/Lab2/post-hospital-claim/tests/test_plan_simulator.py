@@ -0,0 +1,128 @@
+import copy
+
+import pytest
+
+import plan_simulator
+import policy_adjudication_tools
+from plan_simulator import _prepare_corpus, build_variant_policy, simulate_plan_variants
+from policy_adjudication_tools import MOCK_POLICY_DB, adjudicate_claims_batch, invalidate_policy_cache
+from synthetic_claims import SyntheticDataset
+
+DEDUCTIBLE_750 = {"deductible_individual": 750.0, "deductible_family": 1500.0}
+LAB_COPAY_20 = {"Lab_InNetwork": {"copay": 20.0}}
+
+
+def _claim(member_id: str, plan_id: str, lines: list[tuple[str, float]], cpt_code: str = "80053") -> dict:
+    return {
+        "member_id": member_id,
+        "member_eligibility": {"member_id": member_id, "is_eligible": True, "plan_id": plan_id},
+        "services": [
+            {"date_of_service": date_of_service, "cpt_code": cpt_code, "icd_10_code": "M54.5", "provider_npi": "0987654321",
+             "charge_amount": charge_amount, "network_status": "In-Network"}
+            for date_of_service, charge_amount in lines
+        ],
+    }
+
+
+# Family claims on both sides of a benefit year boundary, some spanning it
+CROSS_YEAR_CLAIMS = [
+    _claim("MEMBER600", "HMO_SILVER", [("2023-12-30", 800.0), ("2024-01-02", 900.0)]),
+    _claim("MEMBER601", "HMO_SILVER", [("2023-11-01", 3000.0)]),
+    _claim("MEMBER602", "HMO_SILVER", [("2024-02-01", 5000.0), ("2023-12-31", 700.0)]),
+    _claim("MEMBER123", "PPO_GOLD", [("2023-05-05", 100.0)], cpt_code="99214"),
+    _claim("MEMBER123", "PPO_GOLD", [("2024-03-05", 400.0)], cpt_code="99214"),
+]
+
+
+def _batch_totals(claims: list[dict], name: str) -> dict:
+    # What simulate_plan_variants reports, computed from adjudicate_claims_batch on the same starting accumulators
+    results = [claim for success, claim, _ in adjudicate_claims_batch(copy.deepcopy(claims)) if success]
+    per_claim = sorted(claim["claim_summary"]["total_member_responsibility"] for claim in results)
+    return {
+        "variant": name,
+        "claims": len(results),
+        "denied_lines": sum(line["line_status"].startswith("Denied") for claim in results for line in claim["services"]),
+        "total_member_responsibility": round(sum(per_claim), 2),
+        "total_insurer_payment": round(sum(claim["claim_summary"]["total_insurer_payment"] for claim in results), 2),
+        "member_responsibility_per_claim": {
+            "mean": round(sum(per_claim) / len(per_claim), 2),
+            "p50": plan_simulator._percentile(per_claim, 50),
+            "p90": plan_simulator._percentile(per_claim, 90),
+            "p99": plan_simulator._percentile(per_claim, 99),
+            "max": per_claim[-1],
+        },
+    }
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    dataset = SyntheticDataset(seed=7, members=60, inactive_rate=0.2)
+    dataset.install()
+    return dataset
+
+
+@pytest.fixture
+def plan_variant(monkeypatch):
+    """Returns install(plan_id, overrides, benefit_overrides): makes a variant the plan's policy in MOCK_POLICY_DB."""
+    def install(plan_id: str, overrides=None, benefit_overrides=None):
+        monkeypatch.setitem(MOCK_POLICY_DB, plan_id, build_variant_policy(MOCK_POLICY_DB[plan_id], overrides, benefit_overrides))
+        invalidate_policy_cache()
+
+    yield install
+    invalidate_policy_cache()
+
+
+class TestSimulatePlanVariants:
+    def test_baseline_matches_adjudicate_claims_batch(self, dataset, reset_accumulators):
+        claims = list(dataset.iter_validated_claims(800))
+        dataset.reset_accumulators()
+        simulated = simulate_plan_variants(copy.deepcopy(claims), [{"name": "baseline"}], max_workers=1)
+        assert simulated == [_batch_totals(claims, "baseline")]
+        assert simulated[0]["claims"] == len(claims)
+
+    def test_variant_matches_batch_on_the_changed_plan(self, reset_accumulators, plan_variant):
+        reset_accumulators()
+        variants = [
+            {"name": "baseline"},
+            {"name": "silver750", "plan_id": "HMO_SILVER", "overrides": DEDUCTIBLE_750, "benefit_overrides": LAB_COPAY_20},
+        ]
+        simulated = simulate_plan_variants(copy.deepcopy(CROSS_YEAR_CLAIMS), variants, max_workers=1)
+        assert policy_adjudication_tools.ACCUMULATOR_STORE.data == reset_accumulators().data # Nothing written back
+
+        expected = [_batch_totals(CROSS_YEAR_CLAIMS, "baseline")]
+        reset_accumulators() # Starting accumulators again, and no stored results to return as repeats
+        plan_variant("HMO_SILVER", DEDUCTIBLE_750, LAB_COPAY_20)
+        expected.append(_batch_totals(CROSS_YEAR_CLAIMS, "silver750"))
+        assert simulated == expected
+        assert simulated[0]["total_member_responsibility"] != simulated[1]["total_member_responsibility"]
+
+    def test_policies_are_keyed_per_benefit_year(self, reset_accumulators):
+        reset_accumulators()
+        claims = [_claim("MEMBER123", "PPO_GOLD", [("2023-05-05", 400.0)], cpt_code="99214"),
+                  _claim("MEMBER123", "PPO_GOLD", [("2024-03-05", 400.0)], cpt_code="99214")]
+        corpus, skipped = _prepare_corpus(copy.deepcopy(CROSS_YEAR_CLAIMS + claims))
+        assert skipped == 0
+        assert set(corpus["policies"]) == {("HMO_SILVER", 2023), ("HMO_SILVER", 2024), ("PPO_GOLD", 2023), ("PPO_GOLD", 2024)}
+        assert {("MEMBER600", 2023), ("MEMBER600", 2024), ("MEMBER602", 2024)} <= set(corpus["accumulators"])
+
+        # Each claim is adjudicated on its benefit year's policy: no deductible in 2024
+        corpus, _ = _prepare_corpus(copy.deepcopy(claims))
+        corpus["policies"][("PPO_GOLD", 2024)] = build_variant_policy(corpus["policies"][("PPO_GOLD", 2024)], {"deductible_individual": 0.0})
+        plan_simulator._init_worker(corpus, quiet=False)
+        baseline = plan_simulator._simulate_variant({"name": "baseline"})
+        assert (baseline["member_responsibility_per_claim"]["p50"], baseline["member_responsibility_per_claim"]["max"]) == (40.0, 400.0)
+
+        # A variant's overrides apply to its plan's policy of every benefit year
+        variant = plan_simulator._simulate_variant({"plan_id": "PPO_GOLD", "overrides": {"deductible_individual": 100.0}})
+        assert (variant["member_responsibility_per_claim"]["p50"], variant["member_responsibility_per_claim"]["max"]) == (130.0, 130.0)
+
+    def test_worker_processes_match_in_process(self, reset_accumulators):
+        reset_accumulators()
+        variants = [{"name": "baseline"}, {"name": "gold750", "plan_id": "PPO_GOLD", "overrides": DEDUCTIBLE_750}]
+        assert simulate_plan_variants(copy.deepcopy(CROSS_YEAR_CLAIMS), variants, max_workers=2) == \
+            simulate_plan_variants(copy.deepcopy(CROSS_YEAR_CLAIMS), variants, max_workers=1)
+
+    def test_unknown_variant_plan_is_rejected(self, reset_accumulators):
+        reset_accumulators()
+        with pytest.raises(ValueError):
+            simulate_plan_variants(copy.deepcopy(CROSS_YEAR_CLAIMS), [{"plan_id": "PPO_PLATINUM"}], max_workers=1)
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTTLCache:
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache(maxsize=4, ttl=10.0, clock=clock)
+        cache.put("a", 1)
+        cache.put("b", 2, ttl=30.0)
+        clock.now = 10.0
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=60.0)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+        assert cache.stats()["evictions"] == 1
+
+    def test_get_or_load_collapses_concurrent_misses(self):
+        cache = TTLCache(maxsize=4, ttl=60.0)
+        calls = []
+        release = threading.Event()
+
+        def loader():
+            calls.append(True)
+            release.wait(5)
+            return "value"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05) # Let every thread reach the in-flight load
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert results == ["value"] * 8
+        assert cache.get("k") == "value"
+
+    def test_loader_error_reaches_waiters_and_is_not_cached(self):
+        cache = TTLCache(maxsize=4, ttl=60.0)
+
+        def failing_loader():
+            raise RuntimeError("backend down")
+
+        with pytest.raises(RuntimeError):
+            cache.get_or_load("k", failing_loader)
+        assert cache.get_or_load("k", lambda: "recovered") == "recovered"
+
+    def test_should_cache_and_per_value_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache(maxsize=4, ttl=60.0, clock=clock)
+        assert cache.get_or_load("error", lambda: {"ok": False}, should_cache=lambda value: value["ok"]) == {"ok": False}
+        assert cache.get("error") is None
+        cache.get_or_load("missing", lambda: None, ttl=lambda value: 5.0 if value is None else 60.0)
+        clock.now = 4.0
+        assert cache.get("missing", "expired") is None
+        clock.now = 5.0
+        assert cache.get("missing", "expired") == "expired"
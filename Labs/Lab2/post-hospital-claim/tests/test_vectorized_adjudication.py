@@ -0,0 +1,150 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+import policy_adjudication_tools
+from policy_adjudication_tools import CPT_SERVICE_TYPES, MOCK_POLICY_DB, BenefitsEngineTool, CompiledPlan
+from vectorized_adjudication import RuleTable, adjudicate_lines_vectorized
+
+DEDUCTIBLE = "deductible_met_individual"
+OOP = "oop_max_met_individual"
+LINE_FIELDS = ("allowed_amount", "copay_applied", "deductible_applied", "coinsurance_member_owes", "member_responsibility",
+               "insurer_payment", "applied_to_deductible_this_line", "applied_to_oop_max_this_line")
+
+
+def _random_book(seed: int, families: int, lines: int):
+    # Families of one to four members on one plan, accumulators anywhere up to the limits (deductible above them too)
+    rng = random.Random(seed)
+    plan_ids = list(MOCK_POLICY_DB)
+    member_plan, member_family, records = [], [], []
+    for family in range(families):
+        plan_id = plan_ids[rng.randrange(len(plan_ids))]
+        plan = MOCK_POLICY_DB[plan_id]
+        for _ in range(rng.choice([1, 1, 2, 3, 4])):
+            member_plan.append(plan_id)
+            member_family.append(family)
+            records.append({
+                DEDUCTIBLE: rng.choice([0.0, 123.45, plan["deductible_individual"] - 0.01, plan["deductible_individual"],
+                                        plan["deductible_individual"] + 50.0, round(rng.uniform(0, plan["deductible_individual"]), 2)]),
+                OOP: rng.choice([0.0, 40.5, plan["oop_max_individual"] - 1.0, plan["oop_max_individual"],
+                                 round(rng.uniform(0, plan["oop_max_individual"]), 2)]),
+            })
+    cpt_codes = list(CPT_SERVICE_TYPES) + ["00000"]
+    book = [
+        (rng.randrange(len(member_plan)), rng.choice(cpt_codes), round(rng.uniform(0, 2500), 2), rng.random() < 0.6)
+        for _ in range(lines)
+    ]
+    return member_plan, member_family, records, book
+
+
+def _scalar(member_plan, member_family, records, book):
+    # Line by line with BenefitsEngineTool, each line seeing its member's record and the family totals
+    # (FamilyAccumulators.for_member), then adding its rounded amounts to the member's record
+    engine = BenefitsEngineTool()
+    records = [values.copy() for values in records]
+    family_members = {}
+    for member, family in enumerate(member_family):
+        family_members.setdefault(family, []).append(member)
+    results = []
+    for member, cpt_code, charge, in_network in book:
+        plan = MOCK_POLICY_DB[member_plan[member]]
+        accumulators = records[member].copy()
+        family = family_members[member_family[member]]
+        if len(family) > 1:
+            accumulators["deductible_met_family"] = sum(records[other][DEDUCTIBLE] for other in family)
+            accumulators["oop_max_met_family"] = sum(records[other][OOP] for other in family)
+        line = {"cpt_code": cpt_code, "charge_amount": charge, "network_status": "In-Network" if in_network else "Out-of-Network"}
+        result = engine.adjudicate_claim_line(line, plan, accumulators, CompiledPlan(plan))
+        records[member][DEDUCTIBLE] += result["applied_to_deductible_this_line"]
+        records[member][OOP] += result["applied_to_oop_max_this_line"]
+        results.append(result)
+    return results, records
+
+
+def _vectorized(member_plan, member_family, records, book, with_families=True):
+    plan_ids = list(MOCK_POLICY_DB)
+    plans = [CompiledPlan(MOCK_POLICY_DB[plan_id]) for plan_id in plan_ids]
+    rule_table = RuleTable(plans)
+    member_plan_position = [plan_ids.index(plan_id) for plan_id in member_plan]
+    member_index = np.array([member for member, _, _, _ in book])
+    in_network = [line[3] for line in book]
+    family_kwargs = {}
+    if with_families:
+        family_sizes = np.bincount(member_family)
+        family_plan = {family: plans[position] for family, position in zip(member_family, member_plan_position)}
+        family_kwargs = {
+            "family_index": member_family,
+            # A family of one has no family limit
+            "family_deductible_limit": [family_plan[family].deductible_family if size > 1 else math.inf
+                                        for family, size in enumerate(family_sizes)],
+            "family_oop_max_limit": [family_plan[family].oop_max_family if size > 1 else math.inf
+                                     for family, size in enumerate(family_sizes)],
+        }
+    return adjudicate_lines_vectorized(
+        [line[2] for line in book], in_network,
+        rule_table.rule_indexes([member_plan_position[member] for member in member_index], [line[1] for line in book], in_network),
+        member_index, rule_table,
+        [plans[position].deductible_individual for position in member_plan_position],
+        [plans[position].oop_max_individual for position in member_plan_position],
+        [values[DEDUCTIBLE] for values in records], [values[OOP] for values in records],
+        **family_kwargs,
+    )
+
+
+@pytest.fixture(autouse=True)
+def no_fee_schedule(monkeypatch):
+    # The scalar engine prices lines from an installed fee schedule; the vectorized one takes allowed amounts as input
+    monkeypatch.setattr(policy_adjudication_tools, "FEE_SCHEDULE", None)
+
+
+class TestVectorizedAdjudication:
+    @pytest.mark.parametrize("seed", [1, 2, 3])
+    def test_matches_scalar_engine_with_family_limits(self, seed):
+        book = _random_book(seed, families=40, lines=3000)
+        scalar, scalar_records = _scalar(*book)
+        vectorized = _vectorized(*book)
+
+        for field in LINE_FIELDS:
+            assert vectorized[field] == pytest.approx([line[field] for line in scalar], abs=1e-9), field
+        assert vectorized["final_deductible_met"] == pytest.approx([values[DEDUCTIBLE] for values in scalar_records], abs=1e-9)
+        assert vectorized["final_oop_max_met"] == pytest.approx([values[OOP] for values in scalar_records], abs=1e-9)
+
+    def test_family_limit_caps_lines_of_every_member(self):
+        # The family is $500 short of its $3,000 deductible, well before either member with lines reaches their own
+        records = [{DEDUCTIBLE: 1000.0, OOP: 1000.0}, {DEDUCTIBLE: 1500.0, OOP: 1500.0}, {DEDUCTIBLE: 0.0, OOP: 0.0}]
+        book = [(0, "00000", 400.0, True), (2, "00000", 400.0, True), (0, "00000", 400.0, True), (2, "00000", 400.0, True)]
+        vectorized = _vectorized(["HMO_SILVER"] * 3, [0, 0, 0], records, book)
+        assert vectorized["deductible_applied"].tolist() == [400.0, 100.0, 0.0, 0.0]
+        assert vectorized["final_deductible_met"].tolist() == [1400.0, 1500.0, 100.0]
+
+        individual_only = _vectorized(["HMO_SILVER"] * 3, [0, 0, 0], records, book, with_families=False)
+        assert individual_only["deductible_applied"].tolist() == [400.0, 400.0, 100.0, 400.0]
+
+    def test_rounds_half_cents_like_round(self):
+        # 10% coinsurance of $0.15, $0.25 and $1.15: the binary products sit a hair off the half cent, where
+        # rounding cents of amount * 100 goes the other way
+        records = [{DEDUCTIBLE: 500.0, OOP: 0.0}]
+        book = [(0, "00000", 0.15, True), (0, "00000", 0.25, True), (0, "00000", 1.15, True)]
+        scalar, _ = _scalar(["PPO_GOLD"], [0], records, book)
+        vectorized = _vectorized(["PPO_GOLD"], [0], records, book)
+        assert vectorized["member_responsibility"].tolist() == [line["member_responsibility"] for line in scalar] == [0.01, 0.03, 0.11]
+
+    def test_rule_indexes_select_the_compiled_plans_rules(self):
+        plans = [CompiledPlan(plan) for plan in MOCK_POLICY_DB.values()]
+        rule_table = RuleTable(plans)
+        lines = [(position, cpt_code, in_network) for position in range(len(plans))
+                 for cpt_code in list(CPT_SERVICE_TYPES) + ["00000", None] for in_network in (True, False)]
+        rule_indexes = rule_table.rule_indexes(*(list(column) for column in zip(*lines)))
+        for (position, cpt_code, in_network), rule_index in zip(lines, rule_indexes.tolist()):
+            rule = plans[position].rule_for(cpt_code, 0 if in_network else 1)
+            assert (rule_table.copay_before_deductible[rule_index], rule_table.deductible_applies[rule_index],
+                    rule_table.coinsurance[rule_index]) == (rule.copay_before_deductible, bool(rule.deductible_applies),
+                                                            rule.coinsurance), (position, cpt_code, in_network)
+
+    def test_family_index_needs_family_limits(self):
+        rule_table = RuleTable([CompiledPlan(MOCK_POLICY_DB["PPO_GOLD"])])
+        with pytest.raises(ValueError):
+            adjudicate_lines_vectorized([100.0], [True], [0], [0], rule_table, [500.0], [3000.0], [0.0], [0.0],
+                                        family_index=[0])
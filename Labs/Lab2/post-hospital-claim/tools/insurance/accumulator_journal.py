@@ -0,0 +1,245 @@
+"""
+Write-ahead journal of accumulator deltas.
+
+Adjudication appends a claim's deltas (keyed by claim id, member and benefit year) to the journal and waits until
+they are on disk before it updates the accumulator store. If the process dies in between, or the update fails,
+replay() applies the journaled deltas later. The store records which claim ids it has applied, so replaying a
+delta that already made it is a no-op, however often replay runs.
+
+Appends use group commit: concurrent callers share one write + fsync, so high claim rates do not pay an fsync per
+claim. compact() folds the journal into the accumulator snapshot and starts a new, empty journal.
+
+A claim is journaled and written to the store inside hold(), together with its compare-and-swap retries (which journal
+it again). Compaction waits for the claims of the rotated journal that are still held before it replays them: a held
+claim's write may still be on its way, and replaying a record whose compare-and-swap then loses would apply stale
+deltas. A claim journaled again since the rotation is left to the next compaction (its newer record supersedes the
+rotated one). A claim whose compare-and-swap retries all lose is voided before its hold ends: its last record's
+deltas were computed from stale accumulators, so void() journals a record that replay ends the claim on instead.
+
+    journal = AccumulatorJournal("/var/lib/pbaa/accumulators.journal", snapshot_path="/var/lib/pbaa/accumulators.snapshot")
+    journal.recover(store)                  # on startup: load the snapshot, replay the journal
+    with journal.hold(["CLM1"]):
+        journal.append("CLM1", "MEMBER123", 2023, {"deductible_met_individual": 50.0, "oop_max_met_individual": 50.0})
+        ...                                 # update the store (with claim id CLM1)
+    journal.compact(store)                  # periodically
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from accumulator_store import AccumulatorStore
+
+logger = logging.getLogger(__name__)
+
+# How long the first caller of a group commit waits for others to join before it writes and fsyncs the batch
+GROUP_COMMIT_WINDOW_SECONDS = 0.002
+
+
+class AccumulatorJournal:
+    """
+    Append-only JSONL file of {"claim_id", "member_id", "benefit_year", "deltas"} records.
+
+    A claim can be journaled more than once for the same member/year (it is re-adjudicated when its compare-and-swap
+    loses); the last record wins on replay, earlier ones were never applied. A record with "deltas": null (see void)
+    means the claim was never applied and must not be.
+
+    :param path: journal file; created if missing
+    :param snapshot_path: where compact() writes the store snapshot and recover() loads it from; only needed for a
+                          process-local store (a SQLite store is its own snapshot)
+    :param group_commit_window: seconds the batch leader waits for more appends before the fsync
+    :param fsync: False skips the fsync (tests and benchmarks only: appends are then not durable)
+    """
+    def __init__(self, path: str, snapshot_path: str | None = None,
+                 group_commit_window: float = GROUP_COMMIT_WINDOW_SECONDS, fsync: bool = True):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.group_commit_window = group_commit_window
+        self.fsync = fsync
+        self._file = open(path, "a", encoding="utf-8")
+        self._commit = threading.Condition()
+        self._pending = [] # Encoded records not yet written
+        self._appended = 0 # Sequence number of the last record handed to append
+        self._durable = 0 # Sequence number of the last record on disk
+        self._flushing = False
+        self._compact_lock = threading.Lock()
+        self._holds = threading.Condition()
+        self._held = Counter() # claim id -> holds (see hold)
+        self._journaled_since_rotation = set() # Claim ids appended to the current journal file
+
+    def append(self, claim_id: str, member_id: str, benefit_year: int, deltas: dict):
+        """Journals one claim's deltas; returns once they are durable."""
+        self.append_many([(claim_id, member_id, benefit_year, deltas)])
+
+    def append_many(self, records: list[tuple[str, str, int, dict]]):
+        """Journals (claim_id, member_id, benefit_year, deltas) records in one group commit."""
+        if not records:
+            return
+        lines = [
+            json.dumps({"claim_id": claim_id, "member_id": member_id, "benefit_year": benefit_year, "deltas": deltas}) + "\n"
+            for claim_id, member_id, benefit_year, deltas in records
+        ]
+        with self._commit:
+            self._pending.extend(lines)
+            self._appended += len(lines)
+            self._journaled_since_rotation.update(claim_id for claim_id, _, _, _ in records)
+            target = self._appended
+            while self._durable < target:
+                if self._flushing:
+                    # Another caller is writing a batch; ours goes in the next one
+                    self._commit.wait()
+                    continue
+                self._flushing = True
+                self._commit.release()
+                try:
+                    self._write_batch()
+                finally:
+                    self._commit.acquire()
+                    self._flushing = False
+                    self._commit.notify_all()
+
+    def void(self, records: list[tuple[str, str, int]]):
+        """
+        Journals that the (claim_id, member_id, benefit_year) updates were given up without being applied (e.g. every
+        compare-and-swap attempt lost), so replay skips their earlier records. Call it while still holding the claims.
+        """
+        self.append_many([(claim_id, member_id, benefit_year, None) for claim_id, member_id, benefit_year in records])
+
+    def _write_batch(self):
+        # Called by the batch leader without the condition held, so followers can keep queueing records
+        if self.group_commit_window > 0:
+            time.sleep(self.group_commit_window)
+        with self._commit:
+            batch, self._pending = self._pending, []
+            batch_end = self._appended
+        self._file.write("".join(batch))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        with self._commit:
+            self._durable = batch_end
+
+    @contextlib.contextmanager
+    def hold(self, claim_ids: list[str]):
+        """
+        Marks the claims' accumulator updates as in progress for the block. Journal a claim's deltas inside the hold
+        and keep holding until its store write, and any re-adjudication after a lost compare-and-swap, is done.
+        """
+        claim_ids = list(claim_ids)
+        with self._holds:
+            self._held.update(claim_ids)
+        try:
+            yield
+        finally:
+            with self._holds:
+                self._held.subtract(claim_ids)
+                for claim_id in claim_ids:
+                    if self._held[claim_id] <= 0:
+                        del self._held[claim_id]
+                self._holds.notify_all()
+
+    def close(self):
+        with self._commit:
+            self._file.close()
+
+    def records(self):
+        """Yields the journaled records, oldest first, from a rotated journal left by an interrupted compaction too."""
+        for path in (f"{self.path}.compacting", self.path):
+            yield from _read_records(path)
+
+    def replay(self, store: AccumulatorStore) -> int:
+        """Applies every journaled claim delta that the store does not have yet. :returns: deltas applied"""
+        return _replay(self.records(), store)
+
+    def recover(self, store: AccumulatorStore) -> int:
+        """Startup recovery: loads the snapshot into the store (if there is one), then replays the journal."""
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            store.load_snapshot(self.snapshot_path)
+        applied = self.replay(store)
+        logger.info("[AccumulatorJournal] Recovered accumulators; %s journaled delta(s) replayed", applied)
+        return applied
+
+    def compact(self, store: AccumulatorStore) -> int:
+        """
+        Folds the journal into the accumulator snapshot: the current journal is rotated out (new appends go to a
+        fresh file), its deltas are applied to the store once the claims still held (see hold) are done, the
+        snapshot is written, and the rotated file is deleted. A crash at any step leaves a state that recover()
+        still restores correctly.
+        :returns: deltas applied
+        """
+        rotated_path = f"{self.path}.compacting"
+        with self._compact_lock:
+            with self._commit:
+                # Wait out an in-flight group commit, then swap files under the condition so no append is split
+                while self._flushing or self._pending:
+                    self._commit.wait()
+                if not os.path.exists(rotated_path):
+                    self._file.close()
+                    os.replace(self.path, rotated_path)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                    self._journaled_since_rotation = set()
+                    _fsync_directory(self.path)
+
+            records = list(_read_records(rotated_path))
+            claim_ids = {record["claim_id"] for record in records}
+            with self._holds:
+                self._holds.wait_for(lambda: self._held.keys().isdisjoint(claim_ids))
+            with self._commit:
+                # Journaled again since the rotation: the newer record is replayed (and forgotten) next time
+                superseded = claim_ids & self._journaled_since_rotation
+            records = [record for record in records if record["claim_id"] not in superseded]
+            applied = _replay(records, store)
+            if self.snapshot_path:
+                store.write_snapshot(self.snapshot_path)
+            os.remove(rotated_path)
+            _fsync_directory(self.path)
+            # Nothing left on disk can replay these claims, so the store can drop their markers
+            store.forget_claims(list(dict.fromkeys(
+                (record["member_id"], record["benefit_year"], record["claim_id"]) for record in records
+            )))
+        logger.info("[AccumulatorJournal] Compacted %s journal record(s); %s delta(s) applied", len(records), applied)
+        return applied
+
+
+def _read_records(path: str):
+    try:
+        f = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last record from a crash mid-write was never acknowledged to its caller
+                logger.warning("[AccumulatorJournal] Skipping unreadable journal record in %s", path)
+
+
+def _replay(records, store: AccumulatorStore) -> int:
+    latest = {}
+    for record in records:
+        latest[(record["member_id"], record["benefit_year"], record["claim_id"])] = record["deltas"]
+    applied = 0
+    for (member_id, benefit_year, claim_id), deltas in latest.items():
+        if deltas is None or store.applied_claims(member_id, benefit_year, [claim_id]):
+            continue # Voided, or already in the store
+        store.apply_deltas(member_id, benefit_year, [deltas], claim_ids=[claim_id])
+        applied += 1
+    return applied
+
+
+def _fsync_directory(path: str):
+    # Makes a rename/unlink in the journal's directory durable (not supported on every platform)
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
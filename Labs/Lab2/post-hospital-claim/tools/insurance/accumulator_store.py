@@ -0,0 +1,332 @@
+import json
+import os
+import sqlite3
+import threading
+
+# Accumulator record for a member/benefit year that has not been written yet
+DEFAULT_ACCUMULATORS = {"deductible_met_individual": 0.0, "oop_max_met_individual": 0.0}
+
+
+class AccumulatorStore:
+    """
+    Versioned accumulator records keyed by (member_id, benefit_year).
+    Every successful write bumps the record's version; a record that was never written has version 0.
+    Writers read (values, version), compute, then compare_and_swap() so concurrent updates are never lost.
+    A write can record the claim ids it applied; a later write carrying an already applied claim id skips that
+    claim's delta, which makes replaying the accumulator journal idempotent.
+    """
+    def get(self, member_id: str, benefit_year: int) -> tuple[dict, int]:
+        raise NotImplementedError
+
+    def compare_and_swap(self, member_id: str, benefit_year: int, expected_version: int, new_values: dict,
+                         claim_ids: list[str] = ()) -> bool:
+        raise NotImplementedError
+
+    def applied_claims(self, member_id: str, benefit_year: int, claim_ids: list[str]) -> set[str]:
+        """The subset of claim_ids whose deltas are already in the record."""
+        raise NotImplementedError
+
+    def forget_claims(self, claims: list[tuple[str, int, str]]):
+        """Drops the applied-claim markers for (member_id, benefit_year, claim_id) once no replay can carry them."""
+        raise NotImplementedError
+
+    def get_many(self, member_years: list[tuple[str, int]]) -> dict[tuple[str, int], tuple[dict, int]]:
+        return {member_year: self.get(*member_year) for member_year in dict.fromkeys(member_years)}
+
+    def apply_deltas_many(self, writes: list[tuple[str, int, list[dict], list[str | None] | None]],
+                          expected_versions: dict[tuple[str, int], int] | None = None) -> bool:
+        """
+        Applies (member_id, benefit_year, deltas, claim_ids) writes to several records as one all-or-nothing write,
+        provided every record in expected_versions (which may include records that are only read, e.g. the rest of
+        a family) is still at that version. Deltas of already applied claims are skipped as in apply_deltas.
+        :returns: True if applied (or nothing was left to apply), False if a version check failed
+        """
+        raise NotImplementedError
+
+    def apply_deltas(self, member_id: str, benefit_year: int, deltas: list[dict], expected_version: int | None = None,
+                     max_attempts: int = 20, claim_ids: list[str | None] | None = None) -> tuple[bool, dict, int]:
+        """
+        Adds each delta ({field: amount}) in order and writes the result atomically.
+        With expected_version the write only happens if nobody else wrote in between (single attempt);
+        without it the read-add-CAS loop retries until it wins.
+        claim_ids (parallel to deltas, None for anonymous deltas) are recorded with the write; deltas of claims
+        that were already applied are skipped, and if nothing is left the call succeeds without writing.
+        :returns: (applied, values, version) - the new record, or the current one if the CAS lost
+        """
+        for _ in range(1 if expected_version is not None else max_attempts):
+            values, version = self.get(member_id, benefit_year)
+            pending_deltas, pending_ids = self._unapplied(member_id, benefit_year, deltas, claim_ids)
+            if not pending_deltas:
+                return True, values, version
+            if expected_version is not None and version != expected_version:
+                return False, values, version
+            new_values = _add_deltas(values, pending_deltas)
+            if self.compare_and_swap(member_id, benefit_year, version, new_values, pending_ids):
+                return True, new_values, version + 1
+        values, version = self.get(member_id, benefit_year)
+        return False, values, version
+
+    def _unapplied(self, member_id: str, benefit_year: int, deltas: list[dict],
+                   claim_ids: list[str | None] | None) -> tuple[list[dict], list[str]]:
+        if not claim_ids:
+            return deltas, []
+        applied = self.applied_claims(member_id, benefit_year, [claim_id for claim_id in claim_ids if claim_id])
+        pending = [(delta, claim_id) for delta, claim_id in zip(deltas, claim_ids) if claim_id not in applied]
+        return [delta for delta, _ in pending], [claim_id for _, claim_id in pending if claim_id]
+
+
+def _add_deltas(values: dict, deltas: list[dict]) -> dict:
+    new_values = values.copy()
+    for delta in deltas:
+        for field, amount in delta.items():
+            new_values[field] = new_values.get(field, 0.0) + amount
+    return new_values
+
+
+class InMemoryAccumulatorStore(AccumulatorStore):
+    """
+    Process-local store over a dict keyed "<member_id>_<benefit_year>" (the MOCK_ACCUMULATORS_DB layout).
+    Keys are spread over a fixed set of striped locks so different members never serialize on one global lock.
+    """
+    def __init__(self, data: dict | None = None, lock_stripes: int = 64):
+        self.data = data if data is not None else {}
+        self._versions = {}
+        self._applied = {} # key -> claim ids whose deltas are in the record
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    def get(self, member_id: str, benefit_year: int) -> tuple[dict, int]:
+        key = f"{member_id}_{benefit_year}"
+        with self._lock_for(key):
+            values = self.data.get(key)
+            if not values:
+                return DEFAULT_ACCUMULATORS.copy(), self._versions.get(key, 0)
+            return values.copy(), self._versions.get(key, 0)
+
+    def compare_and_swap(self, member_id: str, benefit_year: int, expected_version: int, new_values: dict,
+                         claim_ids: list[str] = ()) -> bool:
+        key = f"{member_id}_{benefit_year}"
+        with self._lock_for(key):
+            if self._versions.get(key, 0) != expected_version:
+                return False
+            self.data[key] = new_values.copy()
+            self._versions[key] = expected_version + 1
+            if claim_ids:
+                self._applied.setdefault(key, set()).update(claim_ids)
+            return True
+
+    def applied_claims(self, member_id: str, benefit_year: int, claim_ids: list[str]) -> set[str]:
+        key = f"{member_id}_{benefit_year}"
+        with self._lock_for(key):
+            return self._applied.get(key, set()).intersection(claim_ids)
+
+    def forget_claims(self, claims: list[tuple[str, int, str]]):
+        for member_id, benefit_year, claim_id in claims:
+            key = f"{member_id}_{benefit_year}"
+            with self._lock_for(key):
+                applied = self._applied.get(key)
+                if applied is not None:
+                    applied.discard(claim_id)
+                    if not applied:
+                        del self._applied[key]
+
+    def apply_deltas(self, member_id: str, benefit_year: int, deltas: list[dict], expected_version: int | None = None,
+                     max_attempts: int = 20, claim_ids: list[str | None] | None = None) -> tuple[bool, dict, int]:
+        # The stripe lock makes read-add-write atomic here, so no CAS retry loop is needed
+        key = f"{member_id}_{benefit_year}"
+        with self._lock_for(key):
+            version = self._versions.get(key, 0)
+            values = self.data.get(key) or DEFAULT_ACCUMULATORS
+            applied = self._applied.get(key, ())
+            pending = [(delta, claim_id) for delta, claim_id in zip(deltas, claim_ids or [None] * len(deltas)) if claim_id not in applied]
+            if not pending:
+                return True, values.copy(), version
+            if expected_version is not None and version != expected_version:
+                return False, values.copy(), version
+            new_values = _add_deltas(values, [delta for delta, _ in pending])
+            self.data[key] = new_values
+            self._versions[key] = version + 1
+            new_claim_ids = [claim_id for _, claim_id in pending if claim_id]
+            if new_claim_ids:
+                self._applied.setdefault(key, set()).update(new_claim_ids)
+            return True, new_values.copy(), version + 1
+
+    def apply_deltas_many(self, writes: list[tuple[str, int, list[dict], list[str | None] | None]],
+                          expected_versions: dict[tuple[str, int], int] | None = None) -> bool:
+        expected_versions = expected_versions or {}
+        keys = [f"{member_id}_{benefit_year}" for member_id, benefit_year, _, _ in writes]
+        keys += [f"{member_id}_{benefit_year}" for member_id, benefit_year in expected_versions]
+        # Stripes are always taken in index order, so concurrent multi-record writes cannot deadlock
+        locks = [self._locks[i] for i in sorted({hash(key) % len(self._locks) for key in keys})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            pending = []
+            for member_id, benefit_year, deltas, claim_ids in writes:
+                key = f"{member_id}_{benefit_year}"
+                applied = self._applied.get(key, ())
+                record_pending = [(delta, claim_id) for delta, claim_id in zip(deltas, claim_ids or [None] * len(deltas)) if claim_id not in applied]
+                if record_pending:
+                    pending.append((key, record_pending))
+            if not pending:
+                return True
+            for (member_id, benefit_year), version in expected_versions.items():
+                if self._versions.get(f"{member_id}_{benefit_year}", 0) != version:
+                    return False
+            for key, record_pending in pending:
+                self.data[key] = _add_deltas(self.data.get(key) or DEFAULT_ACCUMULATORS, [delta for delta, _ in record_pending])
+                self._versions[key] = self._versions.get(key, 0) + 1
+                new_claim_ids = [claim_id for _, claim_id in record_pending if claim_id]
+                if new_claim_ids:
+                    self._applied.setdefault(key, set()).update(new_claim_ids)
+            return True
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def write_snapshot(self, path: str):
+        """Writes values, versions and applied claim ids to path atomically (temp file, fsync, rename)."""
+        # Holding every stripe makes the snapshot a consistent cut across members
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            snapshot = {
+                "accumulators": {key: values.copy() for key, values in self.data.items()},
+                "versions": dict(self._versions),
+                "applied_claims": {key: sorted(claim_ids) for key, claim_ids in self._applied.items()},
+            }
+        finally:
+            for lock in self._locks:
+                lock.release()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load_snapshot(self, path: str):
+        """Replaces the store contents with a snapshot written by write_snapshot (data dict is updated in place)."""
+        with open(path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        self.data.clear()
+        self.data.update(snapshot["accumulators"])
+        self._versions = dict(snapshot["versions"])
+        self._applied = {key: set(claim_ids) for key, claim_ids in snapshot["applied_claims"].items() if claim_ids}
+
+
+class SQLiteAccumulatorStore(AccumulatorStore):
+    """
+    Local SQLite-backed store that several worker processes can share.
+    Each thread gets its own connection; CAS is a conditional UPDATE on the version column.
+    """
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS accumulators ("
+            " member_id TEXT NOT NULL, benefit_year INTEGER NOT NULL, accumulator_values TEXT NOT NULL,"
+            " version INTEGER NOT NULL, PRIMARY KEY (member_id, benefit_year))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS applied_claims ("
+            " member_id TEXT NOT NULL, benefit_year INTEGER NOT NULL, claim_id TEXT NOT NULL,"
+            " PRIMARY KEY (member_id, benefit_year, claim_id))"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=self.timeout)
+        return conn
+
+    def get(self, member_id: str, benefit_year: int) -> tuple[dict, int]:
+        row = self._conn().execute(
+            "SELECT accumulator_values, version FROM accumulators WHERE member_id = ? AND benefit_year = ?",
+            (member_id, benefit_year),
+        ).fetchone()
+        if row is None:
+            return DEFAULT_ACCUMULATORS.copy(), 0
+        return json.loads(row[0]), row[1]
+
+    def compare_and_swap(self, member_id: str, benefit_year: int, expected_version: int, new_values: dict,
+                         claim_ids: list[str] = ()) -> bool:
+        conn = self._conn()
+        with conn:
+            if expected_version == 0:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO accumulators (member_id, benefit_year, accumulator_values, version) VALUES (?, ?, ?, 1)",
+                    (member_id, benefit_year, json.dumps(new_values)),
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE accumulators SET accumulator_values = ?, version = version + 1"
+                    " WHERE member_id = ? AND benefit_year = ? AND version = ?",
+                    (json.dumps(new_values), member_id, benefit_year, expected_version),
+                )
+            if cursor.rowcount != 1:
+                return False
+            # Same transaction as the update, so a claim is marked applied exactly when its delta is in
+            conn.executemany(
+                "INSERT OR IGNORE INTO applied_claims (member_id, benefit_year, claim_id) VALUES (?, ?, ?)",
+                [(member_id, benefit_year, claim_id) for claim_id in claim_ids],
+            )
+            return True
+
+    def apply_deltas_many(self, writes: list[tuple[str, int, list[dict], list[str | None] | None]],
+                          expected_versions: dict[tuple[str, int], int] | None = None) -> bool:
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock up front, so the version checks and the writes are one transaction
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            pending = []
+            for member_id, benefit_year, deltas, claim_ids in writes:
+                claim_ids = claim_ids or [None] * len(deltas)
+                applied = self.applied_claims(member_id, benefit_year, [claim_id for claim_id in claim_ids if claim_id])
+                record_pending = [(delta, claim_id) for delta, claim_id in zip(deltas, claim_ids) if claim_id not in applied]
+                if record_pending:
+                    pending.append((member_id, benefit_year, record_pending))
+            if not pending or any(self.get(*member_year)[1] != version for member_year, version in (expected_versions or {}).items()):
+                conn.rollback()
+                return not pending
+            for member_id, benefit_year, record_pending in pending:
+                values, version = self.get(member_id, benefit_year)
+                new_values = json.dumps(_add_deltas(values, [delta for delta, _ in record_pending]))
+                conn.execute(
+                    "INSERT INTO accumulators (member_id, benefit_year, accumulator_values, version) VALUES (?, ?, ?, 1)"
+                    " ON CONFLICT (member_id, benefit_year) DO UPDATE SET accumulator_values = excluded.accumulator_values,"
+                    " version = accumulators.version + 1",
+                    (member_id, benefit_year, new_values),
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO applied_claims (member_id, benefit_year, claim_id) VALUES (?, ?, ?)",
+                    [(member_id, benefit_year, claim_id) for _, claim_id in record_pending if claim_id],
+                )
+            conn.commit()
+            return True
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def applied_claims(self, member_id: str, benefit_year: int, claim_ids: list[str]) -> set[str]:
+        if not claim_ids:
+            return set()
+        rows = self._conn().execute(
+            "SELECT claim_id FROM applied_claims WHERE member_id = ? AND benefit_year = ?"
+            f" AND claim_id IN ({', '.join('?' * len(claim_ids))})",
+            (member_id, benefit_year, *claim_ids),
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def forget_claims(self, claims: list[tuple[str, int, str]]):
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "DELETE FROM applied_claims WHERE member_id = ? AND benefit_year = ? AND claim_id = ?", claims
+            )
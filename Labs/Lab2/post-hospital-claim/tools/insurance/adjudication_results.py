@@ -0,0 +1,241 @@
+"""
+Line-level adjudication results, stored as columns for analytics.
+
+Every adjudicated service line becomes one row (claim, member, plan, CPT, status, date/month of service and the
+amounts). Rows are buffered in memory and written as immutable column segments - one .npz file of NumPy arrays per
+flush - into one directory per benefit year:
+
+    <root>/benefit_year=2023/part-<time>-<pid>-<n>.npz
+
+Low-cardinality strings (plan, CPT, line status) are dictionary-encoded, so aggregates such as the insurer payment
+by plan and month are a bincount over integer codes per segment instead of a pass over Python objects. Segment files
+are written under a temporary name and renamed into place, so scans never see a partial segment and several
+processes can append to the same root. compact() merges a benefit year's segments into one;
+export_parquet() writes the store as Parquet (requires pyarrow) for other analytics tools.
+
+    store = AdjudicationResultStore("/var/lib/pbaa/results")
+    store.append_claim(adjudicated_claim, line_benefit_years)
+    store.insurer_payment_by_plan_month(benefit_years=[2023])  # -> {"PPO_GOLD": {"2023-10": 1234.5, ...}, ...}
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Buffered rows that trigger a flush into a new segment
+FLUSH_ROWS = 10_000
+PARTITION_PREFIX = "benefit_year="
+SEGMENT_SUFFIX = ".npz"
+
+STRING_COLUMNS = ("claim_id", "member_id", "date_of_service")
+DICTIONARY_COLUMNS = ("plan_id", "cpt_code", "line_status") # Stored as int32 codes plus a "<name>_values" array
+AMOUNT_COLUMNS = ("charge_amount", "allowed_amount", "copay_applied", "deductible_applied", "coinsurance_member_owes",
+                  "member_responsibility", "insurer_payment")
+COLUMNS = STRING_COLUMNS + DICTIONARY_COLUMNS + ("service_month",) + AMOUNT_COLUMNS
+# Months are 1-12; 0 when the date of service could not be read
+_MONTH_SLOTS = 13
+
+
+def _service_month(date_of_service) -> int:
+    try:
+        month = int(date_of_service[5:7])
+    except (TypeError, ValueError):
+        return 0
+    return month if 1 <= month <= 12 else 0
+
+
+def _encode_strings(values) -> np.ndarray:
+    return np.array([value.encode() for value in values], dtype=bytes) if values else np.array([], dtype="S1")
+
+
+class AdjudicationResultStore:
+    """
+    Append-only columnar store of adjudicated lines, partitioned by benefit year. Safe to share between threads;
+    several processes may append to the same root, but compact() must only run in one of them at a time.
+
+    :param root: directory of the store; created if missing
+    :param flush_rows: buffered rows that trigger writing a segment (flush() writes the rest)
+    """
+    def __init__(self, root: str, flush_rows: int = FLUSH_ROWS):
+        self.root = root
+        self.flush_rows = flush_rows
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._buffers: dict[int, list[tuple]] = {} # benefit_year -> rows in COLUMNS order
+        self._buffered = 0
+        self._segment_numbers = itertools.count()
+
+    def append_claim(self, claim: dict, benefit_years: list[int]):
+        """
+        Records the lines of an adjudicated claim; benefit_years has the benefit year of each line (in order).
+        The rows reach disk with the next flush.
+        """
+        claim_id = str(claim.get("claim_id") or "")
+        member_id = str(claim.get("member_id") or "")
+        plan_id = str((claim.get("member_eligibility") or {}).get("plan_id") or "")
+        rows = [
+            (benefit_year, (
+                claim_id, member_id, str(line.get("date_of_service") or ""),
+                plan_id, str(line.get("cpt_code") or ""), str(line.get("line_status") or ""),
+                _service_month(line.get("date_of_service")),
+                *(float(line.get(name) or 0.0) for name in AMOUNT_COLUMNS),
+            ))
+            for line, benefit_year in zip(claim.get("services", []), benefit_years)
+        ]
+        with self._lock:
+            for benefit_year, row in rows:
+                self._buffers.setdefault(benefit_year, []).append(row)
+            self._buffered += len(rows)
+            if self._buffered >= self.flush_rows:
+                self._flush_locked()
+
+    def flush(self) -> int:
+        """Writes the buffered rows as new segments. :returns: number of rows written"""
+        with self._lock:
+            return self._flush_locked()
+
+    def close(self):
+        self.flush()
+
+    def _flush_locked(self) -> int:
+        written = 0
+        for benefit_year, rows in self._buffers.items():
+            self._write_segment(benefit_year, dict(zip(COLUMNS, (list(column) for column in zip(*rows)))))
+            written += len(rows)
+        self._buffers = {}
+        self._buffered = 0
+        return written
+
+    def _write_segment(self, benefit_year: int, columns: dict[str, list]):
+        arrays = {name: _encode_strings(columns[name]) for name in STRING_COLUMNS}
+        for name in DICTIONARY_COLUMNS:
+            values, codes = np.unique(_encode_strings(columns[name]), return_inverse=True)
+            arrays[name] = codes.astype(np.int32)
+            arrays[f"{name}_values"] = values
+        arrays["service_month"] = np.array(columns["service_month"], dtype=np.int8)
+        for name in AMOUNT_COLUMNS:
+            arrays[name] = np.array(columns[name], dtype=np.float64)
+
+        partition = os.path.join(self.root, f"{PARTITION_PREFIX}{benefit_year}")
+        os.makedirs(partition, exist_ok=True)
+        path = os.path.join(partition, f"part-{time.time_ns()}-{os.getpid()}-{next(self._segment_numbers)}{SEGMENT_SUFFIX}")
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(f"{path}.tmp", path)
+        logger.debug("[ResultStore] Wrote %s line(s) for benefit year %s to %s", len(arrays["claim_id"]), benefit_year, path)
+        return path
+
+    def benefit_years(self) -> list[int]:
+        """Benefit years that have written segments."""
+        return sorted(
+            int(name[len(PARTITION_PREFIX):]) for name in os.listdir(self.root)
+            if name.startswith(PARTITION_PREFIX) and name[len(PARTITION_PREFIX):].isdigit()
+        )
+
+    def _segment_paths(self, benefit_years=None) -> list[tuple[int, str]]:
+        paths = []
+        for benefit_year in self.benefit_years() if benefit_years is None else benefit_years:
+            partition = os.path.join(self.root, f"{PARTITION_PREFIX}{benefit_year}")
+            if os.path.isdir(partition):
+                paths.extend((benefit_year, os.path.join(partition, name)) for name in sorted(os.listdir(partition))
+                             if name.endswith(SEGMENT_SUFFIX))
+        return paths
+
+    def scan(self, columns=COLUMNS, benefit_years=None):
+        """
+        Yields (benefit_year, {column: array}) per segment, after flushing the buffered rows. Dictionary columns are
+        decoded to byte strings; only the requested columns are read.
+        """
+        self.flush()
+        for benefit_year, path in self._segment_paths(benefit_years):
+            with np.load(path) as segment:
+                yield benefit_year, {
+                    name: segment[f"{name}_values"][segment[name]] if name in DICTIONARY_COLUMNS else segment[name]
+                    for name in columns
+                }
+
+    def sum_by_plan_month(self, column: str = "insurer_payment", benefit_years=None) -> dict[str, dict[str, float]]:
+        """
+        Total of an amount column by plan and month of service: {plan_id: {"YYYY-MM": total}}, for months with
+        at least one line. Only the plan, month and amount columns are read.
+        """
+        if column not in AMOUNT_COLUMNS:
+            raise ValueError(f"Unknown amount column '{column}', expected one of {AMOUNT_COLUMNS}.")
+        self.flush()
+        totals: dict[str, dict[str, float]] = {}
+        for benefit_year, path in self._segment_paths(benefit_years):
+            with np.load(path) as segment:
+                plan_ids, codes, months, amounts = segment["plan_id_values"], segment["plan_id"], segment["service_month"], segment[column]
+            slots = codes.astype(np.intp) * _MONTH_SLOTS + months
+            size = len(plan_ids) * _MONTH_SLOTS
+            sums = np.bincount(slots, weights=amounts, minlength=size)
+            for slot in np.flatnonzero(np.bincount(slots, minlength=size)).tolist():
+                plan_totals = totals.setdefault(plan_ids[slot // _MONTH_SLOTS].decode(), {})
+                month = f"{benefit_year}-{slot % _MONTH_SLOTS:02d}"
+                plan_totals[month] = plan_totals.get(month, 0.0) + float(sums[slot])
+        return {
+            plan_id: {month: round(total, 2) for month, total in sorted(months.items())} for plan_id, months in sorted(totals.items())
+        }
+
+    def insurer_payment_by_plan_month(self, benefit_years=None) -> dict[str, dict[str, float]]:
+        return self.sum_by_plan_month("insurer_payment", benefit_years)
+
+    def compact(self, benefit_years=None) -> int:
+        """Merges each benefit year's segments into one segment. :returns: number of segments merged away"""
+        merged = 0
+        with self._lock:
+            self._flush_locked()
+            by_year: dict[int, list[str]] = {}
+            for benefit_year, path in self._segment_paths(benefit_years):
+                by_year.setdefault(benefit_year, []).append(path)
+            for benefit_year, paths in by_year.items():
+                if len(paths) < 2:
+                    continue
+                parts = []
+                for path in paths:
+                    with np.load(path) as segment:
+                        parts.append({
+                            name: segment[f"{name}_values"][segment[name]] if name in DICTIONARY_COLUMNS else segment[name]
+                            for name in COLUMNS
+                        })
+                columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+                self._write_segment(benefit_year, {
+                    name: [value.decode() for value in array.tolist()] if array.dtype.kind == "S" else array.tolist()
+                    for name, array in columns.items()
+                })
+                for path in paths:
+                    os.remove(path)
+                merged += len(paths) - 1
+        logger.info("[ResultStore] Compacted %s segment(s) in %s", merged, self.root)
+        return merged
+
+    def export_parquet(self, dest_dir: str, benefit_years=None) -> list[str]:
+        """
+        Writes one Parquet file per benefit year (dest_dir/benefit_year=YYYY/results.parquet, a Hive-style layout).
+        :returns: the files written
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Exporting adjudication results to Parquet requires pyarrow (pip install pyarrow).") from e
+        by_year: dict[int, list[dict]] = {}
+        for benefit_year, columns in self.scan(COLUMNS, benefit_years):
+            by_year.setdefault(benefit_year, []).append(columns)
+        written = []
+        for benefit_year, parts in sorted(by_year.items()):
+            table = pa.table({
+                name: np.char.decode(array) if array.dtype.kind == "S" else array
+                for name, array in ((name, np.concatenate([part[name] for part in parts])) for name in COLUMNS)
+            })
+            partition = os.path.join(dest_dir, f"{PARTITION_PREFIX}{benefit_year}")
+            os.makedirs(partition, exist_ok=True)
+            path = os.path.join(partition, "results.parquet")
+            pq.write_table(table, path)
+            written.append(path)
+        return written
@@ -0,0 +1,22 @@
+"""
+Logging setup shared by the claim tools.
+
+The tool modules only create named loggers and log with %-style arguments, so nothing is formatted unless a
+handler will actually emit the record; claim payloads are logged at DEBUG. Handlers and levels belong to the host
+process (Orchestrate runtime, a script, a test). For standalone runs set CLAIM_TOOLS_LOG_LEVEL (e.g. INFO) to get
+the tools' former console output, or call configure_logging() yourself.
+"""
+import logging
+import os
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def configure_logging(level: int | str = logging.INFO):
+    """Console logging for standalone use; a no-op for handlers if the host already configured the root logger."""
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    logging.getLogger().setLevel(level)
+
+
+if os.environ.get("CLAIM_TOOLS_LOG_LEVEL"):
+    configure_logging(os.environ["CLAIM_TOOLS_LOG_LEVEL"].upper())
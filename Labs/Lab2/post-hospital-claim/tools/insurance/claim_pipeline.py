@@ -0,0 +1,216 @@
+"""
+End-to-end claim processing in one process: validation -> eligibility and provider network -> adjudication.
+
+The claim is parsed once and the same dict is passed from stage to stage. I/O that does not depend on an earlier
+stage starts early: while eligibility is checked, the member's accumulators and the per-line pre-auth/guideline
+checks are already in flight, and the policy is fetched while the provider network statuses are resolved.
+process_claim handles one claim, process_claims_batch many (one bulk call per lookup type).
+"""
+import json
+import logging
+
+from ibm_watsonx_orchestrate.agent_builder.tools import tool
+
+from claim_metrics import span
+from claim_validation_tools import _validate_claim_fields, check_eligibility_bulk, check_network_status_bulk
+from policy_adjudication_tools import (
+    ClaimPrefetch,
+    CorePolicySystemAPIClient,
+    _adjudicate_claim,
+    _line_check_executor,
+    adjudicate_claims_batch,
+    get_benefit_year,
+    tool_output_mode_error,
+)
+
+logger = logging.getLogger(__name__)
+
+VALIDATION_SUCCESSFUL = "Validation successful."
+
+
+def _parse_claim(claim: dict | str) -> tuple[dict | None, str | None]:
+    if not isinstance(claim, str):
+        return claim, None
+    try:
+        with span("json_parse"):
+            return json.loads(claim), None
+    except json.JSONDecodeError as e:
+        logger.error("Error decoding JSON: %s", e)
+        return None, f"Invalid claim JSON: {e}"
+
+
+def _intake_copy(claim: dict) -> dict:
+    # Intake annotates the claim (eligibility, network status); leave the caller's dict untouched
+    intake = claim.copy()
+    intake["services"] = [line.copy() for line in claim.get("services", [])]
+    return intake
+
+
+def _eligibility_key(claim: dict) -> tuple[str, str]:
+    return claim["member_id"], claim["services"][0]["date_of_service"]
+
+
+def _apply_eligibility(claim: dict, eligibility_result: tuple[bool, dict | None, str | None]) -> tuple[bool, list[str]]:
+    """Records the eligibility data on the claim. :returns: (continue_processing, errors)"""
+    member_id, date_of_service = _eligibility_key(claim)
+    eligibility_ok, eligibility_data, eligibility_err = eligibility_result
+    if not eligibility_ok:
+        return False, [f"Eligibility API call failed: {eligibility_err}"]
+    if not eligibility_data.get("is_eligible"):
+        return False, [f"Member {member_id} not eligible on {date_of_service}. Reason: {eligibility_data.get('reason', 'Not specified')}"]
+    claim["member_eligibility"] = eligibility_data
+    logger.info("[Pipeline] Member %s is eligible. Plan ID: %s", member_id, eligibility_data.get("plan_id"))
+    return True, []
+
+
+def _network_checks(claim: dict) -> list[tuple[str, str]]:
+    plan_id = claim["member_eligibility"].get("plan_id")
+    return [(line.get("provider_npi"), plan_id) for line in claim["services"] if line.get("provider_npi")]
+
+
+def _apply_network_statuses(claim: dict, network_results: dict) -> list[str]:
+    """Sets network_status on every line. :returns: errors"""
+    errors = []
+    plan_id = claim["member_eligibility"].get("plan_id")
+    if not plan_id:
+        return ["Cannot check provider network status without Plan ID from eligibility."]
+    for line in claim["services"]:
+        npi = line.get("provider_npi")
+        if not npi:
+            errors.append(f"Line with CPT {line.get('cpt_code')} missing Provider NPI for network check.")
+            line["network_status"] = "Missing NPI"
+            continue
+        network_ok, network_data, network_err = network_results[(npi, plan_id)]
+        if not network_ok:
+            errors.append(f"Network check API call failed for NPI {npi}: {network_err}")
+            line["network_status"] = "Error checking status"
+        else:
+            line["network_status"] = network_data.get("network_status") or "Unknown"
+    return errors
+
+
+def process_claim(claim: dict | str, adjudicate: bool = True, output_mode: str = "full") -> tuple[bool, dict | None, list[str]]:
+    """
+    Runs one claim (dict, or JSON string parsed once) through validation, eligibility, network checks and,
+    unless adjudicate is False, adjudication. output_mode shapes the adjudicated claim (see render_adjudication).
+
+    :returns: (success_status, claim_data, messages) - the adjudicated claim, or the validated claim when
+              adjudicate is False or intake failed (with the intake errors as messages)
+    """
+    with span("process_claim"):
+        parsed, parse_err = _parse_claim(claim)
+        if parse_err:
+            return False, None, [parse_err]
+        claim = _intake_copy(parsed)
+
+        errors = _validate_claim_fields(claim)
+        if errors:
+            logger.info("[Pipeline] Basic validation failed: %s", errors)
+            return False, claim, errors
+
+        # Adjudication I/O that only needs member, benefit year and codes runs while eligibility is checked
+        member_id, date_of_service = _eligibility_key(claim)
+        prefetch = ClaimPrefetch(member_id, get_benefit_year(date_of_service), claim["services"]) if adjudicate else None
+        eligibility = check_eligibility_bulk([(member_id, date_of_service)])
+        proceed, errors = _apply_eligibility(claim, eligibility[(member_id, date_of_service)])
+        if not proceed:
+            return False, claim, errors
+
+        if prefetch is not None:
+            prefetch.start_policy(claim["member_eligibility"].get("plan_id"))
+        errors = _apply_network_statuses(claim, check_network_status_bulk(_network_checks(claim)))
+        if errors:
+            logger.info("[Pipeline] Validation completed with errors: %s", errors)
+            return False, claim, errors
+        if not adjudicate:
+            return True, claim, [VALIDATION_SUCCESSFUL]
+
+        adjudicated, adjudicated_data, messages = _adjudicate_claim(claim, prefetch, output_mode)
+        return adjudicated, adjudicated_data, [VALIDATION_SUCCESSFUL] + messages
+
+
+def process_claims_batch(claims: list[dict | str], adjudicate: bool = True,
+                         output_mode: str = "full") -> list[tuple[bool, dict | None, list[str]]]:
+    """
+    process_claim for many claims: every lookup type (eligibility, network status, policies, accumulators,
+    pre-auth, guidelines) is one bulk call for the whole batch. Results are returned in input order.
+    """
+    with span("process_claims_batch"):
+        results = [None] * len(claims)
+        pending = [] # (index, claim) still in the pipeline
+        for index, claim in enumerate(claims):
+            parsed, parse_err = _parse_claim(claim)
+            if parse_err:
+                results[index] = (False, None, [parse_err])
+                continue
+            claim = _intake_copy(parsed)
+            errors = _validate_claim_fields(claim)
+            if errors:
+                results[index] = (False, claim, errors)
+            else:
+                pending.append((index, claim))
+
+        eligibility = check_eligibility_bulk([_eligibility_key(claim) for _, claim in pending]) if pending else {}
+        eligible = []
+        for index, claim in pending:
+            proceed, errors = _apply_eligibility(claim, eligibility[_eligibility_key(claim)])
+            if proceed:
+                eligible.append((index, claim))
+            else:
+                results[index] = (False, claim, errors)
+
+        # Policies only depend on the plans, so they load (into the policy cache) while network statuses resolve
+        policy_future = None
+        if adjudicate and eligible:
+            policy_future = _line_check_executor.submit(
+                CorePolicySystemAPIClient().get_member_policy_details_bulk,
+                [(claim["member_eligibility"].get("plan_id"), get_benefit_year(_eligibility_key(claim)[1])) for _, claim in eligible],
+            )
+        network = check_network_status_bulk([check for _, claim in eligible for check in _network_checks(claim)]) if eligible else {}
+        validated = []
+        for index, claim in eligible:
+            errors = _apply_network_statuses(claim, network)
+            if errors:
+                results[index] = (False, claim, errors)
+            elif not adjudicate:
+                results[index] = (True, claim, [VALIDATION_SUCCESSFUL])
+            else:
+                validated.append((index, claim))
+
+        if policy_future is not None:
+            policy_future.result()
+        if validated:
+            for (index, _), (adjudicated, adjudicated_data, messages) in zip(
+                validated, adjudicate_claims_batch([claim for _, claim in validated], output_mode)
+            ):
+                results[index] = (adjudicated, adjudicated_data, [VALIDATION_SUCCESSFUL] + messages)
+        return results
+
+
+@tool
+def process_claim_submission(claimInfo: str, output_mode: str = "full") -> tuple[bool, dict | None, list[str]]:
+    """
+    Processes a claim submission end to end: validates the claim data, checks member eligibility and provider
+    network status, then adjudicates the claim against the member's policy benefits.
+
+    Parameters:
+    - claimInfo: Dict with following fields:
+        - member_id: Member Id (required field)
+        - patient_name: Patient's name (required field)
+        - services: List of services taken, each with:
+            - 'date_of_service'
+            - 'cpt_code'
+            - 'icd_10_code'
+            - 'provider_npi'
+            - 'charge_amount'
+    - output_mode: "full" (default) returns every service line with its notes; "summary" returns only the claim
+        summary, claim status and eligibility.
+
+    :returns: (overall_success, adjudicated_claim_data, list_of_errors_or_messages)
+    """
+    logger.info("\n[Pipeline] Received new claim submission.")
+    logger.debug("[Pipeline] claimInfo: %s", claimInfo)
+    output_mode_err = tool_output_mode_error(output_mode)
+    if output_mode_err:
+        return False, None, [output_mode_err]
+    return process_claim(claimInfo, output_mode=output_mode)
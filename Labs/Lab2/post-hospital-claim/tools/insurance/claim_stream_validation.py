@@ -0,0 +1,220 @@
+"""
+Streaming validation of claim batch files.
+
+validate_claim_stream() reads JSONL (one claim per line) or a JSON array of claims incrementally from a path or
+file object and yields one (claim_id, is_valid, errors) record per claim, in file order, as it goes. Only the
+current read buffer and a bounded window of in-flight claims are held in memory, so file size does not matter.
+Parsing and the validation rules (the same ones validate_claim_data applies) run in a pool of worker processes.
+"""
+import io
+import itertools
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from claim_validation_tools import _validate_claim_fields
+
+READ_CHUNK_SIZE = 1 << 16
+RECORDS_PER_TASK = 256 # Claims per worker task; amortizes inter-process overhead
+MAX_RECORD_SIZE = 16 << 20 # A JSON array element larger than this is treated as malformed
+# Characters the JSON array scanner stops at, outside and inside strings
+_STRUCTURAL = re.compile(r'[][{}",]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+_DECODER = json.JSONDecoder()
+
+
+def _open_text(source) -> tuple[io.TextIOBase, bool]:
+    """Returns (text stream, should_close) for a path, a text stream or a binary stream."""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "r", encoding="utf-8"), True
+    if isinstance(source, io.TextIOBase):
+        return source, False
+    return io.TextIOWrapper(source, encoding="utf-8"), False
+
+
+def iter_jsonl_records(stream: io.TextIOBase, first_chunk: str = ""):
+    """Yields (record_number, raw_line) for every non-blank line. Lines are not parsed here."""
+    # Put back the chunk already read for format detection, completing its last (partial) line
+    lines = itertools.chain(io.StringIO(first_chunk + stream.readline()), stream) if first_chunk else stream
+    record_number = 0
+    for line in lines:
+        if line.strip():
+            record_number += 1
+            yield record_number, line
+
+
+def iter_json_array_records(stream: io.TextIOBase, first_chunk: str = ""):
+    """
+    Yields (record_number, claim) for each element of a top-level JSON array, decoding one element at a time.
+    An element is only accepted once the "," or "]" after it has been read, so a number cut off at the end of a
+    chunk is never decoded early. Elements that fit in the current chunk are decoded directly; the one cut off by
+    the chunk end is scanned for its end instead, resuming across chunks where the scan stopped, so no text is
+    parsed twice however large the element. A malformed element ends the stream with a ValueError (the array
+    cannot be resynchronized).
+    """
+    chunk = first_chunk or stream.read(READ_CHUNK_SIZE)
+    while chunk and not chunk.strip():
+        chunk = stream.read(READ_CHUNK_SIZE)
+    if not chunk:
+        return
+    chunk = chunk.lstrip()
+    if chunk[0] != "[":
+        raise ValueError("Expected a JSON array of claims.")
+    position = start = 1 # Scan offset, and where the current element starts, in chunk
+    pieces: list[str] = [] # Text of the current element from earlier chunks
+    pending_size = 0
+    depth = 0
+    in_string = escaped = scanning = False
+    record_number = 0
+    while True:
+        while True:
+            if not scanning:
+                # Fast path: decode the element in one go if the chunk holds it and the delimiter after it
+                position = start = _WHITESPACE.match(chunk, start).end()
+                if start == len(chunk):
+                    break
+                try:
+                    claim, end = _DECODER.raw_decode(chunk, start)
+                    end = _WHITESPACE.match(chunk, end).end()
+                except json.JSONDecodeError:
+                    end = len(chunk)
+                if end < len(chunk) and chunk[end] in ",]":
+                    record_number += 1
+                    yield record_number, claim
+                    if chunk[end] == "]":
+                        return
+                    position = start = end + 1
+                    continue
+                scanning = True # Cut off by the chunk (or malformed): scan for its end
+            if in_string:
+                match = _STRING_SPECIAL.search(chunk, position)
+                if match is None:
+                    position = len(chunk)
+                    break
+                position = match.end()
+                if match.group() == "\\":
+                    if position == len(chunk):
+                        escaped = True # The escaped character starts the next chunk
+                        break
+                    position += 1
+                else:
+                    in_string = False
+                continue
+            match = _STRUCTURAL.search(chunk, position)
+            if match is None:
+                position = len(chunk)
+                break
+            char = match.group()
+            position = match.end()
+            if char == '"':
+                in_string = True
+            elif char in "[{":
+                depth += 1
+            elif depth:
+                if char in "]}":
+                    depth -= 1
+            elif char in ",]": # End of the element at depth 0
+                text = chunk[start:position - 1]
+                if pieces:
+                    text = "".join(pieces) + text
+                    pieces, pending_size = [], 0
+                if char == "]" and record_number == 0 and not text.strip():
+                    return # []
+                try:
+                    claim = json.loads(text)
+                except json.JSONDecodeError:
+                    raise ValueError(f"Malformed JSON array element after claim #{record_number}.") from None
+                record_number += 1
+                yield record_number, claim
+                if char == "]":
+                    return
+                start = position
+                scanning = False
+        pieces.append(chunk[start:])
+        pending_size += len(chunk) - start
+        if pending_size > MAX_RECORD_SIZE:
+            raise ValueError(f"JSON array element after claim #{record_number} exceeds {MAX_RECORD_SIZE} characters.")
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            raise ValueError("Unterminated JSON array of claims.")
+        start = 0
+        position = 1 if escaped else 0
+        escaped = False
+
+
+def _validate_record(record_number: int, record) -> tuple[str, bool, list[str]]:
+    if isinstance(record, str):
+        try:
+            claim = json.loads(record)
+        except json.JSONDecodeError as e:
+            return f"#{record_number}", False, [f"Invalid JSON: {e}"]
+    else:
+        claim = record
+    if not isinstance(claim, dict):
+        return f"#{record_number}", False, ["Claim must be a JSON object."]
+    claim_id = str(claim.get("claim_id") or f"#{record_number}")
+    errors = _validate_claim_fields(claim)
+    return claim_id, not errors, errors
+
+
+def _validate_records(records: list[tuple[int, object]]) -> list[tuple[str, bool, list[str]]]:
+    return [_validate_record(record_number, record) for record_number, record in records]
+
+
+def _chunked(records, size: int):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate_claim_stream(source, input_format: str = "auto", max_workers: int | None = None,
+                          records_per_task: int = RECORDS_PER_TASK):
+    """
+    Validates every claim of a JSONL file or JSON array, yielding (claim_id, is_valid, errors) in input order.
+
+    :param source: path, or text/binary file object positioned at the start of the data
+    :param input_format: "jsonl", "array", or "auto" (an array if the first non-blank character is "[")
+    :param max_workers: worker processes for parsing/validation; 0 or 1 validates inline in this process
+    :param records_per_task: claims sent to a worker per task
+    claim_id is the claim's "claim_id" field, or "#<n>" (1-based position) if it has none. A JSONL line that is not
+    valid JSON produces an invalid record and processing continues with the next line.
+    """
+    stream, should_close = _open_text(source)
+    try:
+        first_chunk = ""
+        if input_format == "auto":
+            first_chunk = stream.read(READ_CHUNK_SIZE)
+            input_format = "array" if first_chunk.lstrip().startswith("[") else "jsonl"
+        if input_format == "array":
+            records = iter_json_array_records(stream, first_chunk)
+        elif input_format == "jsonl":
+            records = iter_jsonl_records(stream, first_chunk)
+        else:
+            raise ValueError(f"Unknown input_format '{input_format}'.")
+
+        max_workers = max_workers if max_workers is not None else os.cpu_count() or 1
+        if max_workers <= 1:
+            for record_number, record in records:
+                yield _validate_record(record_number, record)
+            return
+
+        # Bounded window of in-flight tasks keeps memory constant and results in input order
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = deque()
+            for chunk in _chunked(records, records_per_task):
+                in_flight.append(executor.submit(_validate_records, chunk))
+                if len(in_flight) >= max_workers * 2:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+    finally:
+        if should_close:
+            stream.close()
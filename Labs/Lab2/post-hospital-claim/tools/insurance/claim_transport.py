@@ -0,0 +1,317 @@
+"""
+Transports between the claim tool clients and the services behind them (core policy system, pre-auth, guidelines).
+
+A client sends an operation ("policy.get", "preauth.check_bulk", ...) with a JSON-compatible payload and gets back a
+response dict {"status_code": int, "body": dict} (plus "version" for versioned records), the same shape the mock
+APIs return. Every transport is async (request) and can also be called from synchronous code (request_sync).
+
+    InProcessTransport   - the mock APIs, called in-process; their simulated latency is awaited, not slept
+    HTTPTransport        - POSTs to {base_url}/{service}/{name} over pooled keep-alive connections, with per-host
+                           concurrency limits, timeouts, jittered retries and a per-host circuit breaker
+
+Client logic that makes several calls is written once as an exchange: a generator that yields requests
+(operation, payload, idempotent) - or a blocking callable, e.g. a journal fsync - and receives their results.
+run_exchange_sync() drives it from synchronous code, run_exchange() from a coroutine.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+from mock_latency import async_mock_latency, deferred_mock_latency
+
+logger = logging.getLogger(__name__)
+
+# Defaults of HTTPTransport
+HTTP_MAX_CONNECTIONS_PER_HOST = 16
+HTTP_TIMEOUT_SECONDS = 5.0
+HTTP_CONNECT_TIMEOUT_SECONDS = 2.0
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 30.0
+HTTP_MAX_RETRIES = 3
+HTTP_RETRY_BACKOFF_SECONDS = 0.1 # First retry waits up to this long (full jitter); doubles per attempt
+HTTP_RETRY_BACKOFF_MAX_SECONDS = 2.0
+CIRCUIT_FAILURE_THRESHOLD = 5 # Consecutive failures that open a host's circuit
+CIRCUIT_RESET_TIMEOUT_SECONDS = 30.0 # How long an open circuit rejects calls before one trial call is let through
+
+# Statuses worth retrying (idempotent requests only); the 5xx ones also count as failures for the circuit breaker
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+def _service_of(operation: str) -> str:
+    return operation.partition(".")[0]
+
+
+class AsyncTransport:
+    """Interface of a transport; see the module docstring for the request/response format."""
+    async def request(self, operation: str, payload: dict, idempotent: bool = True) -> dict:
+        """
+        Sends one operation. idempotent=False marks a request that must not be sent twice (a non-idempotent
+        write), so it is never retried. Failures are returned as error responses, not raised.
+        """
+        raise NotImplementedError
+
+    def request_sync(self, operation: str, payload: dict, idempotent: bool = True) -> dict:
+        """request() for synchronous callers (runs on the shared background event loop)."""
+        return run_sync(self.request(operation, payload, idempotent))
+
+    def serves(self, service: str) -> bool:
+        """Whether this transport has an endpoint for the service ("policy", "preauth", ...)."""
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class InProcessTransport(AsyncTransport):
+    """
+    Calls in-process handlers (the mock APIs): handlers maps operation -> callable(**payload) -> response dict.
+    Synchronous calls behave exactly like calling the handler; async calls await its simulated latency instead
+    of sleeping. Handlers run on the calling thread, so they must not block on anything but mock_latency().
+    """
+    def __init__(self, handlers: dict):
+        self.handlers = handlers
+
+    def _handler(self, operation: str):
+        handler = self.handlers.get(operation)
+        if handler is None:
+            raise ValueError(f"No in-process handler for operation '{operation}'.")
+        return handler
+
+    async def request(self, operation: str, payload: dict, idempotent: bool = True) -> dict:
+        handler = self._handler(operation)
+        with deferred_mock_latency() as delays:
+            response = handler(**payload)
+        await async_mock_latency(sum(delays))
+        return response
+
+    def request_sync(self, operation: str, payload: dict, idempotent: bool = True) -> dict:
+        return self._handler(operation)(**payload)
+
+    def serves(self, service: str) -> bool:
+        return any(_service_of(operation) == service for operation in self.handlers)
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker: after failure_threshold consecutive failures the circuit opens and calls are
+    rejected without being sent; after reset_timeout one trial call is let through (half-open), and its outcome
+    closes the circuit again or re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT_SECONDS,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return self.CLOSED
+            return self.HALF_OPEN if self._clock() - self._opened_at >= self.reset_timeout else self.OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._clock() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+
+class _LoopState:
+    """HTTPTransport state bound to one event loop: the pooled client and the per-host semaphores."""
+    def __init__(self, client, semaphores: dict):
+        self.client = client
+        self.semaphores = semaphores
+
+
+class HTTPTransport(AsyncTransport):
+    """
+    Calls the services over HTTP: an operation "service.name" is a POST of the JSON payload to
+    {base_urls[service]}/service/name. The response JSON is the body; an ETag header becomes the record "version".
+
+    Connections are pooled and kept alive (one httpx.AsyncClient per event loop). At most max_connections_per_host
+    requests are in flight per host; the rest wait their turn. Idempotent requests that time out, cannot connect or
+    get a 429/5xx are retried up to max_retries times with exponential backoff and full jitter (honouring a
+    numeric Retry-After). Each host has a CircuitBreaker: while it is open, requests fail fast with a 503 response.
+    http_transport replaces the network layer of the clients (an httpx.AsyncBaseTransport, e.g. httpx.MockTransport).
+    """
+    def __init__(self, base_urls: dict[str, str], max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+                 timeout: float = HTTP_TIMEOUT_SECONDS, connect_timeout: float = HTTP_CONNECT_TIMEOUT_SECONDS,
+                 keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY_SECONDS, max_retries: int = HTTP_MAX_RETRIES,
+                 retry_backoff: float = HTTP_RETRY_BACKOFF_SECONDS, retry_backoff_max: float = HTTP_RETRY_BACKOFF_MAX_SECONDS,
+                 failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT_SECONDS,
+                 headers: dict | None = None, http_transport=None):
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("HTTPTransport requires httpx (pip install httpx).") from e
+        self._httpx = httpx
+        self.base_urls = {service: url.rstrip("/") for service, url in base_urls.items()}
+        self.max_connections_per_host = max_connections_per_host
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.headers = headers or {}
+        self._http_transport = http_transport
+        self._hosts = sorted({urlsplit(url).netloc for url in self.base_urls.values()})
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max_connections_per_host * len(self._hosts),
+            max_keepalive_connections=max_connections_per_host * len(self._hosts),
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.breakers = {host: CircuitBreaker(failure_threshold, reset_timeout) for host in self._hosts}
+        self._loop_states = weakref.WeakKeyDictionary() # event loop -> _LoopState
+        self._loop_states_lock = threading.Lock()
+
+    def serves(self, service: str) -> bool:
+        return service in self.base_urls
+
+    def _loop_state(self) -> _LoopState:
+        # httpx clients and asyncio semaphores belong to the loop they are used on
+        loop = asyncio.get_running_loop()
+        with self._loop_states_lock:
+            state = self._loop_states.get(loop)
+            if state is None:
+                client = self._httpx.AsyncClient(timeout=self._timeout, limits=self._limits, headers=self.headers,
+                                                 transport=self._http_transport)
+                state = self._loop_states[loop] = _LoopState(
+                    client, {host: asyncio.Semaphore(self.max_connections_per_host) for host in self._hosts}
+                )
+            return state
+
+    def _backoff(self, attempt: int, retry_after: str | None) -> float:
+        delay = random.uniform(0, min(self.retry_backoff_max, self.retry_backoff * 2 ** attempt))
+        try:
+            return max(delay, min(float(retry_after), self.retry_backoff_max)) if retry_after else delay
+        except ValueError: # HTTP-date Retry-After: fall back to the jittered delay
+            return delay
+
+    async def request(self, operation: str, payload: dict, idempotent: bool = True) -> dict:
+        service = _service_of(operation)
+        base_url = self.base_urls.get(service)
+        if base_url is None:
+            return {"status_code": 404, "body": {"message": f"No endpoint configured for service '{service}'."}}
+        url = f"{base_url}/{operation.replace('.', '/')}"
+        host = urlsplit(base_url).netloc
+        breaker = self.breakers[host]
+        state = self._loop_state()
+        attempts = self.max_retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            if not breaker.allow():
+                return {"status_code": 503, "body": {"message": f"Service {host} unavailable (circuit open); {operation} not sent."}}
+            response, retry_after = await self._send(state, host, url, payload)
+            status_code = response["status_code"]
+            if status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if status_code not in RETRYABLE_STATUS_CODES or attempt == attempts - 1:
+                return response
+            delay = self._backoff(attempt, retry_after)
+            logger.info("[HTTPTransport] %s returned %s; retrying in %.3fs (attempt %s of %s)", operation, status_code, delay, attempt + 2, attempts)
+            await asyncio.sleep(delay)
+        return response
+
+    async def _send(self, state: _LoopState, host: str, url: str, payload: dict) -> tuple[dict, str | None]:
+        """One POST. :returns: (response dict, Retry-After header); connection failures and timeouts become 503/504."""
+        httpx = self._httpx
+        async with state.semaphores[host]:
+            try:
+                http_response = await state.client.post(url, json=payload)
+            except httpx.TimeoutException as e:
+                return {"status_code": 504, "body": {"message": f"Request to {url} timed out: {e!r}"}}, None
+            except httpx.TransportError as e:
+                return {"status_code": 503, "body": {"message": f"Request to {url} failed: {e!r}"}}, None
+        try:
+            body = http_response.json()
+        except ValueError:
+            body = {"message": http_response.text[:200] or http_response.reason_phrase}
+        response = {"status_code": http_response.status_code, "body": body}
+        etag = http_response.headers.get("ETag")
+        if etag:
+            try:
+                response["version"] = int(etag.strip('W/"'))
+            except ValueError:
+                pass
+        return response, http_response.headers.get("Retry-After")
+
+    async def aclose(self):
+        """Closes the connection pool of the running event loop."""
+        with self._loop_states_lock:
+            state = self._loop_states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.client.aclose()
+
+    def close(self):
+        """Closes the connection pool used by synchronous callers."""
+        run_sync(self.aclose())
+
+
+# ---- Running exchanges ----
+
+def run_exchange_sync(transport: AsyncTransport, exchange):
+    """Drives an exchange generator with blocking calls; returns the generator's return value."""
+    try:
+        step = next(exchange)
+        while True:
+            step = exchange.send(step() if callable(step) else transport.request_sync(*step))
+    except StopIteration as done:
+        return done.value
+
+
+async def run_exchange(transport: AsyncTransport, exchange):
+    """Drives an exchange generator from a coroutine; blocking steps run in a worker thread."""
+    try:
+        step = next(exchange)
+        while True:
+            result = await asyncio.to_thread(step) if callable(step) else await transport.request(*step)
+            step = exchange.send(result)
+    except StopIteration as done:
+        return done.value
+
+
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+
+def run_sync(coroutine):
+    """Runs a coroutine from synchronous code on a shared background event loop and waits for its result."""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="claim-transport-loop", daemon=True).start()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is _sync_loop:
+        coroutine.close()
+        raise RuntimeError("run_sync() called from the transport loop itself; await the coroutine instead.")
+    return asyncio.run_coroutine_threadsafe(coroutine, _sync_loop).result()
@@ -1,8 +1,8 @@
 from enum import Enum
+import functools
 import re
 import json
-import time
-from datetime import datetime
+from datetime import date, datetime
 import logging
 from typing import List, Optional
 
@@ -12,49 +12,55 @@ from pydantic import Field, BaseModel
 from ibm_watsonx_orchestrate.agent_builder.tools import tool, ToolPermission
 # import requests
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+import claim_logging  # noqa: F401 - applies CLAIM_TOOLS_LOG_LEVEL on import
+from eligibility_index import EligibilityIndex
+from mock_latency import mock_latency
+from ttl_cache import TTLCache
 
-# Creating an object
-logger = logging.getLogger()
+# Logging is configured by the host process (see claim_logging); records are only formatted if emitted
+logger = logging.getLogger(__name__)
 
-# Setting the threshold of logger to DEBUG
-logger.setLevel(logging.INFO)
-
-# Mock Member Eligibility API
+# Mock Member Eligibility API - coverage spans per member (inclusive ISO dates, "end": None = still active)
 MOCK_MEMBER_ELIGIBILITY_DB = {
-    "MEMBER123": {"active_on_2023-11-15": True, "plan_id": "PPO_GOLD"},
-    "MEMBER456": {"active_on_2023-10-26": True, "plan_id": "HMO_SILVER"},
-    "MEMBER789": {"active_on_2023-10-26": False, "plan_id": "PPO_BRONZE"}, # Inactive
+    "MEMBER123": {"plan_id": "PPO_GOLD", "coverage": [{"start": "2023-01-01", "end": None}]},
+    "MEMBER456": {"plan_id": "HMO_SILVER", "coverage": [{"start": "2023-01-01", "end": None}]},
+    "MEMBER600": {"plan_id": "HMO_SILVER", "coverage": [{"start": "2023-01-01", "end": None}]}, # MEMBER600-602: one family
+    "MEMBER601": {"plan_id": "HMO_SILVER", "coverage": [{"start": "2023-01-01", "end": None}]},
+    "MEMBER602": {"plan_id": "HMO_SILVER", "coverage": [{"start": "2023-01-01", "end": None}]},
+    "MEMBER789": {"plan_id": "PPO_BRONZE", "coverage": [{"start": "2022-01-01", "end": "2022-12-31"}]}, # Inactive since 2023
 }
+# Index over MOCK_MEMBER_ELIGIBILITY_DB; call MEMBER_ELIGIBILITY_INDEX.update() after changing the DB
+MEMBER_ELIGIBILITY_INDEX = EligibilityIndex(MOCK_MEMBER_ELIGIBILITY_DB)
+
+def _eligibility_response(member_id: str, date_of_service: str, coverage: tuple[bool, str | None] | None) -> dict:
+    if coverage is None:
+        return {"status_code": 404, "body": {"message": "Member ID not found."}}
+    is_eligible, plan_id = coverage
+    body = {
+        "member_id": member_id,
+        "date_of_service": date_of_service,
+        "is_eligible": is_eligible,
+        "plan_id": plan_id
+    }
+    if not is_eligible: # Member found but not eligible on that date
+        body["reason"] = "Not active on date of service"
+    return {"status_code": 200, "body": body}
+
 def call_mock_member_eligibility_api(member_id: str, date_of_service: str) -> dict:
     """Simulates checking member eligibility."""
-    logger.info(f"[MockMemberAPI] Checking eligibility for Member ID: {member_id} on {date_of_service}")
-    time.sleep(0.3)
-    key = f"active_on_{date_of_service}"
-    member_info = MOCK_MEMBER_ELIGIBILITY_DB.get(member_id)
-    if member_info and key in member_info:
-        return {
-            "status_code": 200,
-            "body": {
-                "member_id": member_id,
-                "date_of_service": date_of_service,
-                "is_eligible": member_info[key],
-                "plan_id": member_info.get("plan_id")
-            }
-        }
-    elif member_info and not member_info.get(key, False) : # Member found but not eligible on that date
-         return {
-            "status_code": 200,
-            "body": {
-                "member_id": member_id,
-                "date_of_service": date_of_service,
-                "is_eligible": False,
-                "plan_id": member_info.get("plan_id"),
-                "reason": "Not active on date of service"
-            }
-        }
-    return {"status_code": 404, "body": {"message": "Member ID not found."}}
+    logger.info("[MockMemberAPI] Checking eligibility for Member ID: %s on %s", member_id, date_of_service)
+    mock_latency(0.3)
+    return _eligibility_response(member_id, date_of_service, MEMBER_ELIGIBILITY_INDEX.lookup(member_id, date_of_service))
+
+def call_mock_member_eligibility_api_bulk(checks: list[tuple[str, str]]) -> dict:
+    """Simulates one eligibility round-trip for many (member_id, date_of_service) pairs."""
+    logger.info("[MockMemberAPI] Bulk checking eligibility for %s member/date(s)", len(checks))
+    mock_latency(0.3)
+    coverages = MEMBER_ELIGIBILITY_INDEX.lookup_many(checks)
+    return {
+        "status_code": 200,
+        "body": {"results": {check: _eligibility_response(*check, coverage) for check, coverage in coverages.items()}}
+    }
 
 
 # Mock Provider Network API
@@ -63,11 +69,9 @@ MOCK_PROVIDER_NETWORK_DB = {
     "0987654321": {"plan_HMO_SILVER": "In-Network", "plan_PPO_GOLD": "In-Network"},   # Quest
     "1112223333": {"plan_HMO_SILVER": "Out-of-Network"},                             # Another Provider
 }
+NOT_FOUND_FOR_PLAN = "Not Found for Plan"
 
-def call_mock_provider_network_api(provider_npi: str, plan_id: str) -> dict:
-    """Simulates checking provider network status."""
-    logger.info(f"[MockProviderAPI] Checking network status for NPI: {provider_npi} with Plan: {plan_id}")
-    time.sleep(0.3)
+def _provider_network_response(provider_npi: str, plan_id: str) -> dict:
     provider_info = MOCK_PROVIDER_NETWORK_DB.get(provider_npi)
     plan_key = f"plan_{plan_id}"
     if provider_info and plan_key in provider_info:
@@ -85,11 +89,49 @@ def call_mock_provider_network_api(provider_npi: str, plan_id: str) -> dict:
             "body": {
                 "provider_npi": provider_npi,
                 "plan_id": plan_id,
-                "network_status": "Not Found for Plan" # Or a default like "Out-of-Network"
+                "network_status": NOT_FOUND_FOR_PLAN # Or a default like "Out-of-Network"
             }
         }
     return {"status_code": 404, "body": {"message": "Provider NPI not found."}}
 
+def call_mock_provider_network_api(provider_npi: str, plan_id: str) -> dict:
+    """Simulates checking provider network status."""
+    logger.info("[MockProviderAPI] Checking network status for NPI: %s with Plan: %s", provider_npi, plan_id)
+    mock_latency(0.3)
+    return _provider_network_response(provider_npi, plan_id)
+
+def call_mock_provider_network_api_bulk(checks: list[tuple[str, str]]) -> dict:
+    """Simulates one network-status round-trip for many (provider_npi, plan_id) pairs."""
+    logger.info("[MockProviderAPI] Bulk checking network status for %s NPI/plan pair(s)", len(checks))
+    mock_latency(0.3)
+    return {"status_code": 200, "body": {"results": {check: _provider_network_response(*check) for check in checks}}}
+
+
+# Network status by (provider_npi, plan_id). Contracts change rarely, so positive answers are kept for an hour;
+# "Not Found for Plan" is cached for a shorter time so a newly loaded contract shows up quickly. Errors are not cached.
+NETWORK_STATUS_CACHE_MAX_SIZE = 100_000
+NETWORK_STATUS_CACHE_TTL_SECONDS = 60 * 60
+NETWORK_STATUS_NEGATIVE_TTL_SECONDS = 5 * 60
+NETWORK_STATUS_CACHE = TTLCache(maxsize=NETWORK_STATUS_CACHE_MAX_SIZE, ttl=NETWORK_STATUS_CACHE_TTL_SECONDS)
+
+def _network_status_ttl(response: dict) -> float:
+    if response["body"].get("network_status") == NOT_FOUND_FOR_PLAN:
+        return NETWORK_STATUS_NEGATIVE_TTL_SECONDS
+    return NETWORK_STATUS_CACHE_TTL_SECONDS
+
+def _network_status_cacheable(response: dict) -> bool:
+    return response["status_code"] == 200
+
+def invalidate_network_status_cache(provider_npi: str | None = None, plan_id: str | None = None) -> int:
+    """Drops cached network statuses for an NPI and/or plan, or the whole cache if neither is given."""
+    if provider_npi is None and plan_id is None:
+        dropped = len(NETWORK_STATUS_CACHE)
+        NETWORK_STATUS_CACHE.clear()
+        return dropped
+    return NETWORK_STATUS_CACHE.invalidate_where(
+        lambda key: (provider_npi is None or key[0] == provider_npi) and (plan_id is None or key[1] == plan_id)
+    )
+
 @tool
 def check_eligibility(member_id: str, date_of_service: str) -> tuple[bool, dict | None, str | None]:
     """
@@ -101,7 +143,7 @@ def check_eligibility(member_id: str, date_of_service: str) -> tuple[bool, dict
     :returns: (is_eligible_api_success, eligibility_data, error_message)
     eligibility_data itself will contain an 'is_eligible' boolean.
     """
-    logger.info(f"[MemberEligibilityTool] Checking eligibility for Member: {member_id}, DOS: {date_of_service}")
+    logger.info("[MemberEligibilityTool] Checking eligibility for Member: %s, DOS: %s", member_id, date_of_service)
     if not member_id or not date_of_service:
         return False, None, "Member ID and Date of Service are required for eligibility check."
     response = call_mock_member_eligibility_api(member_id, date_of_service)
@@ -109,6 +151,35 @@ def check_eligibility(member_id: str, date_of_service: str) -> tuple[bool, dict
         return True, response["body"], None
     else:
         return False, None, response["body"].get("message", "Eligibility check failed.")
+
+
+def check_eligibility_bulk(checks: list[tuple[str, str]]) -> dict[tuple[str, str], tuple[bool, dict | None, str | None]]:
+    """
+    check_eligibility for many (member_id, date_of_service) pairs with a single eligibility API call.
+    Duplicate pairs are resolved once.
+
+    :returns: {(member_id, date_of_service): (is_eligible_api_success, eligibility_data, error_message)}
+    """
+    logger.info("[MemberEligibilityTool] Checking eligibility for %s member/date(s)", len(checks))
+    results = {}
+    to_fetch = []
+    for check in dict.fromkeys(checks):
+        if not all(check): # Same basic check as check_eligibility
+            results[check] = (False, None, "Member ID and Date of Service are required for eligibility check.")
+        else:
+            to_fetch.append(check)
+    if to_fetch:
+        response = call_mock_member_eligibility_api_bulk(to_fetch)
+        for check in to_fetch:
+            if response["status_code"] == 200:
+                check_response = response["body"]["results"][check]
+                if check_response["status_code"] == 200:
+                    results[check] = (True, check_response["body"], None)
+                else:
+                    results[check] = (False, None, check_response["body"].get("message", "Eligibility check failed."))
+            else:
+                results[check] = (False, None, response["body"].get("message", "Eligibility check failed."))
+    return results
     
 @tool
 def check_network_status(provider_npi: str, plan_id: str) -> tuple[bool, dict | None, str | None]:
@@ -122,17 +193,174 @@ def check_network_status(provider_npi: str, plan_id: str) -> tuple[bool, dict |
     :returns: (api_success, network_data, error_message)
     network_data will contain 'network_status'.
     """
-    logger.info(f"[ProviderNetworkTool] Checking NPI: {provider_npi} for Plan: {plan_id}")
+    logger.info("[ProviderNetworkTool] Checking NPI: %s for Plan: %s", provider_npi, plan_id)
     if not provider_npi or not plan_id:
         return False, None, "Provider NPI and Plan ID are required for network check."
-    response = call_mock_provider_network_api(provider_npi, plan_id)
+    # Concurrent misses for the same pair share one fetch
+    response = NETWORK_STATUS_CACHE.get_or_load(
+        (provider_npi, plan_id),
+        lambda: call_mock_provider_network_api(provider_npi, plan_id),
+        ttl=_network_status_ttl,
+        should_cache=_network_status_cacheable,
+    )
     if response["status_code"] == 200:
         return True, response["body"], None
     else:
         return False, None, response["body"].get("message", "Provider network check failed.")
+
+
+def check_network_status_bulk(checks: list[tuple[str, str]]) -> dict[tuple[str, str], tuple[bool, dict | None, str | None]]:
+    """
+    check_network_status for many (provider_npi, plan_id) pairs, e.g. every line of a batch of claims.
+    Pairs are deduplicated, served from the cache where possible, and the misses fetched with one bulk API call.
+
+    :returns: {(provider_npi, plan_id): (api_success, network_data, error_message)}
+    """
+    logger.info("[ProviderNetworkTool] Checking %s NPI/plan pair(s)", len(checks))
+    responses = {}
+    misses = []
+    for check in dict.fromkeys(checks):
+        if not all(check): # Same basic check as check_network_status
+            continue
+        cached = NETWORK_STATUS_CACHE.get(check)
+        if cached is not None:
+            responses[check] = cached
+        else:
+            misses.append(check)
+    if misses:
+        response = call_mock_provider_network_api_bulk(misses)
+        for check in misses:
+            if response["status_code"] == 200:
+                responses[check] = check_response = response["body"]["results"][check]
+                if _network_status_cacheable(check_response):
+                    NETWORK_STATUS_CACHE.put(check, check_response, ttl=_network_status_ttl(check_response))
+            else:
+                responses[check] = response
+
+    results = {}
+    for check in dict.fromkeys(checks):
+        check_response = responses.get(check)
+        if check_response is None:
+            results[check] = (False, None, "Provider NPI and Plan ID are required for network check.")
+        elif check_response["status_code"] == 200:
+            results[check] = (True, check_response["body"], None)
+        else:
+            results[check] = (False, None, check_response["body"].get("message", "Provider network check failed."))
+    return results
     
+DATE_OF_SERVICE_FORMAT = "%Y-%m-%d"
+_ISO_DATE = re.compile(r"([0-9]{4})-([0-9]{2})-([0-9]{2})")
+
+# Error messages of the basic validation rules; line messages are formatted with the 1-based line number
+MISSING_CLAIM_DATA = "No structured claim data provided."
+MISSING_MEMBER_ID = "Missing Member ID in extracted data."
+MISSING_SERVICE_LINES = "No service lines found in extracted data."
+MISSING_DATE_OF_SERVICE = "Line {}: Missing Date of Service."
+INVALID_DATE_OF_SERVICE = "Line {}: Invalid Date of Service format (expected YYYY-MM-DD)."
+MISSING_CPT_CODE = "Line {}: Missing CPT code."
+MISSING_PROVIDER_NPI = "Line {}: Missing Provider NPI."
+INVALID_CHARGE_AMOUNT = "Line {}: Missing or invalid charge amount (must be a non-negative number)."
+
+
+@functools.lru_cache(maxsize=4096)
+def _is_valid_date_of_service(value: str) -> bool:
+    """Same result as datetime.strptime(value, "%Y-%m-%d") succeeding; claims in a batch share few distinct dates."""
+    match = _ISO_DATE.fullmatch(value)
+    if match:
+        try:
+            date(int(match[1]), int(match[2]), int(match[3]))
+            return True
+        except ValueError:
+            return False
+    # Anything else (e.g. unpadded "2023-1-5", which strptime accepts) takes the slow, exact path
+    try:
+        datetime.strptime(value, DATE_OF_SERVICE_FORMAT)
+        return True
+    except ValueError:
+        return False
+
+
+# Claim schema: field -> {"rule": ..., "error": ...}, checked in this order. Rules (see _FIELD_RULES):
+# - "required": the value must be truthy
+# - "date": required, and a valid YYYY-MM-DD date ("invalid_error" otherwise)
+# - "non_negative_number": an int or float >= 0
+# Line errors are formatted with the 1-based line number.
+CLAIM_FIELDS = {
+    "member_id": {"rule": "required", "error": MISSING_MEMBER_ID},
+    "services": {"rule": "required", "error": MISSING_SERVICE_LINES},
+}
+SERVICE_LINE_FIELDS = {
+    "date_of_service": {"rule": "date", "error": MISSING_DATE_OF_SERVICE, "invalid_error": INVALID_DATE_OF_SERVICE},
+    "cpt_code": {"rule": "required", "error": MISSING_CPT_CODE},
+    "provider_npi": {"rule": "required", "error": MISSING_PROVIDER_NPI},
+    "charge_amount": {"rule": "non_negative_number", "error": INVALID_CHARGE_AMOUNT},
+    # ICD-10 might be optional depending on rules, or sometimes required:
+    # "icd_10_code": {"rule": "required", "error": "Line {}: Missing ICD-10 code."},
+}
+
+
+def _required_check(error: str, **_):
+    return lambda value: None if value else error
+
+
+def _date_check(error: str, invalid_error: str, **_):
+    def check(value):
+        if not value:
+            return error
+        if type(value) is str:
+            return None if _is_valid_date_of_service(value) else invalid_error
+        datetime.strptime(value, DATE_OF_SERVICE_FORMAT) # Non-strings raise TypeError as before
+        return None
+    return check
+
+
+def _non_negative_number_check(error: str, **_):
+    return lambda value: None if isinstance(value, (int, float)) and value >= 0 else error
+
+
+_FIELD_RULES = {"required": _required_check, "date": _date_check, "non_negative_number": _non_negative_number_check}
+
+
+def compile_field_checks(fields: dict[str, dict]) -> tuple[tuple[str, object], ...]:
+    """
+    Compiles a field schema (see CLAIM_FIELDS) into (field, check) pairs; check(value) returns the field's error
+    message, or None if the value is valid. Raises ValueError for an unknown rule.
+    """
+    checks = []
+    for field, spec in fields.items():
+        make_check = _FIELD_RULES.get(spec["rule"])
+        if make_check is None:
+            raise ValueError(f"Unknown validation rule '{spec['rule']}' for field '{field}', expected one of {tuple(_FIELD_RULES)}.")
+        checks.append((field, make_check(**{key: value for key, value in spec.items() if key != "rule"})))
+    return tuple(checks)
+
+
+_CLAIM_CHECKS = compile_field_checks(CLAIM_FIELDS)
+_SERVICE_LINE_CHECKS = compile_field_checks(SERVICE_LINE_FIELDS)
+
+
+def _validate_claim_fields(structured_claim_data: dict) -> list[str]:
+    """Basic validation rules (CLAIM_FIELDS, SERVICE_LINE_FIELDS) for one parsed claim; returns the errors (empty if valid)."""
+    if not structured_claim_data:
+        return [MISSING_CLAIM_DATA]
+
+    errors = []
+    get = structured_claim_data.get
+    for field, check in _CLAIM_CHECKS:
+        error = check(get(field))
+        if error:
+            errors.append(error)
+
+    for line_num, line in enumerate(structured_claim_data.get("services", []), 1):
+        get = line.get
+        for field, check in _SERVICE_LINE_CHECKS:
+            error = check(get(field))
+            if error:
+                errors.append(error.format(line_num))
+    return errors
+
 @tool
-def validate_claim_data(claimInfo: str) -> tuple[bool, list[str]]:
+def validate_claim_data(claimInfo: str) -> tuple[bool, dict | None, list[str]]:
     """
     Performs basic validation on structured claim data.
 
@@ -154,179 +382,11 @@ def validate_claim_data(claimInfo: str) -> tuple[bool, list[str]]:
     try:
         structured_claim_data: dict = json.loads(claimInfo)        
     except json.JSONDecodeError as e:
-        logger.info("Error decoding JSON:", e)
+        logger.error("Error decoding JSON: %s", e)
+        return False, None, [f"Invalid claim JSON: {e}"]
 
-    errors = []
+    errors = _validate_claim_fields(structured_claim_data)
     if not structured_claim_data:
-        errors.append("No structured claim data provided.")
-        return False, errors
-
-    # Validate top-level info
-    if not structured_claim_data.get("member_id"):
-        errors.append("Missing Member ID in extracted data.")
-
-    claim_lines = structured_claim_data.get("services", [])
-    if not claim_lines:
-        errors.append("No service lines found in extracted data.")
-
-    for i, line in enumerate(claim_lines):
-        line_num = i + 1
-        if not line.get("date_of_service"):
-            errors.append(f"Line {line_num}: Missing Date of Service.")
-        else:
-            try:
-                datetime.strptime(line["date_of_service"], "%Y-%m-%d")
-            except ValueError:
-                errors.append(f"Line {line_num}: Invalid Date of Service format (expected YYYY-MM-DD).")
-
-        if not line.get("cpt_code"):
-            errors.append(f"Line {line_num}: Missing CPT code.")
-        if not line.get("provider_npi"):
-            errors.append(f"Line {line_num}: Missing Provider NPI.")
-        if line.get("charge_amount") is None or not isinstance(line.get("charge_amount"), (int, float)) or line.get("charge_amount") < 0:
-            errors.append(f"Line {line_num}: Missing or invalid charge amount (must be a non-negative number).")
-        # ICD-10 might be optional depending on rules, or sometimes required.
-        # if not line.get("icd_10_code"):
-        #     errors.append(f"Line {line_num}: Missing ICD-10 code.")
+        return False, None, errors
 
     return not errors, structured_claim_data, errors
-
-# @tool
-# def process_claim_submission(claimInfo: str) -> tuple[bool, dict | None, list[str]]:
-#     """
-#     Claim processing method to initiate claim intake and validation process. This tool is used to validate the claim submission.
-
-#     Parameters:
-#     - claimInfo: Dict with following fields:
-#         - member_id: Member Id (required field)
-#         - patient_name: Patient's name (required field)
-#         - services: List of services taken, each with:
-#             - 'date_of_service'
-#             - 'cpt_code'
-#             - 'icd_10_code'
-#             - 'provider_npi'
-#             - 'charge_amount'
-
-#     :returns: (overall_success, validated_claim_data, list_of_errors_or_messages)
-#     """
-#     logger.info(f"\n[CIVA] Received new claim submission. claimInfo: {claimInfo}")
-#     errors = []
-
-#     try:
-#         processed_claim_data: dict = json.loads(claimInfo)        
-#     except json.JSONDecodeError as e:
-#         logger.info("Error decoding JSON:", e)
-  
-#     # processed_claim_data = claimInfo.model_dump()
-#     # 3. Basic Validation Rules
-#     is_structurally_valid, validation_errors = _validate_claim_data(processed_claim_data)
-#     if not is_structurally_valid:
-#         errors.extend(validation_errors)
-#         # Decide if we stop here or continue with API checks if some data is present
-#         # For this example, we'll stop if structural validation fails badly.
-#         logger.info(f"[CIVA] Basic validation failed: {validation_errors}")
-#         return False, processed_claim_data, errors
-#     logger.info("[CIVA] Basic data structure validation passed.")
-
-#     # 4. Member Eligibility Check (using extracted Member ID and DOS)
-#     # Assume member_id and DOS are consistent per claim, or take from first line if varies.
-#     # Real system needs to handle multiple DOS or members in one submission if allowed.
-#     member_id = processed_claim_data.get("member_id")
-#     # For simplicity, take DOS from the first line if available globally or per line.
-#     dos_to_check = processed_claim_data.get("services")[0].get("date_of_service") if processed_claim_data.get("services") else None
-
-#     if member_id and dos_to_check:
-#         elig_api_ok, elig_data, elig_error = _check_eligibility(member_id, dos_to_check)
-#         if not elig_api_ok:
-#             errors.append(f"Eligibility API call failed: {elig_error}")
-#         elif elig_data and not elig_data.get("is_eligible"):
-#             errors.append(f"Member {member_id} not eligible on {dos_to_check}. Reason: {elig_data.get('reason', 'Not specified')}")
-#             # This is a major validation failure for the claim.
-#             return False, processed_claim_data, errors
-#         elif elig_data: # Eligible
-#             processed_claim_data["member_eligibility"] = elig_data
-#             logger.info(f"[CIVA] Member {member_id} is eligible. Plan ID: {elig_data.get('plan_id')}")
-#         else: # Should not happen if elig_api_ok is True without data
-#             errors.append("Eligibility check inconclusive.")
-#     else:
-#         errors.append("Missing Member ID or Date of Service for eligibility check.")
-#         # This might be a hard stop depending on rules.
-#         return False, processed_claim_data, errors
-
-#     # 5. Provider Network Check (for each provider NPI on each line)
-#     plan_id = processed_claim_data.get("member_eligibility", {}).get("plan_id")
-#     if not plan_id:
-#         errors.append("Cannot check provider network status without Plan ID from eligibility.")
-#     else:
-#         for line in processed_claim_data.get("services", []):
-#             npi = line.get("provider_npi")
-#             if npi:
-#                 net_api_ok, net_data, net_error = _check_network_status(npi, plan_id)
-#                 if not net_api_ok:
-#                     errors.append(f"Network check API call failed for NPI {npi}: {net_error}")
-#                     line["network_status"] = "Error checking status"
-#                 elif net_data:
-#                     line["network_status"] = net_data.get("network_status")
-#                     logger.info(f"[CIVA] Provider NPI {npi} network status: {line['network_status']}")
-#                 else:
-#                     line["network_status"] = "Unknown"
-#             else:
-#                 errors.append(f"Line with CPT {line.get('cpt_code')} missing Provider NPI for network check.")
-#                 line["network_status"] = "Missing NPI"
-
-
-#     if errors:
-#         logger.info(f"[CIVA] Validation completed with errors: {errors}")
-#         return False, processed_claim_data, errors
-
-#     logger.info("[CIVA] All intake and validation checks passed successfully.")
-#     return True, processed_claim_data, ["Validation successful."]
-
-
-# # ---- Example Usage ----
-# if __name__ == "__main__":
-#     # --- Example Claim Data (output from FCA) ---
-#     fca_output_claim_1 = {
-#         "member_id": "MEMBER789",
-#         "patient_name": "Carol Danvers",
-#         "services": [
-#             {
-#                 "date_of_service": "2023-10-26",
-#                 "cpt_code": "99203",
-#                 "icd_10_code": "R07.9", # Chest pain
-#                 "provider_npi": "1112223333",
-#                 "charge_amount": 150.00
-#             }
-#         ]
-#     }
-#     logger.info("\n--- Scenario 1: Standard Claim  ---")
-#     success, processed_claim_data, messages_1 = process_claim_submission(submission_type='structured', claim_info=fca_output_claim_1)
-
-#     logger.info(f"\nCIVA Scenario1 Final Status: {'Success' if success else 'Failed'}")
-#     logger.info(f"Messages: {messages_1}")
-
-#     fca_output_claim_2 = {
-#         "member_id": "MEMBER456",
-#         "patient_name": "Sarah Member",
-#         "services": [
-#             {
-#                 "date_of_service": "2023-10-26",
-#                 "cpt_code": "99214",
-#                 "icd_10_code": "M54.5",
-#                 "provider_npi": "1234567890",
-#                 "charge_amount": 250.0
-#             },
-#             {
-#                 "date_of_service": "2023-10-26",
-#                 "cpt_code": "80053",
-#                 "provider_npi": "0987654321",
-#                 "charge_amount": 120.0
-#             }
-#         ]
-#     }
-#     logger.info("\n--- Scenario 2: Standard Claim  ---")
-#     success, processed_claim_data, messages_2 = process_claim_submission(submission_type='structured', claim_data=fca_output_claim_2)
-
-#     logger.info(f"\nCIVA Scenario 2 Final Status: {'Success' if success else 'Failed'}")
-#     logger.info(f"Messages: {messages_2}")
-    
\ No newline at end of file
@@ -0,0 +1,267 @@
+"""
+Multi-process claim processing with member affinity.
+
+Adjudication reads and updates the accumulators of the claim's member and family, so two claims of one family
+must not run at the same time, and must be applied in submission order. ClaimWorkerPool runs the claim pipeline
+(claim_pipeline.process_claims_batch) in N worker processes and sends every claim to a worker chosen by a stable
+hash of its member's family id (the member id for members without a family): a family's claims always go to the same
+worker and are processed there in order, so workers never contend for the same accumulators and need no locking
+between them. A worker picks up the claims already waiting in its queue as one batch (up to batch_size).
+
+- Backpressure: each worker has a bounded queue (queue_depth claims); submit() blocks while the claim's worker is
+  full, or raises queue.Full after its timeout.
+- Graceful drain: close() stops accepting claims, lets every worker finish the claims already queued, flushes the
+  result store (see ADJUDICATION_RESULT_STORE) and waits for the workers to exit. Workers ignore SIGINT, so Ctrl-C in
+  the parent drains the pool instead of killing claims mid-update.
+- A worker that dies fails its outstanding claims with an error result instead of leaving them waiting.
+
+Workers are separate processes with their own caches and, unless ACCUMULATOR_DB_PATH points them at a shared
+SQLiteAccumulatorStore, their own in-memory accumulators (which sharding keeps consistent per family, but which are
+discarded when the pool closes). Workers are started with "spawn", so state set up in the parent at runtime (e.g.
+installed mock data) must be recreated by the initializer.
+
+Workers import the claim tools with the parent's environment, except for the fee schedule: they open the build the
+parent prices with (policy_adjudication_tools.FEE_SCHEDULE, including one installed at runtime) instead of indexing
+FEE_SCHEDULE_PATH again, and price without one if the parent has none. A schedule installed after the pool started
+does not reach its workers.
+
+The accumulator journal (ACCUMULATOR_JOURNAL_PATH) is not supported: every worker would inherit the path and append
+to, compact and recover from the same file with no locking between processes, so one worker's compaction would drop
+the others' records. The pool refuses to start while it is set.
+
+Worker start-up (spawn and imports, a second or more per worker) and pickling claims and results through the queues
+make the pool slower than process_claims_batch in-process on a single core; it pays off with several cores and
+workloads long enough to amortize the start-up.
+
+    with ClaimWorkerPool(workers=4) as pool:
+        results = pool.process_claims(claims)  # in input order, as from process_claims_batch
+"""
+import contextlib
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future
+
+import policy_adjudication_tools
+from claim_pipeline import _parse_claim, process_claims_batch
+from policy_adjudication_tools import OUTPUT_MODES, _check_output_mode, _family_of, flush_adjudication_results
+
+logger = logging.getLogger(__name__)
+
+# Claims waiting per worker before submit() blocks
+QUEUE_DEPTH = 256
+# Most claims a worker takes from its queue into one process_claims_batch call
+BATCH_SIZE = 64
+# How often blocked submits and the result collector check that the workers are still alive
+_LIVENESS_POLL_SECONDS = 0.5
+# Serializes the environment changes around starting workers (see _worker_environment)
+_ENVIRONMENT_LOCK = threading.Lock()
+
+
+def shard_key(claim: dict) -> str:
+    """Key claims are sharded by: the member's family id, so claims sharing accumulators share a worker."""
+    return _family_of(str(claim.get("member_id") or ""))[0]
+
+
+def shard_of(key: str, shards: int) -> int:
+    # Stable across processes and runs, unlike hash() of a str
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big") % shards
+
+
+@contextlib.contextmanager
+def _worker_environment(overrides: dict[str, str | None]):
+    # Spawned workers copy os.environ when they start and read their configuration from it at import, before any
+    # initializer runs; None removes the variable
+    with _ENVIRONMENT_LOCK:
+        saved = {name: os.environ.get(name) for name in overrides}
+        try:
+            for name, value in overrides.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            yield
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def _worker_main(worker_index: int, tasks, results, batch_size: int, output_mode: str, initializer, initargs):
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # The parent decides when to stop (see ClaimWorkerPool.close)
+    if initializer is not None:
+        initializer(*initargs)
+    draining = False
+    while not draining:
+        task = tasks.get()
+        if task is None:
+            break
+        batch = [task]
+        while len(batch) < batch_size:
+            try:
+                task = tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                draining = True
+                break
+            batch.append(task)
+        try:
+            outcomes = process_claims_batch([claim for _, claim in batch], output_mode=output_mode)
+        except Exception as e:
+            logger.exception("[ClaimWorker %s] Failed to process a batch of %s claim(s).", worker_index, len(batch))
+            outcomes = [(False, None, [f"Claim worker {worker_index} failed: {e}"])] * len(batch)
+        results.put([(task_id, outcome) for (task_id, _), outcome in zip(batch, outcomes)])
+    flush_adjudication_results()
+    logger.info("[ClaimWorker %s] Drained.", worker_index)
+
+
+class ClaimWorkerPool:
+    """
+    Claim pipeline sharded over worker processes by member family (see module docstring).
+
+    :param workers: number of worker processes (default: CPU count)
+    :param queue_depth: claims that may wait per worker before submit() blocks
+    :param batch_size: most claims a worker processes in one process_claims_batch call
+    :param output_mode: output mode of every result (see render_adjudication); "summary" sends the least data back
+    :param initializer: called with initargs in each worker before it takes claims
+    """
+    def __init__(self, workers: int | None = None, queue_depth: int = QUEUE_DEPTH, batch_size: int = BATCH_SIZE,
+                 output_mode: str = "full", initializer=None, initargs: tuple = ()):
+        _check_output_mode(output_mode)
+        if output_mode == "stream":
+            raise ValueError(f"Output mode 'stream' cannot be sent between processes, use one of {OUTPUT_MODES[:2]}.")
+        if os.environ.get("ACCUMULATOR_JOURNAL_PATH"):
+            raise ValueError("ClaimWorkerPool cannot run with ACCUMULATOR_JOURNAL_PATH set: the workers would share one "
+                             "journal file (see the claim_worker_pool module docstring).")
+        self.workers = workers or os.cpu_count() or 1
+        context = multiprocessing.get_context("spawn") # fork would copy the parent's thread pools in a broken state
+        self._results = context.Queue()
+        self._tasks = [context.Queue(maxsize=queue_depth) for _ in range(self.workers)]
+        self._processes = [
+            context.Process(
+                target=_worker_main, name=f"claim-worker-{index}", daemon=True,
+                args=(index, tasks, self._results, batch_size, output_mode, initializer, initargs),
+            )
+            for index, tasks in enumerate(self._tasks)
+        ]
+        fee_schedule = policy_adjudication_tools.FEE_SCHEDULE
+        with _worker_environment({"FEE_SCHEDULE_PATH": fee_schedule.index_dir if fee_schedule is not None else None}):
+            for process in self._processes:
+                process.start()
+        self._lock = threading.Lock()
+        self._pending: dict[int, tuple[Future, int]] = {} # task id -> (future, worker index)
+        self._task_ids = 0
+        self._failed_workers: set[int] = set()
+        self._closed = False
+        self._collector = threading.Thread(target=self._collect, name="claim-worker-results", daemon=True)
+        self._collector.start()
+        logger.info("[ClaimWorkerPool] Started %s worker(s).", self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, claim: dict | str, timeout: float | None = None) -> Future:
+        """
+        Queues a claim (dict, or JSON string) on its family's worker. Blocks while that worker's queue is full;
+        raises queue.Full if it is still full after timeout seconds.
+        :returns: a Future of the (success_status, claim_data, messages) result of process_claim
+        """
+        future = Future()
+        parsed, parse_err = _parse_claim(claim)
+        if parse_err:
+            future.set_result((False, None, [parse_err]))
+            return future
+        worker_index = shard_of(shard_key(parsed), self.workers)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Cannot submit claims to a closed ClaimWorkerPool.")
+            task_id = self._task_ids
+            self._task_ids += 1
+            self._pending[task_id] = (future, worker_index)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if worker_index in self._failed_workers:
+                self._fail_pending([task_id], worker_index)
+                break
+            wait = _LIVENESS_POLL_SECONDS if deadline is None else min(_LIVENESS_POLL_SECONDS, deadline - time.monotonic())
+            try:
+                self._tasks[worker_index].put((task_id, parsed), timeout=max(wait, 0))
+                break
+            except queue.Full:
+                if deadline is not None and time.monotonic() >= deadline:
+                    with self._lock:
+                        self._pending.pop(task_id, None)
+                    raise
+        return future
+
+    def process_claims(self, claims: list[dict | str]) -> list[tuple[bool, dict | None, list[str]]]:
+        """Submits every claim and waits for the results. :returns: results in input order"""
+        futures = [self.submit(claim) for claim in claims]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Stops accepting claims, waits for the queued claims to be processed, then stops the workers."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        logger.info("[ClaimWorkerPool] Draining %s worker(s).", self.workers)
+        for worker_index, tasks in enumerate(self._tasks):
+            while worker_index not in self._failed_workers:
+                try:
+                    tasks.put(None, timeout=_LIVENESS_POLL_SECONDS)
+                    break
+                except queue.Full:
+                    continue
+        for process in self._processes:
+            process.join()
+        self._results.put(None) # After every worker's results: the collector can stop
+        self._collector.join()
+
+    def _collect(self):
+        while True:
+            try:
+                outcomes = self._results.get(timeout=_LIVENESS_POLL_SECONDS)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if outcomes is None:
+                break
+            with self._lock:
+                futures = [(self._pending.pop(task_id)[0], outcome) for task_id, outcome in outcomes]
+            for future, outcome in futures:
+                future.set_result(outcome)
+        # Whatever is still pending belongs to workers that exited without finishing it
+        self._check_workers(closing=True)
+
+    def _check_workers(self, closing: bool = False):
+        for worker_index, process in enumerate(self._processes):
+            if worker_index in self._failed_workers or process.is_alive():
+                continue
+            if not closing and process.exitcode == 0:
+                continue # Drained; its last results may still be on the way
+            self._failed_workers.add(worker_index)
+            with self._lock:
+                lost = [task_id for task_id, (_, index) in self._pending.items() if index == worker_index]
+            if lost:
+                logger.error("[ClaimWorkerPool] Worker %s exited (code %s) with %s claim(s) unprocessed.",
+                             worker_index, process.exitcode, len(lost))
+            self._fail_pending(lost, worker_index)
+
+    def _fail_pending(self, task_ids: list[int], worker_index: int):
+        with self._lock:
+            futures = [entry[0] for entry in (self._pending.pop(task_id, None) for task_id in task_ids) if entry is not None]
+        exitcode = self._processes[worker_index].exitcode
+        for future in futures:
+            future.set_result((False, None, [f"Claim worker {worker_index} exited unexpectedly (exit code {exitcode})."]))
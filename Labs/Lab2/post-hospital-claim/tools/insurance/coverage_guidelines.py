@@ -0,0 +1,196 @@
+"""
+Coverage guideline rules matched by CPT range and ICD-10 category.
+
+A rule gives the coverage status of a set of code combinations:
+
+    {"cpt": "99202-99215", "icd": "M54.*", "coverage_status": "Generally Payable", "priority": 0}
+
+- cpt: one code ("99214"), an inclusive range of codes of the same length ("99202-99215"), or "*" for any code
+- icd: one code ("M54.5"), a category prefix ("M54.*" - M54 and every code under it), or "*" for any code;
+  dots are ignored, so "M54.5" and "M545" are the same code
+- priority: optional, default 0
+
+When several rules match a line, the highest priority wins; among equal priorities the most specific ICD pattern
+(exact code, then the longest prefix), then the most specific CPT pattern (exact code, range, any), then the rule
+listed first.
+
+GuidelineIndex compiles the rules once: the CPT ranges are cut into non-overlapping segments (a bisect finds the
+line's segment), and each segment has a trie over the ICD characters whose nodes already hold the best rule for
+every code under them, so a match is one bisect plus one step per ICD character.
+
+    index = GuidelineIndex(rules_from_exact({"99214_M54.5": "Generally Payable"}) + rules)
+    index.coverage_status("99213", "M54.16", default="Requires Review - Unknown Code Combo")
+"""
+from bisect import bisect_right
+
+from ttl_cache import TTLCache
+
+# Ranks of the pattern kinds (higher is more specific)
+_ICD_EXACT_SPECIFICITY = 1_000
+_CPT_EXACT, _CPT_RANGE, _CPT_ANY = 2, 1, 0
+_RANGE_END = "\x00"
+# Distinct (CPT, ICD) results remembered per index (least recently used dropped first); lines repeat the same few
+# combinations
+MATCH_MEMO_MAX_SIZE = 65_536
+_NOT_MEMOIZED = object()
+
+
+class GuidelineRule:
+    __slots__ = ("cpt", "icd", "coverage_status", "priority", "cpt_range", "icd_code", "icd_is_prefix", "rank")
+
+    def __init__(self, cpt: str, icd: str, coverage_status: str, priority: int = 0, order: int = 0):
+        """Raises ValueError for a malformed CPT or ICD pattern."""
+        self.cpt = cpt
+        self.icd = icd
+        self.coverage_status = coverage_status
+        self.priority = priority
+        self.cpt_range, cpt_specificity = _parse_cpt_pattern(cpt)
+        self.icd_code, self.icd_is_prefix = _parse_icd_pattern(icd)
+        icd_specificity = len(self.icd_code) if self.icd_is_prefix else _ICD_EXACT_SPECIFICITY
+        self.rank = (priority, icd_specificity, cpt_specificity, -order)
+
+    def __repr__(self) -> str:
+        return f"GuidelineRule({self.cpt!r}, {self.icd!r}, {self.coverage_status!r}, priority={self.priority})"
+
+
+def _normalize_icd(code: str) -> str:
+    return code.replace(".", "").strip().upper()
+
+
+def _parse_cpt_pattern(pattern: str) -> tuple[tuple[str, str] | None, int]:
+    # ((low, high) or None for any code, specificity)
+    pattern = pattern.strip().upper()
+    if pattern == "*":
+        return None, _CPT_ANY
+    low, separator, high = pattern.partition("-")
+    if not separator:
+        if not pattern:
+            raise ValueError("Empty CPT pattern in coverage guideline rule.")
+        return (pattern, pattern), _CPT_EXACT
+    low, high = low.strip(), high.strip()
+    if not low or len(low) != len(high) or low > high:
+        raise ValueError(f"Invalid CPT range '{pattern}': the bounds must have the same length and be in order.")
+    return (low, high), _CPT_RANGE
+
+
+def _parse_icd_pattern(pattern: str) -> tuple[str, bool]:
+    # (normalized code or prefix, is_prefix); "*" is the empty prefix
+    pattern = pattern.strip()
+    is_prefix = pattern.endswith("*")
+    code = _normalize_icd(pattern[:-1] if is_prefix else pattern)
+    if not code and not is_prefix:
+        raise ValueError("Empty ICD-10 pattern in coverage guideline rule.")
+    if "*" in code:
+        raise ValueError(f"Invalid ICD-10 pattern '{pattern}': '*' is only allowed at the end.")
+    return code, is_prefix
+
+
+def rules_from_exact(guidelines: dict[str, str]) -> list[GuidelineRule]:
+    """Rules for a {"<cpt>_<icd>": coverage_status} table of exact code combinations."""
+    return [
+        GuidelineRule(*key.split("_", 1), coverage_status, order=order) for order, (key, coverage_status) in enumerate(guidelines.items())
+    ]
+
+
+def _better(rule: GuidelineRule | None, other: GuidelineRule | None) -> GuidelineRule | None:
+    if rule is None or (other is not None and other.rank > rule.rank):
+        return other
+    return rule
+
+
+class _IcdTrie:
+    """ICD trie for the rules of one CPT segment; each node holds the best prefix rule for the codes under it."""
+    __slots__ = ("root",)
+
+    def __init__(self, rules: list[GuidelineRule]):
+        # node = [children, best prefix rule on the path to this node, best exact rule ending here]
+        self.root = [{}, None, None]
+        for rule in rules:
+            node = self.root
+            for char in rule.icd_code:
+                node = node[0].setdefault(char, [{}, None, None])
+            if rule.icd_is_prefix:
+                node[1] = _better(node[1], rule)
+            else:
+                node[2] = _better(node[2], rule)
+        # Push prefix rules down so a lookup only needs the deepest node it reaches
+        pending = [(self.root, None)]
+        while pending:
+            node, inherited = pending.pop()
+            node[1] = _better(inherited, node[1])
+            node[2] = _better(node[1], node[2])
+            pending.extend((child, node[1]) for child in node[0].values())
+
+    def match(self, icd_code: str) -> GuidelineRule | None:
+        node = self.root
+        for char in icd_code:
+            child = node[0].get(char)
+            if child is None:
+                return node[1] # Ran off the trie: only prefix rules apply
+            node = child
+        return node[2]
+
+
+class GuidelineIndex:
+    """
+    Compiled coverage guideline rules. Immutable once built (compile a new index to change the rules); safe to share
+    between threads.
+    """
+    def __init__(self, rules: list[GuidelineRule | dict]):
+        self.rules = [
+            rule if isinstance(rule, GuidelineRule) else GuidelineRule(
+                rule["cpt"], rule["icd"], rule["coverage_status"], rule.get("priority", 0), order=order
+            )
+            for order, rule in enumerate(rules)
+        ]
+        any_cpt = [rule for rule in self.rules if rule.cpt_range is None]
+        tries = {} # Segments with the same rules share one trie
+        def trie_for(segment_rules: list[GuidelineRule]) -> _IcdTrie:
+            key = tuple(sorted(id(rule) for rule in segment_rules))
+            if key not in tries:
+                tries[key] = _IcdTrie(segment_rules)
+            return tries[key]
+
+        self._any_cpt_trie = trie_for(any_cpt)
+        # Per CPT code length: sorted segment boundaries and the trie of each segment. A range opens at its low code
+        # and closes at high + _RANGE_END, which sorts right after high among codes of that length;
+        # segment k covers [boundaries[k], boundaries[k + 1]).
+        self._segments: dict[int, tuple[list[str], list[_IcdTrie]]] = {}
+        by_length: dict[int, list[GuidelineRule]] = {}
+        for rule in self.rules:
+            if rule.cpt_range is not None:
+                by_length.setdefault(len(rule.cpt_range[0]), []).append(rule)
+        for length, ranged in by_length.items():
+            boundaries = sorted({rule.cpt_range[0] for rule in ranged} | {rule.cpt_range[1] + _RANGE_END for rule in ranged})
+            covering = [[] for _ in boundaries]
+            for rule in ranged:
+                for k in range(bisect_right(boundaries, rule.cpt_range[0]) - 1, bisect_right(boundaries, rule.cpt_range[1])):
+                    covering[k].append(rule)
+            self._segments[length] = (boundaries, [trie_for(rules + any_cpt) if rules else self._any_cpt_trie for rules in covering])
+        # Shared by the adjudication threads; an index never changes, so entries only leave when evicted
+        self._memo = TTLCache(maxsize=MATCH_MEMO_MAX_SIZE, ttl=float("inf"))
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match(self, cpt_code: str, icd_code: str) -> GuidelineRule | None:
+        """The rule that decides the coverage of the code combination, or None if no rule matches."""
+        key = (cpt_code, icd_code)
+        rule = self._memo.get(key, _NOT_MEMOIZED)
+        if rule is not _NOT_MEMOIZED:
+            return rule
+        cpt = cpt_code.strip().upper()
+        trie = self._any_cpt_trie
+        segments = self._segments.get(len(cpt))
+        if segments is not None:
+            boundaries, tries = segments
+            k = bisect_right(boundaries, cpt) - 1
+            if k >= 0:
+                trie = tries[k]
+        rule = trie.match(_normalize_icd(icd_code))
+        self._memo.put(key, rule)
+        return rule
+
+    def coverage_status(self, cpt_code: str, icd_code: str, default: str | None = None) -> str | None:
+        rule = self.match(cpt_code, icd_code)
+        return default if rule is None else rule.coverage_status
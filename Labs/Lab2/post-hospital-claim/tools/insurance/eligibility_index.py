@@ -0,0 +1,81 @@
+from bisect import bisect_right
+from datetime import date
+
+
+def _date_ordinal(value: str | None, default: int) -> int:
+    return default if value is None else date.fromisoformat(value).toordinal()
+
+
+class EligibilityIndex:
+    """
+    Member coverage spans, queried by date of service.
+
+    Each member has sorted, non-overlapping [start, end] coverage spans (inclusive, ISO dates; end None = open-ended),
+    optionally with their own plan_id, plus a member-level plan_id. A lookup is a bisect over the span starts,
+    so any date can be answered, not just dates someone stored a flag for.
+
+    Records have the MOCK_MEMBER_ELIGIBILITY_DB layout:
+        {"MEMBER123": {"plan_id": "PPO_GOLD", "coverage": [{"start": "2023-01-01", "end": "2023-12-31"}]}}
+    """
+    def __init__(self, records: dict | None = None):
+        self._members = {} # member_id -> (starts, ends, plan_ids, member_plan_id)
+        self.update(records or {})
+
+    def update(self, records: dict):
+        """Adds or replaces members. Raises ValueError for overlapping or inverted spans."""
+        for member_id, record in records.items():
+            member_plan_id = record.get("plan_id")
+            spans = sorted(
+                (_date_ordinal(span["start"], date.min.toordinal()), _date_ordinal(span.get("end"), date.max.toordinal()),
+                 span.get("plan_id", member_plan_id))
+                for span in record.get("coverage", [])
+            )
+            for (start, end, _), (next_start, _, _) in zip(spans, spans[1:] + [(None, None, None)]):
+                if end < start:
+                    raise ValueError(f"Coverage span for {member_id} ends before it starts.")
+                if next_start is not None and next_start <= end:
+                    raise ValueError(f"Coverage spans for {member_id} overlap.")
+            self._members[member_id] = (
+                [start for start, _, _ in spans], [end for _, end, _ in spans], [plan for _, _, plan in spans], member_plan_id
+            )
+
+    def __contains__(self, member_id: str) -> bool:
+        return member_id in self._members
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def lookup(self, member_id: str, date_of_service: str | int) -> tuple[bool, str | None] | None:
+        """
+        (is_eligible, plan_id) on the date (ISO string or date ordinal); None if the member is unknown.
+        plan_id is the covering span's plan, or the member's plan when not covered. Unparseable dates are not covered.
+        """
+        member = self._members.get(member_id)
+        if member is None:
+            return None
+        starts, ends, plan_ids, member_plan_id = member
+        if isinstance(date_of_service, str):
+            try:
+                date_of_service = date.fromisoformat(date_of_service).toordinal()
+            except ValueError:
+                return False, member_plan_id
+        i = bisect_right(starts, date_of_service) - 1
+        if i >= 0 and date_of_service <= ends[i]:
+            return True, plan_ids[i]
+        return False, member_plan_id
+
+    def lookup_many(self, checks: list[tuple[str, str]]) -> dict[tuple[str, str], tuple[bool, str | None] | None]:
+        """lookup() for many (member_id, date_of_service) pairs; each distinct date string is parsed once."""
+        ordinals = {}
+        results = {}
+        for member_id, date_of_service in checks:
+            if (member_id, date_of_service) in results:
+                continue
+            ordinal = ordinals.get(date_of_service)
+            if ordinal is None:
+                try:
+                    ordinal = ordinals[date_of_service] = date.fromisoformat(date_of_service).toordinal()
+                except (TypeError, ValueError):
+                    ordinal = ordinals[date_of_service] = -1 # Before any span: never covered
+            results[(member_id, date_of_service)] = self.lookup(member_id, ordinal)
+        return results
@@ -0,0 +1,35 @@
+"""
+Explanation-of-benefits text for adjudicated claim lines.
+
+Adjudication records what happened on a line as note codes - (code, *args) tuples such as ("copay_applied", 25.0) -
+instead of formatting a sentence at every step. The text is built from them only when an output needs it:
+
+    render_note(("copay_applied", 25.0))  # -> "Applied $25.00 Copay."
+"""
+
+NOTE_TEMPLATES = {
+    # Benefits engine
+    "network_status_defaulted": "Warning: Network status '{0}' treating as Out-of-Network.",
+    "fee_schedule_rate": "Allowed ${0:.2f} per fee schedule {1} (effective {2}).",
+    "copay_applied": "Applied ${0:.2f} Copay.",
+    "family_deductible_limit": "Family deductible (${0:.2f}) limits the deductible applied.",
+    "deductible_applied": "Applied ${0:.2f} towards deductible.",
+    "coinsurance_applied": "Applied {0:.0f}% coinsurance (${1:.2f}).", # (rate in percent, amount)
+    "oop_max_reached": "OOP Max Limit (${0:.2f}) reached. Reducing member responsibility by ${1:.2f}.",
+    "family_oop_max_reached": "Family OOP Max Limit (${0:.2f}) reached. Reducing member responsibility by ${1:.2f}.",
+    # Pre-auth and guideline checks
+    "pre_auth_check_failed": "Pre-auth check failed: {0}",
+    "pre_auth_not_approved": "Pre-authorization required but status is '{0}'.",
+    "pre_auth_approved": "Pre-authorization approved (Auth #: {0}).",
+    "guideline_check_failed": "Guideline check failed: {0}",
+    "guideline_status": "Guideline check: {0}",
+}
+
+
+def render_note(note: tuple) -> str:
+    """The text of one note code. Raises KeyError for an unknown code."""
+    return NOTE_TEMPLATES[note[0]].format(*note[1:])
+
+
+def render_notes(notes) -> list[str]:
+    return [render_note(note) for note in notes]
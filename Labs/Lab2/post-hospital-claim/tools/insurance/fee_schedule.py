@@ -0,0 +1,193 @@
+"""
+Fee-schedule allowed amounts, looked up by (contract, CPT, modifier, date of service).
+
+A schedule source (CSV or Parquet) has one row per rate:
+
+    contract_id,cpt_code,modifier,effective_date,allowed_amount
+    HMO_SILVER_PAR,99214,,2023-01-01,142.50
+    HMO_SILVER_PAR,99214,25,2023-01-01,160.00
+    HMO_SILVER_PAR,99214,,2024-01-01,148.00
+
+build_fee_schedule_index() sorts the rows once and writes them as two NumPy columns (a composite
+"contract|cpt|modifier|effective_date" key and the amount); FeeSchedule maps those files read-only, so a large
+schedule is shared by the page cache between worker processes instead of being parsed into every one of them.
+
+Every build goes into its own directory under the index root, named by a digest of the rates, written completely
+under a temporary name and renamed into place; a build never changes afterwards. A FeeSchedule keeps reading the
+build it opened, a changed schedule is swapped in by opening its new build, and processes building the same
+schedule at once share one directory. Builds of earlier schedules stay in the root until they are deleted (once no
+process reads them).
+
+A lookup is one binary search on the key column: the last rate of the line's contract/CPT/modifier that took
+effect on or before the date of service. A line whose modifier has no rate of its own falls back to the
+contract's unmodified rate.
+
+    schedule = load_fee_schedule("fee_schedule.csv")           # builds the index under fee_schedule.csv.index/
+    schedule.allowed_amount("HMO_SILVER_PAR", "99214", "25", "2023-10-26")  # -> 160.0
+"""
+import csv
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from datetime import date
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FEE_SCHEDULE_COLUMNS = ("contract_id", "cpt_code", "modifier", "effective_date", "allowed_amount")
+KEYS_FILE = "keys.npy"
+AMOUNTS_FILE = "amounts.npy"
+
+# Separates the key parts; sorts below every character allowed in them, so "A|1|" sorts before "A|1|25"
+_KEY_SEPARATOR = "\x1f"
+_ISO_DATE_LENGTH = 10
+
+
+def _rate_prefix(contract_id: str, cpt_code: str, modifier: str | None) -> str:
+    return f"{contract_id}{_KEY_SEPARATOR}{cpt_code}{_KEY_SEPARATOR}{modifier or ''}{_KEY_SEPARATOR}"
+
+
+def read_fee_schedule_rows(source_path: str) -> list[tuple[str, str, str, str, float]]:
+    """Reads (contract_id, cpt_code, modifier, effective_date, allowed_amount) rows from a .csv or .parquet file."""
+    if source_path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Reading Parquet fee schedules requires pyarrow (pip install pyarrow).") from e
+        columns = pq.read_table(source_path, columns=list(FEE_SCHEDULE_COLUMNS)).to_pydict()
+        records = zip(*(columns[name] for name in FEE_SCHEDULE_COLUMNS))
+    else:
+        with open(source_path, newline="", encoding="utf-8") as f:
+            records = [tuple(row.get(name) for name in FEE_SCHEDULE_COLUMNS) for row in csv.DictReader(f)]
+    return [
+        (str(contract_id), str(cpt_code), str(modifier or ""), str(effective_date), float(allowed_amount))
+        for contract_id, cpt_code, modifier, effective_date, allowed_amount in records
+    ]
+
+
+def build_fee_schedule_index(rows, index_root: str) -> str:
+    """
+    Sorts fee-schedule rows into the key/amount columns of a build directory under index_root (see the module
+    docstring); an existing build of the same rates is reused.
+    Raises ValueError for an invalid effective date, a separator character in a key part, or two rates for the
+    same contract/CPT/modifier/effective date.
+    :returns: the build directory, for FeeSchedule
+    """
+    keyed = {}
+    for contract_id, cpt_code, modifier, effective_date, allowed_amount in rows:
+        if any(_KEY_SEPARATOR in part for part in (contract_id, cpt_code, modifier)):
+            raise ValueError(f"Fee schedule key parts cannot contain {_KEY_SEPARATOR!r}: {contract_id}/{cpt_code}/{modifier}")
+        key = _rate_prefix(contract_id, cpt_code, modifier) + date.fromisoformat(effective_date).isoformat()
+        if key in keyed:
+            raise ValueError(f"Duplicate fee schedule rate for {contract_id}/{cpt_code}/{modifier or '-'} effective {effective_date}.")
+        keyed[key] = allowed_amount
+
+    keys = sorted(keyed)
+    columns = {
+        KEYS_FILE: np.array([key.encode() for key in keys], dtype=f"S{max((len(key.encode()) for key in keys), default=1)}"),
+        AMOUNTS_FILE: np.array([keyed[key] for key in keys], dtype=np.float64),
+    }
+    digest = hashlib.blake2b(digest_size=16)
+    for column in columns.values():
+        digest.update(column.dtype.str.encode())
+        digest.update(column.tobytes())
+    index_dir = os.path.join(index_root, digest.hexdigest())
+    if os.path.isdir(index_dir):
+        logger.info("[FeeSchedule] Reusing the index of %s rate(s) in %s", len(keys), index_dir)
+        return index_dir
+
+    os.makedirs(index_root, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=".build-", dir=index_root)
+    try:
+        for name, column in columns.items():
+            with open(os.path.join(staging_dir, name), "wb") as f:
+                np.save(f, column)
+        try:
+            os.rename(staging_dir, index_dir)
+        except OSError:
+            if not os.path.isdir(index_dir):
+                raise
+            # Another process published the same build first
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    logger.info("[FeeSchedule] Indexed %s rate(s) into %s", len(keys), index_dir)
+    return index_dir
+
+
+class FeeSchedule:
+    """
+    Read-only, memory-mapped fee-schedule index written by build_fee_schedule_index().
+    Safe to share between threads; swap in a new schedule by opening a new FeeSchedule, not by mutating one.
+    """
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self._keys = np.load(os.path.join(index_dir, KEYS_FILE), mmap_mode="r")
+        self._amounts = np.load(os.path.join(index_dir, AMOUNTS_FILE), mmap_mode="r")
+        self._key_size = self._keys.dtype.itemsize
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _find(self, prefix: str, date_of_service: str) -> int | None:
+        query = (prefix + date_of_service).encode()
+        if len(query) > self._key_size:
+            return None # Longer than any key, so no rate can have this prefix
+        index = int(np.searchsorted(self._keys, query, side="right")) - 1
+        if index < 0:
+            return None
+        key = self._keys[index]
+        # The nearest key at or below the query is a rate of this contract/CPT/modifier only if it shares the prefix
+        if len(key) != len(query) or not key.startswith(prefix.encode()):
+            return None
+        return index
+
+    def lookup(self, contract_id: str, cpt_code: str, modifier: str | None,
+               date_of_service: str) -> tuple[float, str] | None:
+        """(allowed_amount, effective_date) of the rate in effect on the ISO date of service, or None."""
+        if not (contract_id and cpt_code) or not isinstance(date_of_service, str) or len(date_of_service) != _ISO_DATE_LENGTH:
+            return None
+        for rate_modifier in dict.fromkeys((modifier or "", "")):
+            prefix = _rate_prefix(contract_id, cpt_code, rate_modifier)
+            index = self._find(prefix, date_of_service)
+            if index is not None:
+                return float(self._amounts[index]), self._keys[index][-_ISO_DATE_LENGTH:].decode()
+        return None
+
+    def allowed_amount(self, contract_id: str, cpt_code: str, modifier: str | None, date_of_service: str) -> float | None:
+        rate = self.lookup(contract_id, cpt_code, modifier, date_of_service)
+        return None if rate is None else rate[0]
+
+    def allowed_amounts(self, contract_ids, cpt_codes, modifiers, dates_of_service) -> np.ndarray:
+        """
+        Vectorized allowed_amount for many lines (e.g. as the allowed input of vectorized_adjudication);
+        NaN where no rate applies.
+        """
+        amounts = np.full(len(contract_ids), np.nan)
+        for use_modifier in (True, False):
+            pending = np.flatnonzero(np.isnan(amounts))
+            if not len(pending) or not len(self._keys):
+                break
+            prefixes = np.array([
+                _rate_prefix(contract_ids[i], cpt_codes[i], modifiers[i] if use_modifier else "").encode() for i in pending.tolist()
+            ])
+            queries = np.char.add(prefixes, np.array([str(dates_of_service[i]).encode() for i in pending.tolist()]))
+            searchable = np.char.str_len(queries) <= self._key_size
+            pending, prefixes, queries = pending[searchable], prefixes[searchable], queries[searchable]
+            indexes = np.searchsorted(self._keys, queries.astype(self._keys.dtype), side="right") - 1
+            keys = self._keys[np.maximum(indexes, 0)]
+            matched = (indexes >= 0) & (np.char.str_len(keys) == np.char.str_len(queries)) & np.char.startswith(keys, prefixes)
+            amounts[pending[matched]] = self._amounts[indexes[matched]]
+        return amounts
+
+
+def load_fee_schedule(source_path: str, index_root: str | None = None) -> FeeSchedule:
+    """
+    Opens a fee schedule: a directory is taken to be a build (FeeSchedule.index_dir), a .csv/.parquet file is
+    indexed first (under index_root, default "<source>.index").
+    """
+    if os.path.isdir(source_path):
+        return FeeSchedule(source_path)
+    return FeeSchedule(build_fee_schedule_index(read_fee_schedule_rows(source_path), index_root or f"{source_path}.index"))
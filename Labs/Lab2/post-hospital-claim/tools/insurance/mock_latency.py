@@ -0,0 +1,49 @@
+"""
+Simulated network latency of the mock external APIs.
+
+The mock API functions call mock_latency(seconds) instead of time.sleep(). MOCK_API_LATENCY_SCALE (default 1)
+multiplies every delay: 1 keeps the realistic latencies, 0 removes them (benchmarks of the CPU-bound paths).
+Async callers run a mock inside deferred_mock_latency() and await async_mock_latency() for the collected delay,
+so the simulated latency does not block their event loop.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+_latency_scale = float(os.environ.get("MOCK_API_LATENCY_SCALE", "1"))
+_deferred_delays = contextvars.ContextVar("deferred_mock_latency", default=None)
+
+
+def set_mock_latency_scale(scale: float):
+    global _latency_scale
+    _latency_scale = scale
+
+
+def get_mock_latency_scale() -> float:
+    return _latency_scale
+
+
+def mock_latency(seconds: float):
+    deferred = _deferred_delays.get()
+    if deferred is not None:
+        deferred.append(seconds)
+    elif _latency_scale > 0:
+        time.sleep(seconds * _latency_scale)
+
+
+@contextmanager
+def deferred_mock_latency():
+    """Collects the mock_latency() delays of the enclosed calls instead of sleeping. Yields the list of delays."""
+    delays = []
+    token = _deferred_delays.set(delays)
+    try:
+        yield delays
+    finally:
+        _deferred_delays.reset(token)
+
+
+async def async_mock_latency(seconds: float):
+    if _latency_scale > 0 and seconds > 0:
+        await asyncio.sleep(seconds * _latency_scale)
@@ -0,0 +1,187 @@
+"""
+Plan what-if simulator: adjudicates a claims corpus against plan-parameter variants
+(e.g. "PPO_GOLD with a 750 deductible") and reports cost distributions per variant.
+
+Pre-auth and guideline results do not depend on plan parameters, so they are fetched once (bulk) in the parent
+together with the starting accumulators. Variants then run in parallel worker processes that receive the parsed
+claims once at start-up and only read them; nothing is written back to the accumulator store.
+"""
+import copy
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from policy_adjudication_tools import (
+    BenefitsEngineTool,
+    CorePolicySystemAPIClient,
+    MedicalGuidelinesTool,
+    PreAuthorizationDBClient,
+    _adjudicate_claim_for_family,
+    _get_claim_header,
+    claim_benefit_years,
+)
+
+logger = logging.getLogger(__name__)
+
+# Corpus shared read-only by the worker processes, set once per worker by _init_worker
+_corpus = None
+
+
+def build_variant_policy(base_policy: dict, overrides: dict | None = None, benefit_overrides: dict | None = None) -> dict:
+    """
+    Returns a copy of base_policy with top-level fields (e.g. deductible_individual) replaced by overrides
+    and benefit rules updated per key from benefit_overrides (e.g. {"Lab_InNetwork": {"copay": 20}}).
+    """
+    policy = copy.deepcopy(base_policy)
+    policy.update(overrides or {})
+    for benefit_key, rule_overrides in (benefit_overrides or {}).items():
+        policy["benefits"].setdefault(benefit_key, {}).update(rule_overrides)
+    return policy
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _init_worker(corpus: dict, quiet: bool = True):
+    global _corpus
+    _corpus = corpus
+    if quiet:
+        logging.disable(logging.INFO) # Per-line INFO logs would dominate simulation time in the workers
+
+
+def _simulate_variant(variant: dict) -> dict:
+    corpus = _corpus
+    policies = dict(corpus["policies"]) # (plan_id, benefit_year) -> policy
+    if variant.get("plan_id"):
+        for plan_id, benefit_year in corpus["policies"]:
+            if plan_id == variant["plan_id"]:
+                policies[(plan_id, benefit_year)] = build_variant_policy(
+                    corpus["policies"][(plan_id, benefit_year)], variant.get("overrides"), variant.get("benefit_overrides")
+                )
+
+    benefits_engine = BenefitsEngineTool()
+    preauth_results = corpus["preauth_results"]
+    guideline_results = corpus["guideline_results"]
+    # Family accumulators (keyed by (member_id, benefit_year)) advance claim by claim within this variant only
+    running_accumulators = copy.deepcopy(corpus["accumulators"])
+    claim_member_responsibility = []
+    total_insurer_payment = 0.0
+    denied_lines = 0
+    for claim, (member_id, benefit_year, plan_id) in zip(corpus["claims"], corpus["headers"]):
+        # Each variant adjudicates its own copy of the claim; the shared corpus stays untouched
+        adjudicated_data = claim.copy()
+        adjudicated_data["services"] = [line.copy() for line in claim.get("services", [])]
+        _adjudicate_claim_for_family(
+            adjudicated_data,
+            member_id,
+            benefit_year,
+            {year: policies[(plan_id, year)] for year in claim_benefit_years(adjudicated_data["services"], benefit_year)},
+            running_accumulators,
+            lambda cpt, icd, member_id=member_id: preauth_results[(member_id, cpt, icd)],
+            lambda cpt, icd: guideline_results[(cpt, icd)],
+            benefits_engine,
+        )
+        summary = adjudicated_data["claim_summary"]
+        claim_member_responsibility.append(summary["total_member_responsibility"])
+        total_insurer_payment += summary["total_insurer_payment"]
+        denied_lines += sum(1 for line in adjudicated_data["services"] if line.get("line_status", "").startswith("Denied"))
+
+    claim_member_responsibility.sort()
+    claims_count = len(claim_member_responsibility)
+    total_member_responsibility = sum(claim_member_responsibility)
+    return {
+        "variant": variant.get("name", variant.get("plan_id", "baseline")),
+        "claims": claims_count,
+        "denied_lines": denied_lines,
+        "total_member_responsibility": round(total_member_responsibility, 2),
+        "total_insurer_payment": round(total_insurer_payment, 2),
+        "member_responsibility_per_claim": {
+            "mean": round(total_member_responsibility / claims_count, 2) if claims_count else 0.0,
+            "p50": _percentile(claim_member_responsibility, 50),
+            "p90": _percentile(claim_member_responsibility, 90),
+            "p99": _percentile(claim_member_responsibility, 99),
+            "max": claim_member_responsibility[-1] if claims_count else 0.0,
+        },
+    }
+
+
+def _prepare_corpus(claims: list[dict]) -> tuple[dict, int]:
+    """Parses claim headers and bulk-fetches everything that does not depend on plan parameters."""
+    policy_client = CorePolicySystemAPIClient()
+    parsed = []
+    for claim in claims:
+        ok, member_id, benefit_year, plan_id, _ = _get_claim_header(claim)
+        if ok:
+            parsed.append((claim, (member_id, benefit_year, plan_id)))
+
+    # Policies per (plan, benefit year): a claim spanning benefit years uses each year's policy
+    claim_plan_years = [
+        [(plan_id, year) for year in claim_benefit_years(claim.get("services", []), benefit_year)]
+        for claim, (_, benefit_year, plan_id) in parsed
+    ]
+    policies = {
+        plan_year: policy
+        for plan_year, (policy_ok, policy, _) in policy_client.get_member_policy_details_bulk(
+            [plan_year for plan_years in claim_plan_years for plan_year in plan_years]
+        ).items()
+        if policy_ok
+    }
+    # Claims that could not be adjudicated at all (missing header data, unknown plan) are left out
+    usable = [all(plan_year in policies for plan_year in plan_years) for plan_years in claim_plan_years]
+    usable_claims = [claim for (claim, _), ok in zip(parsed, usable) if ok]
+    headers = [header for (_, header), ok in zip(parsed, usable) if ok]
+    skipped = len(claims) - len(usable_claims)
+    accumulators = {
+        member_year: family
+        for member_year, (_, family, _) in policy_client.get_family_accumulators_bulk(
+            [(member_id, year) for claim, (member_id, benefit_year, _) in zip(usable_claims, headers)
+             for year in claim_benefit_years(claim.get("services", []), benefit_year)]
+        ).items()
+    }
+    preauth_checks = []
+    guideline_checks = []
+    for claim, (member_id, _, _) in zip(usable_claims, headers):
+        for line in claim.get("services", []):
+            cpt = line.get("cpt_code")
+            icd = line.get("icd_10_code", "Unknown")
+            preauth_checks.append((member_id, cpt, icd))
+            guideline_checks.append((cpt, icd))
+    corpus = {
+        "claims": usable_claims,
+        "headers": headers,
+        "policies": policies,
+        "accumulators": accumulators,
+        "preauth_results": PreAuthorizationDBClient().check_pre_auth_status_bulk(preauth_checks) if preauth_checks else {},
+        "guideline_results": MedicalGuidelinesTool().check_coverage_guidelines_bulk(guideline_checks) if guideline_checks else {},
+    }
+    return corpus, skipped
+
+
+def simulate_plan_variants(claims: list[dict], variants: list[dict], max_workers: int | None = None) -> list[dict]:
+    """
+    Adjudicates the claims (validated claim dicts, as for adjudicate_claims_batch) against every plan variant.
+
+    Each variant is {"name": ..., "plan_id": ..., "overrides": {...}, "benefit_overrides": {...}}; claims on other
+    plans are adjudicated with their unchanged policy, so totals stay comparable across variants. Include a variant
+    without "plan_id" to get the baseline. Policies are looked up per (plan_id, benefit_year), and a variant's
+    overrides apply to its plan's policy of every benefit year in the corpus. Accumulators start from the current core-system values for every variant.
+
+    :returns: one aggregate per variant (in input order) with total member/insurer cost and the per-claim member
+              responsibility distribution (mean, p50, p90, p99, max)
+    """
+    corpus, skipped = _prepare_corpus(claims)
+    logger.info("[PlanSimulator] Simulating %s variant(s) over %s claim(s), %s skipped.", len(variants), len(corpus['claims']), skipped)
+    for variant in variants:
+        if variant.get("plan_id") and not any(plan_id == variant["plan_id"] for plan_id, _ in corpus["policies"]):
+            raise ValueError(f"Variant plan '{variant['plan_id']}' has no claims in the corpus or is unknown.")
+
+    max_workers = max_workers or min(len(variants), os.cpu_count() or 1)
+    if max_workers <= 1:
+        _init_worker(corpus, quiet=False)
+        return [_simulate_variant(variant) for variant in variants]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(corpus,)) as executor:
+        return list(executor.map(_simulate_variant, variants))
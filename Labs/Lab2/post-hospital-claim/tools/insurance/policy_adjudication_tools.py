@@ -1,5 +1,12 @@
+import atexit
+import contextlib
+import functools
+import hashlib
 import json
+import os
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
 # from enum import Enum
@@ -7,14 +14,56 @@ import logging
 from ibm_watsonx_orchestrate.agent_builder.tools import tool, ToolPermission
 # import requests
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Creating an object
-logger = logging.getLogger()
-
-# Setting the threshold of logger to DEBUG
-logger.setLevel(logging.INFO)
+from accumulator_journal import AccumulatorJournal
+from adjudication_results import AdjudicationResultStore
+from accumulator_store import DEFAULT_ACCUMULATORS, AccumulatorStore, InMemoryAccumulatorStore, SQLiteAccumulatorStore
+import claim_logging  # noqa: F401 - applies CLAIM_TOOLS_LOG_LEVEL on import
+from claim_metrics import span
+from claim_transport import AsyncTransport, HTTPTransport, InProcessTransport, run_exchange, run_exchange_sync
+from coverage_guidelines import GuidelineIndex, rules_from_exact
+from eob_notes import render_notes
+from fee_schedule import FeeSchedule, load_fee_schedule
+from mock_latency import mock_latency
+from ttl_cache import TTLCache
+
+# Logging is configured by the host process (see claim_logging); records are only formatted if emitted
+logger = logging.getLogger(__name__)
+
+
+# Shared pool used to fan out the independent per-line lookups (pre-auth, guidelines) of a claim
+LINE_CHECK_MAX_WORKERS = 16
+_line_check_executor = ThreadPoolExecutor(max_workers=LINE_CHECK_MAX_WORKERS, thread_name_prefix="pbaa-line-check")
+
+
+# Process-wide policy cache keyed by (plan_id, plan_year). Plan definitions only change once a plan year,
+# so the TTL mainly bounds how long an edited plan can be served stale without an explicit invalidation.
+POLICY_CACHE_MAX_SIZE = 512
+POLICY_CACHE_TTL_SECONDS = 6 * 60 * 60
+POLICY_CACHE = TTLCache(maxsize=POLICY_CACHE_MAX_SIZE, ttl=POLICY_CACHE_TTL_SECONDS)
+
+
+# Adjudication results by claim fingerprint, so a repeated submission of the same claim (e.g. a conversational
+# retry) returns the prior adjudication instead of applying the claim to the accumulators a second time.
+# LRU-bounded; the TTL only needs to outlive the window in which a claim is realistically resubmitted.
+ADJUDICATION_RESULT_CACHE_MAX_SIZE = 10_000
+ADJUDICATION_RESULT_CACHE_TTL_SECONDS = 24 * 60 * 60
+ADJUDICATION_RESULT_CACHE = TTLCache(maxsize=ADJUDICATION_RESULT_CACHE_MAX_SIZE, ttl=ADJUDICATION_RESULT_CACHE_TTL_SECONDS)
+
+# The pre-auth service's (CPT, ICD) requirement table, loaded once and kept in memory: lines whose code combination
+# can never require pre-auth skip the per-member authorization lookup. A table that failed to load is retried
+# after the shorter TTL; meanwhile every line is checked with the service.
+PRE_AUTH_REQUIREMENTS_TTL_SECONDS = 6 * 60 * 60
+PRE_AUTH_REQUIREMENTS_RETRY_SECONDS = 30
+PRE_AUTH_REQUIREMENTS_CACHE = TTLCache(maxsize=1, ttl=PRE_AUTH_REQUIREMENTS_TTL_SECONDS)
+
+# What an adjudication returns: "full" - every line with its notes rendered as text, "summary" - the claim without
+# its lines (claim_summary, status, eligibility), "stream" - like full, but "services" is a generator that renders
+# one line at a time as it is consumed (in-process callers only; it is not JSON-serializable)
+OUTPUT_MODES = ("full", "summary", "stream")
+# Modes the @tool entry points accept: a tool result must be JSON-serializable
+TOOL_OUTPUT_MODES = ("full", "summary")
+# Line fields holding note codes; outputs render them into "notes" / "processing_messages"
+LINE_NOTE_CODE_FIELDS = {"note_codes": "notes", "message_codes": "processing_messages"}
 
 
 # ---- MOCK EXTERNAL DATABASES / APIs ----
@@ -35,7 +84,8 @@ MOCK_POLICY_DB = {
             "Inpatient_InNetwork": {"deductible_applies": True, "coinsurance": 0.2}, # 20% after ded
             "Default_InNetwork": {"deductible_applies": True, "coinsurance": 0.2}, # Default rule
             "Default_OutOfNetwork": {"deductible_applies": True, "coinsurance": 0.4},
-        }
+        },
+        "fee_schedule_contracts": {"In-Network": "HMO_SILVER_PAR"}, # Fee schedule contract per network status
     },
     "PPO_GOLD": {
          "plan_year": 2023,
@@ -50,7 +100,8 @@ MOCK_POLICY_DB = {
             "Lab_OutOfNetwork": {"deductible_applies": True, "coinsurance": 0.3},
             "Default_InNetwork": {"deductible_applies": True, "coinsurance": 0.1},
             "Default_OutOfNetwork": {"deductible_applies": True, "coinsurance": 0.3},
-        }
+        },
+        "fee_schedule_contracts": {"In-Network": "PPO_GOLD_PAR", "Out-of-Network": "PPO_GOLD_UCR"},
     }
 }
 
@@ -58,8 +109,58 @@ MOCK_POLICY_DB = {
 MOCK_ACCUMULATORS_DB = {
     "MEMBER456_2023": {"deductible_met_individual": 200.00, "oop_max_met_individual": 350.00},
     "MEMBER123_2023": {"deductible_met_individual": 0.00, "oop_max_met_individual": 50.00},
-    # Add family accumulators if needed
+    "MEMBER600_2023": {"deductible_met_individual": 200.00, "oop_max_met_individual": 350.00},
+    "MEMBER601_2023": {"deductible_met_individual": 1500.00, "oop_max_met_individual": 2600.00},
+    "MEMBER602_2023": {"deductible_met_individual": 1100.00, "oop_max_met_individual": 1250.00},
+    # Family accumulators are the sums of the family members' individual records
+}
+
+# Mock Family Enrollment - members covered under the same subscriber share the plan's family deductible/OOP max.
+# Members not listed are a family of one.
+MOCK_FAMILY_DB = {
+    "FAMILY600": ["MEMBER600", "MEMBER601", "MEMBER602"],
 }
+MEMBER_FAMILIES = {member_id: family_id for family_id, member_ids in MOCK_FAMILY_DB.items() for member_id in member_ids}
+
+# Versioned store behind the mock accumulator API. Set ACCUMULATOR_DB_PATH to share a local SQLite store
+# between claim workers; otherwise MOCK_ACCUMULATORS_DB is used in-process with striped per-member locks.
+ACCUMULATOR_STORE: AccumulatorStore = (
+    SQLiteAccumulatorStore(os.environ["ACCUMULATOR_DB_PATH"]) if os.environ.get("ACCUMULATOR_DB_PATH")
+    else InMemoryAccumulatorStore(MOCK_ACCUMULATORS_DB)
+)
+
+# Write-ahead journal of accumulator deltas. Set ACCUMULATOR_JOURNAL_PATH to journal every claim's deltas (durably,
+# with group commit) before the accumulators are updated, so a crash or failed update cannot lose them; on import the
+# snapshot (ACCUMULATOR_SNAPSHOT_PATH, default "<journal>.snapshot") is loaded and the journal replayed.
+ACCUMULATOR_JOURNAL: AccumulatorJournal | None = (
+    AccumulatorJournal(
+        os.environ["ACCUMULATOR_JOURNAL_PATH"],
+        snapshot_path=os.environ.get("ACCUMULATOR_SNAPSHOT_PATH") or f"{os.environ['ACCUMULATOR_JOURNAL_PATH']}.snapshot",
+    ) if os.environ.get("ACCUMULATOR_JOURNAL_PATH") else None
+)
+if ACCUMULATOR_JOURNAL is not None:
+    if isinstance(ACCUMULATOR_STORE, SQLiteAccumulatorStore):
+        ACCUMULATOR_JOURNAL.snapshot_path = None # The SQLite database is the snapshot
+    ACCUMULATOR_JOURNAL.recover(ACCUMULATOR_STORE)
+
+# Fee schedule that prices lines (see fee_schedule.py). Set FEE_SCHEDULE_PATH to a .csv/.parquet schedule or a built
+# index directory; without one, allowed amounts default to the charge (In-Network) or 80% of it (Out-of-Network).
+# install_fee_schedule() swaps in a new schedule while claims keep adjudicating. ClaimWorkerPool workers open the
+# parent's schedule instead.
+FEE_SCHEDULE: FeeSchedule | None = load_fee_schedule(os.environ["FEE_SCHEDULE_PATH"]) if os.environ.get("FEE_SCHEDULE_PATH") else None
+
+# Line-level results for analytics (see adjudication_results.py). Set ADJUDICATION_RESULTS_PATH to a directory to
+# record the lines of every claim this process adjudicates (repeats of a claim are not recorded again), partitioned by
+# benefit year; buffered lines are flushed at exit.
+ADJUDICATION_RESULT_STORE: AdjudicationResultStore | None = (
+    AdjudicationResultStore(os.environ["ADJUDICATION_RESULTS_PATH"]) if os.environ.get("ADJUDICATION_RESULTS_PATH") else None
+)
+if ADJUDICATION_RESULT_STORE is not None:
+    atexit.register(ADJUDICATION_RESULT_STORE.close)
+
+# How many times a claim is re-adjudicated when another claim updated the same member's accumulators first
+ACCUMULATOR_CAS_MAX_ATTEMPTS = 8
+ACCUMULATOR_CAS_BACKOFF_SECONDS = 0.05
 
 # Mock Pre-Authorization Database
 MOCK_PRE_AUTH_DB = {
@@ -77,84 +178,461 @@ MOCK_COVERAGE_GUIDELINES = {
     "64493_M54.5": "Payable with PreAuth",
     "64494_G56.0": "Payable with PreAuth"
 }
+# Guideline rules for the combinations not listed above: CPT ranges, ICD-10 categories, priorities
+# (see coverage_guidelines for the syntax and how overlapping rules are ranked)
+MOCK_COVERAGE_GUIDELINE_RULES = [
+    {"cpt": "99202-99215", "icd": "*", "coverage_status": "Generally Payable"}, # Office/outpatient visits
+    {"cpt": "80047-89398", "icd": "*", "coverage_status": "Generally Payable"}, # Pathology and laboratory
+    {"cpt": "64479-64495", "icd": "M54.*", "coverage_status": "Payable with PreAuth"}, # Spinal injections for back pain
+    {"cpt": "64479-64495", "icd": "M47.*", "coverage_status": "Payable with PreAuth"}, # ... and for spondylosis
+    {"cpt": "*", "icd": "Z41.*", "coverage_status": "Not Covered", "priority": 10}, # Cosmetic procedures, whatever the CPT
+]
+UNKNOWN_GUIDELINE_STATUS = "Requires Review - Unknown Code Combo"
+_mock_guideline_index: GuidelineIndex | None = None
 
 # --- Mock API Call Functions ---
 def call_mock_policy_api(plan_id: str) -> dict:
-    logger.info(f"[MockPolicyAPI] Fetching policy details for Plan ID: {plan_id}")
-    time.sleep(0.2)
+    logger.info("[MockPolicyAPI] Fetching policy details for Plan ID: %s", plan_id)
+    mock_latency(0.2)
     policy = MOCK_POLICY_DB.get(plan_id)
     if policy:
         return {"status_code": 200, "body": policy}
     return {"status_code": 404, "body": {"message": f"Policy '{plan_id}' not found."}}
 
-def call_mock_accumulator_api_get(member_id: str, benefit_year: int) -> dict:
+def _accumulator_deltas(updates: dict) -> dict:
+    # Optional "claim_id" in an update makes it idempotent: a claim already applied to the record is skipped
+    return {
+        "deductible_met_individual": updates.get("deductible_applied", 0.0),
+        "oop_max_met_individual": updates.get("oop_applied", 0.0),
+    }
+
+def call_mock_accumulator_api_get(member_id: str, benefit_year: int, store: AccumulatorStore | None = None) -> dict:
     key = f"{member_id}_{benefit_year}"
-    logger.info(f"[MockAccumulatorAPI] Fetching accumulators for: {key}")
-    time.sleep(0.2)
-    accumulators = MOCK_ACCUMULATORS_DB.get(key)
-    if accumulators:
-        return {"status_code": 200, "body": accumulators.copy()} # Return a copy
-    # Return default if not found (assuming new member or year start)
-    return {"status_code": 200, "body": {"deductible_met_individual": 0.0, "oop_max_met_individual": 0.0}}
-
-def call_mock_accumulator_api_update(member_id: str, benefit_year: int, updates: dict) -> dict:
+    logger.info("[MockAccumulatorAPI] Fetching accumulators for: %s", key)
+    mock_latency(0.2)
+    # Returns a copy, defaulting to zeros if not found (assuming new member or year start)
+    accumulators, version = (store or ACCUMULATOR_STORE).get(member_id, benefit_year)
+    return {"status_code": 200, "body": accumulators, "version": version}
+
+def call_mock_accumulator_api_update(member_id: str, benefit_year: int, updates: dict, expected_version: int | None = None,
+                                     store: AccumulatorStore | None = None) -> dict:
     key = f"{member_id}_{benefit_year}"
-    logger.info(f"[MockAccumulatorAPI] Updating accumulators for: {key} with {updates}")
-    time.sleep(0.2)
-    if key not in MOCK_ACCUMULATORS_DB:
-        MOCK_ACCUMULATORS_DB[key] = {"deductible_met_individual": 0.0, "oop_max_met_individual": 0.0}
+    logger.info("[MockAccumulatorAPI] Updating accumulators for: %s", key)
+    logger.debug("[MockAccumulatorAPI] Accumulator updates for %s: %s", key, updates)
+    mock_latency(0.2)
+    # Atomic add; with expected_version it is a compare-and-swap that fails if another claim updated first
+    applied, accumulators, version = (store or ACCUMULATOR_STORE).apply_deltas(
+        member_id, benefit_year, [_accumulator_deltas(updates)], expected_version, claim_ids=[updates.get("claim_id")]
+    )
+    if not applied:
+        return {"status_code": 409, "body": {"message": f"Accumulators for {key} changed concurrently (version {version}, expected {expected_version})."}}
 
-    # In reality, this would be atomic and handle concurrency
-    MOCK_ACCUMULATORS_DB[key]["deductible_met_individual"] += updates.get("deductible_applied", 0.0)
-    MOCK_ACCUMULATORS_DB[key]["oop_max_met_individual"] += updates.get("oop_applied", 0.0)
-
-    logger.info(f"[MockAccumulatorAPI] New accumulator state for {key}: {MOCK_ACCUMULATORS_DB[key]}")
-    return {"status_code": 200, "body": {"message": "Accumulators updated successfully."}}
+    logger.debug("[MockAccumulatorAPI] New accumulator state for %s: %s", key, accumulators)
+    return {"status_code": 200, "body": {"message": "Accumulators updated successfully."}, "version": version}
 
 
 def call_mock_preauth_api(member_id: str, cpt_code: str, diagnosis_code: str) -> dict:
     key = f"{member_id}_{cpt_code}_{diagnosis_code}"
-    logger.info(f"[MockPreAuthAPI] Checking pre-auth for: {key}")
-    time.sleep(0.2)
+    logger.info("[MockPreAuthAPI] Checking pre-auth for: %s", key)
+    mock_latency(0.2)
     auth_info = MOCK_PRE_AUTH_DB.get(key)
     if auth_info:
         return {"status_code": 200, "body": auth_info}
     # Default: Not required if not found in DB (safer default)
     return {"status_code": 200, "body": {"required": False}}
 
+def call_mock_preauth_requirements_api() -> dict:
+    logger.info("[MockPreAuthAPI] Fetching the pre-auth requirement table")
+    mock_latency(0.2)
+    # The mock's rule table: every code combination that some member's record requires pre-auth for
+    requirements = sorted({
+        tuple(key.rsplit("_", 2)[1:]) for key, auth_info in MOCK_PRE_AUTH_DB.items() if auth_info.get("required")
+    })
+    return {"status_code": 200, "body": {"requirements": [list(pair) for pair in requirements]}}
+
+def _coverage_guideline_index() -> GuidelineIndex:
+    # The mock guidelines compiled once; invalidate_coverage_guidelines() recompiles them after a change
+    global _mock_guideline_index
+    index = _mock_guideline_index
+    if index is None:
+        index = _mock_guideline_index = GuidelineIndex(rules_from_exact(MOCK_COVERAGE_GUIDELINES) + MOCK_COVERAGE_GUIDELINE_RULES)
+    return index
+
+def invalidate_coverage_guidelines():
+    """Recompiles MOCK_COVERAGE_GUIDELINES / MOCK_COVERAGE_GUIDELINE_RULES on the next guideline check."""
+    global _mock_guideline_index
+    _mock_guideline_index = None
+
 def call_mock_guidelines_api(cpt_code: str, diagnosis_code: str) -> dict:
-    key = f"{cpt_code}_{diagnosis_code}"
-    logger.info(f"[MockGuidelinesAPI] Checking guidelines for: {key}")
-    time.sleep(0.1)
-    status = MOCK_COVERAGE_GUIDELINES.get(key, "Requires Review - Unknown Code Combo")
+    logger.info("[MockGuidelinesAPI] Checking guidelines for: %s_%s", cpt_code, diagnosis_code)
+    mock_latency(0.1)
+    status = _coverage_guideline_index().coverage_status(cpt_code, diagnosis_code, UNKNOWN_GUIDELINE_STATUS)
     return {"status_code": 200, "body": {"coverage_status": status}}
 
 
+# --- Mock Bulk API Call Functions (one round-trip per batch) ---
+# Bulk payloads and bodies are JSON-shaped like the real services': results are lists in request order.
+def call_mock_policy_api_bulk(plan_ids: list[str]) -> dict:
+    logger.info("[MockPolicyAPI] Bulk fetching policy details for %s plan(s)", len(plan_ids))
+    mock_latency(0.2)
+    policies = {plan_id: MOCK_POLICY_DB[plan_id] for plan_id in plan_ids if plan_id in MOCK_POLICY_DB}
+    not_found = [plan_id for plan_id in plan_ids if plan_id not in MOCK_POLICY_DB]
+    return {"status_code": 200, "body": {"policies": policies, "not_found": not_found}}
+
+def register_families(families: dict[str, list[str]]):
+    """
+    Adds or replaces families in MOCK_FAMILY_DB and the member -> family index. A member registered in a new family
+    leaves their previous one (a family left without members is dropped).
+    """
+    for family_id, member_ids in families.items():
+        for member_id in MOCK_FAMILY_DB.get(family_id, []):
+            MEMBER_FAMILIES.pop(member_id, None)
+        MOCK_FAMILY_DB[family_id] = list(member_ids)
+        for member_id in member_ids:
+            previous_family_id = MEMBER_FAMILIES.get(member_id)
+            if previous_family_id is not None and previous_family_id != family_id:
+                MOCK_FAMILY_DB[previous_family_id].remove(member_id)
+                if not MOCK_FAMILY_DB[previous_family_id]:
+                    del MOCK_FAMILY_DB[previous_family_id]
+            MEMBER_FAMILIES[member_id] = family_id
+
+
+def _family_of(member_id: str) -> tuple[str, list[str]]:
+    family_id = MEMBER_FAMILIES.get(member_id)
+    if family_id is None:
+        return member_id, [member_id]
+    return family_id, MOCK_FAMILY_DB[family_id]
+
+
+def call_mock_accumulator_api_get_bulk(member_years: list[tuple[str, int]], store: AccumulatorStore | None = None) -> dict:
+    # Returns the records of every requested member's whole family for that year, so family totals need no extra
+    # call: "families" lists one {"family_id", "members": [{"member_id", "accumulators", "version"}]} per member/year
+    logger.info("[MockAccumulatorAPI] Bulk fetching accumulators for %s member/year(s)", len(member_years))
+    mock_latency(0.2)
+    families = [(*_family_of(member_id), benefit_year) for member_id, benefit_year in member_years]
+    records = (store or ACCUMULATOR_STORE).get_many(list(dict.fromkeys(
+        (family_member, benefit_year) for _, family_members, benefit_year in families for family_member in family_members
+    )))
+    return {
+        "status_code": 200,
+        "body": {
+            "families": [
+                {
+                    "family_id": family_id,
+                    "members": [
+                        {"member_id": family_member, "accumulators": records[(family_member, benefit_year)][0],
+                         "version": records[(family_member, benefit_year)][1]}
+                        for family_member in family_members
+                    ],
+                }
+                for family_id, family_members, benefit_year in families
+            ],
+        },
+    }
+
+def call_mock_accumulator_api_update_bulk(transactions: list[dict], store: AccumulatorStore | None = None) -> dict:
+    # Each transaction is {"writes": [(member_id, benefit_year, [updates...]), ...], "expected_versions":
+    # [(member_id, benefit_year, version), ...] or None}: all of its updates are applied in order as one atomic write
+    # if every listed record is still at its version. The indexes of transactions that lost to a concurrent update
+    # are reported back.
+    logger.info("[MockAccumulatorAPI] Bulk updating accumulators with %s transaction(s)", len(transactions))
+    mock_latency(0.2)
+    store = store or ACCUMULATOR_STORE
+    conflicts = []
+    for index, transaction in enumerate(transactions):
+        expected_versions = transaction.get("expected_versions")
+        applied = store.apply_deltas_many(
+            [
+                (member_id, benefit_year, [_accumulator_deltas(u) for u in member_updates], [u.get("claim_id") for u in member_updates])
+                for member_id, benefit_year, member_updates in transaction["writes"]
+            ],
+            None if expected_versions is None else {(member_id, benefit_year): version for member_id, benefit_year, version in expected_versions},
+        )
+        if not applied:
+            conflicts.append(index)
+    return {"status_code": 200, "body": {"message": "Accumulators updated successfully.", "conflicts": conflicts}}
+
+def call_mock_preauth_api_bulk(checks: list[tuple[str, str, str]]) -> dict:
+    logger.info("[MockPreAuthAPI] Bulk checking pre-auth for %s line(s)", len(checks))
+    mock_latency(0.2)
+    results = [
+        MOCK_PRE_AUTH_DB.get(f"{member_id}_{cpt_code}_{diagnosis_code}", {"required": False})
+        for member_id, cpt_code, diagnosis_code in checks
+    ]
+    return {"status_code": 200, "body": {"results": results}}
+
+def call_mock_guidelines_api_bulk(checks: list[tuple[str, str]]) -> dict:
+    logger.info("[MockGuidelinesAPI] Bulk checking guidelines for %s code combo(s)", len(checks))
+    mock_latency(0.1)
+    index = _coverage_guideline_index()
+    results = [
+        {"coverage_status": index.coverage_status(cpt_code, diagnosis_code, UNKNOWN_GUIDELINE_STATUS)}
+        for cpt_code, diagnosis_code in checks
+    ]
+    return {"status_code": 200, "body": {"results": results}}
+
+
+# --- Service transports ---
+# Set CORE_POLICY_API_URL (policies and accumulators), PRE_AUTH_API_URL and/or GUIDELINES_API_URL to call those
+# services over HTTP (pooled, with retries and circuit breaking, see claim_transport.HTTPTransport); services
+# without a URL are served by the mock APIs above, in-process.
+API_BASE_URLS = {
+    service: os.environ[variable]
+    for service, variable in (("policy", "CORE_POLICY_API_URL"), ("accumulators", "CORE_POLICY_API_URL"),
+                              ("preauth", "PRE_AUTH_API_URL"), ("guidelines", "GUIDELINES_API_URL"))
+    if os.environ.get(variable)
+}
+API_TRANSPORT: AsyncTransport | None = HTTPTransport(API_BASE_URLS) if API_BASE_URLS else None
+
+
+def mock_api_handlers(accumulator_store: AccumulatorStore | None = None) -> dict:
+    """The mock APIs by operation, for an InProcessTransport; accumulator calls use accumulator_store (default ACCUMULATOR_STORE)."""
+    return {
+        "policy.get": call_mock_policy_api,
+        "policy.get_bulk": call_mock_policy_api_bulk,
+        "accumulators.get": functools.partial(call_mock_accumulator_api_get, store=accumulator_store),
+        "accumulators.get_bulk": functools.partial(call_mock_accumulator_api_get_bulk, store=accumulator_store),
+        "accumulators.update": functools.partial(call_mock_accumulator_api_update, store=accumulator_store),
+        "accumulators.update_bulk": functools.partial(call_mock_accumulator_api_update_bulk, store=accumulator_store),
+        "preauth.check": call_mock_preauth_api,
+        "preauth.check_bulk": call_mock_preauth_api_bulk,
+        "preauth.requirements": call_mock_preauth_requirements_api,
+        "guidelines.check": call_mock_guidelines_api,
+        "guidelines.check_bulk": call_mock_guidelines_api_bulk,
+    }
+
+MOCK_API_TRANSPORT = InProcessTransport(mock_api_handlers())
+
+
+def _default_transport(service: str, accumulator_store: AccumulatorStore | None = None) -> AsyncTransport:
+    if API_TRANSPORT is not None and API_TRANSPORT.serves(service):
+        return API_TRANSPORT
+    return MOCK_API_TRANSPORT if accumulator_store is None else InProcessTransport(mock_api_handlers(accumulator_store))
+
+
 # ---- PBAA's TOOLS ----
 
+class FamilyAccumulators:
+    """
+    The accumulator records of one family for one benefit year, as read from the core system (a member without a
+    family is a family of one), plus their versions for the compare-and-swap write-back.
+    Family totals are the sums of the members' individual accumulators.
+    """
+    def __init__(self, family_id: str, benefit_year: int, records: dict[str, tuple[dict, int]]):
+        self.family_id = family_id
+        self.benefit_year = benefit_year
+        self.records = {member_id: values.copy() for member_id, (values, _) in records.items()}
+        self.versions = {(member_id, benefit_year): version for member_id, (_, version) in records.items()}
+
+    def for_member(self, member_id: str, policy_details: dict) -> dict:
+        """
+        A member's accumulators for line adjudication: the individual record, plus the family totals for the
+        family limits the policy has when the member belongs to a family.
+        """
+        accumulators = (self.records.get(member_id) or DEFAULT_ACCUMULATORS).copy()
+        if len(self.records) > 1:
+            if policy_details.get("deductible_family") is not None:
+                accumulators["deductible_met_family"] = sum(r.get("deductible_met_individual", 0.0) for r in self.records.values())
+            if policy_details.get("oop_max_family") is not None:
+                accumulators["oop_max_met_family"] = sum(r.get("oop_max_met_individual", 0.0) for r in self.records.values())
+        return accumulators
+
+    def add(self, member_id: str, deductible_applied: float, oop_applied: float):
+        """Mirrors the core system's arithmetic for an applied update, so the next claim starts from the same state."""
+        values = (self.records.get(member_id) or DEFAULT_ACCUMULATORS).copy()
+        values["deductible_met_individual"] = values.get("deductible_met_individual", 0.0) + deductible_applied
+        values["oop_max_met_individual"] = values.get("oop_max_met_individual", 0.0) + oop_applied
+        self.records[member_id] = values
+
+
 class CorePolicySystemAPIClient:
-    def get_member_policy_details(self, plan_id: str) -> tuple[bool, dict | None, str | None]:
-        logger.info(f"[CorePolicyClient] Getting policy details for Plan: {plan_id}")
-        response = call_mock_policy_api(plan_id)
+    """
+    Client of the core policy system (policies and accumulators). Every call has a blocking and an async form
+    (a-prefixed, e.g. aget_member_policy_details_bulk); both are written once as exchanges (see claim_transport).
+    """
+    def __init__(self, accumulator_store: AccumulatorStore | None = None, accumulator_journal: AccumulatorJournal | None = None,
+                 transport: AsyncTransport | None = None):
+        self.accumulator_store = accumulator_store or ACCUMULATOR_STORE
+        self.accumulator_journal = accumulator_journal or ACCUMULATOR_JOURNAL
+        self.transport = transport or _default_transport("policy", accumulator_store)
+
+    def hold_claims(self, claim_ids: list[str]):
+        """
+        Context in which the claims' journaled accumulator updates are in progress (see AccumulatorJournal.hold):
+        compaction keeps their applied markers until it ends. A no-op without a journal.
+        """
+        return self.accumulator_journal.hold(claim_ids) if self.accumulator_journal is not None else contextlib.nullcontext()
+
+    def _journal_updates(self, records: list[tuple[str, str, int, dict]]):
+        # Write-ahead: the deltas are durable before the core system sees them, so a failed or interrupted
+        # update can be replayed (idempotently, by claim id) instead of being lost
+        if self.accumulator_journal is not None and records:
+            with span("accumulator_journal"):
+                self.accumulator_journal.append_many(
+                    [(claim_id, member_id, benefit_year, _accumulator_deltas(updates)) for claim_id, member_id, benefit_year, updates in records]
+                )
+
+    def void_journaled_updates(self, records: list[tuple[str, str, int]]):
+        """
+        Voids the journaled (claim_id, member_id, benefit_year) updates of claims given up without being applied, so
+        replaying the journal skips them (see AccumulatorJournal.void). A no-op without a journal.
+        """
+        if self.accumulator_journal is not None and records:
+            with span("accumulator_journal"):
+                self.accumulator_journal.void(records)
+
+    @staticmethod
+    def _policy_details_result(response: dict) -> tuple[bool, dict | None, str | None]:
         if response["status_code"] == 200:
             return True, response["body"], None
         return False, None, response["body"].get("message", "Failed to retrieve policy details.")
 
+    def get_member_policy_details(self, plan_id: str, plan_year: int | None = None) -> tuple[bool, dict | None, str | None]:
+        logger.info("[CorePolicyClient] Getting policy details for Plan: %s", plan_id)
+        # Concurrent misses for the same plan share one fetch; only successful responses are cached
+        with span("policy_fetch"):
+            response = POLICY_CACHE.get_or_load(
+                (plan_id, plan_year),
+                lambda: self.transport.request_sync("policy.get", {"plan_id": plan_id}),
+                should_cache=lambda r: r["status_code"] == 200,
+            )
+        return self._policy_details_result(response)
+
+    async def aget_member_policy_details(self, plan_id: str, plan_year: int | None = None) -> tuple[bool, dict | None, str | None]:
+        logger.info("[CorePolicyClient] Getting policy details for Plan: %s", plan_id)
+        with span("policy_fetch"):
+            response = POLICY_CACHE.get((plan_id, plan_year))
+            if response is None:
+                response = await self.transport.request("policy.get", {"plan_id": plan_id})
+                if response["status_code"] == 200:
+                    POLICY_CACHE.put((plan_id, plan_year), response)
+        return self._policy_details_result(response)
+
+    def get_member_policy_details_bulk(self, plan_keys: list[tuple[str, int | None]]) -> dict[tuple[str, int | None], tuple[bool, dict | None, str | None]]:
+        """Fetches policies for (plan_id, plan_year) pairs, going to the policy system only for cache misses."""
+        return run_exchange_sync(self.transport, self._policy_details_bulk(plan_keys))
+
+    async def aget_member_policy_details_bulk(self, plan_keys: list[tuple[str, int | None]]) -> dict[tuple[str, int | None], tuple[bool, dict | None, str | None]]:
+        return await run_exchange(self.transport, self._policy_details_bulk(plan_keys))
+
+    def _policy_details_bulk(self, plan_keys):
+        logger.info("[CorePolicyClient] Getting policy details for %s plan(s)", len(plan_keys))
+        results = {}
+        misses = []
+        for plan_key in dict.fromkeys(plan_keys):
+            cached = POLICY_CACHE.get(plan_key)
+            if cached is not None:
+                results[plan_key] = (True, cached["body"], None)
+            else:
+                misses.append(plan_key)
+        if not misses:
+            return results
+
+        with span("policy_fetch_bulk"):
+            response = yield "policy.get_bulk", {"plan_ids": list(dict.fromkeys(plan_id for plan_id, _ in misses))}
+        if response["status_code"] != 200:
+            err = response["body"].get("message", "Failed to retrieve policy details.")
+            results.update({plan_key: (False, None, err) for plan_key in misses})
+            return results
+        policies = response["body"]["policies"]
+        for plan_key in misses:
+            plan_id = plan_key[0]
+            if plan_id in policies:
+                POLICY_CACHE.put(plan_key, {"status_code": 200, "body": policies[plan_id]})
+                results[plan_key] = (True, policies[plan_id], None)
+            else:
+                results[plan_key] = (False, None, f"Policy '{plan_id}' not found.")
+        return results
+
     def get_member_accumulators(self, member_id: str, benefit_year: int) -> tuple[bool, dict | None, str | None]:
-        logger.info(f"[CorePolicyClient] Getting accumulators for Member: {member_id}, Year: {benefit_year}")
-        response = call_mock_accumulator_api_get(member_id, benefit_year)
+        accum_ok, accumulators, _, accum_err = self.get_member_accumulators_versioned(member_id, benefit_year)
+        return accum_ok, accumulators, accum_err
+
+    async def aget_member_accumulators(self, member_id: str, benefit_year: int) -> tuple[bool, dict | None, str | None]:
+        accum_ok, accumulators, _, accum_err = await self.aget_member_accumulators_versioned(member_id, benefit_year)
+        return accum_ok, accumulators, accum_err
+
+    def get_member_accumulators_versioned(self, member_id: str, benefit_year: int) -> tuple[bool, dict | None, int | None, str | None]:
+        """Like get_member_accumulators, plus the record version to pass back to update_member_accumulators_if_unchanged."""
+        return run_exchange_sync(self.transport, self._member_accumulators_versioned(member_id, benefit_year))
+
+    async def aget_member_accumulators_versioned(self, member_id: str, benefit_year: int) -> tuple[bool, dict | None, int | None, str | None]:
+        return await run_exchange(self.transport, self._member_accumulators_versioned(member_id, benefit_year))
+
+    def _member_accumulators_versioned(self, member_id: str, benefit_year: int):
+        logger.info("[CorePolicyClient] Getting accumulators for Member: %s, Year: %s", member_id, benefit_year)
+        with span("accumulator_fetch"):
+            response = yield "accumulators.get", {"member_id": member_id, "benefit_year": benefit_year}
         if response["status_code"] == 200:
-            return True, response["body"], None
-        return False, None, response["body"].get("message", "Failed to retrieve accumulators.")
+            return True, response["body"], response.get("version"), None
+        return False, None, None, response["body"].get("message", "Failed to retrieve accumulators.")
+
+    def get_member_accumulators_bulk(self, member_years: list[tuple[str, int]]) -> dict[tuple[str, int], tuple[bool, dict | None, int | None, str | None]]:
+        return run_exchange_sync(self.transport, self._member_accumulators_bulk(member_years))
+
+    async def aget_member_accumulators_bulk(self, member_years: list[tuple[str, int]]) -> dict[tuple[str, int], tuple[bool, dict | None, int | None, str | None]]:
+        return await run_exchange(self.transport, self._member_accumulators_bulk(member_years))
+
+    def _member_accumulators_bulk(self, member_years):
+        logger.info("[CorePolicyClient] Getting accumulators for %s member/year(s)", len(member_years))
+        unique_member_years = list(dict.fromkeys(member_years))
+        with span("accumulator_fetch_bulk"):
+            response = yield "accumulators.get_bulk", {"member_years": unique_member_years}
+        if response["status_code"] != 200:
+            err = response["body"].get("message", "Failed to retrieve accumulators.")
+            return {member_year: (False, None, None, err) for member_year in unique_member_years}
+        results = {}
+        for (member_id, benefit_year), family in zip(unique_member_years, response["body"]["families"]):
+            record = next(record for record in family["members"] if record["member_id"] == member_id)
+            results[(member_id, benefit_year)] = (True, record["accumulators"], record["version"], None)
+        return results
+
+    def get_family_accumulators_bulk(self, member_years: list[tuple[str, int]]) -> dict[tuple[str, int], tuple[bool, FamilyAccumulators | None, str | None]]:
+        """
+        Accumulators of each member's family for the year, in one call for all of them. Members of the same family
+        share one FamilyAccumulators per year.
+        :returns: {(member_id, benefit_year): (success, family_accumulators, error_message)}
+        """
+        return run_exchange_sync(self.transport, self._family_accumulators_bulk(member_years))
+
+    async def aget_family_accumulators_bulk(self, member_years: list[tuple[str, int]]) -> dict[tuple[str, int], tuple[bool, FamilyAccumulators | None, str | None]]:
+        return await run_exchange(self.transport, self._family_accumulators_bulk(member_years))
+
+    def _family_accumulators_bulk(self, member_years):
+        logger.info("[CorePolicyClient] Getting family accumulators for %s member/year(s)", len(member_years))
+        unique_member_years = list(dict.fromkeys(member_years))
+        with span("accumulator_fetch_bulk"):
+            response = yield "accumulators.get_bulk", {"member_years": unique_member_years}
+        if response["status_code"] != 200:
+            err = response["body"].get("message", "Failed to retrieve accumulators.")
+            return {member_year: (False, None, err) for member_year in unique_member_years}
+        results = {}
+        by_family_year = {}
+        for (member_id, benefit_year), family in zip(unique_member_years, response["body"]["families"]):
+            family_key = (family["family_id"], benefit_year)
+            if family_key not in by_family_year:
+                by_family_year[family_key] = FamilyAccumulators(family["family_id"], benefit_year, {
+                    record["member_id"]: (record["accumulators"], record["version"]) for record in family["members"]
+                })
+            results[(member_id, benefit_year)] = (True, by_family_year[family_key], None)
+        return results
 
     def update_member_accumulators(self, member_id: str, benefit_year: int, deductible_applied_total: float, oop_applied_total: float) -> tuple[bool, str | None]:
-        logger.info(f"[CorePolicyClient] Updating accumulators for Member: {member_id}, Year: {benefit_year}")
+        return run_exchange_sync(self.transport, self._update_member_accumulators(member_id, benefit_year, deductible_applied_total, oop_applied_total))
+
+    async def aupdate_member_accumulators(self, member_id: str, benefit_year: int, deductible_applied_total: float, oop_applied_total: float) -> tuple[bool, str | None]:
+        return await run_exchange(self.transport, self._update_member_accumulators(member_id, benefit_year, deductible_applied_total, oop_applied_total))
+
+    def _update_member_accumulators(self, member_id: str, benefit_year: int, deductible_applied_total: float, oop_applied_total: float):
+        logger.info("[CorePolicyClient] Updating accumulators for Member: %s, Year: %s", member_id, benefit_year)
         if deductible_applied_total > 0 or oop_applied_total > 0:
              updates = {
                 "deductible_applied": deductible_applied_total,
                 "oop_applied": oop_applied_total
              }
-             response = call_mock_accumulator_api_update(member_id, benefit_year, updates)
+             # Without a claim id a repeated update would be applied twice, so it is sent at most once
+             with span("accumulator_update"):
+                 response = yield "accumulators.update", {"member_id": member_id, "benefit_year": benefit_year, "updates": updates}, False
              if response["status_code"] == 200:
                  return True, None
              return False, response["body"].get("message", "Failed to update accumulators.")
@@ -162,53 +640,368 @@ class CorePolicySystemAPIClient:
             logger.info("[CorePolicyClient] No accumulator updates needed.")
             return True, "No updates needed." # Considered success if no change needed
 
+    def update_member_accumulators_if_unchanged(self, member_id: str, benefit_year: int, expected_version: int,
+                                                deductible_applied_total: float, oop_applied_total: float,
+                                                claim_id: str | None = None) -> tuple[bool, bool, str | None]:
+        """
+        Compare-and-swap update: only applies if the accumulators are still at expected_version.
+        With a claim_id the update is journaled first (when a journal is configured) and applied at most once.
+        :returns: (success, conflict, error_message) - conflict means another claim updated this member first
+        """
+        return run_exchange_sync(self.transport, self._update_member_accumulators_if_unchanged(
+            member_id, benefit_year, expected_version, deductible_applied_total, oop_applied_total, claim_id
+        ))
+
+    async def aupdate_member_accumulators_if_unchanged(self, member_id: str, benefit_year: int, expected_version: int,
+                                                       deductible_applied_total: float, oop_applied_total: float,
+                                                       claim_id: str | None = None) -> tuple[bool, bool, str | None]:
+        return await run_exchange(self.transport, self._update_member_accumulators_if_unchanged(
+            member_id, benefit_year, expected_version, deductible_applied_total, oop_applied_total, claim_id
+        ))
+
+    def _update_member_accumulators_if_unchanged(self, member_id, benefit_year, expected_version, deductible_applied_total,
+                                                 oop_applied_total, claim_id):
+        logger.info("[CorePolicyClient] Updating accumulators for Member: %s, Year: %s (expected version %s)", member_id, benefit_year, expected_version)
+        if deductible_applied_total <= 0 and oop_applied_total <= 0:
+            logger.info("[CorePolicyClient] No accumulator updates needed.")
+            return True, False, "No updates needed."
+        updates = {"deductible_applied": deductible_applied_total, "oop_applied": oop_applied_total}
+        journaled = claim_id is not None and self.accumulator_journal is not None
+        with self.hold_claims([claim_id] if journaled else []):
+            if journaled:
+                updates["claim_id"] = claim_id
+                yield functools.partial(self._journal_updates, [(claim_id, member_id, benefit_year, updates)])
+            with span("accumulator_update"):
+                # Retried only with a claim id: a retry of an update that did land would otherwise conflict with itself
+                response = yield "accumulators.update", {
+                    "member_id": member_id, "benefit_year": benefit_year, "updates": updates, "expected_version": expected_version,
+                }, "claim_id" in updates
+        if response["status_code"] == 200:
+            return True, False, None
+        return False, response["status_code"] == 409, response["body"].get("message", "Failed to update accumulators.")
+
+    def update_member_accumulators_bulk(self, transactions: list[tuple[list[tuple[str, int, float, float, str | None]], dict[tuple[str, int], int] | None]],
+                                        _span: str = "accumulator_update_bulk") -> tuple[bool, set[int], str | None]:
+        """
+        Applies transactions of ([(member_id, benefit_year, deductible_applied_total, oop_applied_total, claim_id), ...],
+        expected_versions). Each transaction is one all-or-nothing compare-and-swap write that only happens if every
+        record in expected_versions (e.g. the whole family's, for family limits) is unchanged; None means unconditional.
+        Updates with a claim_id are journaled first, all in one group commit, and applied at most once.
+        :returns: (success, indexes of the conflicted transactions, error_message)
+        """
+        return run_exchange_sync(self.transport, self._update_member_accumulators_bulk(transactions, _span))
+
+    async def aupdate_member_accumulators_bulk(self, transactions: list[tuple[list[tuple[str, int, float, float, str | None]], dict[tuple[str, int], int] | None]],
+                                               _span: str = "accumulator_update_bulk") -> tuple[bool, set[int], str | None]:
+        return await run_exchange(self.transport, self._update_member_accumulators_bulk(transactions, _span))
+
+    def _update_member_accumulators_bulk(self, transactions, _span: str):
+        logger.info("[CorePolicyClient] Updating accumulators in %s transaction(s)", len(transactions))
+        journaling = self.accumulator_journal is not None
+        pending = []
+        pending_indexes = []
+        journal_records = []
+        for index, (updates, expected_versions) in enumerate(transactions):
+            writes = {}
+            for member_id, benefit_year, deductible_applied, oop_applied, claim_id in updates:
+                if deductible_applied <= 0 and oop_applied <= 0:
+                    continue
+                member_update = {"deductible_applied": deductible_applied, "oop_applied": oop_applied}
+                if claim_id is not None and journaling:
+                    member_update["claim_id"] = claim_id
+                    journal_records.append((claim_id, member_id, benefit_year, member_update))
+                writes.setdefault((member_id, benefit_year), []).append(member_update)
+            if writes:
+                pending.append({
+                    "writes": [(member_id, benefit_year, member_updates) for (member_id, benefit_year), member_updates in writes.items()],
+                    "expected_versions": None if expected_versions is None else [
+                        (member_id, benefit_year, version) for (member_id, benefit_year), version in expected_versions.items()
+                    ],
+                })
+                pending_indexes.append(index)
+        if not pending:
+            logger.info("[CorePolicyClient] No accumulator updates needed.")
+            return True, set(), "No updates needed."
+        # Safe to retry only if every update carries a claim id (applied at most once)
+        idempotent = all("claim_id" in u for transaction in pending for _, _, member_updates in transaction["writes"] for u in member_updates)
+        with self.hold_claims([claim_id for claim_id, _, _, _ in journal_records]):
+            if journal_records:
+                yield functools.partial(self._journal_updates, journal_records)
+            with span(_span):
+                response = yield "accumulators.update_bulk", {"transactions": pending}, idempotent
+        if response["status_code"] == 200:
+            return True, {pending_indexes[i] for i in response["body"]["conflicts"]}, None
+        return False, set(), response["body"].get("message", "Failed to update accumulators.")
+
+    def update_member_accumulators_atomic(self, updates: list[tuple[str, int, float, float, str | None]],
+                                          expected_versions: dict[tuple[str, int], int] | None) -> tuple[bool, bool, str | None]:
+        """
+        One claim's updates (possibly several benefit years) as a single transaction, see update_member_accumulators_bulk.
+        :returns: (success, conflict, error_message) - conflict means another claim updated a checked record first
+        """
+        update_ok, conflicts, update_err = self.update_member_accumulators_bulk([(updates, expected_versions)], _span="accumulator_update")
+        return update_ok and not conflicts, bool(conflicts), update_err
+
+    async def aupdate_member_accumulators_atomic(self, updates: list[tuple[str, int, float, float, str | None]],
+                                                 expected_versions: dict[tuple[str, int], int] | None) -> tuple[bool, bool, str | None]:
+        update_ok, conflicts, update_err = await self.aupdate_member_accumulators_bulk([(updates, expected_versions)], _span="accumulator_update")
+        return update_ok and not conflicts, bool(conflicts), update_err
+
+
+def invalidate_policy_cache(plan_id: str | None = None, plan_year: int | None = None) -> int:
+    """Drops cached policies for a plan (optionally a single plan year), or the whole cache if no plan is given."""
+    if plan_id is None:
+        dropped = len(POLICY_CACHE)
+        POLICY_CACHE.clear()
+        return dropped
+    return POLICY_CACHE.invalidate_where(lambda key: key[0] == plan_id and (plan_year is None or key[1] == plan_year))
+
+
+def invalidate_pre_auth_requirements() -> int:
+    """Drops the in-memory pre-auth requirement table, so it is loaded again on the next pre-auth check."""
+    dropped = len(PRE_AUTH_REQUIREMENTS_CACHE)
+    PRE_AUTH_REQUIREMENTS_CACHE.clear()
+    return dropped
+
+
+class PreAuthRequirementIndex:
+    """The (CPT, ICD) combinations for which pre-authorization can be required, for any member."""
+    def __init__(self, requirements):
+        self._pairs = frozenset((cpt_code, diagnosis_code) for cpt_code, diagnosis_code in requirements)
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def may_require(self, cpt_code: str, diagnosis_code: str) -> bool:
+        return (cpt_code, diagnosis_code) in self._pairs
+
+
+_REQUIREMENTS_NOT_LOADED = object()
+
 
 class PreAuthorizationDBClient:
+    def __init__(self, transport: AsyncTransport | None = None):
+        self.transport = transport or _default_transport("preauth")
+
+    def get_pre_auth_requirements(self) -> PreAuthRequirementIndex | None:
+        """The requirement index (see PRE_AUTH_REQUIREMENTS_CACHE), or None if it could not be loaded."""
+        return PRE_AUTH_REQUIREMENTS_CACHE.get_or_load(
+            "requirements", # Concurrent first checks share one load
+            self._load_pre_auth_requirements,
+            ttl=lambda index: PRE_AUTH_REQUIREMENTS_TTL_SECONDS if index is not None else PRE_AUTH_REQUIREMENTS_RETRY_SECONDS,
+        )
+
+    def _load_pre_auth_requirements(self) -> PreAuthRequirementIndex | None:
+        with span("pre_auth_requirements"):
+            response = self.transport.request_sync("preauth.requirements", {})
+        if response["status_code"] != 200:
+            logger.warning("[PreAuthClient] Could not load the pre-auth requirement table (%s); checking every line with the pre-auth service.",
+                           response["body"].get("message", response["status_code"]))
+            return None
+        index = PreAuthRequirementIndex(response["body"]["requirements"])
+        logger.info("[PreAuthClient] Loaded %s pre-auth requirement(s)", len(index))
+        return index
+
+    def _pre_auth_requirements(self):
+        # Exchange step: the requirement index, loading it (blocking, once) only when it is not in memory yet
+        index = PRE_AUTH_REQUIREMENTS_CACHE.get("requirements", _REQUIREMENTS_NOT_LOADED)
+        if index is _REQUIREMENTS_NOT_LOADED:
+            index = yield self.get_pre_auth_requirements
+        return index
+
     def check_pre_auth_status(self, member_id: str, cpt_code: str, diagnosis_code: str) -> tuple[bool, dict | None, str | None]:
-        logger.info(f"[PreAuthClient] Checking PreAuth for Member: {member_id}, CPT: {cpt_code}, ICD: {diagnosis_code}")
+        return run_exchange_sync(self.transport, self._pre_auth_status(member_id, cpt_code, diagnosis_code))
+
+    async def acheck_pre_auth_status(self, member_id: str, cpt_code: str, diagnosis_code: str) -> tuple[bool, dict | None, str | None]:
+        return await run_exchange(self.transport, self._pre_auth_status(member_id, cpt_code, diagnosis_code))
+
+    def _pre_auth_status(self, member_id: str, cpt_code: str, diagnosis_code: str):
+        logger.info("[PreAuthClient] Checking PreAuth for Member: %s, CPT: %s, ICD: %s", member_id, cpt_code, diagnosis_code)
         if not all([member_id, cpt_code, diagnosis_code]): # Basic check
              return False, None, "Missing required fields for pre-auth check (MemberID, CPT, ICD10)."
-        response = call_mock_preauth_api(member_id, cpt_code, diagnosis_code)
+        requirements = yield from self._pre_auth_requirements()
+        if requirements is not None and not requirements.may_require(cpt_code, diagnosis_code):
+            return True, {"required": False}, None
+        with span("pre_auth"):
+            response = yield "preauth.check", {"member_id": member_id, "cpt_code": cpt_code, "diagnosis_code": diagnosis_code}
         if response["status_code"] == 200:
             return True, response["body"], None
         return False, None, response["body"].get("message", "Failed to check pre-authorization.")
 
+    def check_pre_auth_status_bulk(self, checks: list[tuple[str, str, str]]) -> dict[tuple[str, str, str], tuple[bool, dict | None, str | None]]:
+        return run_exchange_sync(self.transport, self._pre_auth_status_bulk(checks))
+
+    async def acheck_pre_auth_status_bulk(self, checks: list[tuple[str, str, str]]) -> dict[tuple[str, str, str], tuple[bool, dict | None, str | None]]:
+        return await run_exchange(self.transport, self._pre_auth_status_bulk(checks))
+
+    def _pre_auth_status_bulk(self, checks):
+        logger.info("[PreAuthClient] Checking PreAuth for %s line(s)", len(checks))
+        results = {}
+        to_fetch = []
+        requirements = yield from self._pre_auth_requirements()
+        for check in dict.fromkeys(checks):
+            if not all(check): # Same basic check as the single-line path
+                results[check] = (False, None, "Missing required fields for pre-auth check (MemberID, CPT, ICD10).")
+            elif requirements is not None and not requirements.may_require(check[1], check[2]):
+                results[check] = (True, {"required": False}, None)
+            else:
+                to_fetch.append(check)
+        if to_fetch:
+            with span("pre_auth_bulk"):
+                response = yield "preauth.check_bulk", {"checks": to_fetch}
+            if response["status_code"] == 200:
+                results.update((check, (True, auth_info, None)) for check, auth_info in zip(to_fetch, response["body"]["results"]))
+            else:
+                err = response["body"].get("message", "Failed to check pre-authorization.")
+                results.update((check, (False, None, err)) for check in to_fetch)
+        return results
+
 class MedicalGuidelinesTool:
+    def __init__(self, transport: AsyncTransport | None = None):
+        self.transport = transport or _default_transport("guidelines")
+
     def check_coverage_guidelines(self, cpt_code: str, diagnosis_code: str) -> tuple[bool, dict | None, str | None]:
-        logger.info(f"[GuidelinesTool] Checking Guidelines for CPT: {cpt_code}, ICD: {diagnosis_code}")
+        return run_exchange_sync(self.transport, self._coverage_guidelines(cpt_code, diagnosis_code))
+
+    async def acheck_coverage_guidelines(self, cpt_code: str, diagnosis_code: str) -> tuple[bool, dict | None, str | None]:
+        return await run_exchange(self.transport, self._coverage_guidelines(cpt_code, diagnosis_code))
+
+    def _coverage_guidelines(self, cpt_code: str, diagnosis_code: str):
+        logger.info("[GuidelinesTool] Checking Guidelines for CPT: %s, ICD: %s", cpt_code, diagnosis_code)
         if not all([cpt_code, diagnosis_code]):
             return False, None, "Missing CPT or ICD10 for guideline check."
-        response = call_mock_guidelines_api(cpt_code, diagnosis_code)
+        with span("guidelines"):
+            response = yield "guidelines.check", {"cpt_code": cpt_code, "diagnosis_code": diagnosis_code}
         if response["status_code"] == 200:
             return True, response["body"], None
         return False, None, response["body"].get("message", "Failed to check coverage guidelines.")
 
+    def check_coverage_guidelines_bulk(self, checks: list[tuple[str, str]]) -> dict[tuple[str, str], tuple[bool, dict | None, str | None]]:
+        return run_exchange_sync(self.transport, self._coverage_guidelines_bulk(checks))
+
+    async def acheck_coverage_guidelines_bulk(self, checks: list[tuple[str, str]]) -> dict[tuple[str, str], tuple[bool, dict | None, str | None]]:
+        return await run_exchange(self.transport, self._coverage_guidelines_bulk(checks))
+
+    def _coverage_guidelines_bulk(self, checks):
+        logger.info("[GuidelinesTool] Checking Guidelines for %s code combo(s)", len(checks))
+        results = {}
+        to_fetch = []
+        for check in dict.fromkeys(checks):
+            if not all(check):
+                results[check] = (False, None, "Missing CPT or ICD10 for guideline check.")
+            else:
+                to_fetch.append(check)
+        if to_fetch:
+            with span("guidelines_bulk"):
+                response = yield "guidelines.check_bulk", {"checks": to_fetch}
+            if response["status_code"] == 200:
+                results.update((check, (True, guideline, None)) for check, guideline in zip(to_fetch, response["body"]["results"]))
+            else:
+                err = response["body"].get("message", "Failed to check coverage guidelines.")
+                results.update((check, (False, None, err)) for check in to_fetch)
+        return results
+
+
+# Simplified CPT -> policy service type mapping (e.g. "SpecialistVisit", "Lab"); unmapped codes use "Default"
+CPT_SERVICE_TYPES = {
+    "99213": "SpecialistVisit", "99214": "SpecialistVisit", "99203": "SpecialistVisit", "99204": "SpecialistVisit", # Assuming these are specialist
+    "80053": "Lab", "80048": "Lab",
+    "64493": "Inpatient", "64494": "Inpatient", # Example mapping
+}
+SERVICE_TYPES = ("Default", "SpecialistVisit", "Lab", "Inpatient")
+NETWORK_STATUSES = ("In-Network", "Out-of-Network")
+# Network status -> its spelling in policy benefit keys (e.g. "SpecialistVisit_InNetwork")
+BENEFIT_NETWORK_KEYS = {"In-Network": "InNetwork", "Out-of-Network": "OutOfNetwork"}
+
+
+class BenefitRule:
+    """A policy benefit rule with the copay/deductible/coinsurance decisions pre-resolved."""
+    __slots__ = ("rule_key", "copay_before_deductible", "deductible_applies", "coinsurance")
+
+    def __init__(self, rule_key: str, rule: dict):
+        self.rule_key = rule_key
+        copay = rule.get("copay", 0.0)
+        # Copay typically applies *instead* of deductible/coinsurance if applies_to_deductible is False
+        self.copay_before_deductible = copay if copay > 0 and not rule.get("applies_to_deductible", True) else 0.0
+        self.deductible_applies = rule.get("deductible_applies", False)
+        self.coinsurance = rule.get("coinsurance", 0.0) # Member's portion
+
+
+class CompiledPlan:
+    """
+    Policy details compiled once per policy for line adjudication.
+    Every (service type, network status) rule, including the Default fallback, is resolved up front into a
+    flat list indexed by service_type_index * len(NETWORK_STATUSES) + network_index, and CPT codes map straight
+    to a service type offset, so a line lookup is two dict/list indexings with no string building.
+    """
+    __slots__ = ("policy_details", "deductible_individual", "oop_max_individual", "deductible_family", "oop_max_family",
+                 "rules", "cpt_rule_offsets", "fee_schedule_contracts")
+
+    def __init__(self, policy_details: dict, benefits_engine: "BenefitsEngineTool | None" = None):
+        benefits_engine = benefits_engine or BenefitsEngineTool()
+        self.policy_details = policy_details
+        self.deductible_individual = policy_details.get("deductible_individual", 0.0)
+        self.oop_max_individual = policy_details.get("oop_max_individual", 0.0)
+        self.deductible_family = policy_details.get("deductible_family") # None: plan has no family limit
+        self.oop_max_family = policy_details.get("oop_max_family")
+        self.rules = [
+            BenefitRule(f"{service_type}_{BENEFIT_NETWORK_KEYS[network_status]}",
+                        benefits_engine.get_benefit_rule(service_type, policy_details["benefits"], network_status))
+            for service_type in SERVICE_TYPES
+            for network_status in NETWORK_STATUSES
+        ]
+        self.cpt_rule_offsets = {
+            cpt: SERVICE_TYPES.index(service_type) * len(NETWORK_STATUSES) for cpt, service_type in CPT_SERVICE_TYPES.items()
+        }
+        # Fee schedule contract per network index (None: allowed amount is not priced from a fee schedule)
+        contracts = policy_details.get("fee_schedule_contracts", {})
+        self.fee_schedule_contracts = tuple(contracts.get(network_status) for network_status in NETWORK_STATUSES)
+
+    def rule_for(self, cpt_code: str | None, network_index: int) -> BenefitRule:
+        return self.rules[self.cpt_rule_offsets.get(cpt_code, 0) + network_index]
+
+
+# Compiled plans keyed by id() of the policy dict; the stored CompiledPlan keeps the dict alive so the id can't be reused
+_compiled_plans = TTLCache(maxsize=POLICY_CACHE_MAX_SIZE, ttl=POLICY_CACHE_TTL_SECONDS)
+
+def get_compiled_plan(policy_details: dict) -> CompiledPlan:
+    """Returns the CompiledPlan for a policy dict, compiling it on first use. Policy dicts are treated as read-only."""
+    compiled = _compiled_plans.get(id(policy_details))
+    if compiled is None or compiled.policy_details is not policy_details:
+        compiled = CompiledPlan(policy_details)
+        _compiled_plans.put(id(policy_details), compiled)
+    return compiled
+
 
 class BenefitsEngineTool:
     def get_benefit_rule(self, service_type_key: str, policy_benefits: dict, network_status: str) -> dict:
         """Helper to find the specific benefit rule, falling back to default."""
         # Construct specific key first (e.g., SpecialistVisit_InNetwork)
-        specific_key = f"{service_type_key}_{network_status}"
+        network_key = BENEFIT_NETWORK_KEYS.get(network_status, network_status.replace("-", ""))
+        specific_key = f"{service_type_key}_{network_key}"
         if specific_key in policy_benefits:
             return policy_benefits[specific_key]
 
         # Fallback to default for the network status
-        default_key = f"Default_{network_status}"
+        default_key = f"Default_{network_key}"
         if default_key in policy_benefits:
-            logger.info(f"[BenefitsEngine] Warning: No specific rule for '{specific_key}', using default '{default_key}'.")
+            logger.info("[BenefitsEngine] Warning: No specific rule for '%s', using default '%s'.", specific_key, default_key)
             return policy_benefits[default_key]
 
         # Ultimate fallback (should not happen with good policy definitions)
-        logger.info(f"[BenefitsEngine] Error: No benefit rule found for '{specific_key}' or default '{default_key}'.")
+        logger.info("[BenefitsEngine] Error: No benefit rule found for '%s' or default '%s'.", specific_key, default_key)
         return {"copay": 0, "deductible_applies": True, "coinsurance": 1.0} # Default to 100% member resp if no rule
 
-    def adjudicate_claim_line(self, claim_line: dict, policy_details: dict, current_accumulators: dict) -> dict:
+    def adjudicate_claim_line(self, claim_line: dict, policy_details: dict, current_accumulators: dict,
+                              compiled_plan: CompiledPlan | None = None, fee_schedule: FeeSchedule | None = None) -> dict:
         """
         Adjudicates a single claim line based on policy and accumulators.
         Returns a dictionary with calculated amounts for the line.
+        compiled_plan can be passed to skip the per-policy lookup; it is compiled from policy_details otherwise.
+        fee_schedule prices the line (default: the installed FEE_SCHEDULE, if any).
         IMPORTANT: This MUTATES current_accumulators for the next line within the same claim.
         """
-        logger.info(f"[BenefitsEngine] Adjudicating Line - CPT: {claim_line.get('cpt_code')}, Charge: {claim_line.get('charge_amount')}")
+        logger.debug("[BenefitsEngine] Adjudicating Line - CPT: %s, Charge: %s", claim_line.get('cpt_code'), claim_line.get('charge_amount'))
 
         results = {
             "line_status": "Processing",
@@ -218,7 +1011,7 @@ class BenefitsEngineTool:
             "coinsurance_member_owes": 0.0,
             "member_responsibility": 0.0,
             "insurer_payment": 0.0,
-            "notes": [],
+            "note_codes": [], # (code, *args) tuples, rendered into text by eob_notes
             "applied_to_deductible_this_line": 0.0, # How much accumulators should increase
             "applied_to_oop_max_this_line": 0.0,
         }
@@ -226,36 +1019,53 @@ class BenefitsEngineTool:
         # --- Basic Setup ---
         charge_amount = claim_line.get("charge_amount", 0.0)
         network_status = claim_line.get("network_status", "Unknown")
-        if network_status not in ["In-Network", "Out-of-Network"]:
-            results["notes"].append(f"Warning: Network status '{network_status}' treating as Out-of-Network.")
+        if network_status == "In-Network":
+            network_index = 0
+        elif network_status == "Out-of-Network":
+            network_index = 1
+        else:
+            results["note_codes"].append(("network_status_defaulted", network_status))
             network_status = "Out-of-Network"
+            network_index = 1
 
-        # ** Allowed Amount Determination (Simplified) **
-        # Real system: Look up fee schedule based on CPT, modifiers, provider contract, network status.
-        # Here, we'll naively use the charge amount, maybe with a small reduction for OON.
-        if network_status == "In-Network":
+        # --- Get Policy Rules ---
+        # CPT -> service type -> (service type, network) rule is pre-resolved in the compiled plan
+        if compiled_plan is None:
+            compiled_plan = get_compiled_plan(policy_details)
+        benefit_rule = compiled_plan.rule_for(claim_line.get("cpt_code"), network_index)
+
+        # ** Allowed Amount Determination **
+        # The provider contract's fee schedule rate by CPT, modifier and date of service (the lesser of it and the
+        # billed charge); lines without a scheduled rate use the charge, with a reduction for OON.
+        if fee_schedule is None:
+            fee_schedule = FEE_SCHEDULE
+        rate = None
+        if fee_schedule is not None:
+            contract_id = claim_line.get("contract_id") or compiled_plan.fee_schedule_contracts[network_index]
+            if contract_id:
+                rate = fee_schedule.lookup(contract_id, claim_line.get("cpt_code"), claim_line.get("modifier"),
+                                           claim_line.get("date_of_service"))
+        if rate is not None:
+            scheduled_amount, effective_date = rate
+            results["allowed_amount"] = min(charge_amount, scheduled_amount)
+            results["note_codes"].append(("fee_schedule_rate", scheduled_amount, contract_id, effective_date))
+        elif network_status == "In-Network":
             results["allowed_amount"] = charge_amount # Assume charge equals allowed for simplicity
         else:
             results["allowed_amount"] = charge_amount * 0.8 # Example: Allow 80% of charge for OON
         allowed = results["allowed_amount"]
         remaining_allowed = allowed # Amount left to apply benefits to
 
-        # --- Get Policy Rules ---
-        # Need to map CPT/service type to policy keys (e.g., "SpecialistVisit", "Lab")
-        # Simplified mapping for this example:
-        service_type_key = "Default"
-        cpt = claim_line.get("cpt_code")
-        if cpt in ["99213", "99214", "99203", "99204"]: service_type_key = "SpecialistVisit" # Assuming these are specialist
-        if cpt in ["80053", "80048"]: service_type_key = "Lab"
-        if cpt in ["64493", "64494"]: service_type_key = "Inpatient" # Example mapping
-
-        benefit_rule = self.get_benefit_rule(service_type_key, policy_details["benefits"], network_status)
-
         # --- Benefit Application Order ---
-        deductible_limit = policy_details.get("deductible_individual", 0.0)
-        oop_max_limit = policy_details.get("oop_max_individual", 0.0)
+        deductible_limit = compiled_plan.deductible_individual
+        oop_max_limit = compiled_plan.oop_max_individual
         deductible_met = current_accumulators.get("deductible_met_individual", 0.0)
         oop_max_met = current_accumulators.get("oop_max_met_individual", 0.0)
+        # Family limits apply when the plan has them and the accumulators carry family totals
+        family_deductible_met = current_accumulators.get("deductible_met_family")
+        family_oop_max_met = current_accumulators.get("oop_max_met_family")
+        family_deductible_limit = compiled_plan.deductible_family if family_deductible_met is not None else None
+        family_oop_max_limit = compiled_plan.oop_max_family if family_oop_max_met is not None else None
 
         member_resp_this_line = 0.0
         insurer_pay_this_line = 0.0
@@ -263,19 +1073,22 @@ class BenefitsEngineTool:
         applied_to_oop = 0.0 # Tracks only amounts subject to OOP Max
 
         # 1. Apply Copay (if applicable and BEFORE deductible)
-        copay = benefit_rule.get("copay", 0.0)
-        # Copay typically applies *instead* of deductible/coinsurance if applies_to_deductible is False
-        if copay > 0 and not benefit_rule.get("applies_to_deductible", True): # Check if copay applies *before* ded
+        copay = benefit_rule.copay_before_deductible
+        if copay > 0: # Only set when the copay applies *before* ded
             amount_to_pay = min(copay, remaining_allowed) # Can't pay more copay than allowed amount
             results["copay_applied"] = amount_to_pay
             member_resp_this_line += amount_to_pay
             applied_to_oop += amount_to_pay # Copays usually count towards OOP Max
             remaining_allowed -= amount_to_pay
-            results["notes"].append(f"Applied ${amount_to_pay:.2f} Copay.")
+            results["note_codes"].append(("copay_applied", amount_to_pay))
 
         # 2. Apply Deductible (if applicable)
-        if remaining_allowed > 0 and benefit_rule.get("deductible_applies", False):
+        if remaining_allowed > 0 and benefit_rule.deductible_applies:
             remaining_deductible = max(0, deductible_limit - deductible_met)
+            if family_deductible_limit is not None and family_deductible_limit - family_deductible_met < remaining_deductible:
+                remaining_deductible = max(0, family_deductible_limit - family_deductible_met)
+                if remaining_deductible < remaining_allowed:
+                    results["note_codes"].append(("family_deductible_limit", family_deductible_limit))
             if remaining_deductible > 0:
                 amount_to_apply_to_ded = min(remaining_allowed, remaining_deductible)
                 results["deductible_applied"] = amount_to_apply_to_ded
@@ -283,27 +1096,31 @@ class BenefitsEngineTool:
                 applied_to_deductible += amount_to_apply_to_ded # Track for accumulator update
                 applied_to_oop += amount_to_apply_to_ded # Deductible counts towards OOP Max
                 remaining_allowed -= amount_to_apply_to_ded
-                results["notes"].append(f"Applied ${amount_to_apply_to_ded:.2f} towards deductible.")
+                results["note_codes"].append(("deductible_applied", amount_to_apply_to_ded))
 
         # 3. Apply Coinsurance (if applicable)
         if remaining_allowed > 0:
-            coinsurance_rate = benefit_rule.get("coinsurance", 0.0) # Member's portion
+            coinsurance_rate = benefit_rule.coinsurance # Member's portion
             if coinsurance_rate > 0:
                 member_coinsurance_amount = remaining_allowed * coinsurance_rate
                 results["coinsurance_member_owes"] = member_coinsurance_amount
                 member_resp_this_line += member_coinsurance_amount
                 applied_to_oop += member_coinsurance_amount # Coinsurance counts towards OOP Max
                 remaining_allowed -= member_coinsurance_amount # What's left is insurer portion
-                results["notes"].append(f"Applied {coinsurance_rate*100:.0f}% coinsurance (${member_coinsurance_amount:.2f}).")
+                results["note_codes"].append(("coinsurance_applied", coinsurance_rate * 100, member_coinsurance_amount))
 
         # 4. Calculate Insurer Payment
         insurer_pay_this_line = remaining_allowed # What's left after copay/ded/coins
 
         # 5. Check Out-of-Pocket Max
         potential_total_oop = oop_max_met + applied_to_oop
-        if potential_total_oop > oop_max_limit:
-            overage = potential_total_oop - oop_max_limit
-            results["notes"].append(f"OOP Max Limit (${oop_max_limit:.2f}) reached. Reducing member responsibility by ${overage:.2f}.")
+        overage = potential_total_oop - oop_max_limit
+        oop_limit_note = ("oop_max_reached", oop_max_limit)
+        if family_oop_max_limit is not None and family_oop_max_met + applied_to_oop - family_oop_max_limit > max(overage, 0):
+            overage = family_oop_max_met + applied_to_oop - family_oop_max_limit
+            oop_limit_note = ("family_oop_max_reached", family_oop_max_limit)
+        if overage > 0:
+            results["note_codes"].append(oop_limit_note + (overage,))
             # Reduce member responsibility by the overage, increase insurer payment
             actual_oop_applied_this_line = applied_to_oop - overage
             member_resp_this_line -= overage
@@ -320,11 +1137,28 @@ class BenefitsEngineTool:
         # --- IMPORTANT: Update accumulators for the *next line* ---
         current_accumulators["deductible_met_individual"] += results["applied_to_deductible_this_line"]
         current_accumulators["oop_max_met_individual"] += results["applied_to_oop_max_this_line"]
+        if family_deductible_met is not None:
+            current_accumulators["deductible_met_family"] += results["applied_to_deductible_this_line"]
+        if family_oop_max_met is not None:
+            current_accumulators["oop_max_met_family"] += results["applied_to_oop_max_this_line"]
 
-        logger.info(f"[BenefitsEngine] Line Result: Member Owes: ${results['member_responsibility']:.2f}, Insurer Pays: ${results['insurer_payment']:.2f}, Applied Ded: ${results['applied_to_deductible_this_line']:.2f}, Applied OOP: ${results['applied_to_oop_max_this_line']:.2f}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[BenefitsEngine] Line Result: Member Owes: $%.2f, Insurer Pays: $%.2f, Applied Ded: $%.2f, Applied OOP: $%.2f", results['member_responsibility'], results['insurer_payment'], results['applied_to_deductible_this_line'], results['applied_to_oop_max_this_line'])
         return results
     
 
+def install_fee_schedule(source_path: str, index_root: str | None = None) -> FeeSchedule:
+    """
+    Loads a fee schedule (.csv/.parquet, indexed on load into a new build directory, or a build directory) and
+    makes it the one new claims are priced with. Claims already adjudicating finish on the schedule they started with.
+    """
+    global FEE_SCHEDULE
+    fee_schedule = load_fee_schedule(source_path, index_root)
+    FEE_SCHEDULE = fee_schedule
+    logger.info("[PBAA] Installed fee schedule %s (%s rates).", fee_schedule.index_dir, len(fee_schedule))
+    return fee_schedule
+
+
 def get_benefit_year(date_of_service: str) -> int:
     """Determines the benefit year from the date of service."""
     try:
@@ -333,85 +1167,75 @@ def get_benefit_year(date_of_service: str) -> int:
         return datetime.now().year # Fallback to current year
 
 
-@tool
-def adjudicate_claim(validated_claim_data: str) -> tuple[bool, dict | None, list[str]]:
-    """
-    This method is to check and apply policy benifits and adjudication based on the validated claim data for further processing.
-
-    Parameters:
-    - validated_claim_data: validated claim data (from CIVA).
-        Here's an example of validated_claim_data format:
-        ```
-        {
-            "member_id": "MEMBER456",
-            "patient_name": "Sarah Member",
-            "member_eligibility": {"member_id": "MEMBER456", "date_of_service": "2023-10-26", "is_eligible": True, "plan_id": "HMO_SILVER"},
-            "services": [
-                {
-                    "date_of_service": "2023-10-26",
-                    "cpt_code": "99214",
-                    "icd_10_code": "M54.5",
-                    "provider_npi": "1234567890",
-                    "charge_amount": 250.00,
-                    "network_status": "In-Network"
-                },
-                {
-                    "date_of_service": "2023-10-26",
-                    "cpt_code": "80053",
-                    "icd_10_code": "M54.5",
-                    "provider_npi": "0987654321", # Assumed In-Network from CIVA
-                    "charge_amount": 120.00,
-                    "network_status": "In-Network"
-                }
-            ]
-        }
-        ```
-    :returns: (success_status, adjudicated_claim_data, list_of_messages/errors)
-    """
-    try:
-        processed_claim_data: dict = json.loads(validated_claim_data)  
-        logger.info(f"\n[PBAA] Received validated claim for adjudication. processed_claim_data: {processed_claim_data}")      
-    except json.JSONDecodeError as e:
-        logger.info("Error decoding JSON:", e)
-    
-    policy_client = CorePolicySystemAPIClient()
-    preauth_client = PreAuthorizationDBClient()
-    guidelines_tool = MedicalGuidelinesTool()
-    benefits_engine = BenefitsEngineTool()
-    
-    adjudicated_data = processed_claim_data.copy() # Work on a copy
-    messages = []
-    claim_level_status = "Processing"
-    needs_clinical_review = False
-
-    # 1. Get Basic Info
+def _get_claim_header(adjudicated_data: dict) -> tuple[bool, str | None, int | None, str | None, str | None]:
+    """Extracts (ok, member_id, benefit_year, plan_id, error) needed before a claim can be adjudicated."""
     member_id = adjudicated_data.get("member_id")
     if not member_id:
-        return False, adjudicated_data, ["Critical Error: Missing Member ID."]
-    
-    # Use DOS from first line to determine benefit year and get policy/accumulators
-    # Real system might need to handle claims spanning benefit years.
+        return False, None, None, None, "Critical Error: Missing Member ID."
+
+    # DOS of the first line is the claim's benefit year; lines in other benefit years use that year's
+    # policy and accumulators (see claim_benefit_years)
     first_line_dos = adjudicated_data.get("services", [{}])[0].get("date_of_service")
     if not first_line_dos:
-            return False, adjudicated_data, ["Critical Error: Missing Date of Service on first line."]
+        return False, None, None, None, "Critical Error: Missing Date of Service on first line."
     benefit_year = get_benefit_year(first_line_dos)
 
     plan_id = adjudicated_data.get("member_eligibility", {}).get("plan_id")
     if not plan_id:
-        return False, adjudicated_data, ["Critical Error: Missing Plan ID from eligibility data."]
+        return False, None, None, None, "Critical Error: Missing Plan ID from eligibility data."
+    return True, member_id, benefit_year, plan_id, None
+
+
+def _line_benefit_years(claim_lines: list[dict], benefit_year: int) -> list[int]:
+    """Benefit year of each line; a line without a usable date of service falls in the claim's benefit year."""
+    return [_date_of_service_year(line.get("date_of_service")) or benefit_year for line in claim_lines]
+
+
+@functools.lru_cache(maxsize=4096)
+def _date_of_service_year(date_of_service: str | None) -> int | None:
+    # Claims in a batch share few distinct dates of service, so the parse is cached per date string
+    try:
+        return datetime.strptime(date_of_service, "%Y-%m-%d").year
+    except (ValueError, TypeError):
+        return None
+
+
+def claim_benefit_years(claim_lines: list[dict], benefit_year: int) -> list[int]:
+    """The distinct benefit years a claim's lines fall in, starting with the claim's own benefit year."""
+    return list(dict.fromkeys([benefit_year] + _line_benefit_years(claim_lines, benefit_year)))
 
-    # 2. Fetch Policy and Initial Accumulators
-    policy_ok, policy_details, policy_err = policy_client.get_member_policy_details(plan_id)
-    if not policy_ok:
-        return False, adjudicated_data, [f"Failed to get policy details: {policy_err}"]
 
-    accum_ok, initial_accumulators, accum_err = policy_client.get_member_accumulators(member_id, benefit_year)
-    if not accum_ok:
-        return False, adjudicated_data, [f"Failed to get initial accumulators: {accum_err}"]
+def _denied_line_result(line_status: str, line: dict, line_messages: list[tuple]) -> dict:
+    return {
+        "line_status": line_status, "allowed_amount": 0.0, "copay_applied": 0.0, "deductible_applied": 0.0,
+        "coinsurance_member_owes": 0.0, "member_responsibility": line.get("charge_amount", 0.0), # Member owes full charge if denied this way
+        "insurer_payment": 0.0, "note_codes": line_messages,
+        "applied_to_deductible_this_line": 0.0, "applied_to_oop_max_this_line": 0.0
+    }
+
+
+def _adjudicate_claim_lines(adjudicated_data: dict, member_id: str, benefit_year: int, policies: dict[int, dict],
+                            initial_accumulators: dict[int, dict], check_pre_auth, check_guidelines,
+                            benefits_engine: "BenefitsEngineTool") -> tuple[list[str], dict[int, tuple[float, float]]]:
+    """
+    Adjudicates every service line of a claim and writes the claim summary/status into adjudicated_data.
+    policies and initial_accumulators are keyed by benefit year (every year of claim_benefit_years); each line is
+    adjudicated with its own year's policy and running accumulators.
+    check_pre_auth(cpt, icd) and check_guidelines(cpt, icd) return the same tuples as the client methods,
+    so the single-claim and batch paths share this logic.
+    :returns: (messages, {benefit_year: (total_applied_to_deductible, total_applied_to_oop)})
+    """
+    messages = []
+    claim_level_status = "Processing"
+    needs_clinical_review = False
 
-    # Keep track of accumulators AS THIS CLAIM is processed
+    compiled_plans = {year: get_compiled_plan(policy_details) for year, policy_details in policies.items()} # Rule lookups for every line of the claim
+    fee_schedule = FEE_SCHEDULE # Every line of the claim is priced by the same schedule, even if a new one is installed meanwhile
+
+    # Keep track of accumulators AS THIS CLAIM is processed, per benefit year
     # Need a deep copy if accumulators dict contains mutable types, fine for simple floats.
-    current_claim_accumulators = initial_accumulators.copy()
+    current_claim_accumulators = {year: accumulators.copy() for year, accumulators in initial_accumulators.items()}
+    year_totals = {year: [0.0, 0.0] for year in initial_accumulators}
 
     # Track overall claim totals and accumulator changes from this claim
     total_member_responsibility = 0.0
@@ -421,8 +1245,8 @@ def adjudicate_claim(validated_claim_data: str) -> tuple[bool, dict | None, list
 
     # 3. Adjudicate Each Line
     claim_lines = adjudicated_data.get("services", [])
-    for i, line in enumerate(claim_lines):
-        logger.info(f"\n[PBAA] Processing Line {i+1} - CPT: {line.get('cpt_code')}")
+    for i, (line, line_year) in enumerate(zip(claim_lines, _line_benefit_years(claim_lines, benefit_year))):
+        logger.debug("\n[PBAA] Processing Line %s - CPT: %s", i+1, line.get('cpt_code'))
         line_adjudication_result = None
         line_status = "Pending"
         line_messages = []
@@ -430,65 +1254,60 @@ def adjudicate_claim(validated_claim_data: str) -> tuple[bool, dict | None, list
         # Check Pre-Authorization
         cpt = line.get("cpt_code")
         icd = line.get("icd_10_code", "Unknown") # Need a default if missing
-        auth_ok, auth_info, auth_err = preauth_client.check_pre_auth_status(member_id, cpt, icd)
+        auth_ok, auth_info, auth_err = check_pre_auth(cpt, icd)
 
         if not auth_ok:
             line_status = "Adjudication Error"
-            line_messages.append(f"Pre-auth check failed: {auth_err}")
+            line_messages.append(("pre_auth_check_failed", auth_err))
             needs_clinical_review = True # Flag for review
         elif auth_info.get("required") and auth_info.get("status") != "Approved":
             line_status = "Denied - PreAuth Missing/Not Approved"
-            line_messages.append(f"Pre-authorization required but status is '{auth_info.get('status', 'Unknown')}'.")
+            line_messages.append(("pre_auth_not_approved", auth_info.get("status", "Unknown")))
             # Decide policy: Deny line or pend for review. Here we deny.
-            line_adjudication_result = { # Set financial result for denied line
-                    "line_status": line_status, "allowed_amount": 0.0, "copay_applied": 0.0, "deductible_applied": 0.0,
-                    "coinsurance_member_owes": 0.0, "member_responsibility": line.get("charge_amount", 0.0), # Member owes full charge if denied this way
-                    "insurer_payment": 0.0, "notes": line_messages,
-                    "applied_to_deductible_this_line": 0.0, "applied_to_oop_max_this_line": 0.0
-            }
+            line_adjudication_result = _denied_line_result(line_status, line, line_messages)
         else: # Pre-auth OK or not required
             if auth_info.get("required"):
-                line_messages.append(f"Pre-authorization approved (Auth #: {auth_info.get('auth_number', 'N/A')}).")
+                line_messages.append(("pre_auth_approved", auth_info.get("auth_number", "N/A")))
 
             # Optional: Check Guidelines
-            guide_ok, guide_info, guide_err = guidelines_tool.check_coverage_guidelines(cpt, icd)
+            guide_ok, guide_info, guide_err = check_guidelines(cpt, icd)
             coverage_status = "Unknown"
             if not guide_ok:
-                line_messages.append(f"Guideline check failed: {guide_err}")
+                line_messages.append(("guideline_check_failed", guide_err))
                 needs_clinical_review = True
             elif guide_info:
                 coverage_status = guide_info.get("coverage_status", "Unknown")
-                line_messages.append(f"Guideline check: {coverage_status}")
+                line_messages.append(("guideline_status", coverage_status))
                 if "Requires Review" in coverage_status:
                     needs_clinical_review = True
                 if "Not Covered" in coverage_status: # Example policy: deny if guidelines say not covered
                         line_status = "Denied - Not Covered per Guidelines"
-                        line_adjudication_result = { # Denied line result
-                        "line_status": line_status, "allowed_amount": 0.0, "copay_applied": 0.0, "deductible_applied": 0.0,
-                        "coinsurance_member_owes": 0.0, "member_responsibility": line.get("charge_amount", 0.0),
-                        "insurer_payment": 0.0, "notes": line_messages,
-                        "applied_to_deductible_this_line": 0.0, "applied_to_oop_max_this_line": 0.0
-                        }
+                        line_adjudication_result = _denied_line_result(line_status, line, line_messages)
 
         # Adjudicate Financially (if not already denied)
         if line_adjudication_result is None:
-            line_adjudication_result = benefits_engine.adjudicate_claim_line(
-                line,
-                policy_details,
-                current_claim_accumulators # Pass the mutable dict
-            )
+            with span("line_math"):
+                line_adjudication_result = benefits_engine.adjudicate_claim_line(
+                    line,
+                    policies[line_year],
+                    current_claim_accumulators[line_year], # Pass the mutable dict
+                    compiled_plans[line_year],
+                    fee_schedule,
+                )
             line_status = line_adjudication_result.get("line_status", "Error")
-            line_messages.extend(line_adjudication_result.get("notes", []))
+            line_messages.extend(line_adjudication_result.get("note_codes", []))
 
 
         # Update line data and totals
         line.update(line_adjudication_result) # Add adjudication results to the line dict
-        line["processing_messages"] = line_messages # Keep messages specific to the line
+        line["message_codes"] = line_messages # Keep messages specific to the line (rendered as processing_messages)
 
         total_member_responsibility += line.get("member_responsibility", 0.0)
         total_insurer_payment += line.get("insurer_payment", 0.0)
         total_applied_to_deductible += line.get("applied_to_deductible_this_line", 0.0)
         total_applied_to_oop += line.get("applied_to_oop_max_this_line", 0.0)
+        year_totals[line_year][0] += line.get("applied_to_deductible_this_line", 0.0)
+        year_totals[line_year][1] += line.get("applied_to_oop_max_this_line", 0.0)
 
     # 4. Finalize Claim Level Info
     adjudicated_data["claim_summary"] = {
@@ -499,10 +1318,21 @@ def adjudicate_claim(validated_claim_data: str) -> tuple[bool, dict | None, list
         "total_applied_to_deductible": round(total_applied_to_deductible, 2),
         "total_applied_to_oop_max": round(total_applied_to_oop, 2),
         "adjudication_timestamp": datetime.now().isoformat(),
-        "initial_accumulators": initial_accumulators, # Show state before this claim
-        "final_accumulators_after_claim": current_claim_accumulators, # Show state after this claim
+        "initial_accumulators": initial_accumulators[benefit_year], # Show state before this claim
+        "final_accumulators_after_claim": current_claim_accumulators[benefit_year], # Show state after this claim
         "needs_clinical_review": needs_clinical_review,
     }
+    if len(initial_accumulators) > 1:
+        # Claim spans benefit years: the accumulators above are the claim's own year, the breakdown has every year
+        adjudicated_data["claim_summary"]["benefit_years"] = {
+            year: {
+                "total_applied_to_deductible": round(year_totals[year][0], 2),
+                "total_applied_to_oop_max": round(year_totals[year][1], 2),
+                "initial_accumulators": initial_accumulators[year],
+                "final_accumulators_after_claim": current_claim_accumulators[year],
+            }
+            for year in initial_accumulators
+        }
 
     if any(l.get("line_status", "").startswith("Denied") for l in claim_lines):
         claim_level_status = "Processed - Partially or Fully Denied"
@@ -515,20 +1345,569 @@ def adjudicate_claim(validated_claim_data: str) -> tuple[bool, dict | None, list
 
     adjudicated_data["claim_level_status"] = claim_level_status
     messages.append(f"Claim adjudication status: {claim_level_status}")
+    return messages, {year: (deductible, oop) for year, (deductible, oop) in year_totals.items()}
 
-    # 5. Update Accumulators in Core System (only if claim processed without critical errors stopping adjudication)
-    if total_applied_to_deductible > 0 or total_applied_to_oop > 0:
-        update_ok, update_err = policy_client.update_member_accumulators(
-            member_id,
-            benefit_year,
-            total_applied_to_deductible,
-            total_applied_to_oop
+
+def _adjudicate_claim_for_family(adjudicated_data: dict, member_id: str, benefit_year: int, policies: dict[int, dict],
+                                 family_accumulators: dict[tuple[str, int], FamilyAccumulators], check_pre_auth,
+                                 check_guidelines, benefits_engine: "BenefitsEngineTool",
+                                 claim_id: str | None = None) -> tuple[list[str], list[tuple[str, int, float, float, str | None]]]:
+    """
+    Adjudicates a claim from the family accumulators of each of its benefit years (keyed by (member_id, year)) and
+    advances them by what the claim applies, so the family's next claim starts from the state after this one.
+    :returns: (messages, accumulator updates for update_member_accumulators_bulk)
+    """
+    messages, year_totals = _adjudicate_claim_lines(
+        adjudicated_data,
+        member_id,
+        benefit_year,
+        policies,
+        {year: family_accumulators[(member_id, year)].for_member(member_id, policies[year]) for year in policies},
+        check_pre_auth,
+        check_guidelines,
+        benefits_engine,
+    )
+    updates = []
+    for year, (deductible_applied, oop_applied) in year_totals.items():
+        if deductible_applied > 0 or oop_applied > 0: # Same condition as the core-system update
+            family_accumulators[(member_id, year)].add(member_id, deductible_applied, oop_applied)
+            updates.append((member_id, year, deductible_applied, oop_applied, claim_id))
+    return messages, updates
+
+
+def _expected_versions(member_id: str, benefit_years, family_accumulators: dict[tuple[str, int], FamilyAccumulators]) -> dict[tuple[str, int], int]:
+    # Every family record a claim's adjudication read, so a concurrent claim of any family member forces a retry
+    expected = {}
+    for year in benefit_years:
+        expected.update(family_accumulators[(member_id, year)].versions)
+    return expected
+
+
+class ClaimPrefetch:
+    """
+    The I/O of one claim's adjudication, started as early as its inputs are known and collected later:
+    the family accumulators (one bulk call for every benefit year of the claim) and the per-line pre-auth/guideline
+    checks need only the member, dates and codes, the policies additionally need the plan (start_policy).
+    Everything runs on the shared line-check pool.
+    """
+    def __init__(self, member_id: str, benefit_year: int, claim_lines: list[dict],
+                 policy_client: "CorePolicySystemAPIClient | None" = None,
+                 preauth_client: "PreAuthorizationDBClient | None" = None,
+                 guidelines_tool: "MedicalGuidelinesTool | None" = None):
+        self.member_id = member_id
+        self.benefit_year = benefit_year
+        self.benefit_years = claim_benefit_years(claim_lines, benefit_year)
+        self.policy_client = policy_client or CorePolicySystemAPIClient()
+        preauth_client = preauth_client or PreAuthorizationDBClient()
+        guidelines_tool = guidelines_tool or MedicalGuidelinesTool()
+        self.code_pairs = list(dict.fromkeys((line.get("cpt_code"), line.get("icd_10_code", "Unknown")) for line in claim_lines))
+        self.accumulators = _line_check_executor.submit(
+            self.policy_client.get_family_accumulators_bulk, [(member_id, year) for year in self.benefit_years]
         )
-        if not update_ok:
-            messages.append(f"CRITICAL WARNING: Failed to update accumulators in core system: {update_err}")
-            # This would likely require manual intervention / retry logic
+        self.preauth_futures = {
+            pair: _line_check_executor.submit(preauth_client.check_pre_auth_status, member_id, *pair) for pair in self.code_pairs
+        }
+        self.guideline_futures = {
+            pair: _line_check_executor.submit(guidelines_tool.check_coverage_guidelines, *pair) for pair in self.code_pairs
+        }
+        self.plan_id = None
+        self.policies = None
+
+    def start_policy(self, plan_id: str) -> dict:
+        """Starts fetching the plan's policy for every benefit year of the claim. :returns: {benefit_year: future}"""
+        if self.policies is None or plan_id != self.plan_id:
+            self.plan_id = plan_id
+            self.policies = {
+                year: _line_check_executor.submit(self.policy_client.get_member_policy_details, plan_id, year) for year in self.benefit_years
+            }
+        return self.policies
+
+    def covers(self, member_id: str, benefit_year: int, claim_lines: list[dict]) -> bool:
+        """True if this prefetch was started for the claim's member, benefit years and every code pair of its lines."""
+        return (member_id, benefit_year) == (self.member_id, self.benefit_year) and claim_benefit_years(claim_lines, benefit_year) == self.benefit_years and all(
+            (line.get("cpt_code"), line.get("icd_10_code", "Unknown")) in self.preauth_futures for line in claim_lines
+        )
+
+    def line_check_results(self) -> tuple[dict, dict]:
+        """(pre_auth_results keyed by (cpt, icd), guideline_results keyed by (cpt, icd))"""
+        return (
+            {pair: future.result() for pair, future in self.preauth_futures.items()},
+            {pair: future.result() for pair, future in self.guideline_futures.items()},
+        )
+
+
+ACCUMULATOR_UPDATE_LOST = "CRITICAL WARNING: Failed to update accumulators in core system"
+DUPLICATE_SUBMISSION = "Duplicate submission: returning the prior adjudication of this claim (accumulators not updated again)."
+
+# Line fields that determine a claim's adjudication; adjudication output written onto the lines is ignored
+FINGERPRINT_LINE_FIELDS = ("date_of_service", "cpt_code", "icd_10_code", "provider_npi", "charge_amount", "network_status")
+
+
+def _accumulator_update_message(update_ok: bool, update_err: str | None) -> str:
+    if not update_ok:
+        if ACCUMULATOR_JOURNAL is not None:
+            return (f"WARNING: Failed to update accumulators in core system: {update_err}. "
+                    "The deltas are journaled and will be applied when the accumulator journal is replayed.")
+        # This would likely require manual intervention / retry logic
+        return _accumulator_update_lost_message(update_err)
+    return "Core accumulators updated successfully."
+
+
+def _accumulator_update_lost_message(update_err: str | None) -> str:
+    # Nothing was applied and nothing will be replayed: the claim is not cached, so a resubmission adjudicates it again
+    return f"{ACCUMULATOR_UPDATE_LOST}: {update_err}"
+
+
+def _fingerprint_value(value):
+    # 250 and 250.0 are the same charge
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def claim_fingerprint(claim: dict) -> str:
+    """
+    Stable hash of a claim's member, plan and service lines (in order); equal for resubmissions of the same claim.
+    A claim_id, if the claim has one, is part of it, so distinct claims with identical services stay distinct.
+    """
+    lines = [[_fingerprint_value(line.get(field)) for field in FINGERPRINT_LINE_FIELDS] for line in claim.get("services", [])]
+    payload = json.dumps(
+        [claim.get("claim_id"), claim.get("member_id"), (claim.get("member_eligibility") or {}).get("plan_id"), lines],
+        separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _journal_claim_id(claim: dict) -> str:
+    """Id the claim's accumulator deltas are journaled under: its claim_id, or its fingerprint."""
+    return str(claim.get("claim_id") or claim_fingerprint(claim))
+
+
+def _is_final_adjudication(result: tuple[bool, dict | None, list[str]]) -> bool:
+    # Failures are retried for real; so is a claim whose accumulator update was lost (nothing was applied)
+    adjudicated, _, messages = result
+    return adjudicated and not any(message.startswith(ACCUMULATOR_UPDATE_LOST) for message in messages)
+
+
+def _record_adjudication(result: tuple[bool, dict | None, list[str]]):
+    # Called once per claim actually adjudicated (not for prior results handed back)
+    if ADJUDICATION_RESULT_STORE is None or not _is_final_adjudication(result):
+        return
+    adjudicated_data = result[1]
+    ok, _, benefit_year, _, _ = _get_claim_header(adjudicated_data)
+    if ok:
+        ADJUDICATION_RESULT_STORE.append_claim(adjudicated_data, _line_benefit_years(adjudicated_data["services"], benefit_year))
+
+
+def _copy_plain(value):
+    # Results are plain dicts/lists of scalars; copying just those (without a call per scalar) is several times
+    # cheaper than copy.deepcopy
+    if isinstance(value, dict):
+        return {key: _copy_plain(item) if isinstance(item, (dict, list)) else item for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_plain(item) if isinstance(item, (dict, list)) else item for item in value]
+    return value
+
+
+def _prior_adjudication(result: tuple[bool, dict | None, list[str]]) -> tuple[bool, dict | None, list[str]]:
+    # Shares the stored data: render_adjudication() copies it on the way out
+    adjudicated, adjudicated_data, messages = result
+    return adjudicated, adjudicated_data, messages + [DUPLICATE_SUBMISSION]
+
+
+def _check_output_mode(output_mode: str):
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode '{output_mode}', expected one of {OUTPUT_MODES}.")
+
+
+def tool_output_mode_error(output_mode: str) -> str | None:
+    """The error a @tool entry point returns for output_mode, or None if the mode is allowed there."""
+    if output_mode not in TOOL_OUTPUT_MODES:
+        return f"Unknown output mode '{output_mode}', expected one of {TOOL_OUTPUT_MODES}."
+    return None
+
+
+def _render_line(line: dict) -> dict:
+    rendered = {}
+    for key, value in line.items():
+        if key in LINE_NOTE_CODE_FIELDS:
+            rendered[LINE_NOTE_CODE_FIELDS[key]] = render_notes(value)
         else:
-                messages.append("Core accumulators updated successfully.")
+            rendered[key] = _copy_plain(value) if isinstance(value, (dict, list)) else value
+    return rendered
+
+
+def render_adjudication(result: tuple[bool, dict | None, list[str]], output_mode: str = "full") -> tuple[bool, dict | None, list[str]]:
+    """
+    Builds the output of an adjudication (as stored, with note codes on its lines) in one of OUTPUT_MODES.
+    The output never shares data with the stored result. Raises ValueError for an unknown output mode.
+    """
+    _check_output_mode(output_mode)
+    adjudicated, adjudicated_data, messages = result
+    if adjudicated_data is None:
+        return adjudicated, None, list(messages)
+    rendered = {}
+    for key, value in adjudicated_data.items():
+        if key != "services":
+            rendered[key] = _copy_plain(value)
+        elif output_mode == "full":
+            rendered[key] = [_render_line(line) for line in value]
+        elif output_mode == "stream":
+            rendered[key] = (_render_line(line) for line in list(value))
+    return adjudicated, rendered, list(messages)
+
 
+def invalidate_adjudication_results(claim: dict | None = None) -> int:
+    """Forgets the stored adjudication of a claim (so it is adjudicated again), or all of them if no claim is given."""
+    if claim is None:
+        dropped = len(ADJUDICATION_RESULT_CACHE)
+        ADJUDICATION_RESULT_CACHE.clear()
+        return dropped
+    return int(ADJUDICATION_RESULT_CACHE.invalidate(claim_fingerprint(claim)))
 
+
+def replay_accumulator_journal() -> int:
+    """Applies journaled accumulator deltas that have not reached the store yet (e.g. after failed updates)."""
+    return ACCUMULATOR_JOURNAL.replay(ACCUMULATOR_STORE) if ACCUMULATOR_JOURNAL is not None else 0
+
+
+def compact_accumulator_journal() -> int:
+    """Folds the accumulator journal into the accumulator snapshot and starts a new journal."""
+    return ACCUMULATOR_JOURNAL.compact(ACCUMULATOR_STORE) if ACCUMULATOR_JOURNAL is not None else 0
+
+
+def flush_adjudication_results() -> int:
+    """Writes the buffered line results to the result store (see ADJUDICATION_RESULT_STORE)."""
+    return ADJUDICATION_RESULT_STORE.flush() if ADJUDICATION_RESULT_STORE is not None else 0
+
+
+@tool
+def adjudicate_claim(validated_claim_data: str, output_mode: str = "full") -> tuple[bool, dict | None, list[str]]:
+    """
+    This method is to check and apply policy benifits and adjudication based on the validated claim data for further processing.
+
+    Parameters:
+    - validated_claim_data: validated claim data (from CIVA).
+        Here's an example of validated_claim_data format:
+        ```
+        {
+            "member_id": "MEMBER456",
+            "patient_name": "Sarah Member",
+            "member_eligibility": {"member_id": "MEMBER456", "date_of_service": "2023-10-26", "is_eligible": True, "plan_id": "HMO_SILVER"},
+            "services": [
+                {
+                    "date_of_service": "2023-10-26",
+                    "cpt_code": "99214",
+                    "icd_10_code": "M54.5",
+                    "provider_npi": "1234567890",
+                    "charge_amount": 250.00,
+                    "network_status": "In-Network"
+                },
+                {
+                    "date_of_service": "2023-10-26",
+                    "cpt_code": "80053",
+                    "icd_10_code": "M54.5",
+                    "provider_npi": "0987654321", # Assumed In-Network from CIVA
+                    "charge_amount": 120.00,
+                    "network_status": "In-Network"
+                }
+            ]
+        }
+        ```
+    - output_mode: "full" (default) returns every service line with its notes; "summary" returns only the claim
+        summary, claim status and eligibility, e.g. when only the totals are passed on to an incident.
+    :returns: (success_status, adjudicated_claim_data, list_of_messages/errors)
+    """
+    output_mode_err = tool_output_mode_error(output_mode)
+    if output_mode_err:
+        return False, None, [output_mode_err]
+    try:
+        with span("json_parse"):
+            processed_claim_data: dict = json.loads(validated_claim_data)  
+        logger.info("\n[PBAA] Received validated claim for adjudication. member_id: %s", processed_claim_data.get("member_id"))
+        logger.debug("[PBAA] processed_claim_data: %s", processed_claim_data)
+    except json.JSONDecodeError as e:
+        logger.error("Error decoding JSON: %s", e)
+        return False, None, [f"Invalid claim JSON: {e}"]
+
+    with span("adjudicate_claim"):
+        return _adjudicate_claim(processed_claim_data, output_mode=output_mode)
+
+
+def _adjudicate_claim(processed_claim_data: dict, prefetch: ClaimPrefetch | None = None,
+                      output_mode: str = "full") -> tuple[bool, dict | None, list[str]]:
+    """
+    adjudicate_claim on an already parsed claim dict (for in-process callers that skip the JSON round-trip).
+    prefetch can carry fetches the caller already started for this claim (see ClaimPrefetch).
+    output_mode is one of OUTPUT_MODES (see render_adjudication).
+    A claim with the same fingerprint as one already adjudicated gets the prior result back; concurrent
+    submissions of the same claim share one adjudication.
+    """
+    _check_output_mode(output_mode) # Before the claim is applied to the accumulators
+    fingerprint = claim_fingerprint(processed_claim_data)
+    adjudicated_here = []
+
+    def adjudicate():
+        adjudicated_here.append(True)
+        result = _adjudicate_claim_once(processed_claim_data, prefetch)
+        _record_adjudication(result)
+        return result
+
+    result = ADJUDICATION_RESULT_CACHE.get_or_load(fingerprint, adjudicate, should_cache=_is_final_adjudication)
+    if not adjudicated_here:
+        logger.info("[PBAA] Claim %s was already adjudicated; returning the prior result.", fingerprint[:12])
+        result = _prior_adjudication(result)
+    with span("render_output"):
+        return render_adjudication(result, output_mode)
+
+
+def _adjudicate_claim_once(processed_claim_data: dict, prefetch: ClaimPrefetch | None = None) -> tuple[bool, dict | None, list[str]]:
+    benefits_engine = BenefitsEngineTool()
+    
+    adjudicated_data = processed_claim_data.copy() # Work on a copy
+
+    # 1. Get Basic Info
+    ok, member_id, benefit_year, plan_id, header_err = _get_claim_header(adjudicated_data)
+    if not ok:
+        return False, adjudicated_data, [header_err]
+
+    # 2. Fetch Policy and Initial Accumulators, while the per-line pre-auth/guideline checks run concurrently
+    original_lines = [line.copy() for line in adjudicated_data.get("services", [])] # Pristine lines for re-adjudication
+    if prefetch is None or not prefetch.covers(member_id, benefit_year, original_lines):
+        prefetch = ClaimPrefetch(member_id, benefit_year, original_lines)
+    policy_client = prefetch.policy_client
+    policy_futures = prefetch.start_policy(plan_id)
+    accum_future = prefetch.accumulators
+    preauth_results, guideline_results = prefetch.line_check_results()
+
+    policies = {}
+    for year, policy_future in policy_futures.items():
+        policy_ok, policy_details, policy_err = policy_future.result()
+        if not policy_ok:
+            return False, adjudicated_data, [f"Failed to get policy details: {policy_err}"]
+        policies[year] = policy_details
+
+    member_years = [(member_id, year) for year in prefetch.benefit_years]
+    claim_id = _journal_claim_id(adjudicated_data)
+    # Held across re-adjudications, which journal the claim again (see AccumulatorJournal.hold)
+    with policy_client.hold_claims([claim_id]):
+        for attempt in range(ACCUMULATOR_CAS_MAX_ATTEMPTS):
+            # Results are written onto copies of the lines, so the stored adjudication shares nothing the caller can mutate
+            adjudicated_data["services"] = [line.copy() for line in original_lines]
+            if attempt == 0:
+                family_results = accum_future.result()
+            else:
+                # Another claim of this member's family updated the accumulators first: start over from the fresh state
+                logger.info("[PBAA] Accumulators for %s changed concurrently, re-adjudicating (attempt %s).", member_id, attempt + 1)
+                time.sleep(random.uniform(0, ACCUMULATOR_CAS_BACKOFF_SECONDS * attempt)) # Jitter so racing claims don't collide again
+                family_results = policy_client.get_family_accumulators_bulk(member_years)
+            for accum_ok, _, accum_err in family_results.values():
+                if not accum_ok:
+                    return False, adjudicated_data, [f"Failed to get initial accumulators: {accum_err}"]
+            family_accumulators = {member_year: family for member_year, (_, family, _) in family_results.items()}
+
+            # 3. & 4. Adjudicate Each Line (only the accumulator-dependent math is sequential) and Finalize Claim Level Info
+            messages, updates = _adjudicate_claim_for_family(
+                adjudicated_data,
+                member_id,
+                benefit_year,
+                policies,
+                family_accumulators,
+                lambda cpt, icd: preauth_results[(cpt, icd)],
+                lambda cpt, icd: guideline_results[(cpt, icd)],
+                benefits_engine,
+                claim_id,
+            )
+
+            # 5. Update Accumulators in Core System (only if claim processed without critical errors stopping adjudication)
+            if not updates:
+                return True, adjudicated_data, messages
+            update_ok, conflict, update_err = policy_client.update_member_accumulators_atomic(
+                updates, _expected_versions(member_id, policies, family_accumulators)
+            )
+            if not conflict:
+                messages.append(_accumulator_update_message(update_ok, update_err))
+                return True, adjudicated_data, messages
+
+        # Every attempt lost: the last one's journaled deltas were computed from stale accumulators
+        policy_client.void_journaled_updates([
+            (update_claim_id, update_member_id, year) for update_member_id, year, _, _, update_claim_id in updates
+            if update_claim_id is not None
+        ])
+    messages.append(_accumulator_update_lost_message(f"Accumulators for the family of {member_id} kept changing concurrently."))
     return True, adjudicated_data, messages
+
+
+def adjudicate_claims_batch(validated_claims: list[dict], output_mode: str = "full") -> list[tuple[bool, dict | None, list[str]]]:
+    """
+    Adjudicates many validated claims (see _adjudicate_claims_batch). Claims adjudicated before, and repeats of a
+    claim within the batch, get the prior result back instead of being applied to the accumulators again.
+    Every result is rendered in output_mode (see render_adjudication).
+    """
+    _check_output_mode(output_mode)
+    with span("adjudicate_claims_batch"):
+        results: list[tuple[bool, dict | None, list[str]] | None] = [None] * len(validated_claims)
+        first_index = {} # fingerprint -> index of its first claim in this batch
+        repeats = []
+        for idx, claim in enumerate(validated_claims):
+            fingerprint = claim_fingerprint(claim)
+            if fingerprint in first_index:
+                repeats.append((idx, first_index[fingerprint]))
+                continue
+            prior = ADJUDICATION_RESULT_CACHE.get(fingerprint)
+            if prior is not None:
+                results[idx] = _prior_adjudication(prior)
+            first_index[fingerprint] = idx
+
+        new_claims = {fingerprint: idx for fingerprint, idx in first_index.items() if results[idx] is None}
+        if new_claims:
+            for (fingerprint, idx), result in zip(
+                new_claims.items(), _adjudicate_claims_batch([validated_claims[idx] for idx in new_claims.values()])
+            ):
+                if _is_final_adjudication(result):
+                    ADJUDICATION_RESULT_CACHE.put(fingerprint, result)
+                    _record_adjudication(result)
+                results[idx] = result
+        for idx, original_idx in repeats:
+            original = results[original_idx]
+            results[idx] = _prior_adjudication(original) if _is_final_adjudication(original) else original
+        with span("render_output"):
+            return [render_adjudication(result, output_mode) for result in results]
+
+
+def _adjudicate_claims_batch(validated_claims: list[dict]) -> list[tuple[bool, dict | None, list[str]]]:
+    """
+    Adjudicates many validated claims (already parsed, same format as adjudicate_claim input) in one pass.
+
+    Policies, accumulators, pre-auths and guidelines are fetched with one bulk call each instead of one
+    call per claim/line; the accumulator call returns every family's records for every benefit year involved.
+    Claims are grouped by family and adjudicated in input order within each group, carrying the accumulator state
+    from one claim to the next, so the results are identical to calling adjudicate_claim on each claim in turn.
+    Accumulator updates are written back in one bulk call, one transaction per family.
+
+    :returns: list of (success_status, adjudicated_claim_data, list_of_messages/errors), in input order
+    """
+    logger.info("\n[PBAA] Received batch of %s validated claim(s) for adjudication.", len(validated_claims))
+    policy_client = CorePolicySystemAPIClient()
+    preauth_client = PreAuthorizationDBClient()
+    guidelines_tool = MedicalGuidelinesTool()
+    benefits_engine = BenefitsEngineTool()
+
+    results: list[tuple[bool, dict | None, list[str]] | None] = [None] * len(validated_claims)
+    headers = {}
+    for idx, claim in enumerate(validated_claims):
+        adjudicated_data = claim.copy() # Work on a copy
+        ok, member_id, benefit_year, plan_id, header_err = _get_claim_header(adjudicated_data)
+        if not ok:
+            results[idx] = (False, adjudicated_data, [header_err])
+        else:
+            headers[idx] = (adjudicated_data, member_id, benefit_year, plan_id)
+    benefit_years = {
+        idx: claim_benefit_years(adjudicated_data.get("services", []), benefit_year)
+        for idx, (adjudicated_data, _, benefit_year, _) in headers.items()
+    }
+
+    # Bulk fetch policies (every benefit year of every claim), then accumulators for the claims whose policies were found
+    policies = policy_client.get_member_policy_details_bulk(
+        [(plan_id, year) for idx, (_, _, _, plan_id) in headers.items() for year in benefit_years[idx]]
+    )
+    claim_policies = {}
+    for idx, (adjudicated_data, _, _, plan_id) in list(headers.items()):
+        failed = next((policy_err for policy_ok, _, policy_err in (policies[(plan_id, year)] for year in benefit_years[idx]) if not policy_ok), None)
+        if failed is not None:
+            results[idx] = (False, adjudicated_data, [f"Failed to get policy details: {failed}"])
+            del headers[idx]
+        else:
+            claim_policies[idx] = {year: policies[(plan_id, year)][1] for year in benefit_years[idx]}
+
+    original_lines = {idx: [line.copy() for line in adjudicated_data.get("services", [])] for idx, (adjudicated_data, _, _, _) in headers.items()}
+    claim_ids = {idx: _journal_claim_id(adjudicated_data) for idx, (adjudicated_data, _, _, _) in headers.items()}
+
+    # Bulk fetch pre-auths and guidelines for every line that will be adjudicated
+    preauth_checks = []
+    guideline_checks = []
+    for adjudicated_data, member_id, _, _ in headers.values():
+        for line in adjudicated_data.get("services", []):
+            cpt = line.get("cpt_code")
+            icd = line.get("icd_10_code", "Unknown")
+            preauth_checks.append((member_id, cpt, icd))
+            guideline_checks.append((cpt, icd))
+    preauth_results = preauth_client.check_pre_auth_status_bulk(preauth_checks) if preauth_checks else {}
+    guideline_results = guidelines_tool.check_coverage_guidelines_bulk(guideline_checks) if guideline_checks else {}
+
+    # Adjudicate each family's claims in order, carrying accumulators from claim to claim. Each family is written back
+    # as one compare-and-swap transaction; families that lost to a concurrent update are re-fetched and re-adjudicated.
+    # Held across re-adjudications, which journal the claims again (see AccumulatorJournal.hold)
+    with policy_client.hold_claims(list(claim_ids.values())):
+        pending = list(headers)
+        conflicted_updates = []
+        for attempt in range(ACCUMULATOR_CAS_MAX_ATTEMPTS):
+            if not pending:
+                break
+            if attempt:
+                logger.info("[PBAA] Accumulators changed concurrently for %s claim(s), re-adjudicating (attempt %s).", len(pending), attempt + 1)
+            family_results = policy_client.get_family_accumulators_bulk(
+                [(headers[idx][1], year) for idx in pending for year in benefit_years[idx]]
+            )
+            families: dict[str, list[int]] = {}
+            for idx in pending:
+                _, member_id, benefit_year, _ = headers[idx]
+                accum_err = next((err for ok, _, err in (family_results[(member_id, year)] for year in benefit_years[idx]) if not ok), None)
+                if accum_err is not None:
+                    results[idx] = (False, headers[idx][0], [f"Failed to get initial accumulators: {accum_err}"])
+                    continue
+                families.setdefault(family_results[(member_id, benefit_year)][1].family_id, []).append(idx)
+            family_accumulators = {member_year: family for member_year, (_, family, _) in family_results.items() if family is not None}
+
+            transactions = []
+            transaction_claims = [] # (claim indexes of the family, indexes of the claims with updates)
+            for claim_indexes in families.values():
+                family_updates = []
+                expected_versions = {}
+                updated_claims = []
+                for idx in claim_indexes:
+                    adjudicated_data, member_id, benefit_year, _ = headers[idx]
+                    adjudicated_data["services"] = [line.copy() for line in original_lines[idx]] # Fresh copies, as in _adjudicate_claim_once
+                    messages, updates = _adjudicate_claim_for_family(
+                        adjudicated_data,
+                        member_id,
+                        benefit_year,
+                        claim_policies[idx],
+                        family_accumulators,
+                        lambda cpt, icd, member_id=member_id: preauth_results[(member_id, cpt, icd)],
+                        lambda cpt, icd: guideline_results[(cpt, icd)],
+                        benefits_engine,
+                        claim_ids[idx],
+                    )
+                    results[idx] = (True, adjudicated_data, messages)
+                    expected_versions.update(_expected_versions(member_id, benefit_years[idx], family_accumulators))
+                    if updates:
+                        family_updates.extend(updates)
+                        updated_claims.append(idx)
+                if family_updates:
+                    transactions.append((family_updates, expected_versions))
+                    transaction_claims.append((claim_indexes, updated_claims))
+
+            # Update Accumulators in Core System with a single bulk call
+            if not transactions:
+                pending = []
+                break
+            update_ok, conflicts, update_err = policy_client.update_member_accumulators_bulk(transactions)
+            for index, (_, updated_claims) in enumerate(transaction_claims):
+                if index not in conflicts:
+                    for idx in updated_claims:
+                        results[idx][2].append(_accumulator_update_message(update_ok, update_err))
+            conflicted_updates = [transaction_claims[index][1] for index in sorted(conflicts)]
+            pending = [idx for index in sorted(conflicts) for idx in transaction_claims[index][0]]
+
+        if pending:
+            # Every attempt lost: the claims' last journaled deltas were computed from stale accumulators
+            lost_claims = [idx for updated_claims in conflicted_updates for idx in updated_claims]
+            policy_client.void_journaled_updates([
+                (claim_ids[idx], headers[idx][1], year) for idx in lost_claims for year in benefit_years[idx]
+            ])
+            for idx in lost_claims:
+                _, member_id, _, _ = headers[idx]
+                results[idx][2].append(_accumulator_update_lost_message(f"Accumulators for the family of {member_id} kept changing concurrently."))
+
+    return results
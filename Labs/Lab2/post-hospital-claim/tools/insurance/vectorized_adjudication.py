@@ -0,0 +1,248 @@
+"""
+Columnar (NumPy) version of BenefitsEngineTool.adjudicate_claim_line for replaying large claim files.
+
+Lines are passed as arrays (charge, network flag, rule index, member index) together with per-member limits and
+running accumulators, and optionally each member's family with the family limits. Copay, deductible, coinsurance,
+OOP-max capping and insurer payment are computed for all lines at once; the only sequential dependency (the running
+deductible/OOP totals of each member and of each family) is resolved with capped segmented cumulative sums over
+integer cents. Amounts are rounded to the cent like the scalar engine's round(x, 2); its float accumulators can
+still leave an amount a rounding error off a half cent, which then rounds a cent the other way.
+
+Family totals are only capped once the member totals are: a family limit cuts the line that reaches it and every
+later line of the family, whichever member it belongs to. That is the scalar engine's result unless a family
+member starts above the individual OOP max after the family has reached its own (accumulators the engine never
+writes).
+"""
+import numpy as np
+
+from policy_adjudication_tools import CompiledPlan, NETWORK_STATUSES
+
+
+class RuleTable:
+    """Benefit rules of one or more compiled plans laid out as parallel arrays, addressed by a global rule index."""
+    def __init__(self, compiled_plans: list[CompiledPlan]):
+        rules = [rule for plan in compiled_plans for rule in plan.rules]
+        self.plan_offsets = np.cumsum([0] + [len(plan.rules) for plan in compiled_plans[:-1]])
+        self.copay_before_deductible = np.array([rule.copay_before_deductible for rule in rules], dtype=np.float64)
+        self.deductible_applies = np.array([bool(rule.deductible_applies) for rule in rules], dtype=bool)
+        self.coinsurance = np.array([rule.coinsurance for rule in rules], dtype=np.float64)
+        self._compiled_plans = compiled_plans
+
+    def rule_indexes(self, plan_positions, cpt_codes, in_network) -> np.ndarray:
+        """Encodes lines as global rule indexes; plan_positions index into the plans this table was built from."""
+        plan_positions = np.asarray(plan_positions)
+        cpt_offsets = np.fromiter(
+            (self._compiled_plans[plan].cpt_rule_offsets.get(cpt, 0) for plan, cpt in zip(plan_positions.tolist(), cpt_codes)),
+            dtype=np.int64, count=len(plan_positions),
+        )
+        network_index = np.where(np.asarray(in_network, dtype=bool), 0, len(NETWORK_STATUSES) - 1)
+        return self.plan_offsets[plan_positions] + cpt_offsets + network_index
+
+
+# Limit in cents of a family without one
+_NO_LIMIT_CENTS = 2 ** 62
+
+
+def _to_cents(amounts) -> np.ndarray:
+    """Cents of round(amount, 2) per amount."""
+    amounts = np.asarray(amounts, dtype=np.float64)
+    scaled = amounts * 100
+    cents = np.rint(scaled)
+    # amount * 100 can land on or off a half cent the exact binary value is not on. round() decides on the exact
+    # value: split the amount's mantissa in two (Veltkamp) so both halves times 100, and so the sign of the
+    # distance to the half cent, are exact; an exact half cent goes to the even cent.
+    near_half = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    if near_half.any():
+        near = amounts[near_half]
+        split = near * 134217729.0 # 2**27 + 1
+        high = split - (split - near)
+        lower = np.floor(scaled[near_half])
+        distance = (high * 100 - (lower + 0.5)) + (near - high) * 100
+        cents[near_half] = lower + ((distance > 0) | ((distance == 0) & (lower % 2 == 1)))
+    return cents.astype(np.int64)
+
+
+def _limit_cents(limits: np.ndarray) -> np.ndarray:
+    cents = np.full(len(limits), _NO_LIMIT_CENTS, dtype=np.int64)
+    finite = np.isfinite(limits)
+    cents[finite] = _to_cents(limits[finite])
+    return cents
+
+
+def _segment_starts(member_index: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.r_[True, member_index[1:] != member_index[:-1]]) if len(member_index) else np.empty(0, dtype=np.int64)
+
+
+def _running_totals(increments_cents: np.ndarray, group_index: np.ndarray, starts: np.ndarray,
+                    initial_cents: np.ndarray, limit_cents: np.ndarray, keep_initial_above_limit: bool) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Per-group (member or family) running total capped at the group's limit: total_i = min(limit, total_{i-1} + increment_i),
+    which is initial + segmented cumsum less the largest excess over the limit so far (increments may be negative).
+    A total that starts above the limit either stays there (deductible) or is pulled back to the limit (OOP max, as
+    the scalar engine does). Returns (total before each line, total after each line) in cents.
+    """
+    cumulative = np.cumsum(increments_cents)
+    lengths = np.diff(np.r_[starts, len(increments_cents)])
+    cumulative -= np.repeat(cumulative[starts] - increments_cents[starts], lengths)
+    initial = initial_cents[group_index]
+    limit = limit_cents[group_index]
+    uncapped = initial + cumulative
+    excess = np.maximum(0, uncapped - limit)
+    if len(excess):
+        # Segmented running max: lift each segment above the previous ones
+        lift = np.repeat(np.arange(len(starts), dtype=np.int64) * (excess.max() + 1), lengths)
+        excess = np.maximum.accumulate(excess + lift) - lift
+    after = uncapped - excess
+    if keep_initial_above_limit:
+        after = np.where(initial >= limit, initial, after)
+    before = np.empty_like(after)
+    before[1:] = after[:-1]
+    before[starts] = initial[starts]
+    return before, after
+
+
+def _family_running_totals(increments_cents: np.ndarray, family_order: np.ndarray, line_family: np.ndarray,
+                           family_starts: np.ndarray, initial_cents: np.ndarray, limit_cents: np.ndarray,
+                           keep_initial_above_limit: bool) -> np.ndarray:
+    """Family total before each line (in cents, lines in member order), the family's lines taken in family_order."""
+    before, _ = _running_totals(increments_cents[family_order], line_family, family_starts, initial_cents, limit_cents,
+                                keep_initial_above_limit)
+    family_before = np.empty_like(before)
+    family_before[family_order] = before
+    return family_before
+
+
+def adjudicate_lines_vectorized(charge, in_network, rule_index, member_index, rule_table: RuleTable,
+                                deductible_limit, oop_max_limit, deductible_met, oop_max_met, allowed=None,
+                                family_index=None, family_deductible_limit=None, family_oop_max_limit=None) -> dict:
+    """
+    Adjudicates service lines column-wise. Lines of the same member, and of the same family, are processed in array
+    order.
+
+    :param charge: charge amount per line
+    :param in_network: True for In-Network lines (anything else is treated as Out-of-Network, like the scalar engine)
+    :param rule_index: global rule index per line (see RuleTable.rule_indexes)
+    :param member_index: member position per line, indexing the per-member arrays below
+    :param deductible_limit, oop_max_limit: individual limits per member (from the member's plan)
+    :param deductible_met, oop_max_met: accumulators per member before the first line
+    :param allowed: optional allowed amount per line; defaults to charge In-Network and 80% of charge Out-of-Network
+    :param family_index: optional family position per member, indexing the per-family limits below. Family totals
+                         are the sums of the members' accumulators, so every member of a family must be in the
+                         per-member arrays, with lines or not. Without it every member is a family of one.
+    :param family_deductible_limit, family_oop_max_limit: limits per family (required with family_index); inf
+                         where the family has none, as for a family of one or a plan without family limits
+    :returns: dict of per-line arrays named like the scalar line result, plus per-member
+              "final_deductible_met" / "final_oop_max_met"
+    """
+    charge = np.asarray(charge, dtype=np.float64)
+    in_network = np.asarray(in_network, dtype=bool)
+    rule_index = np.asarray(rule_index, dtype=np.int64)
+    member_index = np.asarray(member_index, dtype=np.int64)
+    deductible_met = np.asarray(deductible_met, dtype=np.float64)
+    oop_max_met = np.asarray(oop_max_met, dtype=np.float64)
+    if allowed is None:
+        allowed = np.where(in_network, charge, charge * 0.8)
+    else:
+        allowed = np.asarray(allowed, dtype=np.float64)
+
+    # Group each member's lines together, keeping their relative order
+    order = None
+    if len(member_index) > 1 and np.any(member_index[1:] < member_index[:-1]):
+        order = np.argsort(member_index, kind="stable")
+        charge, in_network, rule_index, member_index, allowed = (
+            charge[order], in_network[order], rule_index[order], member_index[order], allowed[order]
+        )
+    starts = _segment_starts(member_index)
+
+    if family_index is not None:
+        if family_deductible_limit is None or family_oop_max_limit is None:
+            raise ValueError("family_index needs family_deductible_limit and family_oop_max_limit.")
+        family_index = np.asarray(family_index, dtype=np.int64)
+        family_deductible_limit = np.asarray(family_deductible_limit, dtype=np.float64)
+        family_oop_max_limit = np.asarray(family_oop_max_limit, dtype=np.float64)
+        line_family = family_index[member_index]
+        # A family's lines in their original order, whichever member they belong to
+        family_order = np.lexsort((np.arange(len(member_index)) if order is None else order, line_family))
+        family_lines = (family_order, line_family[family_order], _segment_starts(line_family[family_order]))
+        family_count = len(family_deductible_limit)
+
+    # 1. Copay (only rules where it applies before the deductible carry a non-zero copay)
+    copay_rule = rule_table.copay_before_deductible[rule_index]
+    copay_applied = np.where(copay_rule > 0, np.minimum(copay_rule, allowed), 0.0)
+    remaining = allowed - copay_applied
+
+    # 2. Deductible: the running total grows by each line's rounded deductible amount, capped at the limit
+    deductible_eligible = np.where(rule_table.deductible_applies[rule_index] & (remaining > 0), remaining, 0.0)
+    deductible_limit_cents = _to_cents(deductible_limit)
+    deductible_met_cents = _to_cents(deductible_met)
+    deductible_before, deductible_after = _running_totals(
+        _to_cents(deductible_eligible), member_index, starts, deductible_met_cents, deductible_limit_cents, True
+    )
+    # Remaining amounts are taken in dollars, as the scalar engine does, so a half cent rounds the same way
+    remaining_deductible = np.maximum(0.0, np.asarray(deductible_limit, dtype=np.float64)[member_index] - deductible_before / 100.0)
+    if family_index is not None:
+        # Up to the line that reaches the family limit the member totals are uncut, so their increments drive the
+        # family total; from that line on nothing is left of the family deductible
+        family_before = _family_running_totals(
+            deductible_after - deductible_before, *family_lines,
+            np.bincount(family_index, weights=deductible_met_cents, minlength=family_count).astype(np.int64),
+            _limit_cents(family_deductible_limit), True,
+        )
+        remaining_deductible = np.minimum(
+            remaining_deductible, np.maximum(0.0, family_deductible_limit[line_family] - family_before / 100.0)
+        )
+    deductible_applied = np.where(
+        (deductible_eligible > 0) & (remaining_deductible > 0), np.minimum(deductible_eligible, remaining_deductible), 0.0
+    )
+    remaining = remaining - deductible_applied
+
+    # 3. Coinsurance
+    coinsurance_rate = rule_table.coinsurance[rule_index]
+    coinsurance_member_owes = np.where((remaining > 0) & (coinsurance_rate > 0), remaining * coinsurance_rate, 0.0)
+    remaining = remaining - coinsurance_member_owes
+
+    # 4. & 5. Insurer payment and OOP max capping
+    applied_to_oop = copay_applied + deductible_applied + coinsurance_member_owes
+    oop_limit = np.asarray(oop_max_limit, dtype=np.float64)[member_index]
+    oop_met_cents = _to_cents(oop_max_met)
+    oop_before, oop_after = _running_totals(
+        _to_cents(applied_to_oop), member_index, starts, oop_met_cents, _to_cents(oop_max_limit), False
+    )
+    overage = oop_before / 100.0 + applied_to_oop - oop_limit
+    if family_index is not None:
+        family_before = _family_running_totals(
+            oop_after - oop_before, *family_lines,
+            np.bincount(family_index, weights=oop_met_cents, minlength=family_count).astype(np.int64),
+            _limit_cents(family_oop_max_limit), False,
+        )
+        family_oop_limit = np.where(np.isfinite(family_oop_max_limit), family_oop_max_limit, np.inf)[line_family]
+        overage = np.maximum(overage, family_before / 100.0 + applied_to_oop - family_oop_limit)
+    overage = np.maximum(0.0, overage)
+    applied_to_oop = applied_to_oop - overage
+
+    applied_to_deductible_cents = _to_cents(deductible_applied)
+    applied_to_oop_cents = _to_cents(applied_to_oop)
+    results = {
+        "allowed_amount": allowed,
+        "copay_applied": copay_applied,
+        "deductible_applied": deductible_applied,
+        "coinsurance_member_owes": coinsurance_member_owes,
+        "member_responsibility": _to_cents(copay_applied + deductible_applied + coinsurance_member_owes - overage) / 100.0,
+        "insurer_payment": _to_cents(remaining + overage) / 100.0,
+        "applied_to_deductible_this_line": applied_to_deductible_cents / 100.0,
+        "applied_to_oop_max_this_line": applied_to_oop_cents / 100.0,
+    }
+    if order is not None:
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(order))
+        results = {name: values[inverse] for name, values in results.items()}
+
+    # Accumulators grow by the rounded line amounts, as in the scalar engine
+    member_count = len(deductible_met)
+    results["final_deductible_met"] = (
+        deductible_met_cents + np.bincount(member_index, weights=applied_to_deductible_cents, minlength=member_count).astype(np.int64)
+    ) / 100.0
+    results["final_oop_max_met"] = (
+        oop_met_cents + np.bincount(member_index, weights=applied_to_oop_cents, minlength=member_count).astype(np.int64)
+    ) / 100.0
+    return results